@@ -16,23 +16,26 @@ Agent Guardian - Error Classification, Circuit Breaker & Loop Detection
   breaker = CircuitBreaker("state/api-health.json")
   state = breaker.check_health("todoist")
   breaker.record_result("todoist", success=True)
+  breaker.transact("todoist", transition)  # 自訂轉換：單次加鎖 read-modify-write
 
   # 跨進程使用（PostToolUse hook）：
   detector = LoopDetector(warning_mode=True, initial_state=saved_state)
   result = detector.check_loop(tool, params, output)
   saved_state = detector.get_state()  # 寫回 state/loop-state-{sid}.json
 """
+import copy
 import hashlib
 import json
 import os
 import re
+import time
 from collections import deque
 from datetime import datetime, timedelta
 from typing import Dict, Optional
 
-# Import shared API source patterns, regex cache, and file lock
+# Import shared API source detection, regex cache, and file lock
 try:
-    from hook_utils import API_SOURCE_PATTERNS, FileLock, get_compiled_regex
+    from hook_utils import FileLock, detect_api_sources, get_compiled_regex
     _FILE_LOCK_AVAILABLE = True
 except ImportError:
     _FILE_LOCK_AVAILABLE = False
@@ -45,6 +48,11 @@ except ImportError:
         "gmail": ["gmail.googleapis"],
     }
 
+    def detect_api_sources(text: str) -> list:
+        lower = text.lower()
+        return [source for source, patterns in API_SOURCE_PATTERNS.items()
+                if any(p in lower for p in patterns)]
+
     # Standalone fallback: simple cache for compiled regex
     _standalone_regex_cache: dict = {}
 
@@ -55,6 +63,12 @@ except ImportError:
         return _standalone_regex_cache[key]
 
 
+# CircuitBreaker 進程內狀態快取：{絕對路徑: (檔案簽章, 讀取時間 ns, state)}
+_health_state_cache: Dict[str, tuple] = {}
+# 檔案時間戳精度不足時（FAT 2 秒），此時間窗內的 mtime 不足以證明內容未變
+_RACY_WINDOW_NS = 2_000_000_000
+
+
 # ============================================
 # Error Classifier
 # ============================================
@@ -195,12 +209,9 @@ class ErrorClassifier:
             }
 
     def _detect_api_source(self, command: str) -> Optional[str]:
-        """偵測 API 來源（使用 hook_utils.API_SOURCE_PATTERNS 共用定義）"""
-        lower_cmd = command.lower()
-        for source, patterns in API_SOURCE_PATTERNS.items():
-            if any(p in lower_cmd for p in patterns):
-                return source
-        return None
+        """偵測 API 來源（使用 hook_utils 共用掃描器，取 API_SOURCE_PATTERNS 順序第一個）"""
+        sources = detect_api_sources(command)
+        return sources[0] if sources else None
 
     def _extract_http_status(self, output: str) -> Optional[int]:
         """提取 HTTP 狀態碼"""
@@ -305,110 +316,156 @@ class CircuitBreaker:
             with open(self.state_file, "w", encoding="utf-8") as f:
                 json.dump(state, f, ensure_ascii=False, indent=2)
 
+    def _file_signature(self) -> Optional[tuple]:
+        """狀態檔案簽章（mtime, inode, size）；檔案不存在時為 None"""
+        try:
+            st = os.stat(self.state_file)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def _read_state(self) -> Dict:
+        """讀取狀態，簽章未變時直接使用進程內快取（不讀檔）。
+
+        mtime 落在讀取時間 _RACY_WINDOW_NS 內的快取視為不可信（同一時間刻度內
+        可能又被改寫而簽章不變），此時一律重讀，直到取得「夠舊」的簽章為止。
+        """
+        key = os.path.abspath(self.state_file)
+        signature = self._file_signature()
+        cached = _health_state_cache.get(key)
+        if (cached and signature is not None and cached[0] == signature
+                and signature[0] < cached[1] - _RACY_WINDOW_NS):
+            return copy.deepcopy(cached[2])
+        read_ns = time.time_ns()
+        state = self._load_state()
+        if signature is not None and self._file_signature() == signature:
+            _health_state_cache[key] = (signature, read_ns, copy.deepcopy(state))
+        else:
+            _health_state_cache.pop(key, None)
+        return state
+
     def _atomic_update(self, updater):
         """以檔案鎖保護的 read-modify-write 操作。
 
         使用 hook_utils.FileLock 避免團隊模式中多個並行 Agent
         同時讀寫 api-health.json 導致狀態覆蓋（競態條件）。
+        內容未改變時不寫檔。
 
         Args:
           updater: callable(state_dict) -> None，原地修改 state dict
         """
         if _FILE_LOCK_AVAILABLE:
             with FileLock(self.state_file):
-                state = self._load_state()
-                updater(state)
-                self._save_state(state)
+                self._apply_update(updater)
         else:
             # Fallback：hook_utils 不可用時退化為無鎖模式（直接讀寫）
-            state = self._load_state()
-            updater(state)
+            self._apply_update(updater)
+
+    def _apply_update(self, updater):
+        state = self._read_state()
+        before = copy.deepcopy(state)
+        updater(state)
+        if state != before:
             self._save_state(state)
+            _health_state_cache.pop(os.path.abspath(self.state_file), None)
 
-    def _get_api_state(self, api_source: str) -> Dict:
-        """取得特定 API 的狀態"""
-        state = self._load_state()
-        if api_source not in state:
-            def _init(s):
-                s[api_source] = {
-                    "state": self.STATE_CLOSED,
-                    "failures": 0,
-                    "cooldown": None
-                }
-            self._atomic_update(_init)
-            state = self._load_state()
-        return state[api_source]
+    def transact(self, api_source: str, transition) -> Dict:
+        """單次加鎖 read-modify-write：檢查並轉換特定 API 的狀態。
+
+        條目不存在時先初始化為 closed；transition(entry) 回傳新條目，
+        回傳 None 代表不變。整個過程只持有一次鎖、最多寫入一次。
+
+        Returns:
+          交易後的 API 狀態條目
+        """
+        result = {}
+
+        def _do_transact(state):
+            if api_source not in state:
+                state[api_source] = self._initial_entry()
+            updated = transition(dict(state[api_source]))
+            if updated is not None:
+                state[api_source] = updated
+            result.update(state[api_source])
+
+        self._atomic_update(_do_transact)
+        return result
+
+    def _initial_entry(self) -> Dict:
+        return {"state": self.STATE_CLOSED, "failures": 0, "cooldown": None}
+
+    def _entry(self, new_state: str, failures: int, cooldown: Optional[datetime] = None) -> Dict:
+        return {
+            "state": new_state,
+            "failures": failures,
+            "cooldown": cooldown.isoformat() if cooldown else None
+        }
+
+    def _cooldown_elapsed(self, api_state: Dict) -> bool:
+        """open 狀態且 cooldown 期已過"""
+        if api_state["state"] != self.STATE_OPEN:
+            return False
+        cooldown_str = api_state.get("cooldown")
+        return bool(cooldown_str) and datetime.now() >= datetime.fromisoformat(cooldown_str)
 
     def check_health(self, api_source: str) -> str:
         """
         檢查 API 健康狀態。
 
+        快取命中且不需轉換狀態時不讀檔也不取鎖；需要初始化條目或
+        open -> half_open 轉換時才進入 transact()，並在鎖內重新判斷。
+
         Returns:
           "closed" | "open" | "half_open"
         """
-        api_state = self._get_api_state(api_source)
-        current_state = api_state["state"]
+        api_state = self._read_state().get(api_source)
+        if api_state is not None and not self._cooldown_elapsed(api_state):
+            return api_state["state"]
 
-        # 若為 open 狀態，檢查是否已過 cooldown 期
-        if current_state == self.STATE_OPEN:
-            cooldown_str = api_state.get("cooldown")
-            if cooldown_str:
-                cooldown_time = datetime.fromisoformat(cooldown_str)
-                if datetime.now() >= cooldown_time:
-                    # cooldown 期過，轉為 half_open
-                    self._update_state(api_source, self.STATE_HALF_OPEN, failures=api_state["failures"])
-                    return self.STATE_HALF_OPEN
+        def _to_half_open(entry):
+            # cooldown 期過，轉為 half_open
+            if self._cooldown_elapsed(entry):
+                return self._entry(self.STATE_HALF_OPEN, entry["failures"])
+            return None
 
-        return current_state
+        return self.transact(api_source, _to_half_open)["state"]
 
     def record_result(self, api_source: str, success: bool):
         """
-        記錄 API 呼叫結果並更新狀態。
+        記錄 API 呼叫結果並更新狀態（單次加鎖 read-modify-write）。
 
         Args:
           api_source: API 來源（如 "todoist"）
           success: 是否成功
         """
-        api_state = self._get_api_state(api_source)
+        self.transact(api_source, lambda entry: self._next_entry(entry, success))
+
+    def _next_entry(self, api_state: Dict, success: bool) -> Optional[Dict]:
+        """三態狀態機：依呼叫結果回傳新條目，None 代表不變"""
         current_state = api_state["state"]
         failures = api_state["failures"]
 
         if success:
             # 成功 -> 重置失敗計數，狀態轉為 closed
-            self._update_state(api_source, self.STATE_CLOSED, failures=0)
-        else:
-            # 失敗處理
-            if current_state == self.STATE_CLOSED:
-                failures += 1
-                if failures >= self.FAILURE_THRESHOLD:
-                    # 達到閾值 -> 轉為 open，設定 cooldown
-                    cooldown = datetime.now() + timedelta(seconds=self.COOLDOWN_SECONDS)
-                    self._update_state(api_source, self.STATE_OPEN, failures=failures, cooldown=cooldown)
-                else:
-                    # 未達閾值 -> 保持 closed，累積失敗計數
-                    self._update_state(api_source, self.STATE_CLOSED, failures=failures)
-
-            elif current_state == self.STATE_HALF_OPEN:
-                # half_open 狀態試探失敗 -> 轉回 open，cooldown 翻倍
-                cooldown_seconds = min(self.COOLDOWN_SECONDS * 2, self.COOLDOWN_MAX_SECONDS)
-                cooldown = datetime.now() + timedelta(seconds=cooldown_seconds)
-                self._update_state(api_source, self.STATE_OPEN, failures=failures, cooldown=cooldown)
-
-    def _update_state(
-        self,
-        api_source: str,
-        new_state: str,
-        failures: int,
-        cooldown: Optional[datetime] = None
-    ):
-        """更新狀態（使用檔案鎖避免競態條件）"""
-        def _do_update(state):
-            state[api_source] = {
-                "state": new_state,
-                "failures": failures,
-                "cooldown": cooldown.isoformat() if cooldown else None
-            }
-        self._atomic_update(_do_update)
+            return self._entry(self.STATE_CLOSED, 0)
+
+        # 失敗處理
+        if current_state == self.STATE_CLOSED:
+            failures += 1
+            if failures >= self.FAILURE_THRESHOLD:
+                # 達到閾值 -> 轉為 open，設定 cooldown
+                cooldown = datetime.now() + timedelta(seconds=self.COOLDOWN_SECONDS)
+                return self._entry(self.STATE_OPEN, failures, cooldown)
+            # 未達閾值 -> 保持 closed，累積失敗計數
+            return self._entry(self.STATE_CLOSED, failures)
+
+        if current_state == self.STATE_HALF_OPEN:
+            # half_open 狀態試探失敗 -> 轉回 open，cooldown 翻倍
+            cooldown_seconds = min(self.COOLDOWN_SECONDS * 2, self.COOLDOWN_MAX_SECONDS)
+            cooldown = datetime.now() + timedelta(seconds=cooldown_seconds)
+            return self._entry(self.STATE_OPEN, failures, cooldown)
+
+        return None
 
 
 # ============================================
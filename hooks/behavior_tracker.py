@@ -13,14 +13,30 @@ Behavior Pattern Tracker — Instinct Lite 行為模式採集器。
   - 信心分數：重複觀察 → 信心遞增（0.1 ~ 1.0）
   - 滾動視窗：30 天未觀察的模式自動衰減
   - 敏感資訊消毒：summary_sample 寫入前自動移除 token/key/secret
+  - Write-behind：track() 只在記憶體累加（O(1)、不取鎖），批次寫出
+
+寫入流程（避免每次工具呼叫都持鎖改寫整個 behavior-patterns.json）：
+  1. track()：同簽名的增量在本進程記憶體中合併
+  2. flush()：累積 FLUSH_EVERY 次、超過 FLUSH_INTERVAL_SECONDS 或進程結束時，
+     把合併後的增量以單次寫入附加到當日 journal（只持 journal 的短鎖，
+     不碰主檔的鎖；所有進程共用同一檔，hook_utils.journal_append）
+         context/behavior-patterns.journal/{YYYY-MM-DD}.jsonl
+  3. merge_pending()：持 FileLock 把所有 journal 的新增行合併進
+     behavior-patterns.json（已合併 offset 與結果一起原子寫入，
+     已合併完的前幾日 journal 隨即刪除；hook_utils.replay_journal）。
+     journal 每跨過 MERGE_EVERY_BYTES 或檔案超過 MERGE_INTERVAL_SECONDS
+     未更新時由 flush() 以非阻塞方式觸發；report() 讀取前也會合併。
 
 使用方式：
   由 post_tool_logger.py 在寫入 JSONL 後呼叫 track()。
   也可獨立執行 `python behavior_tracker.py report` 查看統計。
 """
+import atexit
 import hashlib
+import heapq
 import json
 import os
+import time
 from datetime import datetime, timedelta
 
 # Use script-relative path to avoid CWD dependency in team mode
@@ -32,6 +48,18 @@ DECAY_DAYS = 14     # 超過 14 天未觀察的模式移除（原 30 天過於
 CONFIDENCE_INCREMENT = 0.05
 CONFIDENCE_MAX = 1.0
 CONFIDENCE_INITIAL = 0.1
+CLEANUP_EVERY = 100           # 每累計 100 次呼叫清理一次過期模式
+FLUSH_EVERY = 20              # 記憶體緩衝累計呼叫數上限
+FLUSH_INTERVAL_SECONDS = 10   # 記憶體緩衝最長停留時間
+MERGE_EVERY_BYTES = 16 * 1024
+MERGE_INTERVAL_SECONDS = 60
+JOURNAL_SUFFIX = ".journal"
+OFFSETS_KEY = "_journal_offsets"
+
+# 本進程尚未寫出的增量：sig → 合併後的增量（保持插入順序）
+_pending: dict = {}
+_pending_calls = 0
+_last_flush = time.monotonic()
 
 
 def _sanitize_summary(summary: str) -> str:
@@ -105,9 +133,14 @@ def _cleanup_stale(data: dict) -> dict:
     return data
 
 
+def _journal_dir() -> str:
+    """回傳 behavior-patterns.json 對應的 journal 目錄。"""
+    return os.path.splitext(PATTERNS_FILE)[0] + JOURNAL_SUFFIX
+
+
 def track(tool: str, summary: str, tags: list, has_error: bool = False,
           input_len: int = 0, output_len: int = 0):
-    """追蹤一次工具呼叫模式。
+    """追蹤一次工具呼叫模式（只在記憶體累加，達門檻時批次寫出）。
 
     Args:
         tool: 工具名稱（Bash/Read/Write/Edit 等）
@@ -117,67 +150,175 @@ def track(tool: str, summary: str, tags: list, has_error: bool = False,
         input_len: 輸入大小（chars）
         output_len: 輸出大小（chars）
     """
+    global _pending_calls
     try:
         sig = _compute_signature(tool, summary)
+        now = datetime.now().astimezone().isoformat()
+
+        delta = _pending.get(sig)
+        if delta is None:
+            # 消毒摘要，移除敏感資訊後再儲存（僅新簽名需要樣本）
+            delta = _pending[sig] = {
+                "sig": sig,
+                "tool": tool,
+                "summary": _sanitize_summary(summary)[:150],
+                "tags": list(set(tags))[:5],
+                "n": 0, "ok": 0, "in": 0, "out": 0,
+                "first": now,
+            }
+        delta["n"] += 1
+        if not has_error:
+            delta["ok"] += 1
+        delta["in"] += input_len
+        delta["out"] += output_len
+        delta["last"] = now
+        _pending_calls += 1
+
+        if _pending_calls >= FLUSH_EVERY or time.monotonic() - _last_flush >= FLUSH_INTERVAL_SECONDS:
+            flush()
+    except Exception:
+        pass  # 靜默失敗，不中斷 Agent 流程
 
-        # 消毒摘要，移除敏感資訊後再儲存
-        safe_summary = _sanitize_summary(summary)
 
-        # FileLock 保護 read-modify-write 序列，防並行覆蓋
-        try:
-            from hook_utils import FileLock
-            lock_ctx = FileLock(PATTERNS_FILE)
-        except ImportError:
-            from contextlib import nullcontext
-            lock_ctx = nullcontext()
-
-        with lock_ctx:
-            data = _load_patterns()
-            patterns = data.setdefault("patterns", {})
-            now = datetime.now().astimezone().isoformat()
-
-            if sig in patterns:
-                p = patterns[sig]
-                p["count"] += 1
-                p["confidence"] = min(p["confidence"] + CONFIDENCE_INCREMENT, CONFIDENCE_MAX)
-                p["last_seen"] = now
-                if not has_error:
-                    p["success_count"] = p.get("success_count", 0) + 1
-                # 更新 Token 經濟統計
-                p["total_input"] = p.get("total_input", 0) + input_len
-                p["total_output"] = p.get("total_output", 0) + output_len
-            else:
-                # 新模式
-                if len(patterns) >= MAX_PATTERNS:
-                    # 移除信心最低的模式
-                    lowest = min(patterns, key=lambda k: patterns[k].get("confidence", 0))
-                    del patterns[lowest]
-
-                patterns[sig] = {
-                    "tool": tool,
-                    "summary_sample": safe_summary[:150],
-                    "tags": list(set(tags))[:5],
-                    "count": 1,
-                    "confidence": CONFIDENCE_INITIAL,
-                    "success_count": 1 if not has_error else 0,
-                    "first_seen": now,
-                    "last_seen": now,
-                    "total_input": input_len,
-                    "total_output": output_len,
-                }
-
-            # 每 100 次呼叫清理一次過期模式
-            total_calls = sum(p.get("count", 0) for p in patterns.values())
-            if total_calls % 100 == 0:
-                data = _cleanup_stale(data)
-
-            _save_patterns(data)
+def flush(merge: bool = False) -> None:
+    """把記憶體中的增量附加到當日 journal（不取主檔的鎖），必要時合併進主檔。
+
+    Args:
+        merge: True 時一律合併（可等待鎖）；False 時僅在到期時以非阻塞方式嘗試
+    """
+    global _pending_calls, _last_flush
+    try:
+        due = False
+        if _pending:
+            lines = "".join(json.dumps(d, ensure_ascii=False) + "\n" for d in _pending.values())
+            data = lines.encode("utf-8")
+            from hook_utils import journal_append, journal_crossed
+            end = journal_append(_journal_dir(), data)
+            _pending.clear()
+            _pending_calls = 0
+            due = journal_crossed(end, len(data), MERGE_EVERY_BYTES)
+            try:
+                due = due or time.time() - os.path.getmtime(PATTERNS_FILE) > MERGE_INTERVAL_SECONDS
+            except OSError:
+                due = True
+        _last_flush = time.monotonic()
+        if merge or due:
+            merge_pending(timeout_seconds=10 if merge else 0)
     except Exception:
-        pass  # 靜默失敗，不中斷 Agent 流程
+        pass  # 靜默失敗（鎖被其他進程占用時下次再合併）
+
+
+atexit.register(flush)
+
+
+def _apply_delta(patterns: dict, delta: dict, evict_heap: list) -> None:
+    """把單一簽名的合併增量套用到 patterns（與逐次更新的結果一致）。"""
+    sig = delta["sig"]
+    n = delta.get("n", 0)
+    p = patterns.get(sig)
+    if p is not None:
+        p["count"] = p.get("count", 0) + n
+        p["confidence"] = min(p.get("confidence", 0) + CONFIDENCE_INCREMENT * n, CONFIDENCE_MAX)
+        p["last_seen"] = max(p.get("last_seen", ""), delta.get("last", ""))
+        p["success_count"] = p.get("success_count", 0) + delta.get("ok", 0)
+        # 更新 Token 經濟統計
+        p["total_input"] = p.get("total_input", 0) + delta.get("in", 0)
+        p["total_output"] = p.get("total_output", 0) + delta.get("out", 0)
+        return
+
+    # 新模式：滿額時以 min-heap 淘汰信心最低（同分時最久未觀察）的模式
+    if len(patterns) >= MAX_PATTERNS:
+        if not evict_heap:
+            evict_heap.extend(
+                (v.get("confidence", 0), v.get("last_seen", ""), k) for k, v in patterns.items()
+            )
+            heapq.heapify(evict_heap)
+        _evict_lowest(patterns, evict_heap)
+
+    p = patterns[sig] = {
+        "tool": delta.get("tool", ""),
+        "summary_sample": delta.get("summary", ""),
+        "tags": delta.get("tags", []),
+        "count": n,
+        "confidence": min(CONFIDENCE_INITIAL + CONFIDENCE_INCREMENT * (n - 1), CONFIDENCE_MAX),
+        "success_count": delta.get("ok", 0),
+        "first_seen": delta.get("first", ""),
+        "last_seen": delta.get("last", ""),
+        "total_input": delta.get("in", 0),
+        "total_output": delta.get("out", 0),
+    }
+    if evict_heap:
+        heapq.heappush(evict_heap, (p["confidence"], p["last_seen"], sig))
+
+
+def _evict_lowest(patterns: dict, evict_heap: list) -> None:
+    """彈出 heap 最小值並刪除對應模式。
+
+    heap 建立後模式仍可能被累加（信心只增不減），因此彈出的條目若已過期
+    就以目前值重新放回，直到彈出的條目與現況一致。
+    """
+    while evict_heap:
+        confidence, last_seen, sig = heapq.heappop(evict_heap)
+        p = patterns.get(sig)
+        if p is None:
+            continue
+        current = (p.get("confidence", 0), p.get("last_seen", ""), sig)
+        if current != (confidence, last_seen, sig):
+            heapq.heappush(evict_heap, current)
+            continue
+        del patterns[sig]
+        return
+
+
+def merge_pending(timeout_seconds: float = 10) -> None:
+    """持 FileLock 把所有 journal 新增的增量合併進 behavior-patterns.json。
+
+    各 journal 已合併到的 byte offset 與結果一起原子寫入，中斷後重跑不會重複計數；
+    已完整合併且日期早於今天的 journal 在寫入後刪除。
+
+    Raises:
+        TimeoutError: timeout_seconds 內無法取得鎖
+    """
+    jdir = _journal_dir()
+    if not os.path.isdir(jdir):
+        return
+
+    try:
+        from hook_utils import FileLock, remove_journals, replay_journal
+        lock_ctx = FileLock(PATTERNS_FILE, timeout_seconds=timeout_seconds)
+    except ImportError:
+        return  # 無法安全合併時保留 journal，待下次合併
+
+    with lock_ctx:
+        data = _load_patterns()
+        patterns = data.setdefault("patterns", {})
+        evict_heap: list = []
+        calls = data.get("calls_since_cleanup", 0)
+
+        def apply(delta: dict) -> None:
+            nonlocal calls
+            if delta.get("sig"):
+                _apply_delta(patterns, delta, evict_heap)
+                calls += delta.get("n", 0)
+
+        replayed = replay_journal(jdir, data.get(OFFSETS_KEY, {}), apply)
+        if replayed is None:
+            return
+        new_offsets, consumed = replayed
+
+        # 清理觸發改用計數器（不再每次加總所有模式的 count）
+        if calls >= CLEANUP_EVERY:
+            data = _cleanup_stale(data)
+            calls = 0
+        data["calls_since_cleanup"] = calls
+        data[OFFSETS_KEY] = new_offsets
+        _save_patterns(data)
+        remove_journals(consumed)
 
 
 def report():
     """產出行為模式統計報告。"""
+    flush(merge=True)
     data = _load_patterns()
     patterns = data.get("patterns", {})
 
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Hook Client — 轉發 hook 請求到常駐 hook_daemon 的 stdin/stdout shim。
+
+取代直接執行 hook 腳本，協議不變（stdin 讀 JSON、stdout 輸出 JSON）：
+
+    python hooks/hook_client.py pre_bash_guard      # 取代 python hooks/pre_bash_guard.py
+    python hooks/hook_client.py post_tool_logger    # 取代 python hooks/post_tool_logger.py
+
+刻意只 import json/os/socket/sys，讓 shim 本身的啟動成本維持最低；
+規則解析、正則編譯等工作都在 daemon 的熱進程中完成。
+
+daemon 不可用時的降級：
+  - 連線失敗：在本進程直接執行原 hook（行為與未使用 daemon 時相同），
+    並在背景啟動 daemon 供後續呼叫使用
+  - 請求已送出但回應失敗：PreToolUse guard 改在本進程重新判定（不可放寬攔截）；
+    post_tool_logger 輸出 {} 跳過，避免 daemon 稍後完成時重複寫入日誌
+  - HOOK_DAEMON=0：完全停用 daemon，直接在本進程執行
+"""
+import json
+import os
+import socket
+import sys
+
+_HOOKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 與 hook_daemon.HOOK_MODULES 一致（不 import hook_daemon 以免拖慢 shim 啟動）
+_HOOK_MODULES = ("pre_bash_guard", "pre_read_guard", "pre_write_guard", "post_tool_logger")
+# 回應失敗時可安全在本進程重跑的 hook（無累積副作用的 PreToolUse guard）
+_RERUNNABLE_HOOKS = ("pre_bash_guard", "pre_read_guard", "pre_write_guard")
+
+CONNECT_TIMEOUT = 0.5
+RESPONSE_TIMEOUT = 60
+
+
+class DaemonUnavailableError(Exception):
+    """daemon 未啟動或無法連線（請求尚未送出）。"""
+
+
+def _default_info_path() -> str:
+    return os.path.join(os.path.dirname(_HOOKS_DIR), "state", "hook-daemon.json")
+
+
+def send_request(payload: dict, info_path: str = None, timeout: float = RESPONSE_TIMEOUT) -> "dict | None":
+    """送出請求並回傳 daemon 回應；daemon 不可用時回傳 None。"""
+    try:
+        return _exchange(payload, info_path or _default_info_path(), timeout)
+    except (DaemonUnavailableError, OSError, ValueError):
+        return None
+
+
+def _exchange(payload: dict, info_path: str, timeout: float) -> dict:
+    """與 daemon 交換一次請求/回應。
+
+    Raises:
+        DaemonUnavailableError: 連線資訊不存在或連線失敗（請求未送出）
+        OSError / ValueError: 請求送出後的傳輸或解析失敗
+    """
+    try:
+        with open(info_path, encoding="utf-8") as f:
+            info = json.load(f)
+        if info.get("family") == "unix":
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            address = info["address"]
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            address = tuple(info["address"])
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(address)
+    except (OSError, ValueError, KeyError, AttributeError) as exc:
+        raise DaemonUnavailableError(str(exc)) from exc
+
+    with sock:
+        sock.settimeout(timeout)
+        sock.sendall(json.dumps(dict(payload, token=info.get("token", "")),
+                                ensure_ascii=False).encode("utf-8"))
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    response = json.loads(b"".join(chunks).decode("utf-8"))
+    if not isinstance(response, dict):
+        raise ValueError("malformed response")
+    return response
+
+
+def _run_locally(hook: str, stdin_text: str) -> None:
+    """在本進程執行原 hook 腳本（daemon 不可用時的降級路徑）。"""
+    import io
+    import runpy
+    if _HOOKS_DIR not in sys.path:
+        sys.path.insert(0, _HOOKS_DIR)
+    sys.stdin = io.StringIO(stdin_text)
+    runpy.run_path(os.path.join(_HOOKS_DIR, f"{hook}.py"), run_name="__main__")
+
+
+def _spawn_daemon() -> None:
+    """在背景啟動 daemon（已在執行時 daemon 會自行退出）。"""
+    import subprocess
+    kwargs = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL,
+              "stderr": subprocess.DEVNULL, "close_fds": True}
+    if os.name == "nt":
+        kwargs["creationflags"] = (getattr(subprocess, "DETACHED_PROCESS", 0)
+                                   | getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0))
+    else:
+        kwargs["start_new_session"] = True
+    try:
+        subprocess.Popen([sys.executable, os.path.join(_HOOKS_DIR, "hook_daemon.py"), "serve"],
+                         **kwargs)
+    except OSError:
+        pass
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in _HOOK_MODULES:
+        print(f"用法: python hook_client.py <{'|'.join(_HOOK_MODULES)}>", file=sys.stderr)
+        print("{}")
+        sys.exit(0)
+    hook = argv[0]
+
+    try:
+        stdin_text = sys.stdin.read()
+    except Exception:
+        stdin_text = ""
+
+    if os.environ.get("HOOK_DAEMON", "1") == "0":
+        _run_locally(hook, stdin_text)
+        return
+
+    payload = {"op": "run", "hook": hook, "stdin": stdin_text,
+               "env": dict(os.environ), "cwd": os.getcwd()}
+    try:
+        response = _exchange(payload, _default_info_path(), RESPONSE_TIMEOUT)
+    except DaemonUnavailableError:
+        if os.environ.get("HOOK_DAEMON_AUTOSTART", "1") != "0":
+            _spawn_daemon()
+        _run_locally(hook, stdin_text)
+        return
+    except (OSError, ValueError) as exc:
+        print(f"[hook_client] daemon response failed: {exc}", file=sys.stderr)
+        response = {"error": str(exc)}
+
+    if "error" in response:
+        if hook in _RERUNNABLE_HOOKS:
+            _run_locally(hook, stdin_text)
+            return
+        print("{}")
+        sys.exit(0)
+
+    if response.get("stderr"):
+        sys.stderr.write(response["stderr"])
+    sys.stdout.write(response.get("stdout", ""))
+    sys.stdout.flush()
+    sys.exit(response.get("exit_code", 0))
+
+
+if __name__ == "__main__":
+    main()
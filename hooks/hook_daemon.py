@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+Hook Daemon — 常駐 Hook 伺服器，消除每次工具呼叫的 Python 冷啟動成本。
+
+每次 PreToolUse/PostToolUse 原本都要啟動全新直譯器：重新 import yaml、
+重新解析 config/hook-rules.yaml、重新編譯正則、重新建立 ErrorClassifier。
+本模組讓這些 hook 在單一常駐進程中執行，跨呼叫保留：
+  - hook_utils 的 YAML 快取（_yaml_config_cache / _yaml_file_cache）
+  - get_compiled_regex 的 LRU 正則快取
+  - post_tool_logger 模組層級的 ErrorClassifier 與 BENIGN_PATTERNS
+
+搭配 hooks/hook_client.py（stdin/stdout shim，維持現有 JSON 協議）使用：
+
+    "command": "python hooks/hook_client.py pre_bash_guard"
+
+傳輸層：
+  - POSIX：Unix domain socket（state/hook-daemon.sock）
+  - Windows：127.0.0.1 隨機埠（無 AF_UNIX 時）
+  連線資訊與隨機 token 寫入 state/hook-daemon.json（POSIX 權限 0600），
+  每個請求都須附上 token，防止其他本機進程冒用。
+
+熱重載：每次請求前比對 hooks/*.py 與 config/hook-rules.yaml 等檔案的
+mtime/size，有變動時卸載已載入的 hook 模組，下次請求重新 import。
+
+並行：每個連線由獨立執行緒處理；hook 依類型分兩條執行道（lane）——
+pre_* guard 與 post_tool_logger 各自序列化，PreToolUse 不會排在
+PostToolUse 記錄（例如送 ntfy）之後。serve 期間 sys.stdin/stdout/stderr
+與 os.environ 換成執行緒區域代理，兩條道同時執行也不會互相覆寫；
+工作目錄（cwd）只有 guard 道會切換，post_tool_logger 一律使用絕對路徑。
+
+使用方式：
+  python hooks/hook_daemon.py serve [--idle-timeout 1800]
+  python hooks/hook_daemon.py status
+  python hooks/hook_daemon.py stop
+"""
+import argparse
+import hmac
+import importlib
+import io
+import json
+import os
+import secrets
+import socket
+import sys
+import threading
+import time
+from collections.abc import MutableMapping
+
+_HOOKS_DIR = os.path.dirname(os.path.abspath(__file__))
+if _HOOKS_DIR not in sys.path:
+    sys.path.insert(0, _HOOKS_DIR)
+
+from hook_utils import FileLock, get_project_root  # noqa: E402
+
+# 允許透過 daemon 執行的 hook 模組（皆為 stdin JSON → stdout JSON 的 main()）
+HOOK_MODULES = frozenset({
+    "pre_bash_guard",
+    "pre_read_guard",
+    "pre_write_guard",
+    "post_tool_logger",
+})
+
+# 變動時需要重新載入 hook 模組的設定檔（相對於 config/）
+WATCHED_CONFIG_FILES = ("hook-rules.yaml", "otel-config.yaml")
+
+# 需要套用 client 端 cwd 的 hook（guard 以 realpath 判斷相對路徑）
+GUARD_HOOKS = frozenset(name for name in HOOK_MODULES if name.startswith("pre_"))
+
+DEFAULT_IDLE_TIMEOUT = 1800  # 秒；無請求超過此時間自動結束
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+
+def get_daemon_info_path() -> str:
+    """回傳 daemon 連線資訊檔路徑（state/hook-daemon.json）。"""
+    return os.path.join(get_project_root(), "state", "hook-daemon.json")
+
+
+def recv_all(conn: socket.socket, limit: int = MAX_REQUEST_BYTES) -> bytes:
+    """讀取直到對方關閉寫入端（shutdown SHUT_WR）。"""
+    chunks = []
+    total = 0
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > limit:
+            raise ValueError(f"request exceeds {limit} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+class _ThreadLocalStream:
+    """sys.stdin/stdout/stderr 代理：執行緒綁定自己的串流，未綁定時沿用原串流。"""
+
+    def __init__(self, default):
+        self._default = default
+        self._local = threading.local()
+
+    def bind(self, stream) -> None:
+        self._local.stream = stream
+
+    def _target(self):
+        stream = getattr(self._local, "stream", None)
+        return self._default if stream is None else stream
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+    def __iter__(self):
+        return iter(self._target())
+
+
+class _ThreadLocalEnviron(MutableMapping):
+    """os.environ 代理：執行緒綁定 client 端的環境變數，未綁定時沿用原 environ。"""
+
+    def __init__(self, default):
+        self._default = default
+        self._local = threading.local()
+
+    def bind(self, env) -> None:
+        self._local.env = env
+
+    def _target(self):
+        env = getattr(self._local, "env", None)
+        return self._default if env is None else env
+
+    def __getitem__(self, key):
+        return self._target()[key]
+
+    def __setitem__(self, key, value):
+        self._target()[key] = value
+
+    def __delitem__(self, key):
+        del self._target()[key]
+
+    def __iter__(self):
+        return iter(self._target())
+
+    def __len__(self):
+        return len(self._target())
+
+    def copy(self) -> dict:
+        return dict(self._target())
+
+
+def install_thread_local_io():
+    """把 sys 串流與 os.environ 換成執行緒區域代理，回傳還原函式。"""
+    saved = (sys.stdin, sys.stdout, sys.stderr, os.environ)
+    sys.stdin, sys.stdout, sys.stderr = (_ThreadLocalStream(s) for s in saved[:3])
+    os.environ = _ThreadLocalEnviron(saved[3])
+
+    def restore():
+        sys.stdin, sys.stdout, sys.stderr, os.environ = saved
+
+    return restore
+
+
+def run_hook_inprocess(hook: str, stdin_text: str, env: dict = None, cwd: str = None) -> dict:
+    """在目前進程內執行 hook 的 main()，擷取 stdout/stderr 與結束碼。
+
+    以 io.StringIO 取代 sys.stdin/stdout/stderr，並在呼叫期間套用
+    client 端的環境變數與工作目錄（hook 依賴 AGENT_PHASE、DIGEST_TRACE_ID 等）。
+    已安裝執行緒區域代理（install_thread_local_io）時只綁定本執行緒；
+    否則直接交換全域狀態，呼叫端須確保同一時間只有一個 hook 在執行。
+    cwd 一律為全域狀態，同時執行的呼叫中最多只能有一個傳入 cwd。
+
+    Returns:
+        {"stdout": str, "stderr": str, "exit_code": int}
+    """
+    if hook not in HOOK_MODULES:
+        raise ValueError(f"unknown hook: {hook}")
+
+    module = importlib.import_module(hook)
+    out, err = io.StringIO(), io.StringIO()
+    proxies = (sys.stdin, sys.stdout, sys.stderr)
+    env_proxy = os.environ if isinstance(os.environ, _ThreadLocalEnviron) else None
+    thread_local = all(isinstance(proxy, _ThreadLocalStream) for proxy in proxies)
+    if thread_local:
+        saved_streams = saved_env = None
+    else:
+        saved_streams = proxies
+        saved_env = dict(os.environ) if env is not None else None
+    saved_cwd = os.getcwd() if cwd else None
+    exit_code = 0
+    try:
+        if thread_local:
+            for proxy, stream in zip(proxies, (io.StringIO(stdin_text), out, err)):
+                proxy.bind(stream)
+            if env is not None and env_proxy is not None:
+                env_proxy.bind(dict(env))
+        else:
+            if env is not None:
+                os.environ.clear()
+                os.environ.update(env)
+            sys.stdin, sys.stdout, sys.stderr = io.StringIO(stdin_text), out, err
+        if cwd and os.path.isdir(cwd):
+            os.chdir(cwd)
+        try:
+            module.main()
+        except SystemExit as exc:
+            code = exc.code
+            exit_code = code if isinstance(code, int) else (0 if code is None else 1)
+        except Exception as exc:
+            print(f"[hook_daemon] {hook} failed: {exc}", file=err)
+            exit_code = 1
+    finally:
+        if thread_local:
+            for proxy in proxies:
+                proxy.bind(None)
+            if env_proxy is not None:
+                env_proxy.bind(None)
+        else:
+            sys.stdin, sys.stdout, sys.stderr = saved_streams
+            if saved_env is not None:
+                os.environ.clear()
+                os.environ.update(saved_env)
+        if saved_cwd:
+            try:
+                os.chdir(saved_cwd)
+            except OSError:
+                pass
+    return {"stdout": out.getvalue(), "stderr": err.getvalue(), "exit_code": exit_code}
+
+
+class HookDaemon:
+    """常駐 hook 伺服器：每連線一執行緒，guard / post 兩條道各自序列化，跨呼叫保留模組快取。"""
+
+    def __init__(self, info_path: str = None, idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+                 use_unix: bool = None):
+        self.info_path = info_path or get_daemon_info_path()
+        self.idle_timeout = idle_timeout
+        self.use_unix = hasattr(socket, "AF_UNIX") if use_unix is None else use_unix
+        self.token = secrets.token_hex(16)
+        self.sock = None
+        self.address = None
+        self.requests_served = 0
+        self._running = False
+        self._guard_lock = threading.Lock()
+        self._post_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self._watch_signature = self._compute_watch_signature()
+
+    # ── 熱重載 ────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _compute_watch_signature() -> tuple:
+        """hooks/*.py 與監看設定檔的 (path, mtime_ns, size) 快照。"""
+        paths = []
+        try:
+            with os.scandir(_HOOKS_DIR) as it:
+                paths.extend(e.path for e in it if e.name.endswith(".py"))
+        except OSError:
+            pass
+        config_dir = os.path.join(get_project_root(), "config")
+        paths.extend(os.path.join(config_dir, name) for name in WATCHED_CONFIG_FILES)
+        signature = []
+        for path in sorted(paths):
+            try:
+                st = os.stat(path)
+                signature.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    def reload_if_changed(self) -> bool:
+        """檔案有變動時卸載 hooks/ 下已載入的模組（含 hook_utils 快取），回傳是否重載。"""
+        signature = self._compute_watch_signature()
+        if signature == self._watch_signature:
+            return False
+        self._watch_signature = signature
+        for name, module in list(sys.modules.items()):
+            module_file = getattr(module, "__file__", None) or ""
+            if name == __name__ or name == "__main__":
+                continue
+            if os.path.dirname(os.path.abspath(module_file)) == _HOOKS_DIR or name == "context_compressor":
+                del sys.modules[name]
+        # hook_daemon 本身持有的 FileLock/get_project_root 無狀態，不需重新綁定
+        importlib.invalidate_caches()
+        return True
+
+    # ── socket 生命週期 ───────────────────────────────────────────────────
+
+    def bind(self) -> None:
+        """建立監聽 socket 並寫出連線資訊檔。"""
+        state_dir = os.path.dirname(self.info_path)
+        os.makedirs(state_dir, exist_ok=True)
+        if self.use_unix:
+            path = os.path.join(state_dir, "hook-daemon.sock")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.bind(path)
+            os.chmod(path, 0o600)
+            self.address = {"family": "unix", "address": path}
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.bind(("127.0.0.1", 0))
+            self.address = {"family": "tcp", "address": list(self.sock.getsockname())}
+        self.sock.listen(16)
+
+        info = dict(self.address, token=self.token, pid=os.getpid(),
+                    started=time.strftime("%Y-%m-%dT%H:%M:%S"))
+        fd = os.open(self.info_path + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(info, f)
+        os.replace(self.info_path + ".tmp", self.info_path)
+
+    def close(self) -> None:
+        """關閉 socket 並移除連線資訊檔（僅移除自己寫出的那份）。"""
+        self._running = False
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+        try:
+            with open(self.info_path, encoding="utf-8") as f:
+                if json.load(f).get("token") == self.token:
+                    os.remove(self.info_path)
+        except (OSError, ValueError):
+            pass
+        if self.address and self.address["family"] == "unix":
+            try:
+                os.remove(self.address["address"])
+            except OSError:
+                pass
+
+    def _wake_accept(self) -> None:
+        """連一次自己的監聽埠，讓主迴圈立即從 accept() 返回並檢查 _running。"""
+        if not self.address:
+            return
+        family = socket.AF_UNIX if self.address["family"] == "unix" else socket.AF_INET
+        address = self.address["address"]
+        try:
+            with socket.socket(family, socket.SOCK_STREAM) as s:
+                s.settimeout(1)
+                s.connect(address if family == socket.AF_UNIX else tuple(address))
+        except OSError:
+            pass
+
+    # ── 請求處理 ──────────────────────────────────────────────────────────
+
+    def handle_request(self, request: dict) -> dict:
+        """處理單一請求（已解析的 JSON），回傳回應 dict。"""
+        if not hmac.compare_digest(str(request.get("token", "")), self.token):
+            return {"error": "unauthorized"}
+
+        op = request.get("op", "run")
+        if op == "ping":
+            return {"ok": True, "pid": os.getpid(), "requests_served": self.requests_served}
+        if op == "shutdown":
+            self._running = False
+            self._wake_accept()
+            return {"ok": True}
+        if op != "run":
+            return {"error": f"unknown op: {op}"}
+
+        hook = request.get("hook", "")
+        if hook not in HOOK_MODULES:
+            return {"error": f"unknown hook: {hook}"}
+
+        # 重載會卸載模組：須等兩條道都空閒（檔案未變動時不取鎖）
+        if self._compute_watch_signature() != self._watch_signature:
+            with self._guard_lock, self._post_lock:
+                self.reload_if_changed()
+
+        is_guard = hook in GUARD_HOOKS
+        with self._guard_lock if is_guard else self._post_lock:
+            result = run_hook_inprocess(
+                hook,
+                request.get("stdin", ""),
+                env=request.get("env"),
+                cwd=request.get("cwd") if is_guard else None,
+            )
+        with self._counter_lock:
+            self.requests_served += 1
+        return result
+
+    def _serve_connection(self, conn: socket.socket) -> None:
+        try:
+            conn.settimeout(30)
+            try:
+                request = json.loads(recv_all(conn).decode("utf-8"))
+                response = self.handle_request(request) if isinstance(request, dict) else {"error": "bad request"}
+            except (ValueError, UnicodeDecodeError) as exc:
+                response = {"error": f"bad request: {exc}"}
+            conn.sendall(json.dumps(response, ensure_ascii=False).encode("utf-8"))
+        except OSError:
+            pass  # client 已離線，不影響後續請求
+        finally:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def serve_forever(self) -> None:
+        """每個連線交給獨立執行緒處理，直到 shutdown 或閒置逾時。"""
+        if self.sock is None:
+            self.bind()
+        self._running = True
+        self.sock.settimeout(1.0)
+        restore_io = install_thread_local_io()
+        workers = set()
+        last_activity = time.monotonic()
+        try:
+            while self._running:
+                try:
+                    conn, _ = self.sock.accept()
+                except socket.timeout:
+                    workers = {t for t in workers if t.is_alive()}
+                    if workers:
+                        last_activity = time.monotonic()
+                    elif self.idle_timeout and time.monotonic() - last_activity > self.idle_timeout:
+                        break
+                    continue
+                except OSError:
+                    break
+                if not self._running:
+                    conn.close()
+                    break
+                worker = threading.Thread(target=self._serve_connection, args=(conn,), daemon=True)
+                worker.start()
+                workers.add(worker)
+                last_activity = time.monotonic()
+        finally:
+            for worker in workers:
+                worker.join(timeout=30)
+            restore_io()
+            self.close()
+
+
+def _send_control(op: str, info_path: str = None) -> "dict | None":
+    """對執行中的 daemon 送出控制請求（ping/shutdown），無法連線時回傳 None。"""
+    from hook_client import send_request
+    return send_request({"op": op}, info_path=info_path or get_daemon_info_path(), timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常駐 Hook 伺服器")
+    sub = parser.add_subparsers(dest="command")
+    serve_p = sub.add_parser("serve", help="啟動 daemon（前景執行）")
+    serve_p.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT,
+                         help=f"閒置逾時秒數（預設 {DEFAULT_IDLE_TIMEOUT}，0 表示不逾時）")
+    sub.add_parser("status", help="查詢 daemon 狀態")
+    sub.add_parser("stop", help="停止 daemon")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        info_path = get_daemon_info_path()
+        try:
+            # 單一實例：持有 info 檔的鎖直到結束，重複啟動者立即退出
+            with FileLock(info_path, timeout_seconds=0):
+                HookDaemon(info_path=info_path, idle_timeout=args.idle_timeout).serve_forever()
+        except TimeoutError:
+            print("[hook_daemon] already running", file=sys.stderr)
+        return
+
+    if args.command in ("status", "stop"):
+        result = _send_control("ping" if args.command == "status" else "shutdown")
+        print(json.dumps(result or {"running": False}, ensure_ascii=False))
+        sys.exit(0 if result else 1)
+
+    parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
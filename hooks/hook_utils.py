@@ -61,18 +61,87 @@ API_SOURCE_PATTERNS = {
 }
 
 
-def detect_api_sources(text: str) -> list:
+def _trie_pattern(node: dict) -> str:
+    """把字面字串 trie 轉成 regex；每一層依首字元分支，貪婪比對最長者。"""
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:  # 此節點本身即完整字面字串，後續字元可有可無
+        body = f"(?:{body})?" if len(branches) == 1 else body + "?"
+    return body
+
+
+class LiteralScanner:
+    """多組字面字串的單趟掃描器（供 post_tool_logger / agent_guardian 分類共用）。
+
+    所有字面字串建成一棵 trie 並編譯為單一 lookahead regex，由 re 引擎在 C 層
+    逐位置比對，一趟即取得每個命中的位置；同一位置較短的字面字串（最長命中
+    的前綴）由預先計算的前綴表補齊，因此重疊命中不會遺漏。
+
+    Args:
+        groups: {label: [literal, ...]}；同一字面字串可屬於多個 label。
+    """
+
+    def __init__(self, groups: dict):
+        labels: dict = {}
+        for label, literals in groups.items():
+            for literal in literals:
+                if literal and label not in labels.setdefault(literal, ()):
+                    labels[literal] += (label,)
+        self._labels = labels
+        # 每個字面字串 → 同位置必定一起命中的字面字串（自身與其前綴，長到短）
+        self._chains = {
+            literal: [other for other in sorted(labels, key=len, reverse=True)
+                      if literal.startswith(other)]
+            for literal in labels
+        }
+        trie: dict = {}
+        for literal in labels:
+            node = trie
+            for ch in literal:
+                node = node.setdefault(ch, {})
+            node[""] = {}
+        self._regex = re.compile(f"(?=({_trie_pattern(trie)}))") if labels else None
+
+    def scan(self, text: str) -> list:
+        """回傳所有命中 [(offset, literal, labels), ...]，依 offset 排序。"""
+        if self._regex is None:
+            return []
+        hits = []
+        for match in self._regex.finditer(text):
+            offset = match.start()
+            for literal in self._chains[match.group(1)]:
+                hits.append((offset, literal, self._labels[literal]))
+        return hits
+
+    def labels(self, text: str) -> set:
+        """回傳 text 中出現過的 label 集合。"""
+        return {label for _, _, labels in self.scan(text) for label in labels}
+
+
+_api_source_scanner = None
+
+
+def api_sources_from_hits(hits: list) -> list:
+    """從 LiteralScanner 命中清單取出 API 來源（依 API_SOURCE_PATTERNS 順序）。"""
+    found = {label for _, _, labels in hits for label in labels}
+    return [source for source in API_SOURCE_PATTERNS if source in found]
+
+
+def detect_api_sources(text: str, scanner: "LiteralScanner" = None) -> list:
     """Detect which API sources are referenced in a command/path.
 
     Uses the shared API_SOURCE_PATTERNS dict for consistent detection
-    across post_tool_logger and agent_guardian.
+    across post_tool_logger and agent_guardian. Callers that already hold a
+    LiteralScanner built with API_SOURCE_PATTERNS labels may pass it in.
     """
-    sources = []
-    lower = text.lower()
-    for source, patterns in API_SOURCE_PATTERNS.items():
-        if any(p in lower for p in patterns):
-            sources.append(source)
-    return sources
+    global _api_source_scanner
+    if scanner is None:
+        if _api_source_scanner is None:
+            _api_source_scanner = LiteralScanner(API_SOURCE_PATTERNS)
+        scanner = _api_source_scanner
+    return api_sources_from_hits(scanner.scan(text.lower()))
 
 
 # Prompt Injection 偵測 patterns（供 hook 或 Python 腳本引用）
@@ -298,8 +367,9 @@ def log_blocked_event(session_id, tool, summary, reason, guard_tag, level: str =
         "summary": sanitize_sensitive_data(summary[:200]),
         "tags": [level, guard_tag],
     }
-    with open(log_file, "a", encoding="utf-8") as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    from log_reader import append_log_line
+    append_log_line(log_file, (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"),
+                    entry["sid"])
 
 
 def read_stdin_json():
@@ -381,7 +451,13 @@ class FileLock:
                     while True:
                         try:
                             fcntl.flock(self._lock_fd.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
-                            break
+                            # 前一持有者釋放時會刪除鎖檔：若鎖到的是已被刪除的舊檔，
+                            # 新進者可能同時鎖住重建的新檔，須重新開檔再搶鎖
+                            if self._holds_current_lock_file():
+                                break
+                            self._lock_fd.close()
+                            self._lock_fd = open(self.lock_path, "w")
+                            continue
                         except OSError:
                             if time.monotonic() >= deadline:
                                 self._lock_fd.close()
@@ -402,6 +478,13 @@ class FileLock:
             raise
         return self
 
+    def _holds_current_lock_file(self) -> bool:
+        """已開啟的鎖檔是否仍是 lock_path 目前指向的檔案（POSIX inode 比對）。"""
+        try:
+            return os.path.samestat(os.fstat(self._lock_fd.fileno()), os.stat(self.lock_path))
+        except OSError:
+            return False
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self._lock_fd:
             # Windows msvcrt 必須先解鎖再關閉檔案，否則鎖可能殘留
@@ -410,11 +493,19 @@ class FileLock:
                 msvcrt.locking(self._lock_fd.fileno(), msvcrt.LK_UNLCK, 1)
             except (ImportError, OSError, ValueError):
                 pass
-            self._lock_fd.close()
+            # POSIX 在仍持鎖時刪除鎖檔，等待者鎖到舊檔後可由 inode 比對發現並重試；
+            # Windows 無法刪除開啟中的檔案，於關閉後再刪
             try:
                 os.remove(self.lock_path)
+                removed = True
             except OSError:
-                pass
+                removed = False
+            self._lock_fd.close()
+            if not removed:
+                try:
+                    os.remove(self.lock_path)
+                except OSError:
+                    pass
         return False  # 不吞掉例外
 
 
@@ -532,6 +623,91 @@ def atomic_write_lines(filepath: str, lines: list) -> None:
         raise
 
 
+# ── 附加式 journal（token_journal、behavior_tracker 共用）─────────────────
+# 每日一檔：{journal_dir}/{YYYY-MM-DD}.jsonl。寫入端持該 journal 自己的短鎖、
+# 以單次 write 附加完整的行（不碰主檔的鎖）；壓實端持主檔的 FileLock 重播新增
+# 的行，已合併的 byte offset 由呼叫端與主檔一起原子寫入。
+JOURNAL_DELETE_GRACE_SECONDS = 60
+
+
+def journal_append(journal_dir: str, data: bytes) -> int:
+    """把完整的一或多行附加到當日 journal，回傳寫入後的檔案大小。
+
+    Windows CRT 的 append 是先 seek 再 write，並行的進程可能互相覆寫，
+    因此寫入時持該 journal 的 FileLock（只鎖這一次 write，與壓實端的主檔鎖無關）。
+    檔名只依日期，hook 進程再多也不會產生額外的檔案。
+    """
+    os.makedirs(journal_dir, exist_ok=True)
+    path = os.path.join(journal_dir, datetime.now().strftime("%Y-%m-%d") + ".jsonl")
+    flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0)
+    with FileLock(path):
+        fd = os.open(path, flags, 0o644)
+        try:
+            os.write(fd, data)
+            return os.lseek(fd, 0, os.SEEK_END)
+        finally:
+            os.close(fd)
+
+
+def journal_crossed(end: int, written: int, every_bytes: int) -> bool:
+    """本次附加是否跨過 every_bytes 的整數倍（用於觸發壓實）。"""
+    return end // every_bytes != (end - written) // every_bytes
+
+
+def replay_journal(journal_dir: str, offsets: dict, apply) -> "tuple[dict, list] | None":
+    """從各 journal 已合併的 offset 起逐行解析 JSON，把 dict 交給 apply()。
+
+    呼叫端須持有主檔的 FileLock。回傳 (new_offsets, consumed)：
+      - new_offsets 只含目前仍存在的 journal（已刪除的檔案其 offset 自然移除）
+      - consumed 為已完整重播、日期早於今天且閒置超過寬限期的 journal，
+        呼叫端在原子寫入主檔（含 new_offsets）之後以 remove_journals() 刪除
+    沒有任何 journal、也沒有待移除的 offset 條目時回傳 None（呼叫端不必改寫主檔）。
+    """
+    from log_reader import iter_new_lines
+
+    try:
+        names = sorted(n for n in os.listdir(journal_dir) if n.endswith(".jsonl"))
+    except OSError:
+        names = []
+    if not names:
+        return ({}, []) if offsets else None
+
+    today = datetime.now().strftime("%Y-%m-%d")
+    now = datetime.now().timestamp()
+    new_offsets, consumed = {}, []
+    for name in names:
+        path = os.path.join(journal_dir, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        offset = offsets.get(name, 0)
+        if offset > st.st_size:
+            offset = 0  # 刪除後又被重新建立
+        for line, offset in iter_new_lines(path, offset):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                apply(record)
+        new_offsets[name] = offset
+        if (name[:10] < today and offset >= os.path.getsize(path)
+                and now - st.st_mtime > JOURNAL_DELETE_GRACE_SECONDS):
+            consumed.append(path)
+    return new_offsets, consumed
+
+
+def remove_journals(paths: list) -> None:
+    """刪除已合併的 journal（主檔寫入之後呼叫；下次重播時其 offset 條目隨之移除）。"""
+    for path in paths:
+        try:
+            with FileLock(path):
+                os.remove(path)
+        except (OSError, TimeoutError):
+            pass
+
+
 # 通用 YAML 檔案快取（任意路徑，與 _yaml_config_cache 的 hook-rules.yaml 分開）
 _yaml_file_cache: dict = {}
 
@@ -607,7 +783,7 @@ def safe_load_json(filepath: str, default=None):
 
 
 def cleanup_stale_state_files(max_age_hours: int = 48) -> dict:
-    """清理過期的 loop-state-*.json 和 stop-alert-*.json 檔案。
+    """清理過期的 loop-state-*.json、stop-alert-*.json 和 phase3-trace-*.json 檔案。
 
     Args:
         max_age_hours: 檔案最大保留時間（預設 48 小時）
@@ -624,7 +800,7 @@ def cleanup_stale_state_files(max_age_hours: int = 48) -> dict:
         return result
 
     cutoff = datetime.now().timestamp() - (max_age_hours * 3600)
-    patterns = ["loop-state-*.json", "stop-alert-*.json"]
+    patterns = ["loop-state-*.json", "stop-alert-*.json", "phase3-trace-*.json"]
 
     import glob as _glob
     for pattern in patterns:
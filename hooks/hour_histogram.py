@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Hour Histogram — 時段分析工具共用的 24×N（小時 × 日）失敗矩陣
+
+time_slot_risk_scorer、peak_hour_analyzer、trace_analyzer 原本各自以 dict
+逐筆累加每小時的總數與失敗數。本模組以 epoch 秒陣列與失敗權重一次分桶：
+
+    matrix = build_matrix(frame.numeric("ts"), failures, utc_offset=8 * 3600)
+    matrix.hour_totals()     # [24]      各小時總筆數
+    matrix.hour_failures()   # [24]      各小時失敗數（權重加總）
+    matrix.failure_rates()   # [24]      失敗率（無資料為 0.0）
+    matrix.trends()          # [24]      各小時「每日失敗率」的最小平方斜率（/天）
+
+有 numpy 時以 bincount 完成分桶與斜率計算；未安裝時退回純 Python 迴圈，
+結果相同。
+"""
+import math
+from datetime import date, timedelta
+
+try:  # numpy 為選用依賴；未安裝時以純 Python 計算
+    import numpy as np
+except ImportError:  # pragma: no cover - 僅在未安裝 numpy 的環境執行
+    np = None
+
+HOURS = 24
+_HOUR_SECONDS = 3600
+_DAY_SECONDS = 86400
+_EPOCH_DATE = date(1970, 1, 1)
+
+
+def _as_numpy(values, dtype):
+    """array 模組陣列以 buffer 直接轉換（不逐元素建立 Python 物件）。"""
+    typecode = getattr(values, "typecode", None)
+    if typecode is not None:
+        return np.frombuffer(values, dtype=np.dtype(typecode)).astype(dtype, copy=False)
+    return np.asarray(values, dtype=dtype)
+
+
+class HourDayMatrix:
+    """24 × N 的小時/日計數矩陣；第 j 欄對應 first_day + j 天。"""
+
+    def __init__(self, first_day, totals, failures):
+        # totals / failures：numpy 時為 (24, N) ndarray，否則為 24 個長度 N 的 list
+        self.first_day = first_day
+        self.totals = totals
+        self.failures = failures
+
+    @property
+    def n_days(self) -> int:
+        return len(self.totals[0])
+
+    def days(self) -> list:
+        """各欄對應的日期（YYYY-MM-DD）。"""
+        if self.first_day is None:
+            return []
+        return [(_EPOCH_DATE + timedelta(days=self.first_day + j)).isoformat()
+                for j in range(self.n_days)]
+
+    def hour_totals(self) -> list:
+        if np is not None and isinstance(self.totals, np.ndarray):
+            return self.totals.sum(axis=1).tolist()
+        return [sum(row) for row in self.totals]
+
+    def hour_failures(self) -> list:
+        if np is not None and isinstance(self.failures, np.ndarray):
+            return self.failures.sum(axis=1).tolist()
+        return [sum(row) for row in self.failures]
+
+    def failure_rates(self) -> list:
+        return [f / t if t else 0.0 for t, f in zip(self.hour_totals(), self.hour_failures())]
+
+    def trends(self) -> list:
+        """各小時每日失敗率對日序的最小平方斜率；有資料的天數少於 2 時為 0.0。"""
+        if np is not None and isinstance(self.totals, np.ndarray):
+            return _numpy_trends(self.totals, self.failures)
+        slopes = []
+        for totals, failures in zip(self.totals, self.failures):
+            points = [(x, f / t) for x, (t, f) in enumerate(zip(totals, failures)) if t]
+            n = len(points)
+            sx = sum(x for x, _ in points)
+            sy = sum(y for _, y in points)
+            sxx = sum(x * x for x, _ in points)
+            sxy = sum(x * y for x, y in points)
+            denom = n * sxx - sx * sx
+            slopes.append((n * sxy - sx * sy) / denom if denom > 0 else 0.0)
+        return slopes
+
+
+def _numpy_trends(totals, failures) -> list:
+    observed = totals > 0
+    rates = np.divide(failures, totals, out=np.zeros(totals.shape, dtype=float), where=observed)
+    weight = observed.astype(float)
+    x = np.arange(totals.shape[1], dtype=float)
+    n = weight.sum(axis=1)
+    sx = weight @ x
+    sy = rates.sum(axis=1)
+    sxx = weight @ (x * x)
+    sxy = rates @ x
+    denom = n * sxx - sx * sx
+    slopes = np.divide(n * sxy - sx * sy, denom, out=np.zeros(HOURS), where=denom > 0)
+    return slopes.tolist()
+
+
+def build_matrix(epochs, failures=None, utc_offset: int = 0, hours=None) -> HourDayMatrix:
+    """把每筆記錄分桶到 (hour, day)。
+
+    Args:
+        epochs: 每筆的 epoch 秒（NaN 表示時間缺漏，該筆不計）
+        failures: 每筆的失敗權重（bool 或次數）；None 代表全部成功
+        utc_offset: 換算小時與日期用的時區偏移秒數（如 UTC+8 → 28800）
+        hours: 已知的小時欄位（如 log_index 的 hour，< 0 不計）；None 時由 epochs 換算
+    """
+    if np is not None:
+        return _build_numpy(epochs, failures, utc_offset, hours)
+    return _build_python(epochs, failures, utc_offset, hours)
+
+
+def _build_numpy(epochs, failures, utc_offset, hours) -> HourDayMatrix:
+    local = _as_numpy(epochs, float) + utc_offset
+    valid = ~np.isnan(local)
+    if hours is None:
+        hour = np.zeros(local.shape, dtype=np.int64)
+        hour[valid] = (np.floor(local[valid] / _HOUR_SECONDS) % HOURS).astype(np.int64)
+    else:
+        hour = _as_numpy(hours, np.int64)
+        valid &= (hour >= 0) & (hour < HOURS)
+    if not valid.any():
+        empty = np.zeros((HOURS, 0), dtype=np.int64)
+        return HourDayMatrix(None, empty, empty.copy())
+
+    day = np.floor(local[valid] / _DAY_SECONDS).astype(np.int64)
+    first_day = int(day.min())
+    n_days = int(day.max()) - first_day + 1
+    bucket = hour[valid] * n_days + (day - first_day)
+    size = HOURS * n_days
+    totals = np.bincount(bucket, minlength=size).reshape(HOURS, n_days)
+    if failures is None:
+        failed = np.zeros((HOURS, n_days), dtype=np.int64)
+    else:
+        weights = _as_numpy(failures, np.int64)[valid]
+        failed = np.bincount(bucket, weights=weights, minlength=size)
+        failed = failed.astype(np.int64).reshape(HOURS, n_days)
+    return HourDayMatrix(first_day, totals, failed)
+
+
+def _build_python(epochs, failures, utc_offset, hours) -> HourDayMatrix:
+    if failures is None:
+        failures = [0] * len(epochs)
+    if hours is None:
+        hours = [-1] * len(epochs)
+        derive = True
+    else:
+        derive = False
+    rows = []
+    for epoch, failed, hour in zip(epochs, failures, hours):
+        if epoch != epoch:  # NaN
+            continue
+        local = epoch + utc_offset
+        if derive:
+            hour = int(local // _HOUR_SECONDS) % HOURS
+        elif not 0 <= hour < HOURS:
+            continue
+        rows.append((hour, math.floor(local / _DAY_SECONDS), int(failed)))
+    if not rows:
+        return HourDayMatrix(None, [[] for _ in range(HOURS)], [[] for _ in range(HOURS)])
+
+    first_day = min(day for _, day, _ in rows)
+    n_days = max(day for _, day, _ in rows) - first_day + 1
+    totals = [[0] * n_days for _ in range(HOURS)]
+    failed_counts = [[0] * n_days for _ in range(HOURS)]
+    for hour, day, failed in rows:
+        totals[hour][day - first_day] += 1
+        failed_counts[hour][day - first_day] += failed
+    return HourDayMatrix(first_day, totals, failed_counts)
@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+"""
+Log Index — logs/structured/*.jsonl 的增量欄式索引（分析工具共用查詢 API）
+
+query_logs、trace_analyzer、skill_anomaly_detector、time_slot_risk_scorer、
+peak_hour_analyzer、cache_analyzer、classify_failure、collect_system_data
+原本各自逐行 json.loads 全部日誌。本模組讓每一行只解析一次，之後只讀取
+檔案新增的 bytes，並把常用欄位存成型別化欄位：
+
+    {log_dir}/.index/{stem}/
+        meta.json       已索引 byte offset、列數、檔頭指紋
+        strings.jsonl   字串字典（tool/sid/trace_id/summary/tags 組合等皆以 id 存放）
+        {column}.bin    array 模組 typed array，每欄一檔、只附加
+
+寫入順序：先附加欄位檔與字串檔，最後 atomic 寫入 meta.json。中途中斷時
+讀取端只信任 meta 記錄的列數，下次更新會截斷多出的尾端。
+日誌被截斷或輪轉（大小變小、檔頭改變）時重建該檔索引；索引目錄無法寫入
+時仍在記憶體中完成查詢（不中斷分析工具）。
+
+使用方式：
+    from log_index import load_frame
+    frame = load_frame(LOG_DIR, dates=["2026-03-11", "2026-03-10"])
+    errors = frame.where(frame.column("has_error"))
+    errors.column("hour")             # [10, 13, ...]
+    frame.with_tag("loop-suspected")  # tags 以 bitset 比對
+    errors.records()                  # 僅對選取列依 byte offset 讀回完整 JSON
+"""
+import hashlib
+import json
+import shutil
+from array import array
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from hook_utils import FileLock, atomic_write_json, safe_load_json
+
+INDEX_DIRNAME = ".index"
+INDEX_VERSION = 1
+# 用於偵測輪轉/覆寫的檔頭長度
+FINGERPRINT_BYTES = 256
+
+# 數值欄位 → array typecode
+NUMERIC_COLUMNS = {
+    "ts": "d",           # epoch 秒（ts 缺漏或無法解析時為 NaN）
+    "hour": "b",         # ts 字串本身時區的小時（0-23），無法解析時為 -1
+    "has_error": "B",
+    "blocked": "B",      # 欄位 blocked 為真（session-summary 等）
+    "input_len": "q",
+    "output_len": "q",
+    "offset": "Q",       # 該行在 JSONL 中的 byte offset
+    "length": "I",       # 該行 byte 長度（不含換行）
+}
+# 字串欄位（以 strings.jsonl 的 id 存放）
+STRING_COLUMNS = (
+    "tool", "sid", "trace_id", "tags", "phase", "event",
+    "error_category", "summary", "task_key",
+)
+_ID_TYPECODE = "I"
+_TAG_SEP = "\x1f"
+_NAN = float("nan")
+
+
+def _as_str(value) -> str:
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else str(value)
+
+
+def _as_int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _parse_ts(ts_str: str) -> tuple:
+    """ISO 時間字串 → (epoch 秒, 小時)；無法解析時回傳 (NaN, -1)。"""
+    if not ts_str:
+        return _NAN, -1
+    try:
+        dt = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
+        return dt.timestamp(), dt.hour
+    except (ValueError, TypeError, OverflowError, OSError):
+        return _NAN, -1
+
+
+def extract_row(entry: dict) -> tuple:
+    """從單筆日誌擷取索引欄位（數值 dict, 字串 dict）。"""
+    ts_epoch, hour = _parse_ts(_as_str(entry.get("ts") or entry.get("timestamp")))
+    tags = entry.get("tags")
+    if not isinstance(tags, list):
+        tags = []
+    cause_chain = entry.get("cause_chain")
+    numeric = {
+        "ts": ts_epoch,
+        "hour": hour,
+        "has_error": 1 if entry.get("has_error") else 0,
+        "blocked": 1 if entry.get("blocked") else 0,
+        "input_len": _as_int(entry.get("input_len")),
+        "output_len": _as_int(entry.get("output_len")),
+    }
+    strings = {
+        "tool": _as_str(entry.get("tool")),
+        "sid": _as_str(entry.get("sid")),
+        "trace_id": _as_str(entry.get("trace_id")),
+        "tags": _TAG_SEP.join(_as_str(t) for t in tags),
+        "phase": _as_str(entry.get("phase")),
+        "event": _as_str(entry.get("event")),
+        "error_category": _as_str(entry.get("error_category")),
+        "summary": _as_str(entry.get("summary")),
+        "task_key": _as_str(cause_chain.get("task_key")) if isinstance(cause_chain, dict) else "",
+    }
+    return numeric, strings
+
+
+def _empty_columns() -> dict:
+    columns = {name: array(code) for name, code in NUMERIC_COLUMNS.items()}
+    columns.update({name: array(_ID_TYPECODE) for name in STRING_COLUMNS})
+    return columns
+
+
+class Segment:
+    """單一 JSONL 檔案的欄位資料（記憶體中）與其持久化狀態。"""
+
+    def __init__(self, log_path: Path, index_dir: Path):
+        self.log_path = Path(log_path)
+        self.name = self.log_path.stem
+        self.dir = Path(index_dir) / self.name
+        self.columns = _empty_columns()
+        self.strings: list = []
+        self._string_ids: dict = {}
+        self.offset = 0
+        self.fingerprint = ""
+        self.fingerprint_len = 0
+        self._stat_key = None
+        self._tag_cache: dict = {}
+
+    def __len__(self) -> int:
+        return len(self.columns["ts"])
+
+    # ── 持久化 ──────────────────────────────────────────────────────────────
+
+    def _meta_path(self) -> Path:
+        return self.dir / "meta.json"
+
+    def _reset(self) -> None:
+        self.columns = _empty_columns()
+        self.strings = []
+        self._string_ids = {}
+        self.offset = 0
+        self.fingerprint = ""
+        self.fingerprint_len = 0
+        self._tag_cache = {}
+
+    def _load_persisted(self) -> bool:
+        """讀取已持久化的索引；格式不符或檔案殘缺時回傳 False。"""
+        meta = safe_load_json(str(self._meta_path()))
+        if not isinstance(meta, dict) or meta.get("version") != INDEX_VERSION:
+            return False
+        rows = meta.get("rows", 0)
+        try:
+            columns = _empty_columns()
+            for name, arr in columns.items():
+                with open(self.dir / f"{name}.bin", "rb") as f:
+                    arr.fromfile(f, rows)
+            with open(self.dir / "strings.jsonl", "rb") as f:
+                raw = f.read(meta.get("strings_bytes", 0))
+            strings = json.loads(b"[" + b",".join(raw.splitlines()) + b"]") if raw else []
+        except (OSError, EOFError, ValueError):
+            return False
+        if len(strings) != meta.get("strings", 0):
+            return False
+        self.columns = columns
+        self.strings = strings
+        self._string_ids = {s: i for i, s in enumerate(strings)}
+        self.offset = meta.get("offset", 0)
+        self.fingerprint = meta.get("fingerprint", "")
+        self.fingerprint_len = meta.get("fingerprint_len", 0)
+        self._tag_cache = {}
+        return True
+
+    def _persist(self, prev_rows: int, prev_strings: int) -> None:
+        """附加新增列與新字串，最後寫入 meta.json（呼叫端需持有鎖）。"""
+        meta = safe_load_json(str(self._meta_path())) or {}
+        if (meta.get("version") != INDEX_VERSION or meta.get("rows") != prev_rows
+                or meta.get("strings") != prev_strings):
+            prev_rows, prev_strings = 0, 0
+        for name, arr in self.columns.items():
+            path = self.dir / f"{name}.bin"
+            with open(path, "ab") as f:
+                f.truncate(prev_rows * arr.itemsize)
+                f.seek(prev_rows * arr.itemsize)
+                arr[prev_rows:].tofile(f)
+        strings_path = self.dir / "strings.jsonl"
+        strings_bytes = meta.get("strings_bytes", 0) if prev_strings else 0
+        with open(strings_path, "ab") as f:
+            f.truncate(strings_bytes)
+            f.seek(strings_bytes)
+            for s in self.strings[prev_strings:]:
+                f.write(json.dumps(s, ensure_ascii=False).encode("utf-8") + b"\n")
+            strings_bytes = f.tell()
+        atomic_write_json(str(self._meta_path()), {
+            "version": INDEX_VERSION,
+            "source": self.log_path.name,
+            "offset": self.offset,
+            "rows": len(self),
+            "strings": len(self.strings),
+            "strings_bytes": strings_bytes,
+            "fingerprint": self.fingerprint,
+            "fingerprint_len": self.fingerprint_len,
+        })
+
+    # ── 增量更新 ────────────────────────────────────────────────────────────
+
+    def _string_id(self, value: str) -> int:
+        sid = self._string_ids.get(value)
+        if sid is None:
+            sid = len(self.strings)
+            self.strings.append(value)
+            self._string_ids[value] = sid
+        return sid
+
+    @staticmethod
+    def _is_complete_line(tail: bytes) -> bool:
+        """尾端無換行的片段是否為完整 JSON（否則視為寫入中，留待下次）。"""
+        try:
+            return isinstance(json.loads(tail), dict)
+        except ValueError:
+            return False
+
+    def _ingest(self, data: bytes, base_offset: int) -> None:
+        cols = self.columns
+        pos = 0
+        for raw in data.split(b"\n"):
+            line_offset = base_offset + pos
+            pos += len(raw) + 1
+            if not raw.strip():
+                continue
+            try:
+                entry = json.loads(raw)
+            except ValueError:
+                continue
+            if not isinstance(entry, dict):
+                continue
+            numeric, strings = extract_row(entry)
+            for name, value in numeric.items():
+                cols[name].append(value)
+            cols["offset"].append(line_offset)
+            cols["length"].append(len(raw))
+            for name, value in strings.items():
+                cols[name].append(self._string_id(value))
+        self._tag_cache = {}
+
+    def refresh(self, persist: bool = True) -> "Segment":
+        """只解析日誌自上次索引後新增的完整行。"""
+        try:
+            st = self.log_path.stat()
+        except OSError:
+            self._reset()
+            self._stat_key = None
+            return self
+        stat_key = (st.st_size, st.st_mtime_ns)
+        if stat_key == self._stat_key:
+            return self
+
+        if not self.strings and persist:
+            self._load_persisted()
+        prev_rows, prev_strings = len(self), len(self.strings)
+
+        with open(self.log_path, "rb") as f:
+            rotated = st.st_size < self.offset
+            if self.fingerprint_len and not rotated:
+                head = f.read(self.fingerprint_len)
+                rotated = hashlib.sha1(head).hexdigest() != self.fingerprint
+            if rotated:
+                self._reset()
+                prev_rows, prev_strings = 0, 0
+            f.seek(self.offset)
+            data = f.read(st.st_size - self.offset)
+            end = data.rfind(b"\n") + 1
+            if end < len(data) and self._is_complete_line(data[end:]):
+                end = len(data)  # 結尾缺換行但內容完整的最後一行
+            if end:
+                self._ingest(data[:end], self.offset)
+                self.offset += end
+            if self.fingerprint_len < FINGERPRINT_BYTES and self.offset > self.fingerprint_len:
+                f.seek(0)
+                head = f.read(min(self.offset, FINGERPRINT_BYTES))
+                self.fingerprint = hashlib.sha1(head).hexdigest()
+                self.fingerprint_len = len(head)
+        self._stat_key = stat_key
+
+        if persist and (len(self) != prev_rows or len(self.strings) != prev_strings
+                        or not self._meta_path().exists()):
+            try:
+                self.dir.mkdir(parents=True, exist_ok=True)
+                with FileLock(str(self._meta_path()), timeout_seconds=2):
+                    self._persist(prev_rows, prev_strings)
+            except (OSError, TimeoutError):
+                pass  # 唯讀或鎖競爭：本次僅使用記憶體中的索引
+        return self
+
+    # ── 查詢輔助 ────────────────────────────────────────────────────────────
+
+    def tag_ids(self, tag: str) -> frozenset:
+        """回傳含指定 tag 的 tags 組合 id 集合。"""
+        cached = self._tag_cache.get(tag)
+        if cached is None:
+            tagsets = self._tag_cache.get(None)
+            if tagsets is None:
+                tagsets = self._tag_cache[None] = {
+                    i: self.strings[i].split(_TAG_SEP) for i in set(self.columns["tags"])
+                }
+            cached = frozenset(i for i, tags in tagsets.items() if tag in tags)
+            self._tag_cache[tag] = cached
+        return cached
+
+    def read_records(self, rows, date_key: str = None) -> list:
+        """依 byte offset 讀回指定列的完整 JSON（date_key 指定時附上檔名日期）。"""
+        offsets, lengths = self.columns["offset"], self.columns["length"]
+        records = []
+        with open(self.log_path, "rb") as f:
+            if len(rows) * 4 >= len(self):
+                data = f.read(self.offset)
+                raws = (data[offsets[i]:offsets[i] + lengths[i]] for i in rows)
+            else:
+                raws = []
+                for i in rows:
+                    f.seek(offsets[i])
+                    raws.append(f.read(lengths[i]))
+        for raw in raws:
+            try:
+                entry = json.loads(raw)
+            except ValueError:
+                continue  # 已索引的行被改寫；略過
+            if date_key:
+                entry[date_key] = self.name
+            records.append(entry)
+        return records
+
+
+_SEGMENT_CACHE: dict = {}
+
+
+def get_segment(log_path, persist: bool = True, cache: bool = True) -> Segment:
+    """取得（並增量更新）指定 JSONL 的索引；同一進程內重複查詢不重讀檔案。
+
+    cache=False 時不放進進程層級快取（逐日串流的呼叫端用完即釋放，記憶體只佔一天）。
+    """
+    log_path = Path(log_path)
+    key = str(log_path.resolve())
+    segment = _SEGMENT_CACHE.get(key)
+    if segment is None:
+        segment = Segment(log_path, log_path.parent / INDEX_DIRNAME)
+        if cache:
+            _SEGMENT_CACHE[key] = segment
+    return segment.refresh(persist=persist)
+
+
+def drop_index(log_path) -> None:
+    """刪除日誌的欄式索引目錄（日誌輪轉或清除時呼叫）。"""
+    log_path = Path(log_path)
+    _SEGMENT_CACHE.pop(str(log_path.resolve()), None)
+    shutil.rmtree(log_path.parent / INDEX_DIRNAME / log_path.stem, ignore_errors=True)
+
+
+def recent_dates(days: int, today: date = None) -> list:
+    """最近 N 天（含今天）的 YYYY-MM-DD 清單。"""
+    today = today or date.today()
+    return [(today - timedelta(days=i)).isoformat() for i in range(days)]
+
+
+class LogFrame:
+    """跨多個 Segment 的列選取結果；欄位值於取用時才解碼。"""
+
+    def __init__(self, parts: list):
+        # parts: [(Segment, list[int] 列索引)]
+        self._parts = [(seg, rows) for seg, rows in parts if rows]
+        self._cache: dict = {}
+
+    def __len__(self) -> int:
+        return sum(len(rows) for _, rows in self._parts)
+
+    def column(self, name: str) -> list:
+        """回傳欄位值清單（字串欄位已解碼為 str，tags 為 list[str]）。"""
+        cached = self._cache.get(name)
+        if cached is not None:
+            return cached
+        values = []
+        for seg, rows in self._parts:
+            col = seg.columns[name]
+            if name == "tags":
+                decoded = {}
+                for i in rows:
+                    tid = col[i]
+                    tags = decoded.get(tid)
+                    if tags is None:
+                        text = seg.strings[tid]
+                        tags = decoded[tid] = text.split(_TAG_SEP) if text else []
+                    values.append(tags)
+            elif name in STRING_COLUMNS:
+                strings = seg.strings
+                values.extend(strings[col[i]] for i in rows)
+            elif isinstance(rows, range):
+                values.extend(col[rows.start:rows.stop])
+            else:
+                values.extend(col[i] for i in rows)
+        self._cache[name] = values
+        return values
+
+    def numeric(self, name: str) -> array:
+        """回傳數值欄位的 typed array（不建立逐列 Python 物件，可直接交給 numpy）。"""
+        values = array(NUMERIC_COLUMNS[name])
+        for seg, rows in self._parts:
+            col = seg.columns[name]
+            if isinstance(rows, range):
+                values.extend(col[rows.start:rows.stop])
+            else:
+                values.extend(col[i] for i in rows)
+        return values
+
+    def rows(self, *names: str) -> list:
+        """把指定欄位組成逐列 dict（直接取自索引，不讀回原始 JSON）。"""
+        columns = [self.column(name) for name in names]
+        return [dict(zip(names, values)) for values in zip(*columns)]
+
+    def dates(self) -> list:
+        """每列所屬的日誌檔名（不含副檔名，即日期）。"""
+        values = []
+        for seg, rows in self._parts:
+            values.extend([seg.name] * len(rows))
+        return values
+
+    def where(self, mask) -> "LogFrame":
+        """依布林遮罩（與列數等長）選取列。"""
+        mask = iter(mask)
+        parts = []
+        for seg, rows in self._parts:
+            parts.append((seg, [i for i in rows if next(mask)]))
+        return LogFrame(parts)
+
+    def has_tag(self, tag: str) -> list:
+        """每列是否含指定 tag（以 tags 組合 id 比對，不逐列拆字串）。"""
+        result = []
+        for seg, rows in self._parts:
+            ids = seg.tag_ids(tag)
+            col = seg.columns["tags"]
+            result.extend(col[i] in ids for i in rows)
+        return result
+
+    def tag_mask(self, tag: str) -> array:
+        """每列是否含指定 tag 的 0/1 typed array（可直接以 np.frombuffer 轉換）。"""
+        values = array("B")
+        for seg, rows in self._parts:
+            ids = seg.tag_ids(tag)
+            if not ids:
+                values.frombytes(bytes(len(rows)))
+                continue
+            col = seg.columns["tags"]
+            values.extend(col[i] in ids for i in rows)
+        return values
+
+    def with_tag(self, *tags: str) -> "LogFrame":
+        """選取含任一指定 tag 的列。"""
+        parts = []
+        for seg, rows in self._parts:
+            ids = frozenset().union(*(seg.tag_ids(t) for t in tags))
+            col = seg.columns["tags"]
+            parts.append((seg, [i for i in rows if col[i] in ids]))
+        return LogFrame(parts)
+
+    def tag_bits(self) -> tuple:
+        """回傳 (tag 詞彙表, 每列 bitset)；bit i 對應詞彙表第 i 個 tag。"""
+        vocab: dict = {}
+        bits = []
+        for seg, rows in self._parts:
+            col = seg.columns["tags"]
+            masks: dict = {}
+            for i in rows:
+                tid = col[i]
+                mask = masks.get(tid)
+                if mask is None:
+                    mask = 0
+                    text = seg.strings[tid]
+                    for tag in (text.split(_TAG_SEP) if text else []):
+                        mask |= 1 << vocab.setdefault(tag, len(vocab))
+                    masks[tid] = mask
+                bits.append(mask)
+        return list(vocab), bits
+
+    def records(self, date_key: str = None) -> list:
+        """讀回選取列的完整日誌記錄（僅解析被選取的行）。"""
+        records = []
+        for seg, rows in self._parts:
+            try:
+                records.extend(seg.read_records(rows, date_key=date_key))
+            except OSError:
+                continue
+        return records
+
+
+def load_frame(log_dir, dates=None, persist: bool = True, cache: bool = True) -> LogFrame:
+    """載入日誌目錄的索引。
+
+    Args:
+        log_dir: logs/structured 目錄
+        dates: YYYY-MM-DD 清單（依序）；None 時載入目錄下所有 *.jsonl
+        persist: 是否把新增的索引寫回 {log_dir}/.index/
+        cache: 是否把 Segment 留在進程層級快取（見 get_segment）
+    """
+    log_dir = Path(log_dir)
+    if dates is None:
+        paths = sorted(log_dir.glob("*.jsonl")) if log_dir.is_dir() else []
+    else:
+        paths = [log_dir / f"{d}.jsonl" for d in dates]
+    parts = []
+    for path in paths:
+        if not path.is_file():
+            continue
+        try:
+            seg = get_segment(path, persist=persist, cache=cache)
+        except OSError:
+            continue
+        parts.append((seg, range(len(seg))))
+    return LogFrame(parts)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Log Reader — logs/structured JSONL 的 byte offset 串流讀取與 per-session 範圍索引
+
+on_stop_alert 原本每次 Stop 都讀完整份今日日誌：read_todays_log 以行數
+offset 記錄進度但仍 readlines() 全檔，read_session_entries 則把所有 session
+的 JSON 都解碼後才依 sid 篩選。本模組提供兩個元件：
+
+  1. iter_new_lines(path, offset)：從 byte offset 開始分塊讀取，只產出完整的行
+     （尾端未完成的行留待下次），呼叫端保存回傳的 offset 即可增量讀取。
+  2. per-session byte 範圍索引：寫入端（post_tool_logger、log_blocked_event）
+     在 append 當下記錄該行的 [start, end)，存放於
+
+         {log_dir}/.sessions/{stem}/{sid}.bin   array('Q') 的 (start, end) 對，只附加
+
+     Stop hook 依索引 seek 讀回本 session 的行，不解碼其他 session 的 JSON。
+
+索引只是加速：範圍超出檔案、行邊界不符或 sid 不一致（日誌被輪轉/覆寫）時，
+read_session_lines 回傳 None，由呼叫端退回全檔掃描。
+"""
+import os
+import re
+import shutil
+from array import array
+
+SESSION_INDEX_DIRNAME = ".sessions"
+# 串流讀取每次讀取的區塊大小
+READ_BLOCK_SIZE = 64 * 1024
+_RANGE_TYPECODE = "Q"
+_RANGE_ITEM_BYTES = array(_RANGE_TYPECODE).itemsize * 2
+
+
+def iter_new_lines(path: str, offset: int = 0):
+    """從 byte offset 開始逐行產出 (line_bytes, next_offset)。
+
+    line_bytes 不含換行；next_offset 為該行（含換行）之後的位置，
+    呼叫端保存最後一個 next_offset 作為下次的起點。只產出以換行結尾的
+    完整行，尾端寫到一半的行不產出。檔案不存在時不產出任何行。
+    """
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return
+    with f:
+        f.seek(offset)
+        pos = offset
+        carry = b""
+        while True:
+            chunk = f.read(READ_BLOCK_SIZE)
+            if not chunk:
+                break
+            lines = (carry + chunk).split(b"\n")
+            carry = lines.pop()
+            for line in lines:
+                pos += len(line) + 1
+                yield line, pos
+
+
+def session_index_dir(log_path: str) -> str:
+    """回傳日誌對應的 session 範圍索引目錄（{log_dir}/.sessions/{stem}）。"""
+    log_dir, fname = os.path.split(log_path)
+    stem = os.path.splitext(fname)[0]
+    return os.path.join(log_dir, SESSION_INDEX_DIRNAME, stem)
+
+
+def _session_index_path(log_path: str, sid: str) -> str:
+    safe_sid = re.sub(r"[^A-Za-z0-9_-]", "_", sid)
+    return os.path.join(session_index_dir(log_path), f"{safe_sid}.bin")
+
+
+def record_session_range(log_path: str, sid: str, start: int, end: int) -> None:
+    """附加一筆 session 範圍（寫入端在 append 日誌行後呼叫）。
+
+    失敗時靜默略過：缺漏的範圍會在讀取端驗證失敗並退回全檔掃描。
+    """
+    if not sid:
+        return
+    try:
+        os.makedirs(session_index_dir(log_path), exist_ok=True)
+        with open(_session_index_path(log_path, sid), "ab") as f:
+            f.write(array(_RANGE_TYPECODE, (start, end)).tobytes())
+    except OSError:
+        pass
+
+
+def append_log_line(log_path: str, line: bytes, sid: str = "") -> int:
+    """以 append 模式寫入一行（需含換行）並記錄 session 範圍，回傳寫入後的 offset。
+
+    append 模式下 tell() 反映本次 write 結束的位置，不受其他行程
+    並行附加影響，因此 [end - len(line), end) 即為本行範圍。
+    """
+    with open(log_path, "ab") as f:
+        f.write(line)
+        end = f.tell()
+    record_session_range(log_path, sid, end - len(line), end)
+    return end
+
+
+def drop_session_index(log_path: str) -> None:
+    """刪除日誌的 session 範圍索引（日誌輪轉或清除時呼叫）。"""
+    shutil.rmtree(session_index_dir(log_path), ignore_errors=True)
+
+
+def read_session_lines(log_path: str, sid: str) -> "list | None":
+    """依 session 範圍索引讀回該 session 的原始行（bytes，不含換行）。
+
+    回傳 None 表示索引不存在或與日誌不一致，呼叫端應退回全檔掃描。
+    每個範圍都驗證行邊界與 sid，避免輪轉後的舊索引讀到別人的行。
+    """
+    try:
+        with open(_session_index_path(log_path, sid), "rb") as f:
+            data = f.read()
+        size = os.path.getsize(log_path)
+    except OSError:
+        return None
+    ranges = array(_RANGE_TYPECODE)
+    ranges.frombytes(data[:len(data) - len(data) % _RANGE_ITEM_BYTES])
+    if not ranges:
+        return None
+
+    sid_marker = sid.encode("utf-8")
+    lines = []
+    try:
+        with open(log_path, "rb") as f:
+            for i in range(0, len(ranges), 2):
+                start, end = ranges[i], ranges[i + 1]
+                if end <= start or end > size:
+                    return None
+                if start > 0:
+                    f.seek(start - 1)
+                    raw = f.read(end - start + 1)
+                    if raw[:1] != b"\n":
+                        return None
+                    raw = raw[1:]
+                else:
+                    f.seek(0)
+                    raw = f.read(end)
+                if not raw.endswith(b"\n") or sid_marker not in raw:
+                    return None
+                lines.append(raw[:-1])
+    except OSError:
+        return None
+    return lines
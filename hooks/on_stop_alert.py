@@ -29,6 +29,14 @@ import tempfile
 from collections import Counter
 from datetime import date, datetime, timedelta
 
+from log_index import INDEX_DIRNAME, drop_index
+from log_reader import (
+    SESSION_INDEX_DIRNAME,
+    drop_session_index,
+    iter_new_lines,
+    read_session_lines,
+)
+
 NTFY_TOPIC = "wangsc2025"
 NTFY_MAX_BYTES = 4096  # ntfy message size limit
 _PROJ_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -41,24 +49,42 @@ def _offset_file() -> str:
 
 
 def _read_offset() -> tuple:
-    """Read last analyzed offset. Returns (date_str, line_count)."""
+    """Read last analyzed byte offset. Returns (date_str, byte_offset).
+
+    舊版記錄的是行數（無 byte_offset 欄位），以串流方式換算成 byte offset。
+    """
     path = _offset_file()
     if not os.path.exists(path):
         return ("", 0)
     try:
         with open(path, "r", encoding="utf-8") as f:
             data = json.load(f)
-        return (data.get("date", ""), data.get("offset", 0))
+        date_str = data.get("date", "")
+        if "byte_offset" in data:
+            return (date_str, data["byte_offset"])
+        return (date_str, _line_count_to_byte_offset(date_str, data.get("offset", 0)))
     except (json.JSONDecodeError, Exception):
         return ("", 0)
 
 
+def _line_count_to_byte_offset(date_str: str, line_count: int) -> int:
+    """將舊版行數 offset 換算為 byte offset（只計行，不解碼 JSON）。"""
+    if not date_str or line_count <= 0:
+        return 0
+    log_file = os.path.join(_PROJ_ROOT, "logs", "structured", f"{date_str}.jsonl")
+    offset = 0
+    for n, (_, offset) in enumerate(iter_new_lines(log_file), start=1):
+        if n >= line_count:
+            break
+    return offset
+
+
 def _write_offset(date_str: str, offset: int):
-    """Write the current analyzed offset."""
+    """Write the current analyzed byte offset."""
     path = _offset_file()
     os.makedirs(os.path.dirname(path), exist_ok=True)
     with open(path, "w", encoding="utf-8") as f:
-        json.dump({"date": date_str, "offset": offset}, f)
+        json.dump({"date": date_str, "byte_offset": offset}, f)
 
 
 def _parse_all_entries(log_file: str) -> list:
@@ -77,50 +103,66 @@ def _parse_all_entries(log_file: str) -> list:
     return entries
 
 
+def _decode_line(line: bytes):
+    """解碼單行 JSONL；空行、無法解析或非 dict 時回傳 None。"""
+    if not line.strip():
+        return None
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    return entry if isinstance(entry, dict) else None
+
+
 def read_session_entries(today: str, sid_prefix: str) -> list:
     """Read entries for a specific session from today's log.
 
     Filters by session ID prefix (first 12 chars) to isolate
     this session's entries from concurrent sessions.
+
+    優先使用寫入端維護的 session 範圍索引（log_reader），只 seek 讀回本
+    session 的行；索引不存在或與日誌不一致時退回全檔串流掃描，並先以
+    bytes 比對 sid 前綴，只解碼可能屬於本 session 的行。
     """
     log_file = os.path.join(_PROJ_ROOT, "logs", "structured", f"{today}.jsonl")
-    all_entries = _parse_all_entries(log_file)
-    return [e for e in all_entries if e.get("sid", "").startswith(sid_prefix)]
+    lines = read_session_lines(log_file, sid_prefix) if sid_prefix else None
+    if lines is None:
+        marker = sid_prefix.encode("utf-8")
+        lines = (line for line, _ in iter_new_lines(log_file) if marker in line)
+    entries = []
+    for line in lines:
+        entry = _decode_line(line)
+        if entry is not None and str(entry.get("sid", "")).startswith(sid_prefix):
+            entries.append(entry)
+    return entries
 
 
 def read_todays_log() -> tuple:
     """Read only NEW entries from today's structured log (offset-based fallback).
 
-    Returns (new_entries, total_line_count) where new_entries only
-    contains lines added since the last analysis.
+    Returns (new_entries, end_offset) where new_entries only contains
+    lines added since the last analysis and end_offset is the byte offset
+    to pass to _write_offset(). 從上次的 byte offset seek 後串流讀取，
+    不重讀已分析的部分；日誌變小（輪轉）時從頭讀取。
     """
     today = datetime.now().strftime("%Y-%m-%d")
     log_file = os.path.join(_PROJ_ROOT, "logs", "structured", f"{today}.jsonl")
 
-    if not os.path.exists(log_file):
+    try:
+        size = os.path.getsize(log_file)
+    except OSError:
         return ([], 0)
 
-    # Read all lines
-    with open(log_file, "r", encoding="utf-8") as f:
-        all_lines = f.readlines()
-
-    total_count = len(all_lines)
-
-    # Determine offset: skip lines already analyzed
     prev_date, prev_offset = _read_offset()
-    skip = prev_offset if prev_date == today else 0
+    offset = prev_offset if prev_date == today and prev_offset <= size else 0
 
-    # Parse only new lines
     new_entries = []
-    for line in all_lines[skip:]:
-        line = line.strip()
-        if line:
-            try:
-                new_entries.append(json.loads(line))
-            except json.JSONDecodeError:
-                pass
+    for line, offset in iter_new_lines(log_file, offset):
+        entry = _decode_line(line)
+        if entry is not None:
+            new_entries.append(entry)
 
-    return (new_entries, total_count)
+    return (new_entries, offset)
 
 
 def analyze_entries(entries: list) -> dict:
@@ -370,6 +412,33 @@ def _cleanup_stale_state_files(retention_days=7):
     return removed
 
 
+def _cleanup_context_sessions(max_age_hours=4):
+    """清理 tools/context_compressor.py 的過期 Session（彙總檔條目與 context-usage.sessions/ 計數檔）。
+
+    每個 session 都會留下一個計數檔，只有 Stop 時順手清理才不會無限累積；
+    模組載入方式與 post_tool_logger 相同（已載入時重用），失敗時靜默略過。
+    """
+    try:
+        import importlib.util as _ilu
+        mod = sys.modules.get("context_compressor")
+        if mod is None:
+            cc_path = os.path.join(_PROJ_ROOT, "tools", "context_compressor.py")
+            if not os.path.exists(cc_path):
+                return 0
+            spec = _ilu.spec_from_file_location("context_compressor", cc_path)
+            mod = _ilu.module_from_spec(spec)
+            # 先注冊到 sys.modules，使 @dataclass 在 Python 3.11 可正確解析模組
+            sys.modules["context_compressor"] = mod
+            try:
+                spec.loader.exec_module(mod)
+            except Exception:
+                sys.modules.pop("context_compressor", None)
+                raise
+        return mod.cleanup_stale_sessions(max_age_hours=max_age_hours)
+    except Exception:
+        return 0
+
+
 def _rotate_logs(retention_days=7):
     """刪除超過保留天數的結構化日誌與過期 session-summary 條目。"""
     log_dir = os.path.join(_PROJ_ROOT, "logs", "structured")
@@ -377,20 +446,42 @@ def _rotate_logs(retention_days=7):
         return
     cutoff = (datetime.now() - timedelta(days=retention_days)).strftime("%Y-%m-%d")
 
-    # Rotate dated JSONL files (YYYY-MM-DD.jsonl)
+    # Rotate dated JSONL files (YYYY-MM-DD.jsonl) and their chain-head sidecars (.jsonl.head)
     for fname in os.listdir(log_dir):
-        if re.match(r"\d{4}-\d{2}-\d{2}\.jsonl$", fname):
+        if re.match(r"\d{4}-\d{2}-\d{2}\.jsonl(\.head)?$", fname):
             if fname[:10] < cutoff:
                 try:
                     os.remove(os.path.join(log_dir, fname))
                 except OSError:
                     pass
 
+    # 對應的 session 範圍索引（.sessions/YYYY-MM-DD/）
+    session_index_root = os.path.join(log_dir, SESSION_INDEX_DIRNAME)
+    if os.path.isdir(session_index_root):
+        for stem in os.listdir(session_index_root):
+            if re.match(r"\d{4}-\d{2}-\d{2}$", stem) and stem < cutoff:
+                drop_session_index(os.path.join(log_dir, f"{stem}.jsonl"))
+
+    # 對應的欄式索引（.index/YYYY-MM-DD/）
+    column_index_root = os.path.join(log_dir, INDEX_DIRNAME)
+    if os.path.isdir(column_index_root):
+        for stem in os.listdir(column_index_root):
+            if re.match(r"\d{4}-\d{2}-\d{2}$", stem) and stem < cutoff:
+                drop_index(os.path.join(log_dir, f"{stem}.jsonl"))
+
     # Trim session-summary.jsonl: keep only entries within retention window
     # 使用 atomic_write_lines 避免團隊模式下多 Agent 並行結束時的競態損壞
     summary_file = os.path.join(log_dir, "session-summary.jsonl")
     if not os.path.exists(summary_file):
         return
+    # 條目依時間附加：首行仍在保留窗口內時無需改寫（避免每次 Stop 全檔重寫）
+    try:
+        with open(summary_file, "r", encoding="utf-8") as f:
+            first = next((line for line in f if line.strip()), "")
+        if json.loads(first).get("ts", "")[:10] >= cutoff:
+            return
+    except (OSError, ValueError, AttributeError):
+        pass
     kept = []
     try:
         with open(summary_file, "r", encoding="utf-8") as f:
@@ -421,10 +512,103 @@ def _rotate_logs(retention_days=7):
         pass
 
 
-def _update_metrics_daily() -> None:
-    """從今日所有 JSONL 記錄計算日指標，更新 context/metrics-daily.json。
+METRICS_AGG_FILE = ".metrics-daily-agg.json"
+METRICS_AGG_VERSION = 1
+# 偵測檔案被改寫（輪轉、trim）用的檔頭長度
+_CURSOR_FINGERPRINT_BYTES = 256
+
 
-    完整重算今日記錄（覆寫模式），保留 14 天滾動窗口。
+def _new_log_aggregate() -> dict:
+    return {
+        "offset": 0, "fp": "", "fp_len": 0,
+        "total_calls": 0, "blocked_count": 0, "error_count": 0,
+        "total_input": 0, "tag_counts": {},
+    }
+
+
+def _new_session_aggregate() -> dict:
+    return {"offset": 0, "fp": "", "fp_len": 0, "total": 0, "healthy": 0}
+
+
+def _read_appended_entries(path: str, cursor: dict, reset: dict) -> list:
+    """讀取 cursor["offset"] 之後新增的完整 JSONL 行並推進 cursor。
+
+    檔案變小或檔頭指紋改變（輪轉、trim 改寫）時，以 reset 重設 cursor
+    （含其累計值）後從頭讀取。尾端未完成的行留待下次。
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        cursor.clear()
+        cursor.update(reset)
+        return []
+    with open(path, "rb") as f:
+        rewritten = size < cursor["offset"]
+        if cursor["fp_len"] and not rewritten:
+            rewritten = hashlib.sha1(f.read(cursor["fp_len"])).hexdigest() != cursor["fp"]
+        if rewritten:
+            cursor.clear()
+            cursor.update(reset)
+        f.seek(cursor["offset"])
+        data = f.read(size - cursor["offset"])
+        end = data.rfind(b"\n") + 1
+        cursor["offset"] += end
+        if cursor["fp_len"] < _CURSOR_FINGERPRINT_BYTES and cursor["offset"] > cursor["fp_len"]:
+            f.seek(0)
+            head = f.read(min(cursor["offset"], _CURSOR_FINGERPRINT_BYTES))
+            cursor["fp"] = hashlib.sha1(head).hexdigest()
+            cursor["fp_len"] = len(head)
+
+    entries = []
+    for line in data[:end].split(b"\n"):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(entry, dict):
+            entries.append(entry)
+    return entries
+
+
+def _advance_metrics_aggregate(agg: dict, log_file: str, summary_file: str, today: str) -> dict:
+    """把今日日誌與 session-summary 新增的行累加進 agg（跨日時重設）。"""
+    if agg.get("date") != today or agg.get("version") != METRICS_AGG_VERSION:
+        agg = {
+            "version": METRICS_AGG_VERSION, "date": today,
+            "log": _new_log_aggregate(), "sessions": _new_session_aggregate(),
+        }
+
+    log_agg = agg["log"]
+    new_entries = _read_appended_entries(log_file, log_agg, _new_log_aggregate())
+    tag_counts = log_agg["tag_counts"]  # 讀取時若重設 cursor 會換成新 dict
+    for e in new_entries:
+        log_agg["total_calls"] += 1
+        for tag in e.get("tags", []):
+            tag_counts[tag] = tag_counts.get(tag, 0) + 1
+        if e.get("event") == "blocked":
+            log_agg["blocked_count"] += 1
+        if e.get("has_error"):
+            log_agg["error_count"] += 1
+        log_agg["total_input"] += e.get("input_len", 0)
+
+    sessions = agg["sessions"]
+    for s in _read_appended_entries(summary_file, sessions, _new_session_aggregate()):
+        if s.get("ts", "")[:10] == today:
+            sessions["total"] += 1
+            if s.get("status") in ("healthy", "info"):
+                sessions["healthy"] += 1
+    return agg
+
+
+def _update_metrics_daily(project_root: str = None) -> None:
+    """累加今日新增的 JSONL 記錄，更新 context/metrics-daily.json 的今日記錄。
+
+    累計值（tag 計數、blocked/error 數、input_len 總和、session 狀態）與
+    兩個檔案的 byte offset 一起存於 logs/structured/.metrics-daily-agg.json，
+    每次 Stop 只解析上次之後新增的行；今日記錄仍以累計值整筆覆寫，
+    保留 14 天滾動窗口。
     使用 FileLock + atomic_write_json 防止並行 session 競態條件。
     由 main() 在 _rotate_logs() 之後呼叫。
     """
@@ -433,64 +617,52 @@ def _update_metrics_daily() -> None:
     except ImportError:
         return  # hook_utils 不可用時靜默跳過
 
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(script_dir)
+    project_root = project_root or _PROJ_ROOT
+    log_dir = os.path.join(project_root, "logs", "structured")
     metrics_file = os.path.join(project_root, "context", "metrics-daily.json")
+    agg_file = os.path.join(log_dir, METRICS_AGG_FILE)
     today = datetime.now().strftime("%Y-%m-%d")
 
-    # 讀取今日所有 JSONL（所有 session 合計，非僅本 session）
-    log_file = os.path.join(project_root, "logs", "structured", f"{today}.jsonl")
-    all_entries = _parse_all_entries(log_file)
-    if not all_entries:
+    # 今日 JSONL（所有 session 合計，非僅本 session）與 session-summary 的增量累加
+    try:
+        with FileLock(agg_file):
+            agg = _advance_metrics_aggregate(
+                safe_load_json(agg_file, default={}) or {},
+                os.path.join(log_dir, f"{today}.jsonl"),
+                os.path.join(log_dir, "session-summary.jsonl"),
+                today,
+            )
+            atomic_write_json(agg_file, agg)
+    except Exception:
+        return  # 不中斷 Agent 流程
+
+    log_agg = agg["log"]
+    total_calls = log_agg["total_calls"]
+    if not total_calls:
         return
 
     # 計算指標
-    all_tags = []
-    for e in all_entries:
-        all_tags.extend(e.get("tags", []))
-    tag_counts = Counter(all_tags)
-
+    tag_counts = log_agg["tag_counts"]
     api_calls       = tag_counts.get("api-call", 0)
     cache_reads     = tag_counts.get("cache-read", 0)
     cache_writes    = tag_counts.get("cache-write", 0)
-    blocked_count   = sum(1 for e in all_entries if e.get("event") == "blocked")
+    blocked_count   = log_agg["blocked_count"]
     loop_suspected  = tag_counts.get("loop-suspected", 0)
-    error_count     = sum(1 for e in all_entries if e.get("has_error"))
+    error_count     = log_agg["error_count"]
     skill_reads     = tag_counts.get("skill-read", 0)
-    total_calls     = len(all_entries)
 
     # 快取命中率：cache_reads / (cache_reads + api_calls)
     cache_total = cache_reads + api_calls
     cache_hit_ratio = round(cache_reads / cache_total * 100, 1) if cache_total > 0 else 0.0
 
     # 平均輸入 IO（output_len 目前因 hooks 協定限制始終為 0，僅計 input_len）
-    total_input = sum(e.get("input_len", 0) for e in all_entries)
-    avg_io = round(total_input / total_calls, 0) if total_calls > 0 else 0
+    avg_io = round(log_agg["total_input"] / total_calls, 0)
 
-    # 從 session-summary.jsonl 計算今日 session 成功率
+    # 今日 session 成功率（來自 session-summary.jsonl 的累計）
     session_success_rate = None
-    summary_file = os.path.join(project_root, "logs", "structured", "session-summary.jsonl")
-    if os.path.exists(summary_file):
-        today_sessions = []
-        try:
-            with open(summary_file, "r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if line:
-                        try:
-                            entry = json.loads(line)
-                            if entry.get("ts", "")[:10] == today:
-                                today_sessions.append(entry)
-                        except json.JSONDecodeError:
-                            pass
-        except OSError:
-            pass
-        if today_sessions:
-            healthy = sum(
-                1 for s in today_sessions
-                if s.get("status") in ("healthy", "info")
-            )
-            session_success_rate = round(healthy / len(today_sessions) * 100, 1)
+    sessions = agg["sessions"]
+    if sessions["total"]:
+        session_success_rate = round(sessions["healthy"] / sessions["total"] * 100, 1)
 
     # 品質評分（ADR-004）：0-100 分，反映當日系統健康狀態
     # 基底：session_success_rate（可用時）或預設 80
@@ -532,7 +704,7 @@ def _update_metrics_daily() -> None:
         with FileLock(metrics_file):
             data = safe_load_json(metrics_file, default={"schema_version": 1, "records": []})
             records: list = data.get("records", [])
-            # 覆寫今日記錄（每次 session 結束後完整重算，不增量累積）
+            # 覆寫今日記錄（以累計值整筆取代）
             records = [r for r in records if r.get("date") != today]
             records.append(new_record)
             # 保留 14 天滾動窗口
@@ -832,6 +1004,11 @@ def _check_token_budget() -> "str | None":
     try:
         warn_limit = _get_token_warn_limit()
         token_file = _find_token_usage_file_for_stop()
+        try:
+            from token_journal import compact_token_usage
+            compact_token_usage(token_file)  # 合併各進程 journal 後再讀取
+        except Exception:
+            pass
         if not os.path.exists(token_file):
             return None
 
@@ -916,8 +1093,8 @@ def main():
         entries = read_session_entries(today, sid_prefix)
     else:
         # Fallback: offset-based analysis (for backward compatibility)
-        entries, total_count = read_todays_log()
-        _write_offset(today, total_count)
+        entries, end_offset = read_todays_log()
+        _write_offset(today, end_offset)
 
     # Check Gmail OAuth expiry (independent of session log entries)
     gmail_expiry = check_gmail_token_expiry()
@@ -975,6 +1152,7 @@ def main():
 
     _rotate_logs()
     _cleanup_stale_state_files()
+    _cleanup_context_sessions()
     _update_metrics_daily()
 
     # Level 4-B: Error Budget 計算（寫入後才讀，確保今日資料最新）
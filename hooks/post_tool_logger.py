@@ -44,7 +44,13 @@ except ImportError:
     BEHAVIOR_TRACKER_AVAILABLE = False
 
 # Import shared API source patterns and sanitization
-from hook_utils import sanitize_sensitive_data, send_ntfy_alert
+from hook_utils import (
+    API_SOURCE_PATTERNS,
+    LiteralScanner,
+    sanitize_sensitive_data,
+    send_ntfy_alert,
+)
+from log_reader import append_log_line, drop_session_index
 
 # Skill 修改 ntfy 內文上限（Unicode 字元數）。
 SKILL_CHANGE_NTFY_MAX_CHARS = 1000
@@ -247,6 +253,14 @@ def _load_benign_patterns_from_yaml() -> list:
 BENIGN_PATTERNS = _load_benign_patterns_from_yaml()
 
 
+# 分類用單趟掃描器：API 來源、錯誤關鍵字、良性模式共用同一個 trie regex
+ERROR_LABEL = "error"
+BENIGN_LABEL = "benign"
+CLASSIFY_SCANNER = LiteralScanner(
+    {**API_SOURCE_PATTERNS, ERROR_LABEL: ERROR_KEYWORDS, BENIGN_LABEL: BENIGN_PATTERNS}
+)
+
+
 def detect_api_sources(text: str) -> list:
     """Detect which API sources are referenced in a command/path.
 
@@ -254,7 +268,13 @@ def detect_api_sources(text: str) -> list:
     Kept here for backward compatibility (tests import from this module).
     """
     from hook_utils import detect_api_sources as _detect
-    return _detect(text)
+    return _detect(text, CLASSIFY_SCANNER)
+
+
+def detect_output_error(tool_output: str) -> bool:
+    """輸出前 2000 字元含錯誤關鍵字且不含任何良性模式時視為錯誤。"""
+    labels = CLASSIFY_SCANNER.labels(tool_output[:2000].lower())
+    return ERROR_LABEL in labels and BENIGN_LABEL not in labels
 
 
 def _cmd_has_word(command: str, word: str) -> bool:
@@ -398,42 +418,137 @@ def classify_edit(tool_input: dict) -> tuple:
     return summary, tags
 
 
+# 鏈頭 sidecar：{log}.head 記錄最後一筆 _hash 與寫入後的 byte offset，
+# 讓 append 不必重讀整個日誌即可取得 _prev_hash
+CHAIN_HEAD_SUFFIX = ".head"
+# 反向搜尋鏈頭時每次讀取的區塊大小
+_TAIL_BLOCK_SIZE = 64 * 1024
+
+
+def _chain_head_path(log_path: str) -> str:
+    """回傳日誌對應的鏈頭 sidecar 路徑。"""
+    return log_path + CHAIN_HEAD_SUFFIX
+
+
+def _last_hash_in_lines(lines: list) -> "str | None":
+    """由後往前找最後一筆帶 _hash 的記錄。
+
+    與 tools/audit_verify.py 的鏈規則一致：不含 _hash 的記錄（如 guard 寫入的
+    blocked 事件）不影響鏈頭；遇到無法解析的行則視為斷鏈並重置為空字串。
+    找不到任何帶 _hash 的記錄時回傳 None（由呼叫端決定是否繼續往前找）。
+    """
+    for raw in reversed(lines):
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            record = json.loads(raw)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return ""
+        if isinstance(record, dict) and "_hash" in record:
+            return record.get("_hash") or ""
+    return None
+
+
+def _scan_tail_for_hash(log_path: str) -> str:
+    """反向分塊讀取日誌尾端，取得最後一筆 _hash（sidecar 失效時的 fallback）。
+
+    每次只讀 _TAIL_BLOCK_SIZE bytes；一般情況下最後一個區塊即可找到鏈頭，
+    成本與檔案大小無關。
+    """
+    try:
+        with open(log_path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            carry = b""
+            while pos > 0:
+                read_size = min(_TAIL_BLOCK_SIZE, pos)
+                pos -= read_size
+                f.seek(pos)
+                chunk = f.read(read_size) + carry
+                lines = chunk.split(b"\n")
+                # 首段可能是被區塊切斷的半行，留待下一輪與更前面的資料拼接
+                carry = lines[0] if pos > 0 else b""
+                complete = lines[1:] if pos > 0 else lines
+                found = _last_hash_in_lines([ln.decode("utf-8") for ln in complete])
+                if found is not None:
+                    return found
+    except (OSError, UnicodeDecodeError):
+        pass
+    return ""
+
+
+def _read_chain_head(log_path: str) -> str:
+    """取得日誌目前的鏈頭 hash（O(1)：sidecar 命中時不讀日誌本體）。
+
+    - sidecar offset == 檔案大小：直接採用 sidecar 記錄的 hash
+    - 檔案比 offset 大：只讀 offset 之後新增的 bytes（其他寫入者附加的記錄）
+    - sidecar 不存在、損壞或檔案被截斷/輪轉：反向分塊讀取尾端
+    """
+    try:
+        size = os.path.getsize(log_path)
+    except OSError:
+        return ""
+    if size == 0:
+        return ""
+
+    head = None
+    try:
+        with open(_chain_head_path(log_path), "r", encoding="utf-8") as f:
+            head = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        head = None
+
+    if isinstance(head, dict) and isinstance(head.get("offset"), int):
+        offset = head["offset"]
+        if offset == size:
+            return head.get("hash", "")
+        if 0 < offset < size:
+            try:
+                with open(log_path, "rb") as f:
+                    f.seek(offset)
+                    gap = f.read(size - offset)
+                found = _last_hash_in_lines(gap.decode("utf-8").split("\n"))
+                return head.get("hash", "") if found is None else found
+            except (OSError, UnicodeDecodeError):
+                pass
+
+    return _scan_tail_for_hash(log_path)
+
+
 def append_with_checksum(log_path: str, entry: dict) -> None:
     """
     Append-only 寫入（P4-D Paperclip 不可變審計日誌模式）：
-      1. 讀取上一筆記錄的 _hash
+      1. 取得上一筆記錄的 _hash（鏈頭 sidecar，失效時反向讀取尾端區塊）
       2. 計算新記錄 hash（排除 _hash 欄位，避免循環依賴）
-      3. 寫入 _prev_hash + _hash 後 append
+      3. 寫入 _prev_hash + _hash 後 append，並更新鏈頭 sidecar 與 session 範圍索引
+
+    步驟 1-3 在同一把 FileLock 內完成，團隊並行模式下多個 Agent
+    不會讀到相同鏈頭而產生分岔。append 成本與日誌大小無關。
 
     輪轉標記（50MB 後）：第一筆寫入 rotation_marker，重置鏈起點。
     """
     import hashlib
 
-    prev_hash = ""
-    if os.path.exists(log_path):
-        try:
-            with open(log_path, encoding="utf-8") as f:
-                lines = f.readlines()
-            for line in reversed(lines):
-                line = line.strip()
-                if line:
-                    try:
-                        prev_hash = json.loads(line).get("_hash", "")
-                    except json.JSONDecodeError:
-                        pass
-                    break
-        except OSError:
-            pass
+    from hook_utils import FileLock, atomic_write_json
+
+    with FileLock(log_path):
+        prev_hash = _read_chain_head(log_path)
+
+        entry["_prev_hash"] = prev_hash
+        # 排除 _hash 本身再計算（C2 修正：避免循環依賴）
+        hash_payload = {k: v for k, v in entry.items() if k != "_hash"}
+        entry["_hash"] = hashlib.sha256(
+            json.dumps(hash_payload, sort_keys=True, ensure_ascii=False).encode()
+        ).hexdigest()[:16]
 
-    entry["_prev_hash"] = prev_hash
-    # 排除 _hash 本身再計算（C2 修正：避免循環依賴）
-    hash_payload = {k: v for k, v in entry.items() if k != "_hash"}
-    entry["_hash"] = hashlib.sha256(
-        json.dumps(hash_payload, sort_keys=True, ensure_ascii=False).encode()
-    ).hexdigest()[:16]
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        offset = append_log_line(log_path, line, entry.get("sid", ""))
 
-    with open(log_path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        try:
+            atomic_write_json(_chain_head_path(log_path), {"hash": entry["_hash"], "offset": offset})
+        except OSError:
+            pass  # sidecar 失效時下次 append 以反向讀取 fallback 重建
 
 
 def _find_token_usage_file() -> str:
@@ -446,84 +561,83 @@ def _find_token_usage_file() -> str:
     return os.path.join(get_project_root(), "state", "token-usage.json")
 
 
+def _latest_todoist_run_id(fsm: dict) -> str:
+    """run-fsm.json 中最新一筆 todoist run 的 run_id（依 phase3.updated 或 started）。"""
+    runs = fsm.get("runs", {}) if isinstance(fsm, dict) else {}
+    if not isinstance(runs, dict):
+        return ""
+
+    def _sort_key(run):
+        p3 = run.get("phases", {}).get("phase3", {})
+        return p3.get("updated") or run.get("started") or ""
+
+    todoist_runs = [
+        v for v in runs.values()
+        if isinstance(v, dict) and v.get("agent_type") == "todoist"
+    ]
+    if not todoist_runs:
+        return ""
+    # max() 遇到同鍵值取第一筆，與原本 sort(reverse=True) 後取 [0] 相同
+    return (max(todoist_runs, key=_sort_key).get("run_id") or "")[:12]
+
+
+def _resolve_phase3_trace_id(session_id: str) -> str:
+    """Phase 3 缺少 DIGEST_TRACE_ID 時，由 state/run-fsm.json 推得 trace_id。
+
+    以專案根目錄定位 run-fsm.json（不依賴 cwd）。結果依 session 快取在
+    state/phase3-trace-{sid}.json，鍵為 run-fsm.json 的 mtime/size；檔案未變時
+    不再解析整份 FSM，Phase 3 數百次工具呼叫只需一次 stat。
+    """
+    from hook_utils import atomic_write_json, get_project_root, safe_load_json
+
+    state_dir = os.path.join(get_project_root(), "state")
+    fsm_path = os.path.join(state_dir, "run-fsm.json")
+    try:
+        st = os.stat(fsm_path)
+    except OSError:
+        return ""
+    signature = [st.st_mtime_ns, st.st_size]
+
+    sid = "".join(ch for ch in (session_id or "")[:8] if ch.isalnum() or ch in "-_")
+    sidecar_path = os.path.join(state_dir, f"phase3-trace-{sid}.json") if sid else ""
+    if sidecar_path:
+        cached = safe_load_json(sidecar_path, default={})
+        if isinstance(cached, dict) and cached.get("fsm_signature") == signature:
+            return cached.get("trace_id", "")
+
+    try:
+        with open(fsm_path, "r", encoding="utf-8") as f:
+            trace_id = _latest_todoist_run_id(json.load(f))
+    except (OSError, json.JSONDecodeError, AttributeError):
+        return ""
+
+    if sidecar_path:
+        try:
+            atomic_write_json(sidecar_path, {"fsm_signature": signature, "trace_id": trace_id})
+        except OSError:
+            pass  # 快取寫入失敗不影響 trace_id
+    return trace_id
+
+
 def _update_token_usage(input_len: int, output_len: int, tool_name: str) -> None:
     """累積 Token 估算統計（input_len/3.5 + output_len/3.5 ≈ tokens）。
 
-    使用 hook_utils.FileLock 保護 read-modify-write 序列，防止團隊並行模式
-    （5 路 Phase 1）下多個進程同時更新導致計數遺失。
+    不再持全域 FileLock 改寫 token-usage.json：delta 附加到本進程的 journal
+    （token_journal.record_usage），由壓實步驟依 schema v3 規則合併，
+    團隊並行模式（5 路 Phase 1）下各 hook 不互相等待。
 
     Note: output_len depends on what the Claude Code hooks protocol passes
     in tool_output. PostToolUse may receive truncated or empty output for
     some tool types, so output_chars may undercount actual output volume.
     """
     try:
-        from hook_utils import FileLock, atomic_write_json, safe_load_json
-
-        token_file = _find_token_usage_file()
+        from token_journal import record_usage
 
-        with FileLock(token_file):
-            today = datetime.now().strftime("%Y-%m-%d")
-
-            # 持鎖後重新讀取（確保讀到最新狀態）
-            usage = safe_load_json(token_file, default={"daily": {}, "updated": ""})
-
-            # 確保今日條目
-            if today not in usage.get("daily", {}):
-                usage.setdefault("daily", {})[today] = {
-                    "estimated_tokens": 0, "tool_calls": 0,
-                    "input_chars": 0, "output_chars": 0
-                }
-
-            # 估算 token（字元 / 3.5，中英混合取中間值）
-            estimated = (input_len + output_len) / 3.5
-
-            day_data = usage["daily"][today]
-            day_data["estimated_tokens"] = day_data.get("estimated_tokens", 0) + estimated
-            day_data["tool_calls"] = day_data.get("tool_calls", 0) + 1
-            day_data["input_chars"] = day_data.get("input_chars", 0) + input_len
-            day_data["output_chars"] = day_data.get("output_chars", 0) + output_len
-
-            # ADR-035: per-phase 累計（schema v3，silent fail 包在外層 try/except）
-            phase_key = os.environ.get("AGENT_PHASE", "")
-            if phase_key:
-                phases = day_data.setdefault("phases", {})
-                if phase_key not in phases:
-                    phases[phase_key] = {"estimated_tokens": 0, "tool_calls": 0}
-                phases[phase_key]["estimated_tokens"] = phases[phase_key].get("estimated_tokens", 0) + estimated
-                phases[phase_key]["tool_calls"] = phases[phase_key].get("tool_calls", 0) + 1
-
-            # ADR-035: per-trace 累計（schema v3，silent fail 包在外層 try/except）
-            trace_id_env = os.environ.get("DIGEST_TRACE_ID", "")
-            if trace_id_env:
-                traces = day_data.setdefault("traces", {})
-                trace_key = trace_id_env[:12]
-                if trace_key not in traces:
-                    traces[trace_key] = {
-                        "start_time": datetime.now().isoformat(),
-                        "total_tokens": 0,
-                        "phase_breakdown": {},
-                    }
-                traces[trace_key]["total_tokens"] = traces[trace_key].get("total_tokens", 0) + estimated
-                if phase_key:
-                    pb = traces[trace_key].setdefault("phase_breakdown", {})
-                    pb[phase_key] = pb.get(phase_key, 0) + estimated
-                # 防止 traces 無限膨脹（超過 50 筆清除最舊）
-                if len(traces) > 50:
-                    oldest = sorted(
-                        traces.keys(),
-                        key=lambda k: traces[k].get("start_time", ""),
-                    )[0]
-                    del traces[oldest]
-
-            usage["updated"] = datetime.now().isoformat()
-
-            # 只保留 7 天
-            from datetime import timedelta
-            cutoff = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
-            usage["daily"] = {k: v for k, v in usage["daily"].items() if k >= cutoff}
-
-            # 原子寫入（持鎖期間完成，確保無競態）
-            atomic_write_json(token_file, usage)
+        record_usage(
+            _find_token_usage_file(), input_len, output_len,
+            phase=os.environ.get("AGENT_PHASE", ""),
+            trace_id=os.environ.get("DIGEST_TRACE_ID", ""),
+        )
     except Exception:
         pass  # token 統計失敗不影響主流程
 
@@ -577,11 +691,9 @@ def main():
     # Detect errors in output (only for execution tools, not file-content tools)
     has_error = False
     if tool_name in ERROR_DETECT_TOOLS and tool_output:
-        lower_output = tool_output[:2000].lower()
-        if any(kw in lower_output for kw in ERROR_KEYWORDS):
-            if not any(benign in lower_output for benign in BENIGN_PATTERNS):
-                has_error = True
-                tags.append("error")
+        if detect_output_error(tool_output):
+            has_error = True
+            tags.append("error")
 
     # Agent role tag（#4 agent-roles.yaml）
     if _role_tag:
@@ -697,26 +809,7 @@ def main():
     trace_id = os.environ.get("DIGEST_TRACE_ID", "")
     if not trace_id and os.environ.get("AGENT_PHASE") == "phase3":
         # Fallback: Phase 3 (assemble) 可能未繼承 env，從 state/run-fsm.json 取最近 todoist run_id
-        try:
-            fsm_path = os.path.join(os.getcwd(), "state", "run-fsm.json")
-            if os.path.isfile(fsm_path):
-                with open(fsm_path, "r", encoding="utf-8") as f:
-                    fsm = json.load(f)
-                runs = fsm.get("runs", {})
-                todoist_runs = [
-                    (k, v) for k, v in runs.items()
-                    if isinstance(v, dict) and v.get("agent_type") == "todoist"
-                ]
-                if todoist_runs:
-                    # 依 phase3.updated 或 started 取最新一筆
-                    def _sort_key(r):
-                        v = r[1]
-                        p3 = v.get("phases", {}).get("phase3", {})
-                        return p3.get("updated") or v.get("started") or ""
-                    todoist_runs.sort(key=_sort_key, reverse=True)
-                    trace_id = (todoist_runs[0][1].get("run_id") or "")[:12]
-        except (OSError, json.JSONDecodeError, KeyError):
-            pass
+        trace_id = _resolve_phase3_trace_id(session_id)
     entry = {
         "ts": datetime.now().astimezone().isoformat(),
         "sid": (session_id or "")[:12],
@@ -776,6 +869,11 @@ def main():
                 if os.path.exists(rotated):
                     os.remove(rotated)
                 os.rename(log_file, rotated)
+                try:
+                    os.remove(_chain_head_path(log_file))
+                except OSError:
+                    pass
+                drop_session_index(log_file)
 
         append_with_checksum(log_file, entry)
     except OSError:
@@ -851,19 +949,26 @@ def main():
         import sys as _sys
         _proj_root_cc = get_project_root()
         _cc_path = os.path.join(_proj_root_cc, "tools", "context_compressor.py")
-        if os.path.exists(_cc_path):
-            _cc_mod_name = "context_compressor"
+        _cc_mod_name = "context_compressor"
+        # 已載入時直接重用（daemon 模式下檔案變動會由 hook_daemon 卸載）
+        _cc_mod = _sys.modules.get(_cc_mod_name)
+        if _cc_mod is None and os.path.exists(_cc_path):
             _spec = _ilu.spec_from_file_location(_cc_mod_name, _cc_path)
             _cc_mod = _ilu.module_from_spec(_spec)
             # 先注冊到 sys.modules，使 @dataclass 在 Python 3.11 可正確解析模組
             _sys.modules[_cc_mod_name] = _cc_mod
-            _spec.loader.exec_module(_cc_mod)
+            try:
+                _spec.loader.exec_module(_cc_mod)
+            except Exception:
+                _sys.modules.pop(_cc_mod_name, None)
+                raise
+        if _cc_mod is not None:
             _sid_cc = (session_id or "")[:8]
             if _sid_cc:
                 _phase_cc = os.environ.get("AGENT_PHASE", "")
-                _sess = _cc_mod.update_session(_sid_cc, input_len, output_len, _phase_cc)
-                _threshold = _cc_mod.check_threshold(_sess)
-                if _threshold.get("prompt_injection"):
+                # 只在狀態轉換（normal → warning → critical）時回傳提示
+                _threshold = _cc_mod.record_tool_call(_sid_cc, input_len, output_len, _phase_cc)
+                if _threshold:
                     _hint_path = os.path.join(
                         _proj_root_cc, "state",
                         f"context-compression-hint-{_sid_cc}.txt",
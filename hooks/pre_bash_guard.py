@@ -16,14 +16,12 @@ PreToolUse:Bash Guard — Bash 指令機器強制攔截。
 """
 from hook_utils import (
     filter_rules_by_preset,
-    get_compiled_regex,
-    get_rule_patterns,
-    get_rule_re_flags,
     load_yaml_rules,
     log_blocked_event,
     output_decision,
     read_stdin_json,
 )
+from rule_engine import compile_rules
 
 # YAML 不可用時的內建預設規則
 FALLBACK_BASH_RULES = [
@@ -200,19 +198,12 @@ def check_bash_command(command, rules=None):
     if rules is None:
         rules = load_bash_rules()
 
-    for rule in rules:
-        # 前置條件：指令必須包含指定字串才繼續檢查
-        contains = rule.get("contains")
-        if contains and contains not in command:
-            continue
-
-        re_flags = get_rule_re_flags(rule)
-        patterns = get_rule_patterns(rule)
-
-        if any(get_compiled_regex(p, re_flags).search(command) for p in patterns):
-            reason = rule.get("reason", "Blocked by rule: " + rule.get("id", "unknown"))
-            guard_tag = rule.get("guard_tag", rule.get("id", "unknown"))
-            return True, reason, guard_tag
+    # 預編譯引擎：字面字串前置過濾 + 每條規則單一合併 regex，仍依規則順序取第一條命中
+    rule = compile_rules(rules).first_match(command)
+    if rule is not None:
+        reason = rule.get("reason", "Blocked by rule: " + rule.get("id", "unknown"))
+        guard_tag = rule.get("guard_tag", rule.get("id", "unknown"))
+        return True, reason, guard_tag
 
     return False, None, None
 
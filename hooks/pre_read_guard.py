@@ -15,13 +15,13 @@ import re
 
 from hook_utils import (
     filter_rules_by_preset,
-    get_compiled_regex,
     load_yaml_rules,
     log_blocked_event,
     output_decision,
     read_stdin_json,
     send_ntfy_alert,
 )
+from rule_engine import compile_rules
 
 # YAML 不可用時的內建預設規則
 FALLBACK_READ_RULES = [
@@ -129,19 +129,21 @@ def check_read_path(file_path, rules=None, project_root=None):
     # Normalize path for consistent matching
     normalized = file_path.replace("\\", "/")
 
-    for rule in rules:
+    # path_match 規則一律 IGNORECASE、只讀 "patterns"；前置過濾一次算出可能命中的規則
+    engine = compile_rules(rules, force_flags=re.IGNORECASE, single_pattern=False)
+    hits = engine.candidates(normalized)
+
+    for index, rule in enumerate(rules):
         check_type = rule.get("check", "")
         guard_tag = rule.get("guard_tag", rule.get("id", "unknown"))
 
         if check_type == "path_match":
-            patterns = rule.get("patterns", [])
-            for pattern in patterns:
-                if get_compiled_regex(pattern, re.IGNORECASE).search(normalized):
-                    # Allow reading these paths if they're within the project
-                    if _is_within_project(file_path, project_root):
-                        continue
-                    reason = rule.get("reason", f"Blocked by rule: {rule.get('id')}")
-                    return True, reason, guard_tag
+            if index in hits and engine.matches(index, normalized):
+                # Allow reading these paths if they're within the project
+                if _is_within_project(file_path, project_root):
+                    continue
+                reason = rule.get("reason", f"Blocked by rule: {rule.get('id')}")
+                return True, reason, guard_tag
 
         elif check_type == "basename_in":
             for v in rule.get("values", []):
@@ -20,27 +20,20 @@ import os
 from collections import Counter
 from datetime import datetime, timedelta
 
+from log_index import load_frame
+
 LOG_DIR = os.path.join("logs", "structured")
 
 
+def load_log_frame(days: int):
+    """Load the column index (log_index) for the last N days."""
+    dates = [(datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+    return load_frame(LOG_DIR, dates=dates)
+
+
 def load_entries(days: int) -> list:
     """Load JSONL entries from the last N days."""
-    entries = []
-    for i in range(days):
-        date = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
-        log_file = os.path.join(LOG_DIR, f"{date}.jsonl")
-        if os.path.exists(log_file):
-            with open(log_file, "r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if line:
-                        try:
-                            entry = json.loads(line)
-                            entry["_date"] = date
-                            entries.append(entry)
-                        except json.JSONDecodeError:
-                            pass
-    return entries
+    return load_log_frame(days).records(date_key="_date")
 
 
 def load_session_summaries(days: int) -> list:
@@ -216,23 +209,26 @@ def main():
         print()
         return
 
-    entries = load_entries(args.days)
+    # 過濾在欄式索引上完成，只讀回命中的完整記錄
+    frame = load_log_frame(args.days)
 
     # trace_id 過濾（優先於其他過濾器）
     if args.trace:
-        entries = [e for e in entries if e.get("trace_id", "").startswith(args.trace)]
-        print(f"  過濾: trace_id 前綴 '{args.trace}' ({len(entries)} 筆)")
+        frame = frame.where(t.startswith(args.trace) for t in frame.column("trace_id"))
+        print(f"  過濾: trace_id 前綴 '{args.trace}' ({len(frame)} 筆)")
 
     # Apply filters
     if args.blocked:
-        entries = [e for e in entries if e.get("event") == "blocked"]
-        print(f"  過濾: 僅攔截事件 ({len(entries)} 筆)")
+        frame = frame.where(e == "blocked" for e in frame.column("event"))
+        print(f"  過濾: 僅攔截事件 ({len(frame)} 筆)")
     elif args.errors:
-        entries = [e for e in entries if e.get("has_error")]
-        print(f"  過濾: 僅錯誤事件 ({len(entries)} 筆)")
+        frame = frame.where(frame.column("has_error"))
+        print(f"  過濾: 僅錯誤事件 ({len(frame)} 筆)")
     elif args.tag:
-        entries = [e for e in entries if args.tag in e.get("tags", [])]
-        print(f"  過濾: 標籤 '{args.tag}' ({len(entries)} 筆)")
+        frame = frame.with_tag(args.tag)
+        print(f"  過濾: 標籤 '{args.tag}' ({len(frame)} 筆)")
+
+    entries = frame.records(date_key="_date")
 
     if args.format == "json":
         print(json.dumps(entries, indent=2, ensure_ascii=False))
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Rule Engine — PreToolUse guard 規則的預編譯比對引擎。
+
+原本 pre_bash_guard / pre_read_guard 對每條規則依序檢查，每條規則內再逐一
+對每個 pattern 做 regex search；長 heredoc 指令每次要跑數十趟 regex。
+本模組把（preset 過濾後的）規則清單編譯成：
+
+  1. 必要字面字串前置過濾：以正則語法樹（re 解析器）取出每個 pattern
+     一定會出現的連續字面字串與純字面分支（如 (curl|wget)）；文字缺少某
+     pattern 任一必要字串時該 pattern 不可能命中，規則所有 pattern 皆不可能
+     命中時直接略過。所有字面字串去重後只各檢查一次。
+  2. 每條規則一條合併 regex：(?:p1)|(?:p2)|... 一次 search 取代逐 pattern search。
+     含反向參照或全域 inline flag 的規則不合併，維持逐 pattern 比對。
+
+比對仍依規則原順序取第一條命中者（first-match 語意、guard_tag 不變）。
+
+編譯計畫（字面字串、是否可合併）以規則內容指紋為鍵，快取於進程內與
+state/hook-rule-engine.json；hook-rules.yaml 或 preset 改變時指紋隨之改變。
+"""
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+
+from hook_utils import (
+    atomic_write_json,
+    get_compiled_regex,
+    get_project_root,
+    get_rule_patterns,
+    get_rule_re_flags,
+    safe_load_json,
+)
+
+try:
+    from re import _parser as _sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse as _sre_parse
+
+ENGINE_VERSION = 2
+CACHE_PATH = os.path.join(get_project_root(), "state", "hook-rule-engine.json")
+CACHE_MAX_ENTRIES = 16
+_ENGINE_CACHE_MAXSIZE = 32
+_engine_cache: OrderedDict = OrderedDict()
+
+# IGNORECASE 下 re 視為與 ASCII 字母等價的非 ASCII 字元（İ ı → i、ſ → s、K → k）
+_FOLD_TABLE = str.maketrans({"İ": "i", "ı": "i", "ſ": "s", "K": "k"})
+# 零寬節點：不消耗字元，前後字面字串在原文中仍相鄰
+_ZERO_WIDTH_OPS = {"AT", "ASSERT", "ASSERT_NOT"}
+_REPEAT_OPS = {"MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT"}
+_GROUPREF_OPS = {"GROUPREF", "GROUPREF_EXISTS", "GROUPREF_IGNORE", "GROUPREF_LOC_IGNORE",
+                 "GROUPREF_UNI_IGNORE"}
+
+
+def _fold(text):
+    """IGNORECASE 比對用的正規化文字（只會讓前置過濾更寬鬆，不會漏判）。"""
+    if not text.isascii() and any(ch in text for ch in "İıſK"):
+        text = text.translate(_FOLD_TABLE)
+    return text.lower()
+
+
+def _branch_literals(branches, fold):
+    """BRANCH 的每個分支都是純字面字串時回傳各分支字串，否則 None。"""
+    alternatives = []
+    for branch in branches:
+        chars = []
+        stack = list(reversed(list(branch)))
+        while stack:
+            op, av = stack.pop()
+            name = str(op)
+            if name == "LITERAL" and (not fold or av < 128):
+                chars.append(chr(av))
+            elif name == "SUBPATTERN" and not av[1] and not av[2]:
+                stack.extend(reversed(list(av[3])))
+            else:
+                return None
+        alternatives.append("".join(chars))
+    return alternatives
+
+
+def _collect_groups(items, fold, groups, current):
+    """走訪正則語法樹，收集「必定出現」的字面字串需求到 groups。
+
+    每個需求是一組候選字串（任一出現即滿足）；連續字面字串為單一候選。
+    """
+    for op, av in items:
+        name = str(op)
+        if name == "LITERAL" and (not fold or av < 128):
+            current.append(chr(av))
+        elif name == "SUBPATTERN" and not av[1] and not av[2]:
+            _collect_groups(av[3], fold, groups, current)
+        elif name in _ZERO_WIDTH_OPS:
+            continue
+        else:
+            groups.append(["".join(current)])
+            current.clear()
+            if name in _REPEAT_OPS and av[0] >= 1:
+                # 至少出現一次的重複：內部字面字串必定出現，但不與前後相鄰
+                inner = []
+                _collect_groups(av[2], fold, groups, inner)
+                groups.append(["".join(inner)])
+            elif name == "BRANCH":
+                alternatives = _branch_literals(av[1], fold)
+                if alternatives:
+                    groups.append(alternatives)
+
+
+def _has_groupref(items):
+    for op, av in items:
+        name = str(op)
+        if name in _GROUPREF_OPS:
+            return True
+        if name == "SUBPATTERN" and _has_groupref(av[3]):
+            return True
+        if name in _REPEAT_OPS and _has_groupref(av[2]):
+            return True
+        if name == "BRANCH" and any(_has_groupref(branch) for branch in av[1]):
+            return True
+    return False
+
+
+def _analyze_pattern(pattern, flags):
+    """回傳 (字面字串需求清單, fold, combinable)；需求清單為空代表無法過濾。"""
+    try:
+        parsed = _sre_parse.parse(pattern, flags)
+    except (re.error, TypeError, ValueError, OverflowError, RecursionError):
+        return [], False, False
+    state = getattr(parsed, "state", None) or parsed.pattern  # Python < 3.11: .pattern
+    inline = state.flags & ~(flags | re.UNICODE)
+    fold = bool((flags | state.flags) & re.IGNORECASE)
+    groups = []
+    current = []
+    _collect_groups(list(parsed), fold, groups, current)
+    groups.append(["".join(current)])
+    # 含空字串候選的需求恆成立，不具過濾作用
+    groups = [sorted(set(g)) for g in groups if all(g)]
+    return groups, fold, not inline and not _has_groupref(list(parsed))
+
+
+def _build_plan(patterns, flags):
+    """單條規則的編譯計畫（JSON 可序列化）。
+
+    requirements[i] 為第 i 個 pattern 的需求清單；任一 pattern 的所有需求都滿足
+    時規則才是候選。None 代表規則無法過濾（每次都要跑 regex）。
+    """
+    requirements = []
+    fold = False
+    combinable = True
+    for pattern in patterns:
+        groups, pattern_fold, pattern_combinable = _analyze_pattern(pattern, flags)
+        fold = fold or pattern_fold
+        combinable = combinable and pattern_combinable
+        if requirements is not None:
+            requirements = None if not groups else requirements + [groups]
+    if fold and requirements:
+        literals = [lit for groups in requirements for group in groups for lit in group]
+        # 大小寫敏感 pattern 的非 ASCII 字面字串無法與折疊後文字可靠比對，放棄過濾
+        if all(lit.isascii() for lit in literals):
+            requirements = [[[lit.lower() for lit in group] for group in groups]
+                            for groups in requirements]
+        else:
+            requirements = None
+    return {
+        "requirements": requirements,
+        "fold": fold,
+        "combine": combinable and len(patterns) > 1,
+    }
+
+
+class CompiledRules:
+    """已編譯的規則集合：candidates() 一次前置過濾，matches() 單趟合併 regex。"""
+
+    def __init__(self, rules, plans, force_flags=0, single_pattern=True):
+        self.rules = rules
+        self._patterns = []
+        self._flags = []
+        self._combined = []
+        self._always = set()
+        self._requirements = {}  # 規則索引 -> (fold, 各 pattern 的需求清單)
+        self._literals = set()  # (literal, fold)
+        for index, (rule, plan) in enumerate(zip(rules, plans)):
+            patterns = get_rule_patterns(rule) if single_pattern else rule.get("patterns", [])
+            flags = force_flags or get_rule_re_flags(rule)
+            self._patterns.append(patterns)
+            self._flags.append(flags)
+            self._combined.append(
+                "|".join(f"(?:{p})" for p in patterns) if plan.get("combine") else None)
+            if not patterns:
+                continue
+            requirements = plan.get("requirements")
+            if requirements is None:
+                self._always.add(index)
+                continue
+            fold = bool(plan.get("fold"))
+            self._requirements[index] = (fold, requirements)
+            for groups in requirements:
+                for group in groups:
+                    self._literals.update((literal, fold) for literal in group)
+
+    def candidates(self, text):
+        """回傳可能命中的規則索引集合（不含者必定不命中）。"""
+        folded = None
+        present = set()
+        for literal, fold in self._literals:
+            if fold:
+                if folded is None:
+                    folded = _fold(text)
+                haystack = folded
+            else:
+                haystack = text
+            if literal in haystack:
+                present.add((literal, fold))
+        hits = set(self._always)
+        for index, (fold, requirements) in self._requirements.items():
+            if any(all(any((lit, fold) in present for lit in group) for group in groups)
+                   for groups in requirements):
+                hits.add(index)
+        return hits
+
+    def matches(self, index, text):
+        """規則 index 的任一 pattern 是否命中 text（與逐 pattern search 結果相同）。"""
+        flags = self._flags[index]
+        combined = self._combined[index]
+        if combined is not None:
+            try:
+                return get_compiled_regex(combined, flags).search(text) is not None
+            except re.error:
+                self._combined[index] = None
+        return any(get_compiled_regex(p, flags).search(text) for p in self._patterns[index])
+
+    def first_match(self, text):
+        """依規則順序回傳第一條命中的規則（支援 contains 前置條件），無則 None。"""
+        hits = self.candidates(text)
+        for index, rule in enumerate(self.rules):
+            if index not in hits:
+                continue
+            contains = rule.get("contains")
+            if contains and contains not in text:
+                continue
+            if self.matches(index, text):
+                return rule
+        return None
+
+
+def _fingerprint(rules, force_flags, single_pattern):
+    payload = json.dumps([ENGINE_VERSION, force_flags, single_pattern, rules],
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _load_cached_plans(key, count):
+    cache = safe_load_json(CACHE_PATH, default={})
+    plans = cache.get(key) if isinstance(cache, dict) else None
+    if isinstance(plans, list) and len(plans) == count and all(isinstance(p, dict) for p in plans):
+        return plans
+    return None
+
+
+def _store_cached_plans(key, plans):
+    try:
+        cache = safe_load_json(CACHE_PATH, default={})
+        if not isinstance(cache, dict):
+            cache = {}
+        cache.pop(key, None)
+        cache[key] = plans
+        while len(cache) > CACHE_MAX_ENTRIES:
+            cache.pop(next(iter(cache)))
+        atomic_write_json(CACHE_PATH, cache)
+    except (OSError, TypeError, ValueError):
+        pass  # 快取寫入失敗不影響攔截判斷
+
+
+def compile_rules(rules, force_flags=0, single_pattern=True):
+    """取得規則清單的 CompiledRules（進程內 LRU → 磁碟快取 → 重新分析）。
+
+    Args:
+        rules: preset 過濾後的規則清單
+        force_flags: 非 0 時覆寫各規則的 flags（pre_read_guard 固定 IGNORECASE）
+        single_pattern: 是否接受單一 "pattern" 鍵（pre_read_guard 只讀 "patterns"）
+    """
+    key = _fingerprint(rules, force_flags, single_pattern)
+    engine = _engine_cache.get(key)
+    if engine is not None:
+        _engine_cache.move_to_end(key)
+        return engine
+
+    plans = _load_cached_plans(key, len(rules))
+    if plans is None:
+        plans = []
+        for rule in rules:
+            patterns = get_rule_patterns(rule) if single_pattern else rule.get("patterns", [])
+            plans.append(_build_plan(patterns, force_flags or get_rule_re_flags(rule)))
+        _store_cached_plans(key, plans)
+
+    engine = CompiledRules(rules, plans, force_flags, single_pattern)
+    _engine_cache[key] = engine
+    if len(_engine_cache) > _ENGINE_CACHE_MAXSIZE:
+        _engine_cache.popitem(last=False)
+    return engine
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Token Journal — state/token-usage.json 的分片 delta 日誌與壓實（compaction）
+
+post_tool_logger 原本每次工具呼叫都持全域 FileLock 讀取、修改、整檔改寫
+token-usage.json，團隊並行模式（5 路 Phase 1）下所有 hook 在此序列化。
+改為：
+
+  1. 寫入端 record_usage()：不取主檔的鎖，只持 journal 自己的短鎖把一行 delta
+     附加到當日 journal（hook_utils.journal_append，所有進程共用同一檔）
+         state/token-usage.journal/{YYYY-MM-DD}.jsonl
+  2. compact_token_usage()：持 FileLock 把所有 journal 新增的行依原本的
+     schema v3 規則（daily / phases / traces、traces 上限 50、保留 7 天）
+     合併進 token-usage.json。各 journal 已合併到的 byte offset 與結果一起
+     原子寫入（_journal_offsets），中斷後重跑不會重複計數；已合併完的
+     前幾日 journal 隨即刪除，offset 條目最多只有當日與前一日兩筆。
+
+觸發壓實的時機：
+  - 寫入端：當日 journal 每跨過 COMPACT_EVERY_BYTES，或 token-usage.json
+    超過 COMPACT_INTERVAL_SECONDS 未更新時，以非阻塞方式嘗試（鎖被占用即跳過）
+  - 讀取端：phase_budget_reporter、budget_guard、on_stop_alert 讀取前先壓實，
+    因此看到的仍是包含所有 delta 的 schema v3 結構
+"""
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from hook_utils import (
+    FileLock,
+    atomic_write_json,
+    journal_append,
+    journal_crossed,
+    remove_journals,
+    replay_journal,
+    safe_load_json,
+)
+
+JOURNAL_SUFFIX = ".journal"
+OFFSETS_KEY = "_journal_offsets"
+COMPACT_EVERY_BYTES = 16 * 1024
+COMPACT_INTERVAL_SECONDS = 30
+TRACE_LIMIT = 50
+RETENTION_DAYS = 7
+# 估算 token：字元 / 3.5（中英混合取中間值）
+CHARS_PER_TOKEN = 3.5
+
+
+def journal_dir(token_file: str) -> str:
+    """回傳 token-usage.json 對應的 journal 目錄（state/token-usage.journal）。"""
+    return os.path.splitext(token_file)[0] + JOURNAL_SUFFIX
+
+
+def record_usage(token_file: str, input_len: int, output_len: int,
+                 phase: str = "", trace_id: str = "") -> None:
+    """附加一筆 token delta 到當日 journal（不取主檔的鎖），必要時嘗試壓實。"""
+    now = datetime.now()
+    delta = {"ts": now.isoformat(), "in": input_len, "out": output_len}
+    if phase:
+        delta["phase"] = phase
+    if trace_id:
+        delta["trace"] = trace_id[:12]
+    line = (json.dumps(delta, ensure_ascii=False) + "\n").encode("utf-8")
+
+    end = journal_append(journal_dir(token_file), line)
+    if journal_crossed(end, len(line), COMPACT_EVERY_BYTES) or _is_stale(token_file):
+        try:
+            compact_token_usage(token_file, timeout_seconds=0)
+        except (TimeoutError, OSError):
+            pass  # 其他進程正在壓實，或下次再試
+
+
+def _is_stale(token_file: str) -> bool:
+    try:
+        return time.time() - os.path.getmtime(token_file) > COMPACT_INTERVAL_SECONDS
+    except OSError:
+        return True
+
+
+def _apply_delta(usage: dict, delta: dict) -> None:
+    """依 schema v3 規則把單筆 delta 累加進 usage（與舊版 _update_token_usage 相同）。"""
+    ts = delta.get("ts", "")
+    day = ts[:10]
+    input_len = delta.get("in", 0)
+    output_len = delta.get("out", 0)
+    estimated = (input_len + output_len) / CHARS_PER_TOKEN
+
+    day_data = usage.setdefault("daily", {}).setdefault(day, {
+        "estimated_tokens": 0, "tool_calls": 0,
+        "input_chars": 0, "output_chars": 0,
+    })
+    day_data["estimated_tokens"] = day_data.get("estimated_tokens", 0) + estimated
+    day_data["tool_calls"] = day_data.get("tool_calls", 0) + 1
+    day_data["input_chars"] = day_data.get("input_chars", 0) + input_len
+    day_data["output_chars"] = day_data.get("output_chars", 0) + output_len
+
+    # ADR-035: per-phase 累計
+    phase_key = delta.get("phase", "")
+    if phase_key:
+        phase = day_data.setdefault("phases", {}).setdefault(
+            phase_key, {"estimated_tokens": 0, "tool_calls": 0})
+        phase["estimated_tokens"] = phase.get("estimated_tokens", 0) + estimated
+        phase["tool_calls"] = phase.get("tool_calls", 0) + 1
+
+    # ADR-035: per-trace 累計
+    trace_key = delta.get("trace", "")
+    if trace_key:
+        traces = day_data.setdefault("traces", {})
+        trace = traces.setdefault(trace_key, {
+            "start_time": ts, "total_tokens": 0, "phase_breakdown": {},
+        })
+        trace["total_tokens"] = trace.get("total_tokens", 0) + estimated
+        if phase_key:
+            pb = trace.setdefault("phase_breakdown", {})
+            pb[phase_key] = pb.get(phase_key, 0) + estimated
+        # 防止 traces 無限膨脹（超過上限清除最舊）
+        if len(traces) > TRACE_LIMIT:
+            oldest = min(traces, key=lambda k: traces[k].get("start_time", ""))
+            del traces[oldest]
+
+    if ts > usage.get("updated", ""):
+        usage["updated"] = ts
+
+
+def compact_token_usage(token_file: str, timeout_seconds: float = 10) -> "dict | None":
+    """把 journal 新增的 delta 合併進 token-usage.json，回傳合併後內容。
+
+    沒有任何 journal 時不取鎖、直接回傳 None（呼叫端照常讀檔）。
+    已完整合併且日期早於今天的 journal 在寫入後刪除。
+
+    Raises:
+        TimeoutError: timeout_seconds 內無法取得鎖
+    """
+    jdir = journal_dir(token_file)
+    if not os.path.isdir(jdir):
+        return None
+
+    with FileLock(token_file, timeout_seconds=timeout_seconds):
+        usage = safe_load_json(token_file, default={"daily": {}, "updated": ""})
+        if not isinstance(usage, dict):
+            usage = {"daily": {}, "updated": ""}
+        replayed = replay_journal(jdir, usage.get(OFFSETS_KEY, {}),
+                                  lambda delta: _apply_delta(usage, delta))
+        if replayed is None:
+            return None
+        new_offsets, consumed = replayed
+
+        cutoff = (datetime.now() - timedelta(days=RETENTION_DAYS)).strftime("%Y-%m-%d")
+        usage["daily"] = {k: v for k, v in usage.get("daily", {}).items() if k >= cutoff}
+        usage[OFFSETS_KEY] = new_offsets
+        atomic_write_json(token_file, usage)
+        remove_journals(consumed)
+    return usage
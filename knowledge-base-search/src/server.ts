@@ -164,7 +164,16 @@ function buildApp(deps: {
       recencyHalfLifeDays: c.req.query("recencyHalfLifeDays"),
       tags: c.req.query("tags")?.split(",").map((tag) => tag.trim()).filter(Boolean),
     });
-    return c.json({ notes: deps.vectorStore.listNotes(limit, filters) });
+    // 集合版本 ETag：快照同步端以 If-None-Match 確認自上次同步後沒有任何變動
+    const etag = `W/"${deps.vectorStore.notesVersion(filters)}"`;
+    c.header("ETag", etag);
+    if (c.req.header("If-None-Match") === etag) return c.body(null, 304);
+    const notes = deps.vectorStore.listNotes(limit, filters, {
+      updatedAfter: c.req.query("updatedAfter"),
+      afterId: c.req.query("afterId"),
+      order: c.req.query("order") === "asc" ? "asc" : "desc",
+    });
+    return c.json({ notes });
   });
 
   app.get("/api/notes/tags", (c) => c.json({ tags: deps.vectorStore.listTags() }));
@@ -1,3 +1,4 @@
+import { createHash } from "node:crypto";
 import { mkdirSync, readFileSync, writeFileSync } from "node:fs";
 import { dirname } from "node:path";
 import type { Document, ImportNote, StoredNote } from "./types.js";
@@ -15,6 +16,19 @@ export interface SearchFilters {
   recencyHalfLifeDays?: number;
 }
 
+export interface ListNotesOptions {
+  /** 只回傳 updatedAt >= updatedAfter 的筆記（含等於：同時間戳的筆記不會被分頁游標跳過） */
+  updatedAfter?: string;
+  /** 與 updatedAfter 組成 (updatedAt, id) 游標：updatedAt 相同時只回傳 id 較大者 */
+  afterId?: string;
+  order?: "asc" | "desc";
+}
+
+function compareByUpdated(a: StoredNote, b: StoredNote): number {
+  if (a.updatedAt !== b.updatedAt) return a.updatedAt < b.updatedAt ? -1 : 1;
+  return a.id < b.id ? -1 : a.id > b.id ? 1 : 0;
+}
+
 function cosineSimilarity(a: number[], b: number[]): number {
   if (a.length !== b.length) return 0;
   let dot = 0;
@@ -390,10 +404,25 @@ export class InMemoryVectorStore {
     return { items, formattedContext };
   }
 
-  listNotes(limit = 20, filters?: SearchFilters): StoredNote[] {
-    return this.getFilteredNotes(filters)
-      .sort((a, b) => b.updatedAt.localeCompare(a.updatedAt))
-      .slice(0, limit);
+  listNotes(limit = 20, filters?: SearchFilters, options: ListNotesOptions = {}): StoredNote[] {
+    const { updatedAfter, afterId, order = "desc" } = options;
+    const notes = this.getFilteredNotes(filters).filter(
+      (note) =>
+        !updatedAfter ||
+        note.updatedAt > updatedAfter ||
+        (note.updatedAt === updatedAfter && (afterId === undefined || note.id > afterId))
+    );
+    notes.sort(order === "asc" ? compareByUpdated : (a, b) => compareByUpdated(b, a));
+    return notes.slice(0, limit);
+  }
+
+  /** 篩選後筆記集合的版本（id + updatedAt 的雜湊）：新增、修改、刪除都會改變，作為 /api/notes 的 ETag。 */
+  notesVersion(filters?: SearchFilters): string {
+    const hash = createHash("sha1");
+    for (const note of this.getFilteredNotes(filters).sort(compareByUpdated)) {
+      hash.update(`${note.id}\u0000${note.updatedAt}\n`);
+    }
+    return hash.digest("hex");
   }
 
   stats(): {
@@ -168,6 +168,34 @@ describe("knowledge-base REST API", () => {
     expect(searchJson.items[0].metadata.memoryLayer).toBe("recent");
   });
 
+  it("pages /api/notes by updatedAfter/afterId and answers If-None-Match with 304", async () => {
+    const { app } = createApp();
+    await app.request("/api/import", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        notes: [
+          { id: "a", title: "a", contentText: "a", updatedAt: "2026-10-01T00:00:00.000Z" },
+          { id: "b", title: "b", contentText: "b", updatedAt: "2026-10-02T00:00:00.000Z" },
+          { id: "c", title: "c", contentText: "c", updatedAt: "2026-10-02T00:00:00.000Z" },
+        ],
+      }),
+    });
+
+    const firstRes = await app.request("/api/notes?limit=2&sort=updatedAt&order=asc");
+    const etag = firstRes.headers.get("ETag");
+    expect(etag).toBeTruthy();
+    expect((await firstRes.json()).notes.map((note: { id: string }) => note.id)).toEqual(["a", "b"]);
+
+    const nextRes = await app.request(
+      "/api/notes?limit=2&sort=updatedAt&order=asc&updatedAfter=2026-10-02T00:00:00.000Z&afterId=b"
+    );
+    expect((await nextRes.json()).notes.map((note: { id: string }) => note.id)).toEqual(["c"]);
+
+    const unchanged = await app.request("/api/notes?limit=2", { headers: { "If-None-Match": etag! } });
+    expect(unchanged.status).toBe(304);
+  });
+
   it("accepts task-type boost parameters for digest retrieval", async () => {
     const { app } = createApp();
     await app.request("/api/import", {
@@ -84,6 +84,54 @@ describe("InMemoryVectorStore", () => {
     expect(store.listNotes(10)[0]?.id).toBe("active");
   });
 
+  it("pages notes by an inclusive (updatedAt, id) cursor in ascending order", () => {
+    const store = new InMemoryVectorStore();
+    for (const [id, updatedAt] of [
+      ["a", "2026-10-01T00:00:00.000Z"],
+      ["c", "2026-10-02T00:00:00.000Z"],
+      ["b", "2026-10-02T00:00:00.000Z"],
+      ["d", "2026-10-03T00:00:00.000Z"],
+    ]) {
+      store.upsertNote({ id, title: id, contentText: id, updatedAt });
+    }
+
+    const first = store.listNotes(2, undefined, { order: "asc" });
+    expect(first.map((note) => note.id)).toEqual(["a", "b"]);
+    const last = first[first.length - 1]!;
+    const next = store.listNotes(2, undefined, {
+      order: "asc",
+      updatedAfter: last.updatedAt,
+      afterId: last.id,
+    });
+    // c 與 b 同時間戳：游標含等於，不會被跳過
+    expect(next.map((note) => note.id)).toEqual(["c", "d"]);
+    expect(
+      store.listNotes(10, undefined, { updatedAfter: "2026-10-02T00:00:00.000Z" }).map((note) => note.id)
+    ).toEqual(["d", "c", "b"]);
+  });
+
+  it("changes the notes version on edits and deletes only", () => {
+    const store = new InMemoryVectorStore();
+    store.upsertNote({ id: "a", title: "a", contentText: "a", updatedAt: "2026-10-01T00:00:00.000Z" });
+    store.upsertNote({ id: "b", title: "b", contentText: "b", updatedAt: "2026-10-02T00:00:00.000Z" });
+    const version = store.notesVersion();
+    store.listNotes(10);
+    expect(store.notesVersion()).toBe(version);
+
+    store.upsertNote({ id: "a", title: "a", contentText: "a2", updatedAt: "2026-10-04T00:00:00.000Z" });
+    const edited = store.notesVersion();
+    expect(edited).not.toBe(version);
+    store.upsertNote({
+      id: "b",
+      title: "b",
+      contentText: "b",
+      updatedAt: "2026-10-02T00:00:00.000Z",
+      expiresAt: "2020-01-01T00:00:00.000Z",
+    });
+    store.evictExpired();
+    expect(store.notesVersion()).not.toBe(edited);
+  });
+
   it("keeps hybrid query latency under 200ms for 10,000 entries", async () => {
     const store = new InMemoryVectorStore();
     await store.addDocuments(
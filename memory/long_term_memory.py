@@ -1,16 +1,23 @@
 """Long-term memory primitives for multi-level digest storage and retrieval."""
 from __future__ import annotations
 
+import heapq
 import json
 import math
 import re
-from collections import Counter
+from collections import Counter, deque
 from dataclasses import asdict, dataclass, field
 from datetime import datetime, timedelta, timezone
 from enum import Enum
 from pathlib import Path
 from typing import Any
 
+from .retrieval import SparseRetrievalIndex, cosine_with_norms, embedding_norm
+from .segment_store import SegmentedRecordStore, segment_dir_for
+
+# Expired rows stay in the indexes as tombstones until they exceed this share of all rows
+TOMBSTONE_COMPACT_RATIO = 0.25
+
 
 class DigestLevel(str, Enum):
     DAILY = "daily"
@@ -136,6 +143,37 @@ class SearchFilters:
     end_date: str | None = None
 
 
+def _record_payload(record: MemoryRecord) -> dict[str, Any]:
+    return asdict(record) | {"level": record.level.value}
+
+
+def _record_from_payload(item: dict[str, Any]) -> MemoryRecord:
+    return MemoryRecord(
+        id=item["id"],
+        level=DigestLevel(item["level"]),
+        title=item["title"],
+        topic=item["topic"],
+        summary=item["summary"],
+        key_events=list(item.get("key_events", [])),
+        decisions=list(item.get("decisions", [])),
+        open_questions=list(item.get("open_questions", [])),
+        source_session_ids=list(item.get("source_session_ids", [])),
+        raw_messages=list(item.get("raw_messages", [])),
+        tags=list(item.get("tags", [])),
+        language=item.get("language", "zh-TW"),
+        created_at=item["created_at"],
+        updated_at=item["updated_at"],
+        expires_at=item.get("expires_at"),
+        embedding_text=item["embedding_text"],
+        embedding=dict(item.get("embedding", {})),
+        metadata=dict(item.get("metadata", {})),
+    )
+
+
+def _parse_expiry(record: MemoryRecord) -> datetime | None:
+    return datetime.fromisoformat(record.expires_at) if record.expires_at else None
+
+
 class LongTermMemoryManager:
     def __init__(
         self,
@@ -147,64 +185,144 @@ class LongTermMemoryManager:
         self.config = config or LongTermMemoryConfig()
         self.embedder = embedder or LocalEmbeddingModel(self.config.embedding.model)
         self.now_provider = now_provider
-        self.records: list[MemoryRecord] = []
+        self._rows: list[MemoryRecord | None] = []
+        self._tombstones = 0
+        self._expiry_heap: list[tuple[datetime, int]] = []
         self._token_index: dict[str, set[int]] = {}
         self._topic_index: dict[str, set[int]] = {}
         self._task_type_index: dict[str, set[int]] = {}
         self._tag_index: dict[str, set[int]] = {}
         self._date_index: list[datetime | None] = []
+        self._vectors = SparseRetrievalIndex()
+        self._store = SegmentedRecordStore(segment_dir_for(self.config.storage_path))
+        self._unsaved: list[MemoryRecord] = []
         self._load()
 
+    @property
+    def records(self) -> list[MemoryRecord]:
+        if self._tombstones:
+            self._compact_indexes()
+        return self._rows
+
+    @records.setter
+    def records(self, value: list[MemoryRecord]) -> None:
+        self._rows = list(value)
+        self._tombstones = 0
+
     def _load(self) -> None:
-        if not self.config.storage_path.exists():
+        if self._store.exists():
+            self._load_segments()
+        elif self.config.storage_path.exists():
+            self._migrate_json_storage()
+        else:
             self.records = []
-            return
+
+    def _load_segments(self) -> None:
+        snapshot, operations = self._store.load()
+        items = list(snapshot.get("records", []))
+        entries: list[tuple[dict[str, Any], list[str] | None] | None] = list(
+            zip(items, self._snapshot_tokens(snapshot.get("index"), len(items)))
+        )
+        # id -> positions still live, oldest first; deletes drop the earliest matches
+        positions: dict[str, deque[int]] = {}
+        for position, (item, _) in enumerate(entries):
+            positions.setdefault(item["id"], deque()).append(position)
+        for operation in operations:
+            if operation.get("op") == "put":
+                positions.setdefault(operation["record"]["id"], deque()).append(len(entries))
+                entries.append((operation["record"], None))
+            elif operation.get("op") == "delete":
+                for record_id in operation.get("ids", []):
+                    live = positions.get(record_id)
+                    if live:
+                        entries[live.popleft()] = None
+        entries = [entry for entry in entries if entry is not None]
+        self.records = [_record_from_payload(item) for item, _ in entries]
+        self._rebuild_indexes([tokens for _, tokens in entries])
+
+    def _migrate_json_storage(self) -> None:
         payload = json.loads(self.config.storage_path.read_text(encoding="utf-8"))
-        self.records = [
-            MemoryRecord(
-                id=item["id"],
-                level=DigestLevel(item["level"]),
-                title=item["title"],
-                topic=item["topic"],
-                summary=item["summary"],
-                key_events=list(item.get("key_events", [])),
-                decisions=list(item.get("decisions", [])),
-                open_questions=list(item.get("open_questions", [])),
-                source_session_ids=list(item.get("source_session_ids", [])),
-                raw_messages=list(item.get("raw_messages", [])),
-                tags=list(item.get("tags", [])),
-                language=item.get("language", "zh-TW"),
-                created_at=item["created_at"],
-                updated_at=item["updated_at"],
-                expires_at=item.get("expires_at"),
-                embedding_text=item["embedding_text"],
-                embedding=dict(item.get("embedding", {})),
-                metadata=dict(item.get("metadata", {})),
-            )
-            for item in payload.get("records", [])
-        ]
+        self.records = [_record_from_payload(item) for item in payload.get("records", [])]
         self._rebuild_indexes()
+        self.save()
+
+    @staticmethod
+    def _snapshot_tokens(index: Any, record_count: int) -> list[list[str] | None]:
+        if not isinstance(index, dict) or index.get("record_count") != record_count:
+            return [None] * record_count
+        rows: list[list[str] | None] = [[] for _ in range(record_count)]
+        for token, positions in index.get("tokens", {}).items():
+            for position in positions:
+                rows[position].append(token)
+        return rows
+
+    def _index_snapshot(self) -> dict[str, Any]:
+        return {
+            "record_count": len(self.records),
+            "tokens": {token: sorted(positions) for token, positions in self._token_index.items()},
+        }
 
     def save(self) -> None:
-        self.config.storage_path.parent.mkdir(parents=True, exist_ok=True)
-        payload = {
-            "schema_version": 1,
-            "records": [asdict(record) | {"level": record.level.value} for record in self.records],
-            "embedding": asdict(self.config.embedding),
-        }
-        self.config.storage_path.write_text(
-            json.dumps(payload, ensure_ascii=False, indent=2) + "\n",
-            encoding="utf-8",
+        records = self.records
+        # Records may have been edited in place since they were indexed
+        self._expiry_heap = []
+        for index, record in enumerate(records):
+            self._push_expiry(index, record)
+        self._store.compact(
+            {
+                "schema_version": 2,
+                "records": [_record_payload(record) for record in records],
+                "embedding": asdict(self.config.embedding),
+                "index": self._index_snapshot(),
+            }
         )
+        self._unsaved = []
+
+    def _append_operations(self, operations: list[dict[str, Any]]) -> None:
+        puts = [{"op": "put", "record": _record_payload(record)} for record in self._unsaved]
+        self._store.append(puts + operations)
+        self._unsaved = []
+        if self._store.should_compact():
+            self.save()
 
-    def _rebuild_indexes(self) -> None:
+    def _rebuild_indexes(self, tokens: list[list[str] | None] | None = None) -> None:
         self._token_index = {}
         self._topic_index = {}
         self._task_type_index = {}
         self._tag_index = {}
         self._date_index = []
-        for index, record in enumerate(self.records):
-            self._index_record(index, record)
+        self._vectors = SparseRetrievalIndex()
+        self._expiry_heap = []
+        for index, record in enumerate(self._rows):
+            self._index_record(index, record, tokens[index] if tokens else None)
+
+    def _compact_indexes(self) -> None:
+        positions: dict[int, int] = {}
+        rows: list[MemoryRecord | None] = []
+        for old, record in enumerate(self._rows):
+            if record is not None:
+                positions[old] = len(rows)
+                rows.append(record)
+        for mapping in (self._token_index, self._topic_index, self._task_type_index, self._tag_index):
+            for key in list(mapping):
+                remapped = {positions[old] for old in mapping[key] if old in positions}
+                if remapped:
+                    mapping[key] = remapped
+                else:
+                    del mapping[key]
+        self._date_index = [value for old, value in enumerate(self._date_index) if old in positions]
+        self._vectors = SparseRetrievalIndex()
+        for record in rows:
+            self._vectors.add(record.embedding)
+        self._expiry_heap = [(expires, positions[old]) for expires, old in self._expiry_heap if old in positions]
+        heapq.heapify(self._expiry_heap)
+        self._rows = rows
+        self._tombstones = 0
+
+    def _push_expiry(self, index: int, record: MemoryRecord) -> None:
+        expires = _parse_expiry(record)
+        if expires is not None:
+            heapq.heappush(self._expiry_heap, (expires, index))
 
     def _index_bucket(self, mapping: dict[str, set[int]], key: str | None, index: int) -> None:
         normalized = str(key or "").strip().lower()
@@ -231,14 +349,16 @@ class LongTermMemoryManager:
                 continue
         return None
 
-    def _index_record(self, index: int, record: MemoryRecord) -> None:
-        for token in set(_tokenize(record.embedding_text)):
+    def _index_record(self, index: int, record: MemoryRecord, tokens: list[str] | None = None) -> None:
+        for token in set(_tokenize(record.embedding_text)) if tokens is None else tokens:
             self._token_index.setdefault(token, set()).add(index)
         self._index_bucket(self._topic_index, record.topic, index)
         self._index_bucket(self._task_type_index, record.metadata.get("taskType"), index)
         for tag in record.tags:
             self._index_bucket(self._tag_index, tag, index)
         self._date_index.append(self._record_datetime(record))
+        self._vectors.add(record.embedding)
+        self._push_expiry(index, record)
 
     def _parse_filter_date(self, value: str | None) -> datetime | None:
         if not value:
@@ -255,7 +375,7 @@ class LongTermMemoryManager:
         return parsed
 
     def _match_filters(self, index: int, filters: SearchFilters) -> bool:
-        record = self.records[index]
+        record = self._rows[index]
         if filters.topic and record.topic.lower() != filters.topic.strip().lower():
             return False
         record_task_type = str(record.metadata.get("taskType") or "").strip().lower()
@@ -289,8 +409,10 @@ class LongTermMemoryManager:
             tag_matches = self._tag_index.get(tag.strip().lower(), set())
             candidates = tag_matches if not candidates else candidates & tag_matches
         if not candidates:
-            candidates = set(range(len(self.records)))
-        return {index for index in candidates if self._match_filters(index, filters)}
+            candidates = set(range(len(self._rows)))
+        return {
+            index for index in candidates if self._rows[index] is not None and self._match_filters(index, filters)
+        }
 
     def _expiry_for(self, level: DigestLevel, now: datetime) -> str | None:
         retention = self.config.retention_days[level]
@@ -354,7 +476,7 @@ class LongTermMemoryManager:
             generated["open_questions"],
         )
         record = MemoryRecord(
-            id=f"{level.value}-{int(now.timestamp())}-{len(self.records) + 1}",
+            id=f"{level.value}-{int(now.timestamp())}-{len(self._rows) - self._tombstones + 1}",
             level=level,
             title=generated["title"],
             topic=topic,
@@ -373,10 +495,11 @@ class LongTermMemoryManager:
             embedding=self.embedder.embed(embedding_text),
             metadata=metadata or {},
         )
-        self.records.append(record)
-        self._index_record(len(self.records) - 1, record)
+        self._rows.append(record)
+        self._index_record(len(self._rows) - 1, record)
+        self._unsaved.append(record)
         if auto_save:
-            self.save()
+            self._append_operations([])
         return record
 
     def search(
@@ -394,11 +517,13 @@ class LongTermMemoryManager:
         coarse: list[SearchResult] = []
         allowed = set(levels or list(DigestLevel))
         filters = filters or SearchFilters()
-        for index in self._candidate_indexes(query, filters):
-            record = self.records[index]
-            if record.level not in allowed:
-                continue
-            score = _cosine_similarity(query_embedding, record.embedding)
+        candidates = [
+            index for index in self._candidate_indexes(query, filters) if self._rows[index].level in allowed
+        ]
+        query_norm = embedding_norm(query_embedding)
+        for index in self._vectors.select(query_embedding, candidates, top_k=top_k, min_score=min_score):
+            record = self._rows[index]
+            score = cosine_with_norms(query_embedding, query_norm, record.embedding, self._vectors.norms[index])
             if score >= min_score:
                 coarse.append(SearchResult(record=record, score=score, retrieval_path=[record.level.value]))
         coarse.sort(key=lambda item: item.score, reverse=True)
@@ -428,18 +553,30 @@ class LongTermMemoryManager:
 
     def expire_records(self, *, now: datetime | None = None) -> list[MemoryRecord]:
         now = now or self.now_provider()
-        kept: list[MemoryRecord] = []
-        expired: list[MemoryRecord] = []
-        for record in self.records:
-            if record.expires_at and datetime.fromisoformat(record.expires_at) <= now:
-                expired.append(record)
-            else:
-                kept.append(record)
-        if expired:
-            self._backup_expired(expired)
-            self.records = kept
-            self._rebuild_indexes()
-            self.save()
+        expired_rows: list[int] = []
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            _, index = heapq.heappop(self._expiry_heap)
+            record = self._rows[index]
+            if record is None:
+                continue
+            expires = _parse_expiry(record)
+            if expires is None:
+                continue
+            if expires > now:
+                heapq.heappush(self._expiry_heap, (expires, index))
+                continue
+            expired_rows.append(index)
+        if not expired_rows:
+            return []
+        expired_rows.sort()
+        expired = [self._rows[index] for index in expired_rows]
+        for index in expired_rows:
+            self._rows[index] = None
+        self._tombstones += len(expired_rows)
+        self._backup_expired(expired)
+        self._append_operations([{"op": "delete", "ids": [record.id for record in expired]}])
+        if self._tombstones > len(self._rows) * TOMBSTONE_COMPACT_RATIO:
+            self._compact_indexes()
         return expired
 
     def _backup_expired(self, records: list[MemoryRecord]) -> None:
@@ -457,4 +594,4 @@ class LongTermMemoryManager:
         return projected <= self.config.embedding.monthly_cost_limit_usd
 
     def export_records(self) -> list[dict[str, Any]]:
-        return [asdict(record) | {"level": record.level.value} for record in self.records]
+        return [_record_payload(record) for record in self.records]
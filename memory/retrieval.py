@@ -0,0 +1,132 @@
+"""Sparse vectorized retrieval backend for long-term memory embeddings."""
+from __future__ import annotations
+
+import math
+from array import array
+
+try:  # numpy is optional; without it callers fall back to exact per-record scoring
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only where numpy is missing
+    np = None
+
+# Vectorized scores are only used to choose which candidates get exact scoring.
+# Any candidate within this margin of a cut-off (min_score or the k-th best
+# score) is kept, so float summation-order differences never change results.
+SELECTION_EPSILON = 1e-9
+
+
+def embedding_norm(embedding: dict[str, float]) -> float:
+    return math.sqrt(sum(value * value for value in embedding.values()))
+
+
+def cosine_with_norms(
+    query: dict[str, float],
+    query_norm: float,
+    embedding: dict[str, float],
+    embedding_norm_value: float,
+) -> float:
+    """Cosine similarity identical to the per-pair computation, with precomputed norms."""
+    if not query or not embedding:
+        return 0.0
+    dot = sum(query[token] * embedding.get(token, 0.0) for token in query)
+    if query_norm == 0 or embedding_norm_value == 0:
+        return 0.0
+    return dot / (query_norm * embedding_norm_value)
+
+
+class SparseRetrievalIndex:
+    """Row-per-record CSR matrix over a token vocabulary with precomputed row norms.
+
+    Rows are appended as records are indexed; the NumPy arrays are materialized
+    lazily on the first query after a change. ``select`` scores a candidate row
+    set with one sparse matrix-vector product and returns the rows that can
+    reach the top-k, which the caller then scores exactly.
+    """
+
+    def __init__(self) -> None:
+        self.vocabulary: dict[str, int] = {}
+        self.norms = array("d")
+        self._indptr = array("q", [0])
+        self._indices = array("q")
+        self._data = array("d")
+        self._arrays: tuple | None = None
+
+    def __len__(self) -> int:
+        return len(self.norms)
+
+    @staticmethod
+    def available() -> bool:
+        return np is not None
+
+    def add(self, embedding: dict[str, float]) -> int:
+        for token, weight in embedding.items():
+            token_id = self.vocabulary.setdefault(token, len(self.vocabulary))
+            self._indices.append(token_id)
+            self._data.append(weight)
+        self._indptr.append(len(self._indices))
+        self.norms.append(embedding_norm(embedding))
+        self._arrays = None
+        return len(self.norms) - 1
+
+    def _materialize(self) -> tuple:
+        if self._arrays is None:
+            self._arrays = (
+                np.array(self._indptr, dtype=np.int64),
+                np.array(self._indices, dtype=np.int64),
+                np.array(self._data, dtype=np.float64),
+                np.array(self.norms, dtype=np.float64),
+            )
+        return self._arrays
+
+    def scores(self, query: dict[str, float], rows) -> "np.ndarray":
+        """Approximate cosine scores for ``rows`` (CSR sub-matrix times query vector)."""
+        indptr, indices, data, norms = self._materialize()
+        rows = np.asarray(rows, dtype=np.int64)
+        query_norm = embedding_norm(query)
+        result = np.zeros(len(rows), dtype=np.float64)
+        if not len(rows) or query_norm == 0:
+            return result
+
+        dense_query = np.zeros(len(self.vocabulary) + 1, dtype=np.float64)
+        for token, weight in query.items():
+            token_id = self.vocabulary.get(token)
+            if token_id is not None:
+                dense_query[token_id] = weight
+
+        starts = indptr[rows]
+        lengths = indptr[rows + 1] - starts
+        nonempty = lengths > 0
+        if not nonempty.any():
+            return result
+        starts, lengths = starts[nonempty], lengths[nonempty]
+        # Gather the candidate rows' non-zeros contiguously, then reduce per row
+        segment_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        positions = np.arange(lengths.sum()) + np.repeat(starts - segment_starts, lengths)
+        products = data[positions] * dense_query[indices[positions]]
+        dots = np.add.reduceat(products, segment_starts)
+        row_norms = norms[rows[nonempty]]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cosine = np.where(row_norms > 0, dots / (query_norm * row_norms), 0.0)
+        result[nonempty] = cosine
+        return result
+
+    def select(
+        self,
+        query: dict[str, float],
+        rows: list[int],
+        *,
+        top_k: int,
+        min_score: float,
+    ) -> list[int]:
+        """Return the subset of ``rows`` (in their given order) that may rank in the top-k."""
+        if np is None or top_k <= 0 or not rows:
+            return rows
+        scores = self.scores(query, rows)
+        keep = scores >= min_score - SELECTION_EPSILON
+        kept = int(keep.sum())
+        if kept > top_k:
+            kept_scores = scores[keep]
+            top = np.argpartition(-kept_scores, top_k - 1)[:top_k]
+            kth_score = kept_scores[top].min()
+            keep &= scores >= kth_score - SELECTION_EPSILON
+        return [rows[position] for position in np.flatnonzero(keep)]
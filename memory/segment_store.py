@@ -0,0 +1,119 @@
+"""Append-only segmented storage for long-term memory records."""
+from __future__ import annotations
+
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any
+
+SNAPSHOT_NAME = "snapshot.json"
+SEGMENT_PATTERN = re.compile(r"^segment-(\d{6})\.jsonl$")
+SEGMENT_MAX_BYTES = 1024 * 1024
+COMPACT_AFTER_SEGMENTS = 8
+
+
+def segment_dir_for(storage_path: Path) -> Path:
+    return storage_path.with_suffix(".segments")
+
+
+class SegmentedRecordStore:
+    """Snapshot plus numbered append-only segments of record operations.
+
+    ``snapshot.json`` holds every record as of the last compaction together
+    with an index snapshot and ``next_segment``, the first segment not folded
+    into it. Segments hold one JSON operation per line: ``put`` (insert or
+    replace by id) and ``delete``. Compaction writes a new snapshot atomically
+    and only then removes the segments it absorbed, so an interrupted
+    compaction never loses or double-applies operations.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+        self._first_segment: int | None = None
+
+    @property
+    def snapshot_path(self) -> Path:
+        return self.root / SNAPSHOT_NAME
+
+    def _segment_path(self, number: int) -> Path:
+        return self.root / f"segment-{number:06d}.jsonl"
+
+    def _segments(self) -> list[int]:
+        if not self.root.exists():
+            return []
+        numbers = []
+        for entry in self.root.iterdir():
+            match = SEGMENT_PATTERN.match(entry.name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def _next_segment(self) -> int:
+        if self._first_segment is None:
+            self._first_segment = 1
+            if self.snapshot_path.exists():
+                snapshot = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+                self._first_segment = int(snapshot.get("next_segment", 1))
+        return self._first_segment
+
+    def exists(self) -> bool:
+        return self.snapshot_path.exists() or bool(self._segments())
+
+    def load(self) -> tuple[dict[str, Any], list[dict[str, Any]]]:
+        snapshot: dict[str, Any] = {}
+        if self.snapshot_path.exists():
+            snapshot = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+        first = self._first_segment = int(snapshot.get("next_segment", 1))
+        operations: list[dict[str, Any]] = []
+        for number in self._segments():
+            if number < first:
+                continue
+            with self._segment_path(number).open("r", encoding="utf-8") as handle:
+                for line in handle:
+                    try:
+                        operation = json.loads(line)
+                    except ValueError:
+                        continue  # torn write from an interrupted append
+                    if isinstance(operation, dict):
+                        operations.append(operation)
+        return snapshot, operations
+
+    def append(self, operations: list[dict[str, Any]]) -> None:
+        if not operations:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        segments = [number for number in self._segments() if number >= self._next_segment()]
+        number = segments[-1] if segments else self._next_segment()
+        path = self._segment_path(number)
+        size = path.stat().st_size if path.exists() else 0
+        if size >= SEGMENT_MAX_BYTES:
+            number, size = number + 1, 0
+            path = self._segment_path(number)
+        payload = "".join(json.dumps(operation, ensure_ascii=False) + "\n" for operation in operations)
+        if size:
+            with path.open("rb") as reader:
+                reader.seek(size - 1)
+                if reader.read(1) != b"\n":
+                    payload = "\n" + payload  # keep a torn tail from swallowing this line
+        with path.open("ab") as handle:
+            handle.write(payload.encode("utf-8"))
+
+    def should_compact(self) -> bool:
+        next_segment = self._next_segment()
+        return len([number for number in self._segments() if number >= next_segment]) >= COMPACT_AFTER_SEGMENTS
+
+    def compact(self, snapshot: dict[str, Any]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        segments = self._segments()
+        next_segment = max([self._next_segment()] + [number + 1 for number in segments])
+        payload = dict(snapshot) | {"next_segment": next_segment}
+        temporary = self.snapshot_path.with_suffix(".json.tmp")
+        temporary.write_text(json.dumps(payload, ensure_ascii=False) + "\n", encoding="utf-8")
+        os.replace(temporary, self.snapshot_path)
+        self._first_segment = next_segment
+        for number in segments:
+            try:
+                self._segment_path(number).unlink()
+            except OSError:
+                pass
@@ -1422,8 +1422,7 @@ try {
                     Write-Log "[Phase0e] WARN: critical 風險時段，Phase 2 執行受限"
                 }
             }
-            # 持久化風險評估結果供後續分析
-            $riskJson | Set-Content (Join-Path $AgentDir "state\time-slot-risk.json") -Encoding UTF8
+            # state\time-slot-risk.json 由 scorer 自行物化（含 24 小時評分與失效簽章），此處不覆寫
         }
     } else {
         Write-Log "[Phase0e] time_slot_risk_scorer.py 不存在，略過風險評估"
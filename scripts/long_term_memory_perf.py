@@ -8,15 +8,17 @@ import sys
 import time
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from threading import Lock
+from threading import Lock, Thread
 
 REPO_ROOT = Path(__file__).resolve().parent.parent
 if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
-from memory.long_term_memory import DigestLevel, LongTermMemoryConfig, LongTermMemoryManager
-from memory.long_term_memory import SearchFilters
+from memory.long_term_memory import DigestLevel, LongTermMemoryConfig, LongTermMemoryManager  # noqa: E402
+from memory.long_term_memory import SearchFilters, _cosine_similarity  # noqa: E402
+from memory.retrieval import SparseRetrievalIndex, cosine_with_norms, embedding_norm  # noqa: E402
 
 
 def _build_manager(tmp_dir: Path) -> LongTermMemoryManager:
@@ -133,10 +135,142 @@ def run_million_scale_retrieval_benchmark(
     return report
 
 
+def run_vector_scoring_benchmark(
+    record_count: int = 200_000,
+    tokens_per_record: int = 12,
+    top_k: int = 5,
+) -> dict[str, float | int | bool]:
+    vocabulary = [f"token-{index}" for index in range(5_000)]
+    embeddings = [
+        {
+            vocabulary[(index * 31 + offset * 97) % len(vocabulary)]: 1.0 + (index + offset) % 3
+            for offset in range(tokens_per_record)
+        }
+        for index in range(record_count)
+    ]
+    sparse_index = SparseRetrievalIndex()
+    for embedding in embeddings:
+        sparse_index.add(embedding)
+    query = {vocabulary[offset * 97]: 1.0 for offset in range(4)}
+    rows = list(range(record_count))
+
+    started = time.perf_counter()
+    pairwise = sorted(((_cosine_similarity(query, embeddings[row]), row) for row in rows), reverse=True)[:top_k]
+    pairwise_ms = (time.perf_counter() - started) * 1000
+
+    query_norm = embedding_norm(query)
+    sparse_index.select(query, rows[:1], top_k=top_k, min_score=0.0)  # materialize arrays once
+    started = time.perf_counter()
+    selected = sparse_index.select(query, rows, top_k=top_k, min_score=0.0)
+    vectorized = sorted(
+        ((cosine_with_norms(query, query_norm, embeddings[row], sparse_index.norms[row]), row) for row in selected),
+        reverse=True,
+    )[:top_k]
+    vectorized_ms = (time.perf_counter() - started) * 1000
+
+    return {
+        "record_count": record_count,
+        "numpy_available": SparseRetrievalIndex.available(),
+        "pairwise_ms": round(pairwise_ms, 3),
+        "vectorized_ms": round(vectorized_ms, 3),
+        "exact_scored": len(selected),
+        "scores_match": [score for score, _ in pairwise] == [score for score, _ in vectorized],
+    }
+
+
+class _StubKnowledgeBase(BaseHTTPRequestHandler):
+    """最小的 knowledge-base-search 替身：每個請求固定延遲，import 逐筆回傳 noteId。"""
+
+    latency_seconds = 0.005
+
+    def log_message(self, format, *args):  # noqa: A002 - 靜音 stderr 存取紀錄
+        pass
+
+    def _reply(self, payload: dict) -> None:
+        time.sleep(self.latency_seconds)
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):  # noqa: N802
+        self._reply({"status": "ok"})
+
+    def do_POST(self):  # noqa: N802
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path == "/api/search/hybrid":
+            self._reply({"items": []})
+            return
+        notes = request.get("notes", [])
+        note_ids = [note.get("id") or f"note-{note.get('digestDate')}" for note in notes]
+        self._reply(
+            {
+                "message": f"Imported {len(note_ids)} notes, 0 failed",
+                "result": {"success": True, "imported": len(note_ids), "failed": 0, "errors": [], "noteIds": note_ids},
+            }
+        )
+
+
+def run_digest_sync_flush_benchmark(
+    queue_size: int = 200,
+    latency_ms: float = 5.0,
+    batch_size: int = 20,
+) -> dict[str, float | int | bool]:
+    """以本機 stub KB 比較 serial 與 bulk 沖刷同一份佇列的吞吐量（筆/秒）。"""
+    import requests
+
+    from tools.digest_sync import flush_sync_queue
+
+    _StubKnowledgeBase.latency_seconds = latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubKnowledgeBase)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    tmp_dir = Path("tmp") / "perf"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    items = [
+        {"title": f"Daily Digest Memory - {index:05d}", "digestDate": f"{index:05d}", "topic": "AI"}
+        for index in range(queue_size)
+    ]
+
+    report: dict[str, float | int | bool] = {"queue_size": queue_size, "latency_ms": latency_ms}
+    try:
+        for mode in ("serial", "bulk"):
+            queue_path = tmp_dir / f"digest-sync-{mode}-queue.json"
+            queue_path.write_text(json.dumps({"items": items}), encoding="utf-8")
+            started = time.perf_counter()
+            with requests.Session() as session:
+                flushed = flush_sync_queue(
+                    base_url,
+                    queue_path=queue_path,
+                    max_retries=1,
+                    timeout=10,
+                    session=session,
+                    sleep_seconds=0,
+                    # serial 模式每次只處理 batch_size 筆，一次涵蓋整份佇列才能比較
+                    batch_size=queue_size if mode == "serial" else batch_size,
+                    mode=mode,
+                )
+            elapsed = time.perf_counter() - started
+            report[f"{mode}_seconds"] = round(elapsed, 3)
+            report[f"{mode}_notes_per_second"] = round(len(flushed) / elapsed, 1)
+            report[f"{mode}_drained"] = all(item.success for item in flushed) and len(flushed) == queue_size
+    finally:
+        server.shutdown()
+        server.server_close()
+    report["speedup"] = round(report["bulk_notes_per_second"] / report["serial_notes_per_second"], 2)
+    return report
+
+
 def main() -> None:
     report = {
         "write_search_smoke": run_performance_test(),
         "million_scale_retrieval": run_million_scale_retrieval_benchmark(),
+        "vector_scoring": run_vector_scoring_benchmark(),
+        "digest_sync_flush": run_digest_sync_flush_benchmark(),
     }
     print(json.dumps(report, ensure_ascii=False, indent=2))
 
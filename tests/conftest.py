@@ -13,6 +13,16 @@ sys.path.insert(0, os.path.join(project_root, "skills", "ntfy-notify", "scripts"
 sys.path.insert(0, os.path.join(project_root, "skills", "knowledge-query", "scripts"))
 
 
+@pytest.fixture(autouse=True)
+def _isolated_rule_engine_cache(tmp_path, monkeypatch):
+    """規則引擎的編譯計畫快取寫到暫存目錄，不污染 state/hook-rule-engine.json。"""
+    hooks_dir = os.path.join(project_root, "hooks")
+    if hooks_dir not in sys.path:
+        sys.path.insert(0, hooks_dir)
+    import rule_engine
+    monkeypatch.setattr(rule_engine, "CACHE_PATH", str(tmp_path / "hook-rule-engine.json"))
+
+
 @pytest.fixture
 def mock_api_token():
     """Provide a mock API token for testing."""
@@ -303,6 +303,77 @@ class TestCircuitBreaker:
         state = json.load(open(temp_state_file, "r"))
         assert state["todoist"]["failures"] == 2
 
+    # === Transactions & Cache ===
+
+    @staticmethod
+    def _age_file(path, seconds=60):
+        past = datetime.now().timestamp() - seconds
+        os.utime(path, (past, past))
+
+    def test_check_health_served_from_cache(self, breaker, temp_state_file, monkeypatch):
+        """簽章未變且 mtime 夠舊時 check_health 不讀檔"""
+        breaker.record_result("todoist", success=False)
+        self._age_file(temp_state_file)
+        assert breaker.check_health("todoist") == "closed"
+
+        def _fail():
+            raise AssertionError("state file should not be re-read")
+
+        monkeypatch.setattr(breaker, "_load_state", _fail)
+        assert breaker.check_health("todoist") == "closed"
+
+    def test_cache_invalidated_by_external_write(self, breaker, temp_state_file):
+        """其他進程改寫檔案後，快取失效並讀到新狀態"""
+        breaker.record_result("todoist", success=True)
+        self._age_file(temp_state_file, 120)
+        assert breaker.check_health("todoist") == "closed"
+
+        state = {"todoist": {"state": "open", "failures": 3,
+                             "cooldown": (datetime.now() + timedelta(minutes=5)).isoformat()}}
+        with open(temp_state_file, "w") as f:
+            json.dump(state, f)
+        self._age_file(temp_state_file)
+        assert breaker.check_health("todoist") == "open"
+
+    def test_record_result_single_lock_and_write(self, breaker, monkeypatch):
+        """record_result（含條目初始化）只取一次鎖、只寫一次檔"""
+        import agent_guardian
+        enters = []
+        saves = []
+        original_enter = agent_guardian.FileLock.__enter__
+        original_save = breaker._save_state
+
+        def _enter(lock):
+            enters.append(lock.lock_path)
+            return original_enter(lock)
+
+        def _save(state):
+            saves.append(state)
+            original_save(state)
+
+        monkeypatch.setattr(agent_guardian.FileLock, "__enter__", _enter)
+        monkeypatch.setattr(breaker, "_save_state", _save)
+        breaker.record_result("todoist", success=False)
+        assert len(enters) == 1
+        assert len(saves) == 1
+        assert saves[0]["todoist"] == {"state": "closed", "failures": 1, "cooldown": None}
+
+    def test_unchanged_transition_skips_write(self, breaker, monkeypatch):
+        """open 狀態再失敗不改變狀態，也不寫檔"""
+        for _ in range(3):
+            breaker.record_result("todoist", success=False)
+
+        def _fail(state):
+            raise AssertionError("unchanged state should not be written")
+
+        monkeypatch.setattr(breaker, "_save_state", _fail)
+        breaker.record_result("todoist", success=False)
+        assert breaker.check_health("todoist") == "open"
+
+    def test_transact_returns_entry(self, breaker):
+        entry = breaker.transact("gmail", lambda e: dict(e, failures=e["failures"] + 2))
+        assert entry == {"state": "closed", "failures": 2, "cooldown": None}
+
 
 # ============================================
 # Integration Tests
@@ -7,6 +7,7 @@
   4. _load_patterns / _save_patterns: 檔案 I/O 容錯（JSON 損壞/檔案缺失）
   5. _cleanup_stale: 過期模式清理
   6. report(): CLI 報告輸出
+  7. Write-behind：記憶體緩衝、journal 合併冪等、heap 淘汰、計數器觸發清理
 """
 import json
 import os
@@ -25,6 +26,8 @@ from behavior_tracker import (
     _load_patterns,
     _save_patterns,
     _cleanup_stale,
+    flush,
+    merge_pending,
     track,
     report,
     MAX_PATTERNS,
@@ -32,9 +35,18 @@ from behavior_tracker import (
     CONFIDENCE_INCREMENT,
     CONFIDENCE_MAX,
     CONFIDENCE_INITIAL,
+    OFFSETS_KEY,
 )
 
 
+@pytest.fixture(autouse=True)
+def _isolated_buffer(monkeypatch):
+    """每個測試使用獨立的記憶體緩衝，不寫到真實 context/。"""
+    import behavior_tracker
+    monkeypatch.setattr(behavior_tracker, "_pending", {})
+    monkeypatch.setattr(behavior_tracker, "_pending_calls", 0)
+
+
 # ============================================
 # _sanitize_summary 敏感資訊消毒
 # ============================================
@@ -294,6 +306,7 @@ class TestTrack:
 
         track("Bash", "curl https://api.todoist.com", ["api-call", "todoist"])
 
+        flush(merge=True)
         data = _load_patterns()
         assert len(data["patterns"]) == 1
         pattern = list(data["patterns"].values())[0]
@@ -311,6 +324,7 @@ class TestTrack:
         track("Read", "SKILL_INDEX.md", ["skill-index"])
         track("Read", "SKILL_INDEX.md", ["skill-index"])
 
+        flush(merge=True)
         data = _load_patterns()
         pattern = list(data["patterns"].values())[0]
         assert pattern["count"] == 3
@@ -325,6 +339,7 @@ class TestTrack:
         for _ in range(30):
             track("Bash", "git status", ["git"])
 
+        flush(merge=True)
         data = _load_patterns()
         pattern = list(data["patterns"].values())[0]
         assert pattern["confidence"] <= CONFIDENCE_MAX
@@ -336,6 +351,7 @@ class TestTrack:
 
         track("Bash", "curl https://failing-api.com", ["api-call"], has_error=True)
 
+        flush(merge=True)
         data = _load_patterns()
         pattern = list(data["patterns"].values())[0]
         assert pattern["success_count"] == 0
@@ -349,6 +365,7 @@ class TestTrack:
         track("Read", "config.yaml", ["config"], input_len=100, output_len=500)
         track("Read", "config.yaml", ["config"], input_len=80, output_len=400)
 
+        flush(merge=True)
         data = _load_patterns()
         pattern = list(data["patterns"].values())[0]
         assert pattern["total_input"] == 180
@@ -373,6 +390,7 @@ class TestTrack:
         # 新增第 4 個模式 — 應淘汰信心最低的 cmd_a
         track("Bash", "cmd_d unique_delta", ["tag_d"])
 
+        flush(merge=True)
         data = _load_patterns()
         summaries = [p["summary_sample"] for p in data["patterns"].values()]
         assert not any("cmd_a" in s for s in summaries)
@@ -391,6 +409,7 @@ class TestTrack:
 
         track("Bash", 'curl -H "Authorization: Bearer SECRET123" https://api.todoist.com', ["api-call"])
 
+        flush(merge=True)
         data = _load_patterns()
         pattern = list(data["patterns"].values())[0]
         assert "SECRET123" not in pattern["summary_sample"]
@@ -403,6 +422,7 @@ class TestTrack:
         tags = ["api-call", "todoist", "api-call", "todoist", "team-mode", "phase1", "extra1", "extra2"]
         track("Bash", "curl https://api.todoist.com", tags)
 
+        flush(merge=True)
         data = _load_patterns()
         pattern = list(data["patterns"].values())[0]
         assert len(pattern["tags"]) <= 5
@@ -415,11 +435,157 @@ class TestTrack:
 
         track("Bash", "x" * 300, ["tag"])
 
+        flush(merge=True)
         data = _load_patterns()
         pattern = list(data["patterns"].values())[0]
         assert len(pattern["summary_sample"]) <= 150
 
 
+class TestWriteBehind:
+    """記憶體緩衝 → journal → 合併進主檔。"""
+
+    @pytest.fixture
+    def patterns_file(self, tmp_path, monkeypatch):
+        filepath = str(tmp_path / "patterns.json")
+        monkeypatch.setattr("behavior_tracker.PATTERNS_FILE", filepath)
+        return filepath
+
+    def test_track_buffers_without_touching_file(self, patterns_file):
+        track("Bash", "git status", ["git"])
+        assert not os.path.exists(patterns_file)
+        assert not os.path.exists(os.path.splitext(patterns_file)[0] + ".journal")
+
+    def test_flush_threshold_spills_to_journal(self, patterns_file, monkeypatch):
+        monkeypatch.setattr("behavior_tracker.FLUSH_EVERY", 3)
+        monkeypatch.setattr("behavior_tracker.MERGE_INTERVAL_SECONDS", 3600)
+        for _ in range(3):
+            track("Bash", "git status", ["git"])
+        journal_dir = os.path.splitext(patterns_file)[0] + ".journal"
+        lines = []
+        for name in os.listdir(journal_dir):
+            with open(os.path.join(journal_dir, name), encoding="utf-8") as f:
+                lines.extend(json.loads(line) for line in f)
+        # 同簽名的 3 次呼叫合併為一行增量
+        assert len(lines) == 1
+        assert lines[0]["n"] == 3
+
+    def test_merge_is_idempotent(self, patterns_file):
+        track("Read", "SKILL_INDEX.md", [])
+        flush(merge=True)
+        merge_pending()
+        track("Read", "SKILL_INDEX.md", [])
+        flush(merge=True)
+        pattern = list(_load_patterns()["patterns"].values())[0]
+        assert pattern["count"] == 2
+        assert abs(pattern["confidence"] - (CONFIDENCE_INITIAL + CONFIDENCE_INCREMENT)) < 0.001
+
+    def test_merges_journals_from_multiple_processes(self, patterns_file):
+        journal_dir = os.path.splitext(patterns_file)[0] + ".journal"
+        os.makedirs(journal_dir)
+        today = datetime.now().strftime("%Y-%m-%d")
+        sig = _compute_signature("Bash", "ls")
+        for pid in (101, 202):
+            with open(os.path.join(journal_dir, f"{today}-{pid}.jsonl"), "w", encoding="utf-8") as f:
+                f.write(json.dumps({"sig": sig, "tool": "Bash", "summary": "ls", "tags": [],
+                                    "n": 2, "ok": 1, "in": 10, "out": 0,
+                                    "first": f"{today}T08:00:00+08:00",
+                                    "last": f"{today}T08:00:0{pid % 10}+08:00"}) + "\n")
+        merge_pending()
+        pattern = _load_patterns()["patterns"][sig]
+        assert pattern["count"] == 4
+        assert pattern["success_count"] == 2
+        assert pattern["total_input"] == 20
+        assert pattern["last_seen"] == f"{today}T08:00:02+08:00"
+
+    def test_parallel_flushes_keep_every_increment(self, patterns_file):
+        import subprocess
+
+        script = (
+            "import sys; sys.path.insert(0, sys.argv[1]); import behavior_tracker as bt\n"
+            "bt.PATTERNS_FILE = sys.argv[2]\n"
+            "for _ in range(50):\n"
+            "    bt.track('Bash', 'git status', ['git'])\n"
+            "    bt.flush()\n"
+        )
+        hooks_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__)))), "hooks")
+        procs = [
+            subprocess.Popen([sys.executable, "-c", script, hooks_dir, patterns_file])
+            for _ in range(4)
+        ]
+        assert all(p.wait(timeout=60) == 0 for p in procs)
+        merge_pending()
+        assert list(_load_patterns()["patterns"].values())[0]["count"] == 200
+
+    def test_hook_processes_share_daily_journal(self, patterns_file, monkeypatch):
+        """每次 hook 呼叫都是新進程：journal 與 offset 條目不可隨 pid 增加。"""
+        monkeypatch.setattr("behavior_tracker.MERGE_INTERVAL_SECONDS", 3600)
+        _save_patterns({"version": 1, "patterns": {}})
+        for pid in range(100, 105):
+            monkeypatch.setattr(os, "getpid", lambda pid=pid: pid)
+            track("Bash", "git status", ["git"])
+            flush()
+        journal_dir = os.path.splitext(patterns_file)[0] + ".journal"
+        today = datetime.now().strftime("%Y-%m-%d")
+        assert os.listdir(journal_dir) == [f"{today}.jsonl"]
+        merge_pending()
+        data = _load_patterns()
+        assert list(data["patterns"].values())[0]["count"] == 5
+        assert list(data[OFFSETS_KEY]) == [f"{today}.jsonl"]
+
+    def test_consumed_past_journal_deleted(self, patterns_file):
+        journal_dir = os.path.splitext(patterns_file)[0] + ".journal"
+        os.makedirs(journal_dir)
+        old_day = (datetime.now() - timedelta(days=2)).strftime("%Y-%m-%d")
+        path = os.path.join(journal_dir, f"{old_day}-4242.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"sig": "s", "tool": "Bash", "summary": "ls", "n": 1,
+                                "first": f"{old_day}T08:00:00+08:00",
+                                "last": f"{old_day}T08:00:00+08:00"}) + "\n")
+        idle = datetime.now().timestamp() - 3600
+        os.utime(path, (idle, idle))
+        merge_pending()
+        assert not os.path.exists(path)
+        assert _load_patterns()["patterns"]["s"]["count"] == 1
+        merge_pending()
+        assert _load_patterns()[OFFSETS_KEY] == {}
+
+    def test_eviction_sees_confidence_gained_in_same_merge(self, patterns_file, monkeypatch):
+        """heap 建立後才被累加的模式不應因舊的低信心條目而被淘汰。"""
+        monkeypatch.setattr("behavior_tracker.MAX_PATTERNS", 2)
+        track("Bash", "cmd_a unique_alpha", [])
+        track("Bash", "cmd_b unique_beta", [])
+        flush(merge=True)
+
+        track("Bash", "cmd_c unique_gamma", [])  # 建 heap 並淘汰 a（同分時最久未觀察）
+        for _ in range(3):
+            track("Bash", "cmd_b unique_beta", [])  # heap 中 b 的條目過期
+        track("Bash", "cmd_d unique_delta", [])  # 應淘汰 c（0.1），而非 b（0.25）
+        flush(merge=True)
+        summaries = sorted(p["summary_sample"] for p in _load_patterns()["patterns"].values())
+        assert summaries == ["cmd_b unique_beta", "cmd_d unique_delta"]
+
+    def test_cleanup_triggered_by_counter(self, patterns_file, monkeypatch):
+        monkeypatch.setattr("behavior_tracker.CLEANUP_EVERY", 5)
+        old = (datetime.now().astimezone() - timedelta(days=DECAY_DAYS + 1)).isoformat()
+        _save_patterns({"version": 1, "last_cleanup": None, "patterns": {
+            "stale": {"tool": "Bash", "summary_sample": "old", "count": 1,
+                      "confidence": 0.9, "last_seen": old},
+        }})
+        for _ in range(4):
+            track("Bash", "ls", [])
+        flush(merge=True)
+        data = _load_patterns()
+        assert "stale" in data["patterns"]
+        assert data["calls_since_cleanup"] == 4
+
+        track("Bash", "ls", [])
+        flush(merge=True)
+        data = _load_patterns()
+        assert "stale" not in data["patterns"]
+        assert data["calls_since_cleanup"] == 0
+
+
 # ============================================
 # report() CLI 輸出
 # ============================================
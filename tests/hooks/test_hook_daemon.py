@@ -0,0 +1,226 @@
+"""
+tests/hooks/test_hook_daemon.py — 常駐 Hook daemon 與 client shim 測試
+
+覆蓋重點：
+  - run_hook_inprocess：擷取 stdout/結束碼、還原 env/stdin/stdout
+  - HookDaemon：token 驗證、ping/shutdown、執行 guard 與直接執行結果一致
+  - 並行：post_tool_logger 執行中時 guard 請求不排隊、各自的輸出與 env 不互相干擾
+  - 熱重載：監看檔案變動時卸載 hooks 模組
+  - hook_client：daemon 不可用時回報 DaemonUnavailableError / send_request 回傳 None
+"""
+import json
+import os
+import socket
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+HOOKS_DIR = Path(__file__).parent.parent.parent / "hooks"
+if str(HOOKS_DIR) not in sys.path:
+    sys.path.insert(0, str(HOOKS_DIR))
+
+import hook_client  # noqa: E402
+from hook_daemon import HookDaemon, run_hook_inprocess  # noqa: E402
+from pre_bash_guard import check_bash_command  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _no_blocked_log(monkeypatch):
+    """攔截事件不寫入專案 logs/structured。"""
+    import pre_bash_guard
+    import pre_read_guard
+    monkeypatch.setattr(pre_bash_guard, "log_blocked_event", lambda *a, **k: None)
+    monkeypatch.setattr(pre_read_guard, "log_blocked_event", lambda *a, **k: None)
+    monkeypatch.setattr(pre_read_guard, "send_ntfy_alert", lambda *a, **k: None)
+
+
+def _bash_payload(command: str) -> str:
+    return json.dumps({"tool_input": {"command": command}, "session_id": ""})
+
+
+@pytest.fixture(params=["unix", "tcp"])
+def daemon(request, tmp_path):
+    """在背景執行緒啟動 daemon（unix socket 與 TCP 兩種傳輸）。"""
+    use_unix = request.param == "unix"
+    if use_unix and not hasattr(socket, "AF_UNIX"):
+        pytest.skip("AF_UNIX 不可用")
+    info_path = str(tmp_path / "hook-daemon.json")
+    d = HookDaemon(info_path=info_path, idle_timeout=30, use_unix=use_unix)
+    d.bind()
+    thread = threading.Thread(target=d.serve_forever, daemon=True)
+    thread.start()
+    yield d
+    hook_client.send_request({"op": "shutdown"}, info_path=info_path, timeout=5)
+    thread.join(timeout=5)
+
+
+# ─── run_hook_inprocess ──────────────────────────────────────────────────────
+
+class TestRunHookInprocess:
+    def test_block_decision_captured(self):
+        result = run_hook_inprocess("pre_bash_guard", _bash_payload("ls > nul"))
+        assert result["exit_code"] == 0
+        assert json.loads(result["stdout"])["decision"] == "block"
+
+    def test_allow_decision_captured(self):
+        result = run_hook_inprocess("pre_bash_guard", _bash_payload("ls -la"))
+        assert json.loads(result["stdout"])["decision"] == "allow"
+
+    def test_restores_streams_env_and_cwd(self, tmp_path):
+        stdout_before, stdin_before = sys.stdout, sys.stdin
+        cwd_before = os.getcwd()
+        run_hook_inprocess(
+            "pre_bash_guard", _bash_payload("ls"),
+            env={"HOOK_DAEMON_TEST_VAR": "1"}, cwd=str(tmp_path),
+        )
+        assert sys.stdout is stdout_before
+        assert sys.stdin is stdin_before
+        assert os.getcwd() == cwd_before
+        assert "HOOK_DAEMON_TEST_VAR" not in os.environ
+
+    def test_env_applied_during_call(self, monkeypatch):
+        """HOOK_SECURITY_PRESET 等 env 需以 client 端的值生效。"""
+        import pre_bash_guard
+        seen = {}
+
+        def fake_main():
+            seen["preset"] = os.environ.get("HOOK_SECURITY_PRESET")
+            print("{}")
+
+        monkeypatch.setattr(pre_bash_guard, "main", fake_main)
+        result = run_hook_inprocess("pre_bash_guard", "", env={"HOOK_SECURITY_PRESET": "strict"})
+        assert seen["preset"] == "strict"
+        assert result["stdout"] == "{}\n"
+
+    def test_unknown_hook_rejected(self):
+        with pytest.raises(ValueError):
+            run_hook_inprocess("on_stop_alert", "{}")
+
+
+# ─── HookDaemon ──────────────────────────────────────────────────────────────
+
+class TestHookDaemon:
+    def test_ping(self, daemon):
+        result = hook_client.send_request({"op": "ping"}, info_path=daemon.info_path)
+        assert result["ok"] is True
+        assert result["pid"] == os.getpid()
+
+    def test_info_file_has_token(self, daemon):
+        info = json.loads(Path(daemon.info_path).read_text(encoding="utf-8"))
+        assert info["token"] == daemon.token
+        assert info["family"] in ("unix", "tcp")
+
+    def test_wrong_token_rejected(self, daemon):
+        assert daemon.handle_request({"op": "ping", "token": "nope"}) == {"error": "unauthorized"}
+
+    @pytest.mark.parametrize("command", [
+        "ls > nul",
+        "git push --force origin main",
+        "cat <<'EOF'\n" + "echo hello\n" * 200 + "EOF",
+        "echo ok",
+    ])
+    def test_matches_direct_guard(self, daemon, command):
+        result = hook_client.send_request(
+            {"op": "run", "hook": "pre_bash_guard", "stdin": _bash_payload(command),
+             "env": dict(os.environ), "cwd": os.getcwd()},
+            info_path=daemon.info_path,
+        )
+        blocked, reason, _ = check_bash_command(command)
+        decision = json.loads(result["stdout"])
+        assert decision["decision"] == ("block" if blocked else "allow")
+        assert decision.get("reason") == reason
+
+    def test_unknown_hook_error(self, daemon):
+        result = hook_client.send_request(
+            {"op": "run", "hook": "os_system"}, info_path=daemon.info_path
+        )
+        assert "error" in result
+
+    def test_requests_counted(self, daemon):
+        for _ in range(3):
+            hook_client.send_request(
+                {"op": "run", "hook": "pre_read_guard",
+                 "stdin": json.dumps({"tool_input": {"file_path": "README.md"}})},
+                info_path=daemon.info_path,
+            )
+        assert daemon.requests_served == 3
+
+    def test_guard_not_queued_behind_post_tool(self, daemon, monkeypatch):
+        import post_tool_logger
+        started, release = threading.Event(), threading.Event()
+        seen = {}
+
+        def slow_post_main():
+            started.set()
+            seen["phase"] = os.environ.get("AGENT_PHASE")
+            release.wait(10)
+            print("post-done")
+
+        monkeypatch.setattr(post_tool_logger, "main", slow_post_main)
+        post_result = {}
+        post_thread = threading.Thread(target=lambda: post_result.update(hook_client.send_request(
+            {"op": "run", "hook": "post_tool_logger", "stdin": "{}", "env": {"AGENT_PHASE": "post"}},
+            info_path=daemon.info_path,
+        )))
+        post_thread.start()
+        try:
+            assert started.wait(5)
+            guard = hook_client.send_request(
+                {"op": "run", "hook": "pre_bash_guard", "stdin": _bash_payload("ls > nul"),
+                 "env": dict(os.environ, AGENT_PHASE="guard"), "cwd": os.getcwd()},
+                info_path=daemon.info_path, timeout=5,
+            )
+            assert json.loads(guard["stdout"])["decision"] == "block"
+            assert not release.is_set()
+        finally:
+            release.set()
+            post_thread.join(timeout=10)
+        assert post_result["stdout"] == "post-done\n"
+        assert seen["phase"] == "post"
+
+    def test_close_removes_info_file(self, tmp_path):
+        d = HookDaemon(info_path=str(tmp_path / "hook-daemon.json"), use_unix=False)
+        d.bind()
+        assert Path(d.info_path).exists()
+        d.close()
+        assert not Path(d.info_path).exists()
+
+
+class TestReload:
+    def test_no_reload_when_unchanged(self, tmp_path):
+        d = HookDaemon(info_path=str(tmp_path / "hook-daemon.json"))
+        assert d.reload_if_changed() is False
+
+    def test_reload_purges_hook_modules(self, tmp_path, monkeypatch):
+        import pre_bash_guard  # noqa: F401
+        d = HookDaemon(info_path=str(tmp_path / "hook-daemon.json"))
+        monkeypatch.setattr(HookDaemon, "_compute_watch_signature", staticmethod(lambda: ("changed",)))
+        saved = dict(sys.modules)
+        try:
+            assert d.reload_if_changed() is True
+            assert "pre_bash_guard" not in sys.modules
+            assert "hook_utils" not in sys.modules
+        finally:
+            sys.modules.clear()
+            sys.modules.update(saved)
+
+
+# ─── hook_client ─────────────────────────────────────────────────────────────
+
+class TestHookClient:
+    def test_missing_info_is_unavailable(self, tmp_path):
+        with pytest.raises(hook_client.DaemonUnavailableError):
+            hook_client._exchange({"op": "ping"}, str(tmp_path / "missing.json"), 1)
+
+    def test_stale_info_is_unavailable(self, tmp_path):
+        info = tmp_path / "hook-daemon.json"
+        info.write_text(json.dumps({"family": "tcp", "address": ["127.0.0.1", 1], "token": "x"}),
+                        encoding="utf-8")
+        assert hook_client.send_request({"op": "ping"}, info_path=str(info)) is None
+
+    def test_hook_list_matches_daemon(self):
+        from hook_daemon import HOOK_MODULES
+        assert set(hook_client._HOOK_MODULES) == set(HOOK_MODULES)
+        assert set(hook_client._RERUNNABLE_HOOKS) <= set(HOOK_MODULES)
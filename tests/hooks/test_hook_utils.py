@@ -19,6 +19,7 @@ from hook_utils import (
     load_yaml_file, clear_yaml_file_cache,
     get_project_root, cleanup_stale_state_files,
     filter_rules_by_preset, read_stdin_json, output_decision,
+    LiteralScanner, API_SOURCE_PATTERNS, detect_api_sources,
     _compiled_regex_cache, _REGEX_CACHE_MAXSIZE,
     _yaml_config_cache,
 )
@@ -583,6 +584,51 @@ class TestGetProjectRoot:
         assert config_path.startswith(root)
 
 
+class TestLiteralScanner:
+    """多字面字串單趟掃描器測試。"""
+
+    def test_reports_offsets_and_labels(self):
+        scanner = LiteralScanner({"a": ["todoist"], "b": ["error", "fail"]})
+        hits = scanner.scan("todoist error; fail")
+        assert hits == [(0, "todoist", ("a",)), (8, "error", ("b",)), (15, "fail", ("b",))]
+
+    def test_overlapping_and_prefix_hits(self):
+        """重疊與前綴字面字串在同一趟中都會回報。"""
+        scanner = LiteralScanner({"x": ["error", "error_count", "stderr", "rr"]})
+        hits = scanner.scan("stderror_count")
+        assert hits == [
+            (0, "stderr", ("x",)),
+            (3, "error_count", ("x",)),
+            (3, "error", ("x",)),
+            (4, "rr", ("x",)),
+        ]
+
+    def test_shared_literal_has_all_labels(self):
+        scanner = LiteralScanner({"a": ["500"], "b": ["500", ""]})
+        assert scanner.scan("http 500") == [(5, "500", ("a", "b"))]
+        assert scanner.labels("http 500") == {"a", "b"}
+
+    def test_regex_metacharacters_are_literal(self):
+        scanner = LiteralScanner({"x": ["errors: []", "exit code 0\n", "a.b"]})
+        assert scanner.labels("errors: [] and axb") == {"x"}
+        assert scanner.labels("axb") == set()
+
+    def test_empty_scanner(self):
+        assert LiteralScanner({}).scan("anything") == []
+
+    @pytest.mark.parametrize("text", [
+        "curl https://api.todoist.com/rest/v2/tasks",
+        "curl https://hacker-news.firebaseio.com && curl https://ntfy.sh/x",
+        "curl LOCALHOST:3000/api/notes?q=PINGTUNG",
+        "echo hello",
+    ])
+    def test_detect_api_sources_matches_loop(self, text):
+        lower = text.lower()
+        expected = [source for source, patterns in API_SOURCE_PATTERNS.items()
+                    if any(p in lower for p in patterns)]
+        assert detect_api_sources(text) == expected
+
+
 class TestRegexCacheEviction:
     """正則快取淘汰機制測試。"""
 
@@ -788,6 +834,31 @@ class TestLoadYamlConfigExceptionNarrowing:
         assert "json.load(open(" not in docstring
 
 
+class TestFileLockMutualExclusion:
+    """FileLock 釋放時刪除鎖檔，不可讓兩個持有者同時進入臨界區。"""
+
+    def test_concurrent_increments_not_lost(self, tmp_path):
+        import threading
+
+        from hook_utils import FileLock
+        target = tmp_path / "counter.txt"
+        target.write_text("0", encoding="utf-8")
+
+        def _worker():
+            for _ in range(25):
+                with FileLock(str(target)):
+                    value = int(target.read_text(encoding="utf-8"))
+                    target.write_text(str(value + 1), encoding="utf-8")
+
+        threads = [threading.Thread(target=_worker) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert target.read_text(encoding="utf-8") == "150"
+        assert not (tmp_path / "counter.txt.lock").exists()
+
+
 class TestFileLockTimeout:
     """FileLock 超時機制測試（2026-03-20 安全優化）。"""
 
@@ -828,3 +899,78 @@ class TestFileLockTimeout:
                     pass
             else:
                 pytest.skip("Cannot test lock contention on this platform")
+
+
+class TestJournal:
+    """附加式 journal：每日一檔、重播 offset、已合併的前幾日檔案清理。"""
+
+    def test_append_uses_one_file_per_day(self, tmp_path):
+        from datetime import datetime
+
+        from hook_utils import journal_append, journal_crossed
+        jdir = str(tmp_path / "j")
+        first = journal_append(jdir, b'{"n": 1}\n')
+        end = journal_append(jdir, b'{"n": 2}\n{"n": 3}\n')
+        assert os.listdir(jdir) == [datetime.now().strftime("%Y-%m-%d") + ".jsonl"]
+        assert (first, end) == (9, 27)
+        assert journal_crossed(end, 18, 16) is True
+        assert journal_crossed(end, 18, 64) is False
+
+    def test_parallel_processes_append_without_losing_lines(self, tmp_path):
+        import subprocess
+
+        from hook_utils import replay_journal
+        jdir = str(tmp_path / "j")
+        script = (
+            "import sys; sys.path.insert(0, sys.argv[1]); from hook_utils import journal_append\n"
+            "for i in range(200):\n"
+            "    journal_append(sys.argv[2], ('{\"w\": %s, \"i\": %d}\\n' % (sys.argv[3], i)).encode())\n"
+        )
+        hooks_dir = os.path.join(project_root, "hooks")
+        procs = [
+            subprocess.Popen([sys.executable, "-c", script, hooks_dir, jdir, str(w)])
+            for w in range(4)
+        ]
+        assert all(p.wait(timeout=60) == 0 for p in procs)
+
+        seen = []
+        replay_journal(jdir, {}, lambda r: seen.append((r["w"], r["i"])))
+        assert sorted(seen) == [(w, i) for w in range(4) for i in range(200)]
+
+    def test_replay_resumes_and_reports_consumed(self, tmp_path):
+        from datetime import datetime, timedelta
+
+        from hook_utils import remove_journals, replay_journal
+        jdir = tmp_path / "j"
+        jdir.mkdir()
+        today = datetime.now().strftime("%Y-%m-%d")
+        old = (datetime.now() - timedelta(days=2)).strftime("%Y-%m-%d")
+        (jdir / f"{today}.jsonl").write_text('{"n": 1}\n[1]\nnot json\n{"n": 2}\n{"n": 3', encoding="utf-8")
+        (jdir / f"{old}.jsonl").write_text('{"n": 4}\n', encoding="utf-8")
+        (jdir / f"{old}-123.jsonl").write_text('{"n": 5}\n', encoding="utf-8")
+        idle = datetime.now().timestamp() - 3600
+        os.utime(jdir / f"{old}.jsonl", (idle, idle))
+
+        seen = []
+        offsets, consumed = replay_journal(str(jdir), {}, lambda r: seen.append(r["n"]))
+        assert sorted(seen) == [1, 2, 4, 5]
+        assert consumed == [str(jdir / f"{old}.jsonl")]  # 另一檔仍在寬限期內
+
+        remove_journals(consumed)
+        seen.clear()
+        offsets, consumed = replay_journal(str(jdir), offsets, lambda r: seen.append(r["n"]))
+        assert seen == []
+        assert sorted(offsets) == [f"{old}-123.jsonl", f"{today}.jsonl"]
+
+    def test_replay_restarts_recreated_journal(self, tmp_path):
+        from hook_utils import replay_journal
+        jdir = tmp_path / "j"
+        jdir.mkdir()
+        (jdir / "2026-01-01.jsonl").write_text('{"n": 1}\n', encoding="utf-8")
+        seen = []
+        replay_journal(str(jdir), {"2026-01-01.jsonl": 500}, lambda r: seen.append(r["n"]))
+        assert seen == [1]
+
+    def test_replay_without_journals(self, tmp_path):
+        from hook_utils import replay_journal
+        assert replay_journal(str(tmp_path / "missing"), {}, print) is None
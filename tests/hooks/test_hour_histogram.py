@@ -0,0 +1,82 @@
+"""
+tests/hooks/test_hour_histogram.py — 24×N 小時/日失敗矩陣測試
+
+覆蓋重點：
+  - epoch 秒 + utc_offset 換算小時與日期欄
+  - 已知 hour 欄位（< 0 不計）、NaN 時間略過、失敗權重加總
+  - 每日失敗率的線性趨勢
+  - numpy 與純 Python 後端結果一致
+"""
+import sys
+from array import array
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+HOOKS_DIR = Path(__file__).parent.parent.parent / "hooks"
+if str(HOOKS_DIR) not in sys.path:
+    sys.path.insert(0, str(HOOKS_DIR))
+
+import hour_histogram  # noqa: E402
+from hour_histogram import build_matrix  # noqa: E402
+
+NAN = float("nan")
+
+
+def _epoch(day: int, hour: int, minute: int = 0) -> float:
+    return datetime(2026, 3, day, hour, minute, tzinfo=timezone.utc).timestamp()
+
+
+@pytest.fixture(params=["numpy", "python"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        if hour_histogram.np is None:
+            pytest.skip("numpy 未安裝")
+    else:
+        monkeypatch.setattr(hour_histogram, "np", None)
+    return request.param
+
+
+class TestBuildMatrix:
+    def test_hour_and_day_buckets(self, backend):
+        epochs = [_epoch(10, 23, 30), _epoch(11, 1), _epoch(11, 1, 5), NAN]
+        matrix = build_matrix(epochs, [True, False, True, True])
+        assert matrix.days() == ["2026-03-10", "2026-03-11"]
+        totals = matrix.hour_totals()
+        assert totals[23] == 1 and totals[1] == 2 and sum(totals) == 3
+        assert matrix.hour_failures()[1] == 1
+        assert matrix.failure_rates()[23] == 1.0
+        assert matrix.failure_rates()[5] == 0.0
+
+    def test_utc_offset_shifts_hour_and_day(self, backend):
+        matrix = build_matrix([_epoch(10, 23, 30)], utc_offset=8 * 3600)
+        assert matrix.hour_totals()[7] == 1
+        assert matrix.days() == ["2026-03-11"]
+
+    def test_explicit_hours_and_weights(self, backend):
+        epochs = array("d", [_epoch(10, 0)] * 3)
+        hours = array("b", [5, -1, 5])
+        matrix = build_matrix(epochs, [2, 1, 1], hours=hours)
+        assert matrix.hour_totals()[5] == 2
+        assert matrix.hour_failures()[5] == 3
+        assert sum(matrix.hour_totals()) == 2
+
+    def test_empty(self, backend):
+        matrix = build_matrix([], [])
+        assert matrix.n_days == 0
+        assert matrix.days() == []
+        assert matrix.hour_totals() == [0] * 24
+        assert matrix.trends() == [0.0] * 24
+
+    def test_trend_slope(self, backend):
+        # 07 時：三天失敗率 0 → 0.5 → 1.0，斜率 0.5/天；09 時只有一天資料
+        epochs, failures = [], []
+        for day, failed in ((10, 0), (11, 1), (12, 2)):
+            epochs += [_epoch(day, 7), _epoch(day, 7, 30)]
+            failures += [i < failed for i in range(2)]
+        epochs.append(_epoch(11, 9))
+        failures.append(True)
+        trends = build_matrix(epochs, failures).trends()
+        assert trends[7] == pytest.approx(0.5)
+        assert trends[9] == 0.0
@@ -0,0 +1,226 @@
+"""
+tests/hooks/test_log_index.py — logs/structured 增量欄式索引測試
+
+覆蓋重點：
+  - 欄位擷取：ts/hour/tool/sid/tags/has_error/input_len 型別化
+  - 增量：只解析新增 bytes、尾端未完成行留待下次、輪轉後重建
+  - 持久化：跨進程（清空快取）從 .index/ 載入，不重新解析已索引行
+  - 查詢 API：where / numeric / with_tag / tag_bits / rows / records（byte offset 讀回）
+"""
+import json
+import math
+import sys
+from pathlib import Path
+
+import pytest
+
+HOOKS_DIR = Path(__file__).parent.parent.parent / "hooks"
+if str(HOOKS_DIR) not in sys.path:
+    sys.path.insert(0, str(HOOKS_DIR))
+
+import log_index  # noqa: E402
+from log_index import INDEX_DIRNAME, load_frame  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache(monkeypatch):
+    """每個測試使用獨立的進程內 Segment 快取。"""
+    monkeypatch.setattr(log_index, "_SEGMENT_CACHE", {})
+
+
+@pytest.fixture
+def count_parses(monkeypatch):
+    """計算 extract_row 被呼叫次數（= 實際解析的日誌行數）。"""
+    calls = {"n": 0}
+    original = log_index.extract_row
+
+    def counting(entry):
+        calls["n"] += 1
+        return original(entry)
+
+    monkeypatch.setattr(log_index, "extract_row", counting)
+    return calls
+
+
+def _entry(i: int, **kwargs) -> dict:
+    base = {
+        "ts": f"2026-03-11T{i % 24:02d}:00:00+08:00",
+        "sid": f"sid-{i % 2}",
+        "trace_id": "trace-a" if i % 2 else "",
+        "tool": "Bash" if i % 3 else "Read",
+        "summary": f"cmd {i}",
+        "tags": ["bash", "error"] if i % 4 == 0 else ["bash"],
+        "has_error": i % 4 == 0,
+        "input_len": i * 10,
+    }
+    base.update(kwargs)
+    return base
+
+
+def _write(path: Path, entries: list, mode: str = "w") -> None:
+    with open(path, mode, encoding="utf-8") as f:
+        for e in entries:
+            f.write(json.dumps(e, ensure_ascii=False) + "\n")
+
+
+def _reset_cache():
+    log_index._SEGMENT_CACHE.clear()
+
+
+class TestColumns:
+    def test_typed_columns(self, tmp_path):
+        _write(tmp_path / "2026-03-11.jsonl", [_entry(i) for i in range(6)])
+        frame = load_frame(tmp_path)
+        assert len(frame) == 6
+        assert frame.column("hour") == [0, 1, 2, 3, 4, 5]
+        assert frame.column("tool")[:3] == ["Read", "Bash", "Bash"]
+        assert frame.column("input_len")[5] == 50
+        assert frame.column("has_error") == [1, 0, 0, 0, 1, 0]
+        assert frame.column("tags")[0] == ["bash", "error"]
+
+    def test_missing_fields_and_bad_lines(self, tmp_path):
+        (tmp_path / "a.jsonl").write_text(
+            'not json\n\n[1, 2]\n{"tool": "X", "ts": "bogus", "cause_chain": {"task_key": "k"}}\n',
+            encoding="utf-8",
+        )
+        frame = load_frame(tmp_path)
+        assert len(frame) == 1
+        assert frame.column("hour") == [-1]
+        assert math.isnan(frame.column("ts")[0])
+        assert frame.column("task_key") == ["k"]
+        assert frame.column("tags") == [[]]
+
+    def test_dates_select_files_in_order(self, tmp_path):
+        _write(tmp_path / "2026-03-10.jsonl", [_entry(1)])
+        _write(tmp_path / "2026-03-11.jsonl", [_entry(2), _entry(3)])
+        frame = load_frame(tmp_path, dates=["2026-03-11", "2026-03-10", "2026-03-09"])
+        assert frame.dates() == ["2026-03-11", "2026-03-11", "2026-03-10"]
+
+    def test_index_dir_not_globbed_as_log(self, tmp_path):
+        _write(tmp_path / "2026-03-11.jsonl", [_entry(1)])
+        load_frame(tmp_path)
+        assert (tmp_path / INDEX_DIRNAME / "2026-03-11" / "meta.json").exists()
+        assert [p.name for p in tmp_path.glob("*.jsonl")] == ["2026-03-11.jsonl"]
+
+
+class TestIncremental:
+    def test_only_new_lines_parsed(self, tmp_path, count_parses):
+        log = tmp_path / "2026-03-11.jsonl"
+        _write(log, [_entry(i) for i in range(5)])
+        load_frame(tmp_path)
+        assert count_parses["n"] == 5
+
+        _write(log, [_entry(5), _entry(6)], mode="a")
+        frame = load_frame(tmp_path)
+        assert count_parses["n"] == 7
+        assert len(frame) == 7
+
+    def test_persisted_index_reused_across_processes(self, tmp_path, count_parses):
+        log = tmp_path / "2026-03-11.jsonl"
+        _write(log, [_entry(i) for i in range(5)])
+        load_frame(tmp_path)
+        _reset_cache()  # 模擬新進程
+
+        _write(log, [_entry(5)], mode="a")
+        frame = load_frame(tmp_path)
+        assert count_parses["n"] == 6
+        assert frame.column("summary") == [f"cmd {i}" for i in range(6)]
+
+    def test_partial_trailing_line_deferred(self, tmp_path):
+        log = tmp_path / "2026-03-11.jsonl"
+        _write(log, [_entry(0)])
+        with open(log, "a", encoding="utf-8") as f:
+            f.write('{"tool": "Wri')
+        assert len(load_frame(tmp_path)) == 1
+
+        with open(log, "a", encoding="utf-8") as f:
+            f.write('te"}\n')
+        frame = load_frame(tmp_path)
+        assert frame.column("tool") == ["Read", "Write"]
+
+    def test_complete_last_line_without_newline(self, tmp_path):
+        (tmp_path / "a.jsonl").write_text(json.dumps(_entry(1)), encoding="utf-8")
+        assert len(load_frame(tmp_path)) == 1
+
+    def test_rotation_rebuilds(self, tmp_path):
+        log = tmp_path / "2026-03-11.jsonl"
+        _write(log, [_entry(i) for i in range(5)])
+        load_frame(tmp_path)
+        _write(log, [_entry(9, tool="Edit")])
+        _reset_cache()
+        frame = load_frame(tmp_path)
+        assert frame.column("tool") == ["Edit"]
+
+    def test_same_size_rewrite_detected_by_fingerprint(self, tmp_path):
+        log = tmp_path / "2026-03-11.jsonl"
+        _write(log, [_entry(1, tool="AAAA")])
+        load_frame(tmp_path)
+        _write(log, [_entry(1, tool="BBBB")])
+        _reset_cache()
+        assert load_frame(tmp_path).column("tool") == ["BBBB"]
+
+    def test_truncated_column_file_falls_back_to_rebuild(self, tmp_path):
+        log = tmp_path / "2026-03-11.jsonl"
+        _write(log, [_entry(i) for i in range(4)])
+        load_frame(tmp_path)
+        (tmp_path / INDEX_DIRNAME / "2026-03-11" / "ts.bin").write_bytes(b"")
+        _reset_cache()
+        frame = load_frame(tmp_path)
+        assert len(frame) == 4
+        assert frame.column("hour") == [0, 1, 2, 3]
+
+    def test_no_persist_leaves_no_index(self, tmp_path):
+        _write(tmp_path / "a.jsonl", [_entry(1)])
+        assert len(load_frame(tmp_path, persist=False)) == 1
+        assert not (tmp_path / INDEX_DIRNAME).exists()
+
+
+class TestQuery:
+    @pytest.fixture
+    def frame(self, tmp_path):
+        _write(tmp_path / "2026-03-11.jsonl", [_entry(i) for i in range(8)])
+        return load_frame(tmp_path)
+
+    def test_where(self, frame):
+        errors = frame.where(frame.column("has_error"))
+        assert errors.column("hour") == [0, 4]
+        assert errors.where([False, True]).column("hour") == [4]
+
+    def test_numeric_typed_array(self, frame):
+        hours = frame.numeric("hour")
+        assert hours.typecode == "b"
+        assert list(hours) == frame.column("hour")
+        assert list(frame.where(frame.column("has_error")).numeric("input_len")) == [0, 40]
+
+    def test_with_tag_and_has_tag(self, frame):
+        assert len(frame.with_tag("error")) == 2
+        assert len(frame.with_tag("error", "bash")) == 8
+        assert len(frame.with_tag("missing")) == 0
+        assert frame.has_tag("error") == [True, False, False, False, True, False, False, False]
+
+    def test_tag_mask(self, frame):
+        mask = frame.tag_mask("error")
+        assert mask.typecode == "B"
+        assert list(mask) == [int(b) for b in frame.has_tag("error")]
+        assert list(frame.tag_mask("missing")) == [0] * 8
+        assert list(frame.where(frame.column("has_error")).tag_mask("error")) == [1, 1]
+
+    def test_tag_bits(self, frame):
+        vocab, bits = frame.tag_bits()
+        error_bit = 1 << vocab.index("error")
+        assert [bool(b & error_bit) for b in bits] == frame.has_tag("error")
+
+    def test_rows(self, frame):
+        rows = frame.where(frame.column("trace_id")).rows("sid", "input_len")
+        assert rows[0] == {"sid": "sid-1", "input_len": 10}
+        assert len(rows) == 4
+
+    def test_records_read_by_offset(self, frame):
+        records = frame.with_tag("error").records(date_key="_date")
+        assert [r["summary"] for r in records] == ["cmd 0", "cmd 4"]
+        assert records[0]["_date"] == "2026-03-11"
+        assert len(frame.records()) == 8
+
+    def test_empty_dir(self, tmp_path):
+        assert len(load_frame(tmp_path / "missing")) == 0
+        assert load_frame(tmp_path, dates=["2026-01-01"]).records() == []
@@ -0,0 +1,92 @@
+"""
+tests/hooks/test_log_reader.py — JSONL byte offset 串流讀取與 session 範圍索引測試
+
+覆蓋重點：
+  - iter_new_lines：從 offset 續讀、尾端未完成行不產出、跨區塊邊界
+  - append_log_line / read_session_lines：只讀回本 session 的行
+  - 索引與日誌不一致（輪轉、覆寫、缺檔）時回傳 None
+"""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+HOOKS_DIR = Path(__file__).parent.parent.parent / "hooks"
+if str(HOOKS_DIR) not in sys.path:
+    sys.path.insert(0, str(HOOKS_DIR))
+
+import log_reader  # noqa: E402
+from log_reader import (  # noqa: E402
+    append_log_line,
+    drop_session_index,
+    iter_new_lines,
+    read_session_lines,
+    session_index_dir,
+)
+
+
+def _line(sid: str, i: int) -> bytes:
+    return (json.dumps({"sid": sid, "i": i}) + "\n").encode("utf-8")
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return str(tmp_path / "2026-03-11.jsonl")
+
+
+class TestIterNewLines:
+    def test_resume_from_offset(self, log_path):
+        Path(log_path).write_bytes(b"a\nbb\n")
+        items = list(iter_new_lines(log_path))
+        assert items == [(b"a", 2), (b"bb", 5)]
+
+        with open(log_path, "ab") as f:
+            f.write(b"ccc\n")
+        assert list(iter_new_lines(log_path, 5)) == [(b"ccc", 9)]
+
+    def test_partial_trailing_line_not_yielded(self, log_path):
+        Path(log_path).write_bytes(b"a\n{\"half")
+        assert list(iter_new_lines(log_path)) == [(b"a", 2)]
+
+    def test_lines_across_block_boundary(self, log_path, monkeypatch):
+        monkeypatch.setattr(log_reader, "READ_BLOCK_SIZE", 3)
+        Path(log_path).write_bytes(b"abcdef\ngh\n")
+        assert list(iter_new_lines(log_path)) == [(b"abcdef", 7), (b"gh", 10)]
+
+    def test_missing_file(self, tmp_path):
+        assert list(iter_new_lines(str(tmp_path / "missing.jsonl"))) == []
+
+
+class TestSessionIndex:
+    def test_reads_only_own_session(self, log_path):
+        for i in range(6):
+            sid = "sess-a" if i % 2 else "sess-b"
+            append_log_line(log_path, _line(sid, i), sid)
+        lines = read_session_lines(log_path, "sess-a")
+        assert [json.loads(ln)["i"] for ln in lines] == [1, 3, 5]
+
+    def test_empty_sid_not_indexed(self, log_path):
+        append_log_line(log_path, _line("", 0), "")
+        assert not Path(session_index_dir(log_path)).exists()
+
+    def test_unknown_session_returns_none(self, log_path):
+        append_log_line(log_path, _line("sess-a", 0), "sess-a")
+        assert read_session_lines(log_path, "sess-z") is None
+
+    def test_rewritten_log_invalidates_index(self, log_path):
+        for i in range(3):
+            append_log_line(log_path, _line("sess-a", i), "sess-a")
+        Path(log_path).write_bytes(_line("sess-b", 0) * 3)
+        assert read_session_lines(log_path, "sess-a") is None
+
+    def test_truncated_log_invalidates_index(self, log_path):
+        for i in range(3):
+            append_log_line(log_path, _line("sess-a", i), "sess-a")
+        Path(log_path).write_bytes(_line("sess-a", 0))
+        assert read_session_lines(log_path, "sess-a") is None
+
+    def test_drop_session_index(self, log_path):
+        append_log_line(log_path, _line("sess-a", 0), "sess-a")
+        drop_session_index(log_path)
+        assert read_session_lines(log_path, "sess-a") is None
@@ -217,6 +217,80 @@ class TestReadSessionEntries:
         result = read_session_entries("2026-02-16", "abc123")
         assert result == []
 
+    def test_uses_session_index_without_decoding_others(self, tmp_path, monkeypatch):
+        """有 session 範圍索引時，只解碼本 session 的行。"""
+        import on_stop_alert
+        from log_reader import append_log_line
+        log_dir = tmp_path / "logs" / "structured"
+        log_dir.mkdir(parents=True)
+        log_file = str(log_dir / "2026-02-16.jsonl")
+        for i in range(6):
+            sid = "abc123abc1" if i % 3 == 0 else "xyz789xyz7"
+            line = json.dumps({"sid": sid, "tool": "Read", "i": i}) + "\n"
+            append_log_line(log_file, line.encode("utf-8"), sid)
+
+        decoded = []
+        original = on_stop_alert._decode_line
+        monkeypatch.setattr(on_stop_alert, "_decode_line",
+                            lambda line: decoded.append(line) or original(line))
+
+        result = read_session_entries("2026-02-16", "abc123abc1")
+        assert [e["i"] for e in result] == [0, 3]
+        assert len(decoded) == 2
+
+
+class TestReadTodaysLog:
+    """無 session_id 時的 byte offset 增量讀取。"""
+
+    @pytest.fixture
+    def log_file(self, tmp_path):
+        from datetime import datetime
+        log_dir = tmp_path / "logs" / "structured"
+        log_dir.mkdir(parents=True)
+        return log_dir / f"{datetime.now().strftime('%Y-%m-%d')}.jsonl"
+
+    @staticmethod
+    def _append(path, n, start=0):
+        with open(path, "a", encoding="utf-8") as f:
+            for i in range(start, start + n):
+                f.write(json.dumps({"i": i}) + "\n")
+
+    def test_reads_only_new_entries(self, log_file):
+        from datetime import datetime
+
+        from on_stop_alert import _write_offset, read_todays_log
+        today = datetime.now().strftime("%Y-%m-%d")
+        self._append(log_file, 3)
+        entries, end = read_todays_log()
+        assert [e["i"] for e in entries] == [0, 1, 2]
+        assert end == log_file.stat().st_size
+        _write_offset(today, end)
+
+        self._append(log_file, 2, start=3)
+        entries, _ = read_todays_log()
+        assert [e["i"] for e in entries] == [3, 4]
+
+    def test_legacy_line_offset_converted(self, log_file, tmp_path):
+        from datetime import datetime
+
+        from on_stop_alert import read_todays_log
+        self._append(log_file, 5)
+        offset_file = tmp_path / "logs" / "structured" / ".last_analyzed_offset"
+        offset_file.write_text(json.dumps({
+            "date": datetime.now().strftime("%Y-%m-%d"), "offset": 3,
+        }), encoding="utf-8")
+        entries, _ = read_todays_log()
+        assert [e["i"] for e in entries] == [3, 4]
+
+    def test_shrunk_log_read_from_start(self, log_file):
+        from datetime import datetime
+
+        from on_stop_alert import _write_offset, read_todays_log
+        self._append(log_file, 1)
+        _write_offset(datetime.now().strftime("%Y-%m-%d"), 10_000)
+        entries, _ = read_todays_log()
+        assert [e["i"] for e in entries] == [0]
+
 
 class TestWriteSessionSummary:
     """Session 摘要寫入。"""
@@ -443,6 +517,25 @@ class TestRotateLogs:
         assert not old_file.exists()
         assert today_file.exists()
 
+    def test_removes_old_column_indexes(self, tmp_path, monkeypatch):
+        from datetime import datetime
+
+        from log_index import INDEX_DIRNAME, get_segment
+
+        log_dir = tmp_path / "logs" / "structured"
+        log_dir.mkdir(parents=True)
+        today = datetime.now().strftime("%Y-%m-%d")
+        for stem in ("2026-01-01", today):
+            log = log_dir / f"{stem}.jsonl"
+            log.write_text(json.dumps({"ts": f"{stem}T08:00:00+08:00", "tool": "Bash"}) + "\n")
+            get_segment(log)
+        # 日誌已被先前的輪替刪除、只剩索引目錄
+        (log_dir / INDEX_DIRNAME / "2025-12-31").mkdir()
+
+        _rotate_logs(retention_days=7)
+
+        assert sorted(p.name for p in (log_dir / INDEX_DIRNAME).iterdir()) == [today]
+
     def test_trims_old_session_summaries(self, tmp_path, monkeypatch):
         monkeypatch.chdir(tmp_path)
         log_dir = tmp_path / "logs" / "structured"
@@ -587,6 +680,119 @@ class TestUpdateMetricsDaily:
         assert record["error_count"] == 1
 
 
+class TestIncrementalMetricsDaily:
+    """_update_metrics_daily 增量累加（byte offset 游標）測試。"""
+
+    @pytest.fixture
+    def env(self, tmp_path):
+        from datetime import datetime
+        today = datetime.now().strftime("%Y-%m-%d")
+        log_dir = tmp_path / "logs" / "structured"
+        log_dir.mkdir(parents=True)
+        return {
+            "root": str(tmp_path),
+            "today": today,
+            "log": log_dir / f"{today}.jsonl",
+            "summary": log_dir / "session-summary.jsonl",
+            "agg": log_dir / ".metrics-daily-agg.json",
+            "metrics": tmp_path / "context" / "metrics-daily.json",
+        }
+
+    @staticmethod
+    def _append(path, entries, mode="a"):
+        with open(path, mode, encoding="utf-8") as f:
+            for e in entries:
+                f.write(json.dumps(e) + "\n")
+
+    @staticmethod
+    def _today_record(env):
+        data = json.loads(env["metrics"].read_text(encoding="utf-8"))
+        return next(r for r in data["records"] if r["date"] == env["today"])
+
+    def _run(self, env):
+        from on_stop_alert import _update_metrics_daily
+        _update_metrics_daily(project_root=env["root"])
+        return self._today_record(env)
+
+    def test_first_run_creates_record(self, env):
+        self._append(env["log"], [
+            {"tags": ["api-call"], "input_len": 100},
+            {"tags": ["cache-read"], "input_len": 300},
+            {"event": "blocked", "tags": ["blocked"], "has_error": True},
+        ])
+        record = self._run(env)
+        assert record["total_tool_calls"] == 3
+        assert record["cache_hit_ratio"] == 50.0
+        assert record["blocked_count"] == 1
+        assert record["error_count"] == 1
+        assert record["avg_io_per_call"] == round(400 / 3, 0)
+        assert env["agg"].exists()
+
+    def test_appended_lines_accumulate_without_reparse(self, env, monkeypatch):
+        import on_stop_alert
+        self._append(env["log"], [{"tags": ["api-call"]}] * 4)
+        self._run(env)
+
+        parsed = []
+        original = on_stop_alert._read_appended_entries
+
+        def spy(path, cursor, reset):
+            entries = original(path, cursor, reset)
+            parsed.extend(entries)
+            return entries
+
+        monkeypatch.setattr(on_stop_alert, "_read_appended_entries", spy)
+        self._append(env["log"], [{"tags": ["cache-read"]}] * 2)
+        record = self._run(env)
+        assert len(parsed) == 2
+        assert record["total_tool_calls"] == 6
+        assert record["api_calls"] == 4
+        assert record["cache_reads"] == 2
+
+    def test_partial_trailing_line_deferred(self, env):
+        self._append(env["log"], [{"tags": ["api-call"]}])
+        with open(env["log"], "a", encoding="utf-8") as f:
+            f.write('{"tags": ["cache-')
+        assert self._run(env)["total_tool_calls"] == 1
+
+        with open(env["log"], "a", encoding="utf-8") as f:
+            f.write('read"]}\n')
+        record = self._run(env)
+        assert record["total_tool_calls"] == 2
+        assert record["cache_reads"] == 1
+
+    def test_rewritten_log_resets_counts(self, env):
+        self._append(env["log"], [{"tags": ["api-call"]}] * 5)
+        self._run(env)
+        self._append(env["log"], [{"tags": ["cache-read"]}], mode="w")
+        record = self._run(env)
+        assert record["total_tool_calls"] == 1
+        assert record["api_calls"] == 0
+
+    def test_stale_day_aggregate_discarded(self, env):
+        self._append(env["log"], [{"tags": ["api-call"]}] * 2)
+        env["agg"].write_text(json.dumps({
+            "version": 1, "date": "2000-01-01",
+            "log": {"offset": 0, "fp": "", "fp_len": 0, "total_calls": 99,
+                    "blocked_count": 0, "error_count": 0, "total_input": 0,
+                    "tag_counts": {"api-call": 99}},
+            "sessions": {"offset": 0, "fp": "", "fp_len": 0, "total": 0, "healthy": 0},
+        }), encoding="utf-8")
+        assert self._run(env)["total_tool_calls"] == 2
+
+    def test_session_success_rate_incremental(self, env):
+        today = env["today"]
+        self._append(env["log"], [{"tags": []}])
+        self._append(env["summary"], [
+            {"ts": "2000-01-01T08:00:00+08:00", "status": "warning"},
+            {"ts": f"{today}T08:00:00+08:00", "status": "healthy"},
+        ])
+        assert self._run(env)["session_success_rate"] == 100.0
+
+        self._append(env["summary"], [{"ts": f"{today}T09:00:00+08:00", "status": "warning"}])
+        assert self._run(env)["session_success_rate"] == 50.0
+
+
 class TestComputeErrorBudget:
     """Tests for _compute_error_budget() — SLO Error Budget 計算。"""
 
@@ -947,3 +1153,37 @@ class TestCleanupStaleStateFiles:
 
         result = _cleanup_stale_state_files(retention_days=7)
         assert result is None
+
+
+class TestCleanupContextSessions:
+    """Stop 時清理 context_compressor 的過期 Session 計數檔。"""
+
+    def test_removes_stale_session_counters(self, tmp_path, monkeypatch):
+        from datetime import datetime, timedelta
+        monkeypatch.syspath_prepend(project_root)
+        import tools.context_compressor as cc
+        from on_stop_alert import _cleanup_context_sessions
+
+        usage_path = tmp_path / "context-usage.json"
+        monkeypatch.setattr(cc, "CONTEXT_USAGE_PATH", usage_path)
+        monkeypatch.setattr(cc, "STATE_DIR", tmp_path)
+        monkeypatch.setitem(sys.modules, "context_compressor", cc)
+
+        sessions_dir = tmp_path / "context-usage.sessions"
+        sessions_dir.mkdir()
+        old = (datetime.now() - timedelta(hours=10)).isoformat()
+        (sessions_dir / "oldsess1.json").write_text(
+            json.dumps({"session_id": "oldsess1", "last_updated": old}), encoding="utf-8")
+        (sessions_dir / "newsess1.json").write_text(
+            json.dumps({"session_id": "newsess1", "last_updated": datetime.now().isoformat()}),
+            encoding="utf-8")
+
+        assert _cleanup_context_sessions(max_age_hours=4) == 1
+        assert not (sessions_dir / "oldsess1.json").exists()
+        assert (sessions_dir / "newsess1.json").exists()
+
+    def test_missing_module_is_silent(self, monkeypatch):
+        from on_stop_alert import _cleanup_context_sessions
+        monkeypatch.delitem(sys.modules, "context_compressor", raising=False)
+        # _PROJ_ROOT 已指向 tmp_path（無 tools/），應安靜回傳 0
+        assert _cleanup_context_sessions() == 0
@@ -10,12 +10,16 @@ sys.path.insert(0, os.path.join(project_root, "hooks"))
 
 from post_tool_logger import (
     detect_api_sources,
+    detect_output_error,
     classify_bash,
     classify_write,
     classify_read,
     classify_edit,
     _sanitize_bash_summary,
     _skill_change_summary_for_ntfy,
+    _chain_head_path,
+    _read_chain_head,
+    append_with_checksum,
     ERROR_KEYWORDS,
     BENIGN_PATTERNS,
 )
@@ -408,6 +412,27 @@ class TestErrorDetection:
         has_benign = any(bp in lower_output for bp in BENIGN_PATTERNS)
         assert not has_benign
 
+    @pytest.mark.parametrize("output", [
+        "Connection refused: cannot connect to server",
+        '{"error_count": 0, "has_error": false}',
+        "-ErrorAction SilentlyContinue",
+        "stderror: Traceback (most recent call last)",
+        "HTTP 503 Service Unavailable",
+        "imported 5, 0 failed",
+        "all good",
+        "",
+    ])
+    def test_detect_output_error_matches_keyword_loops(self, output):
+        """單趟掃描結果與逐一比對 ERROR_KEYWORDS / BENIGN_PATTERNS 一致。"""
+        lower_output = output[:2000].lower()
+        expected = (any(kw in lower_output for kw in ERROR_KEYWORDS)
+                    and not any(bp in lower_output for bp in BENIGN_PATTERNS))
+        assert detect_output_error(output) is expected
+
+    def test_detect_output_error_only_scans_first_2000_chars(self):
+        assert detect_output_error("x" * 2000 + "error") is False
+        assert detect_output_error("error" + "x" * 2000) is True
+
 
 # ============================================================
 # Tests for output_len Read proxy and cache-miss tag
@@ -599,3 +624,144 @@ class TestSpanTypeInLogEntry:
         """classify_read 不應加入 span_type 標籤。"""
         _, tags = classify_read({"file_path": "config/slo.yaml"})
         assert "span_type" not in tags
+
+
+class TestAppendWithChecksum:
+    """鏈式 hash append 與鏈頭 sidecar 測試。"""
+
+    def _read_entries(self, log_file):
+        import json
+        with open(log_file, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def test_chain_links_prev_hash(self, tmp_path):
+        log_file = str(tmp_path / "2026-03-01.jsonl")
+        for i in range(3):
+            append_with_checksum(log_file, {"event": "post", "n": i})
+        entries = self._read_entries(log_file)
+        assert entries[0]["_prev_hash"] == ""
+        assert entries[1]["_prev_hash"] == entries[0]["_hash"]
+        assert entries[2]["_prev_hash"] == entries[1]["_hash"]
+
+    def test_sidecar_tracks_head_and_offset(self, tmp_path):
+        import json
+        log_file = str(tmp_path / "2026-03-01.jsonl")
+        append_with_checksum(log_file, {"event": "post"})
+        entry = {"event": "post"}
+        append_with_checksum(log_file, entry)
+        with open(_chain_head_path(log_file), encoding="utf-8") as f:
+            head = json.load(f)
+        assert head["hash"] == entry["_hash"]
+        assert head["offset"] == os.path.getsize(log_file)
+
+    def test_unhashed_lines_do_not_break_chain(self, tmp_path):
+        """guard 寫入的 blocked 事件（無 _hash）不應重置鏈頭。"""
+        import json
+        log_file = str(tmp_path / "2026-03-01.jsonl")
+        first = {"event": "post"}
+        append_with_checksum(log_file, first)
+        with open(log_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"event": "blocked", "tags": ["block"]}) + "\n")
+        second = {"event": "post"}
+        append_with_checksum(log_file, second)
+        assert second["_prev_hash"] == first["_hash"]
+
+    def test_fallback_without_sidecar(self, tmp_path):
+        log_file = str(tmp_path / "2026-03-01.jsonl")
+        last = {}
+        for i in range(5):
+            last = {"event": "post", "n": i}
+            append_with_checksum(log_file, last)
+        os.remove(_chain_head_path(log_file))
+        assert _read_chain_head(log_file) == last["_hash"]
+
+    def test_fallback_spans_multiple_blocks(self, tmp_path, monkeypatch):
+        """反向讀取需能跨越區塊邊界拼接被切斷的行。"""
+        import post_tool_logger
+        monkeypatch.setattr(post_tool_logger, "_TAIL_BLOCK_SIZE", 16)
+        log_file = str(tmp_path / "2026-03-01.jsonl")
+        last = {"event": "post", "summary": "中文摘要" * 10}
+        append_with_checksum(log_file, last)
+        with open(log_file, "a", encoding="utf-8") as f:
+            f.write('{"event": "blocked", "summary": "' + "x" * 40 + '"}\n')
+        os.remove(_chain_head_path(log_file))
+        assert _read_chain_head(log_file) == last["_hash"]
+
+    def test_stale_sidecar_after_truncation(self, tmp_path):
+        log_file = str(tmp_path / "2026-03-01.jsonl")
+        append_with_checksum(log_file, {"event": "post"})
+        append_with_checksum(log_file, {"event": "post", "n": 1})
+        # 模擬輪轉：日誌被清空，sidecar 殘留舊 offset
+        open(log_file, "w").close()
+        entry = {"event": "post"}
+        append_with_checksum(log_file, entry)
+        assert entry["_prev_hash"] == ""
+
+    def test_chain_verifies_end_to_end(self, tmp_path):
+        import json
+        from pathlib import Path
+
+        from tools.audit_verify import verify_log_file
+        log_file = str(tmp_path / "2026-03-01.jsonl")
+        for i in range(10):
+            append_with_checksum(log_file, {"event": "post", "n": i})
+            if i % 3 == 0:
+                with open(log_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"event": "blocked"}) + "\n")
+        result = verify_log_file(Path(log_file))
+        assert result["passed"] is True, result["errors"]
+
+
+class TestPhase3TraceResolution:
+    """Phase 3 缺少 DIGEST_TRACE_ID 時由 run-fsm.json 推得 trace_id（含 session 快取）。"""
+
+    @staticmethod
+    def _write_fsm(state_dir, runs):
+        import json
+        (state_dir / "run-fsm.json").write_text(json.dumps({"runs": runs}), encoding="utf-8")
+
+    @pytest.fixture
+    def state_dir(self, tmp_path, monkeypatch):
+        import hook_utils
+        monkeypatch.setattr(hook_utils, "get_project_root", lambda: str(tmp_path))
+        state = tmp_path / "state"
+        state.mkdir()
+        return state
+
+    def test_latest_run_anchored_to_project_root(self, state_dir, tmp_path, monkeypatch):
+        from post_tool_logger import _resolve_phase3_trace_id
+        self._write_fsm(state_dir, {
+            "todoist_a": {"run_id": "aaaa1111", "agent_type": "todoist", "started": "2026-03-23T11:00:00",
+                          "phases": {"phase3": {"updated": "2026-03-23T12:50:00"}}},
+            "todoist_b": {"run_id": "bbbb2222", "agent_type": "todoist", "started": "2026-03-23T12:00:00"},
+            "chat_c": {"run_id": "cccc3333", "agent_type": "chat", "started": "2026-03-24T00:00:00"},
+        })
+        monkeypatch.chdir(tmp_path.parent)
+        assert _resolve_phase3_trace_id("sess1234abcd") == "aaaa1111"
+
+    def test_cached_until_fsm_changes(self, state_dir, monkeypatch):
+        import post_tool_logger
+        self._write_fsm(state_dir, {
+            "todoist_a": {"run_id": "aaaa1111", "agent_type": "todoist", "started": "2026-03-23T11:00:00"},
+        })
+        assert post_tool_logger._resolve_phase3_trace_id("sess1234") == "aaaa1111"
+        assert (state_dir / "phase3-trace-sess1234.json").exists()
+
+        def _fail(fsm):
+            raise AssertionError("run-fsm.json should not be parsed again")
+
+        monkeypatch.setattr(post_tool_logger, "_latest_todoist_run_id", _fail)
+        assert post_tool_logger._resolve_phase3_trace_id("sess1234") == "aaaa1111"
+
+        monkeypatch.undo()
+        import hook_utils
+        monkeypatch.setattr(hook_utils, "get_project_root", lambda: str(state_dir.parent))
+        self._write_fsm(state_dir, {
+            "todoist_a": {"run_id": "aaaa1111", "agent_type": "todoist", "started": "2026-03-23T11:00:00"},
+            "todoist_b": {"run_id": "bbbb2222", "agent_type": "todoist", "started": "2026-03-23T13:00:00"},
+        })
+        assert post_tool_logger._resolve_phase3_trace_id("sess1234") == "bbbb2222"
+
+    def test_missing_fsm_returns_empty(self, state_dir):
+        from post_tool_logger import _resolve_phase3_trace_id
+        assert _resolve_phase3_trace_id("sess1234") == ""
@@ -0,0 +1,161 @@
+"""
+tests/hooks/test_token_journal.py — token-usage 分片 journal 與壓實測試
+
+覆蓋重點：
+  - record_usage：只附加 journal，不改寫 token-usage.json（未達壓實條件時）
+  - compact_token_usage：schema v3（daily/phases/traces）與舊版累加結果一致
+  - 壓實冪等（offset 持久化）、多 journal 合併、已合併的前幾日 journal 清理
+  - traces 上限淘汰最舊、7 天保留
+"""
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+HOOKS_DIR = Path(__file__).parent.parent.parent / "hooks"
+if str(HOOKS_DIR) not in sys.path:
+    sys.path.insert(0, str(HOOKS_DIR))
+
+import token_journal  # noqa: E402
+from token_journal import (  # noqa: E402
+    OFFSETS_KEY,
+    compact_token_usage,
+    journal_dir,
+    record_usage,
+)
+
+
+@pytest.fixture
+def token_file(tmp_path, monkeypatch):
+    # 預設不在寫入端觸發壓實，讓測試明確控制
+    monkeypatch.setattr(token_journal, "_is_stale", lambda path: False)
+    return str(tmp_path / "token-usage.json")
+
+
+def _write_journal(token_file: str, name: str, deltas: list) -> Path:
+    path = Path(journal_dir(token_file)) / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for d in deltas:
+            f.write(json.dumps(d) + "\n")
+    return path
+
+
+def _today() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+class TestRecordUsage:
+    def test_appends_journal_without_touching_usage_file(self, token_file):
+        record_usage(token_file, 35, 0, phase="phase1", trace_id="trace-abcdefghijk")
+        assert not os.path.exists(token_file)
+        files = os.listdir(journal_dir(token_file))
+        assert files == [f"{_today()}.jsonl"]
+        delta = json.loads(Path(journal_dir(token_file), files[0]).read_text(encoding="utf-8"))
+        assert delta["phase"] == "phase1"
+        assert delta["trace"] == "trace-abcdef"
+
+    def test_hook_processes_share_daily_journal(self, token_file, monkeypatch):
+        """每次 hook 呼叫都是新進程：journal 檔名不可隨 pid 增加。"""
+        for pid in range(100, 105):
+            monkeypatch.setattr(os, "getpid", lambda pid=pid: pid)
+            record_usage(token_file, 35, 0)
+        files = os.listdir(journal_dir(token_file))
+        assert files == [f"{_today()}.jsonl"]
+        usage = compact_token_usage(token_file)
+        assert usage["daily"][_today()]["tool_calls"] == 5
+        assert list(usage[OFFSETS_KEY]) == [f"{_today()}.jsonl"]
+
+    def test_stale_usage_file_triggers_compaction(self, token_file, monkeypatch):
+        monkeypatch.setattr(token_journal, "_is_stale", lambda path: True)
+        record_usage(token_file, 70, 0)
+        usage = json.loads(Path(token_file).read_text(encoding="utf-8"))
+        assert usage["daily"][_today()]["tool_calls"] == 1
+
+
+class TestCompact:
+    def test_schema_v3_view(self, token_file):
+        for _ in range(2):
+            record_usage(token_file, 35, 35, phase="phase1", trace_id="trace-a")
+        record_usage(token_file, 7, 0)
+        usage = compact_token_usage(token_file)
+
+        day = usage["daily"][_today()]
+        assert day["tool_calls"] == 3
+        assert day["estimated_tokens"] == pytest.approx(42)
+        assert day["input_chars"] == 77
+        assert day["output_chars"] == 70
+        assert day["phases"]["phase1"] == {"estimated_tokens": pytest.approx(40), "tool_calls": 2}
+        trace = day["traces"]["trace-a"]
+        assert trace["total_tokens"] == pytest.approx(40)
+        assert trace["phase_breakdown"] == {"phase1": pytest.approx(40)}
+        assert usage["updated"].startswith(_today())
+        assert json.loads(Path(token_file).read_text(encoding="utf-8")) == usage
+
+    def test_idempotent(self, token_file):
+        record_usage(token_file, 35, 0)
+        compact_token_usage(token_file)
+        usage = compact_token_usage(token_file)
+        assert usage["daily"][_today()]["tool_calls"] == 1
+
+        record_usage(token_file, 35, 0)
+        usage = compact_token_usage(token_file)
+        assert usage["daily"][_today()]["tool_calls"] == 2
+
+    def test_merges_existing_usage_and_journals(self, token_file):
+        today = _today()
+        Path(token_file).write_text(json.dumps({
+            "daily": {today: {"estimated_tokens": 100, "tool_calls": 5, "groq_calls": 3}},
+        }), encoding="utf-8")
+        ts = f"{today}T08:00:00"
+        _write_journal(token_file, f"{today}-1.jsonl", [{"ts": ts, "in": 35, "out": 0}])
+        _write_journal(token_file, f"{today}-2.jsonl", [{"ts": ts, "in": 70, "out": 0}])
+        day = compact_token_usage(token_file)["daily"][today]
+        assert day["tool_calls"] == 7
+        assert day["estimated_tokens"] == pytest.approx(130)
+        assert day["groq_calls"] == 3
+
+    def test_no_journal_returns_none(self, token_file):
+        assert compact_token_usage(token_file) is None
+        assert not os.path.exists(token_file)
+
+    def test_trace_limit_evicts_oldest(self, token_file, monkeypatch):
+        monkeypatch.setattr(token_journal, "TRACE_LIMIT", 2)
+        today = _today()
+        _write_journal(token_file, f"{today}-1.jsonl", [
+            {"ts": f"{today}T08:00:0{i}", "in": 35, "out": 0, "trace": f"t{i}"} for i in range(3)
+        ])
+        traces = compact_token_usage(token_file)["daily"][today]["traces"]
+        assert sorted(traces) == ["t1", "t2"]
+
+    def test_old_days_dropped_and_consumed_journals_removed(self, token_file):
+        today = _today()
+        old = (datetime.now() - timedelta(days=10)).strftime("%Y-%m-%d")
+        stale = _write_journal(token_file, f"{old}-1.jsonl",
+                               [{"ts": f"{old}T08:00:00", "in": 1, "out": 0}])
+        current = _write_journal(token_file, f"{today}-1.jsonl",
+                                 [{"ts": f"{today}T08:00:00", "in": 1, "out": 0}])
+        stale_size = stale.stat().st_size
+        idle = datetime.now().timestamp() - 3600
+        os.utime(stale, (idle, idle))
+        usage = compact_token_usage(token_file)
+        assert list(usage["daily"]) == [today]
+        assert not stale.exists()
+        assert current.exists()
+        assert usage[OFFSETS_KEY] == {
+            f"{old}-1.jsonl": stale_size,
+            f"{today}-1.jsonl": current.stat().st_size,
+        }
+        # 已刪除的 journal 在下次壓實時自 offsets 移除
+        assert list(compact_token_usage(token_file)[OFFSETS_KEY]) == [f"{today}-1.jsonl"]
+
+    def test_partial_trailing_delta_deferred(self, token_file):
+        today = _today()
+        path = _write_journal(token_file, f"{today}-1.jsonl",
+                              [{"ts": f"{today}T08:00:00", "in": 1, "out": 0}])
+        with open(path, "a", encoding="utf-8") as f:
+            f.write('{"ts": "')
+        assert compact_token_usage(token_file)["daily"][today]["tool_calls"] == 1
@@ -1,4 +1,7 @@
+import pytest
+
 from scripts.long_term_memory_perf import (
+    run_digest_sync_flush_benchmark,
     run_million_scale_retrieval_benchmark,
     run_performance_test,
 )
@@ -20,3 +23,13 @@ def test_million_scale_retrieval_benchmark_stays_under_200ms():
     assert report["candidate_count"] > 0
     assert report["search_p95_ms"] <= 200
     assert report["within_200ms"] is True
+
+
+def test_bulk_flush_outpaces_serial_flush_against_stub_kb():
+    pytest.importorskip("requests")
+
+    report = run_digest_sync_flush_benchmark(queue_size=60, latency_ms=5.0, batch_size=20)
+
+    assert report["serial_drained"] is True
+    assert report["bulk_drained"] is True
+    assert report["speedup"] > 1.5
@@ -1,7 +1,19 @@
+import json
+import random
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
-from memory.long_term_memory import DigestLevel, LongTermMemoryConfig, LongTermMemoryManager, SearchFilters
+import pytest
+
+from memory.long_term_memory import (
+    DigestLevel,
+    LongTermMemoryConfig,
+    LongTermMemoryManager,
+    SearchFilters,
+    _cosine_similarity,
+)
+from memory import long_term_memory, segment_store
+from memory.retrieval import SparseRetrievalIndex
 
 
 def _local_tmp(name: str) -> Path:
@@ -138,3 +150,237 @@ def test_expire_records_removes_outdated_daily_and_keeps_monthly():
     assert [item.id for item in manager.records] == [monthly.id]
     backup_text = (tmp_path / "expired.jsonl").read_text(encoding="utf-8")
     assert daily.id in backup_text
+
+
+def _random_embedding(rng: random.Random, vocabulary: list[str]) -> dict[str, float]:
+    tokens = rng.sample(vocabulary, rng.randint(0, 8))
+    return {token: float(rng.randint(1, 4)) / 7 for token in tokens}
+
+
+def test_search_scores_match_pairwise_cosine():
+    tmp_path = _local_tmp("memory-sparse-search")
+    manager = LongTermMemoryManager(
+        LongTermMemoryConfig(storage_path=tmp_path / "memory.json", backup_path=tmp_path / "expired.jsonl"),
+        now_provider=lambda: datetime(2026, 3, 17, tzinfo=timezone.utc),
+    )
+    rng = random.Random(17)
+    words = ["qdrant", "vector", "memory", "digest", "agent", "summary", "retrieval", "weekly"]
+    for i in range(60):
+        manager.add_digest(
+            level=DigestLevel.DAILY if i % 3 else DigestLevel.WEEKLY,
+            topic="topic",
+            messages=[" ".join(rng.choices(words, k=6))],
+            session_id=f"session-{i}",
+        )
+
+    query = "qdrant vector memory retrieval"
+    query_embedding = manager.embedder.embed(query)
+    for top_k, min_score in [(5, 0.0), (3, 0.3), (100, 0.2)]:
+        results = manager.search(query, top_k=top_k, min_score=min_score, levels=[DigestLevel.DAILY])
+        expected = sorted(
+            (
+                _cosine_similarity(query_embedding, record.embedding)
+                for record in manager.records
+                if record.level is DigestLevel.DAILY
+            ),
+            reverse=True,
+        )
+        expected = [score for score in expected if score >= min_score][:top_k]
+        assert [item.score for item in results] == expected
+        for item in results:
+            assert item.score == _cosine_similarity(query_embedding, item.record.embedding)
+
+
+def test_sparse_index_selects_superset_of_exact_top_k():
+    pytest.importorskip("numpy")
+    rng = random.Random(3)
+    vocabulary = [f"t{i}" for i in range(40)]
+    embeddings = [_random_embedding(rng, vocabulary) for _ in range(500)]
+    index = SparseRetrievalIndex()
+    for embedding in embeddings:
+        index.add(embedding)
+    query = _random_embedding(rng, vocabulary) | {"unseen": 0.5}
+    rows = list(range(len(embeddings)))
+
+    approximate = index.scores(query, rows)
+    for row in rows:
+        assert approximate[row] == pytest.approx(_cosine_similarity(query, embeddings[row]), abs=1e-12)
+
+    selected = index.select(query, rows, top_k=10, min_score=0.1)
+    assert selected == sorted(selected)
+    exact = sorted(rows, key=lambda row: _cosine_similarity(query, embeddings[row]), reverse=True)
+    top = [row for row in exact if _cosine_similarity(query, embeddings[row]) >= 0.1][:10]
+    assert set(top) <= set(selected)
+
+
+def _segment_manager(tmp_path: Path, now: datetime) -> LongTermMemoryManager:
+    return LongTermMemoryManager(
+        LongTermMemoryConfig(storage_path=tmp_path / "memory.json", backup_path=tmp_path / "expired.jsonl"),
+        now_provider=lambda: now,
+    )
+
+
+def _add(manager: LongTermMemoryManager, index: int, level: DigestLevel = DigestLevel.DAILY):
+    return manager.add_digest(
+        level=level,
+        topic=f"topic-{index}",
+        messages=[f"qdrant vector memory note {index}"],
+        session_id=f"session-{index}",
+    )
+
+
+def test_add_digest_appends_to_segment_without_rewriting_snapshot():
+    tmp_path = _local_tmp("memory-segments-append")
+    now = datetime(2026, 3, 17, tzinfo=timezone.utc)
+    manager = _segment_manager(tmp_path, now)
+    for index in range(3):
+        _add(manager, index)
+
+    store_dir = tmp_path / "memory.segments"
+    assert not (store_dir / "snapshot.json").exists()
+    lines = (store_dir / "segment-000001.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["op"] for line in lines] == ["put", "put", "put"]
+    assert not (tmp_path / "memory.json").exists()
+
+    reloaded = _segment_manager(tmp_path, now)
+    assert reloaded.export_records() == manager.export_records()
+
+
+def test_save_compacts_and_reload_uses_index_snapshot(monkeypatch):
+    tmp_path = _local_tmp("memory-segments-compact")
+    now = datetime(2026, 3, 17, tzinfo=timezone.utc)
+    manager = _segment_manager(tmp_path, now)
+    for index in range(3):
+        _add(manager, index)
+    manager.save()
+    _add(manager, 3)
+
+    store_dir = tmp_path / "memory.segments"
+    snapshot = json.loads((store_dir / "snapshot.json").read_text(encoding="utf-8"))
+    assert snapshot["next_segment"] == 2
+    assert snapshot["index"]["record_count"] == 3
+    assert sorted(item.name for item in store_dir.iterdir()) == ["segment-000002.jsonl", "snapshot.json"]
+
+    tokenized: list[str] = []
+    original = long_term_memory._tokenize
+    monkeypatch.setattr(
+        long_term_memory, "_tokenize", lambda text: tokenized.append(text) or original(text)
+    )
+    reloaded = _segment_manager(tmp_path, now)
+    # Only the record appended after the snapshot is re-tokenized on startup
+    assert tokenized == [manager.records[3].embedding_text]
+    assert reloaded.export_records() == manager.export_records()
+    assert reloaded._token_index == manager._token_index
+
+
+def test_expired_records_logged_as_delete():
+    tmp_path = _local_tmp("memory-segments-expiry")
+    now = datetime(2026, 4, 18, tzinfo=timezone.utc)
+    manager = _segment_manager(tmp_path, now)
+    daily = _add(manager, 0)
+    monthly = _add(manager, 1, DigestLevel.MONTHLY)
+    manager.save()
+    manager.expire_records(now=now + timedelta(days=31))
+
+    lines = (tmp_path / "memory.segments" / "segment-000002.jsonl").read_text(encoding="utf-8").splitlines()
+    assert json.loads(lines[-1]) == {"op": "delete", "ids": [daily.id]}
+    assert [record.id for record in _segment_manager(tmp_path, now).records] == [monthly.id]
+
+
+def test_replay_deletes_earliest_match_by_id():
+    tmp_path = _local_tmp("memory-segments-replay")
+    now = datetime(2026, 3, 17, tzinfo=timezone.utc)
+    manager = _segment_manager(tmp_path, now)
+    first, second, third = (_add(manager, index) for index in range(3))
+    manager.save()
+    second_payload = next(item for item in manager.export_records() if item["id"] == second.id)
+    manager._store.append(
+        [
+            {"op": "delete", "ids": [first.id, "missing"]},
+            {"op": "put", "record": dict(second_payload, topic="second-again")},
+            {"op": "delete", "ids": [second.id]},
+        ]
+    )
+
+    reloaded = _segment_manager(tmp_path, now)
+    assert [(record.id, record.topic) for record in reloaded.records] == [
+        (third.id, third.topic),
+        (second.id, "second-again"),
+    ]
+
+
+def test_segments_compact_after_threshold(monkeypatch):
+    monkeypatch.setattr(segment_store, "SEGMENT_MAX_BYTES", 1)
+    monkeypatch.setattr(segment_store, "COMPACT_AFTER_SEGMENTS", 3)
+    tmp_path = _local_tmp("memory-segments-threshold")
+    now = datetime(2026, 3, 17, tzinfo=timezone.utc)
+    manager = _segment_manager(tmp_path, now)
+    for index in range(3):
+        _add(manager, index)
+
+    store_dir = tmp_path / "memory.segments"
+    assert sorted(item.name for item in store_dir.iterdir()) == ["snapshot.json"]
+    assert len(json.loads((store_dir / "snapshot.json").read_text(encoding="utf-8"))["records"]) == 3
+
+
+def test_legacy_json_storage_is_migrated():
+    tmp_path = _local_tmp("memory-segments-migrate")
+    now = datetime(2026, 3, 17, tzinfo=timezone.utc)
+    legacy = _segment_manager(tmp_path / "legacy", now)
+    _add(legacy, 0)
+    payload = {"schema_version": 1, "records": legacy.export_records(), "embedding": {}}
+    (tmp_path / "memory.json").write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+
+    manager = _segment_manager(tmp_path, now)
+
+    assert manager.export_records() == legacy.export_records()
+    assert (tmp_path / "memory.segments" / "snapshot.json").exists()
+    assert manager.search("qdrant vector memory", min_score=0.1)
+
+
+def test_expiry_tombstones_rows_without_touching_other_buckets():
+    tmp_path = _local_tmp("memory-expiry-tombstone")
+    now = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    manager = _segment_manager(tmp_path, now)
+    for index in range(9):
+        _add(manager, index, DigestLevel.MONTHLY)
+    daily = _add(manager, 9)
+    topic_buckets = dict(manager._topic_index)
+
+    expired = manager.expire_records(now=now + timedelta(days=31))
+
+    assert [record.id for record in expired] == [daily.id]
+    assert manager._tombstones == 1
+    assert manager._topic_index == topic_buckets
+    results = manager.search("qdrant vector memory note", min_score=0.0, top_k=20)
+    assert daily.id not in [result.record.id for result in results]
+    assert daily.id not in [record.id for record in manager.records]
+    assert manager._tombstones == 0
+    assert "topic-9" not in manager._topic_index
+
+
+def test_expiry_heap_honors_extended_expiry():
+    tmp_path = _local_tmp("memory-expiry-extended")
+    now = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    manager = _segment_manager(tmp_path, now)
+    record = _add(manager, 0)
+    record.expires_at = (now + timedelta(days=60)).isoformat()
+
+    assert manager.expire_records(now=now + timedelta(days=31)) == []
+    assert [item.id for item in manager.expire_records(now=now + timedelta(days=61))] == [record.id]
+
+
+def test_lazy_compaction_matches_full_rebuild():
+    tmp_path = _local_tmp("memory-expiry-compaction")
+    now = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    manager = _segment_manager(tmp_path, now)
+    for index in range(8):
+        _add(manager, index, DigestLevel.DAILY if index % 2 else DigestLevel.MONTHLY)
+
+    manager.expire_records(now=now + timedelta(days=31))
+
+    assert manager._tombstones == 0
+    compacted = (manager._token_index, manager._topic_index, manager._tag_index, manager._date_index)
+    manager._rebuild_indexes()
+    assert compacted == (manager._token_index, manager._topic_index, manager._tag_index, manager._date_index)
+    assert len(manager.records) == 4
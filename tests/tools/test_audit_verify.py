@@ -4,6 +4,8 @@ tests/tools/test_audit_verify.py — 審計日誌完整性驗證 TDD（P4-D）
 覆蓋重點：
   - verify_log_file：正常鏈 / 斷鏈 / 輪轉標記重置 / hash 不符（篡改偵測）
   - verify_log_dir：空目錄 / 多檔案批次
+  - 平行分區段驗證：結果與循序驗證一致（含區段邊界斷鏈、行號）
+  - 增量驗證：檢查點接續、截斷後退回完整驗證、失敗不推進檢查點
   - _compute_entry_hash：排除 _hash 欄位計算
   - check_mission_alignment：backlog goal_id 統計
 """
@@ -29,10 +31,9 @@ from tools.audit_verify import (  # noqa: E402
 
 # ─── fixtures ────────────────────────────────────────────────────────────────
 
-def make_valid_chain(tmp_path: Path, n: int = 3) -> Path:
-    """建立 n 筆有效鏈式記錄的 JSONL 檔案。"""
-    log_file = tmp_path / "test.jsonl"
-    prev_hash = ""
+def make_valid_chain(tmp_path: Path, n: int = 3, name: str = "test.jsonl", prev_hash: str = "") -> Path:
+    """建立（或接續附加）n 筆有效鏈式記錄的 JSONL 檔案。"""
+    log_file = tmp_path / name
     for i in range(n):
         entry = {"event": f"event_{i}", "_prev_hash": prev_hash}
         payload = {k: v for k, v in entry.items() if k != "_hash"}
@@ -173,6 +174,116 @@ class TestVerifyLogDir:
         assert result["all_passed"] is True
 
 
+class TestChainHeadSidecar:
+    def test_matching_sidecar_passes(self, tmp_path):
+        log_file = make_valid_chain(tmp_path, n=3)
+        last_hash = json.loads(log_file.read_text(encoding="utf-8").splitlines()[-1])["_hash"]
+        (tmp_path / "test.jsonl.head").write_text(
+            json.dumps({"hash": last_hash, "offset": log_file.stat().st_size}), encoding="utf-8"
+        )
+        assert verify_log_file(log_file)["passed"] is True
+
+    def test_mismatched_sidecar_fails(self, tmp_path):
+        log_file = make_valid_chain(tmp_path, n=3)
+        (tmp_path / "test.jsonl.head").write_text(
+            json.dumps({"hash": "deadbeefdeadbeef", "offset": log_file.stat().st_size}),
+            encoding="utf-8",
+        )
+        result = verify_log_file(log_file)
+        assert result["passed"] is False
+        assert any("sidecar" in e for e in result["errors"])
+
+    def test_stale_sidecar_ignored(self, tmp_path):
+        log_file = make_valid_chain(tmp_path, n=3)
+        (tmp_path / "test.jsonl.head").write_text(
+            json.dumps({"hash": "deadbeefdeadbeef", "offset": 1}), encoding="utf-8"
+        )
+        assert verify_log_file(log_file)["passed"] is True
+
+
+def _last_hash(log_file: Path) -> str:
+    return json.loads(log_file.read_text(encoding="utf-8").splitlines()[-1])["_hash"]
+
+
+class TestParallelVerify:
+    def test_chunked_matches_sequential(self, tmp_path):
+        log_file = make_valid_chain(tmp_path, n=40)
+        lines = log_file.read_text(encoding="utf-8").splitlines()
+        lines.insert(10, "NOT JSON")
+        entry = json.loads(lines[25])
+        entry["event"] = "TAMPERED"
+        lines[25] = json.dumps(entry, ensure_ascii=False)
+        log_file.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        expected = verify_log_file(log_file)
+        assert expected["passed"] is False
+        for chunk_bytes in (1, 64, 500):
+            assert verify_log_file(log_file, chunk_bytes=chunk_bytes) == expected
+        assert verify_log_file(log_file, workers=2, chunk_bytes=200) == expected
+
+    def test_break_at_chunk_boundary_reported_with_file_line(self, tmp_path):
+        log_file = make_valid_chain(tmp_path, n=3)
+        # 第 4 行起另起一條鏈（_prev_hash 為空）→ 斷鏈
+        make_valid_chain(tmp_path, n=2)
+        first_line_len = len(log_file.read_text(encoding="utf-8").splitlines()[0]) + 1
+        result = verify_log_file(log_file, chunk_bytes=first_line_len * 3)
+        assert result["passed"] is False
+        assert result["errors"][0].startswith("L4: _prev_hash 不符")
+
+    def test_dir_parallel_matches_sequential(self, tmp_path):
+        log_dir = tmp_path / "logs"
+        log_dir.mkdir()
+        for name in ("2026-01-01.jsonl", "2026-01-02.jsonl", "2026-01-03.jsonl"):
+            make_valid_chain(log_dir, n=15, name=name)
+        assert verify_log_dir(log_dir, workers=2, chunk_bytes=256) == verify_log_dir(log_dir)
+
+
+class TestIncrementalVerify:
+    def _setup(self, tmp_path):
+        log_dir = tmp_path / "logs"
+        log_dir.mkdir()
+        return log_dir, tmp_path / "checkpoint.json"
+
+    def test_resumes_from_checkpoint(self, tmp_path):
+        log_dir, checkpoint = self._setup(tmp_path)
+        log_file = make_valid_chain(log_dir, n=5, name="a.jsonl")
+        first = verify_log_dir(log_dir, incremental=True, checkpoint_path=checkpoint)
+        assert first["results"][0]["total"] == 5
+        assert first["results"][0]["since_offset"] == 0
+
+        size = log_file.stat().st_size
+        make_valid_chain(log_dir, n=3, name="a.jsonl", prev_hash=_last_hash(log_file))
+        second = verify_log_dir(log_dir, incremental=True, checkpoint_path=checkpoint)
+        assert second["all_passed"] is True
+        assert second["results"][0]["total"] == 3
+        assert second["results"][0]["since_offset"] == size
+
+    def test_new_break_detected_with_absolute_line(self, tmp_path):
+        log_dir, checkpoint = self._setup(tmp_path)
+        make_valid_chain(log_dir, n=5, name="a.jsonl")
+        verify_log_dir(log_dir, incremental=True, checkpoint_path=checkpoint)
+        make_valid_chain(log_dir, n=1, name="a.jsonl", prev_hash="bogus")
+        result = verify_log_dir(log_dir, incremental=True, checkpoint_path=checkpoint)
+        assert result["all_passed"] is False
+        assert result["results"][0]["errors"][0].startswith("L6: _prev_hash 不符")
+
+        # 失敗的檔案不推進檢查點：再跑一次仍回報
+        again = verify_log_dir(log_dir, incremental=True, checkpoint_path=checkpoint)
+        assert again["all_passed"] is False
+
+    def test_rewritten_file_falls_back_to_full_verify(self, tmp_path):
+        log_dir, checkpoint = self._setup(tmp_path)
+        log_file = make_valid_chain(log_dir, n=5, name="a.jsonl")
+        verify_log_dir(log_dir, incremental=True, checkpoint_path=checkpoint)
+
+        # 檔案被改寫：長度超過檢查點 offset，但檢查點最後一行的內容已不同
+        log_file.write_text(json.dumps({"event": "rewritten"}) + "\n", encoding="utf-8")
+        make_valid_chain(log_dir, n=7, name="a.jsonl")
+        result = verify_log_dir(log_dir, incremental=True, checkpoint_path=checkpoint)
+        assert result["results"][0]["since_offset"] == 0
+        assert result["results"][0]["total"] == 8
+
+
 # ─── check_mission_alignment ─────────────────────────────────────────────────
 
 class TestCheckMissionAlignment:
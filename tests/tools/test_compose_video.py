@@ -0,0 +1,146 @@
+"""
+tests/tools/test_compose_video.py — compose_video 資產準備測試
+
+覆蓋重點：
+  - 增量目錄同步：只複製變動檔案、移除多餘檔案
+  - 音訊時長快取：大小 + mtime 未變時不再 ffprobe
+  - 場景圖：只重抓 prompt 變動的場景，重複圖仍以 fallback 關鍵字重試
+  - compose 重跑：未變動的 storyboard 不再 ffprobe / 下載
+"""
+import json
+import os
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).parent.parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+import tools.compose_video as compose_video  # noqa: E402
+from tools.compose_video import AssetCache, compose, fetch_images_for_scenes, sync_files  # noqa: E402
+
+
+class FakeFetcher:
+    """假圖庫：同一組關鍵字回傳相同內容；記錄每次下載的場景。"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, image_prompt, dest_path, scene_index=0, keywords_override=None, lock_offset=0, **_):
+        self.calls.append((dest_path.stem, keywords_override))
+        body = keywords_override or image_prompt.split(",")[0]
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        dest_path.write_bytes(body.encode("utf-8"))
+        return True
+
+
+def _scenes(*prompts):
+    return [
+        {"id": f"scene-{i}", "type": "content_slide", "imagePrompt": prompt}
+        for i, prompt in enumerate(prompts, 1)
+    ]
+
+
+def test_sync_files_copies_only_changed_files(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    for name in ("a.mp3", "b.mp3"):
+        (src / name).write_bytes(name.encode())
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    (dest / "stale.mp3").write_bytes(b"old")
+
+    assert sync_files(sorted(src.glob("*.mp3")), dest) == (2, 0, 1)
+    assert sync_files(sorted(src.glob("*.mp3")), dest) == (0, 2, 0)
+
+    (src / "b.mp3").write_bytes(b"changed")
+    assert sync_files(sorted(src.glob("*.mp3")), dest) == (1, 1, 0)
+    assert (dest / "b.mp3").read_bytes() == b"changed"
+    assert sorted(p.name for p in dest.iterdir()) == ["a.mp3", "b.mp3"]
+
+
+def test_duration_cache_keyed_by_size_and_mtime(tmp_path):
+    audio = tmp_path / "scene.mp3"
+    audio.write_bytes(b"12345")
+    cache = AssetCache(tmp_path / "cache.json")
+    cache.set_duration(audio, 3.5)
+    cache.save()
+
+    reloaded = AssetCache(tmp_path / "cache.json")
+    assert reloaded.duration(audio) == 3.5
+
+    stat = audio.stat()
+    os.utime(audio, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert reloaded.duration(audio) is None
+
+
+def test_fetch_images_refetches_only_edited_scene(tmp_path, monkeypatch):
+    fetcher = FakeFetcher()
+    monkeypatch.setattr(compose_video, "HAS_REQUESTS", True)
+    monkeypatch.setattr(compose_video, "fetch_scene_image", fetcher)
+    cache = AssetCache(tmp_path / "cache.json")
+
+    first = fetch_images_for_scenes(_scenes("temple", "lotus", "forest"), tmp_path, "demo", cache=cache)
+    assert sorted(first) == ["scene-1", "scene-2", "scene-3"]
+
+    fetcher.calls.clear()
+    second = fetch_images_for_scenes(_scenes("temple", "mountain", "forest"), tmp_path, "demo", cache=cache)
+
+    assert second == first
+    assert fetcher.calls == [("scene-2", None)]
+    assert (tmp_path / "images" / "demo" / "scene-2.jpg").read_bytes() == b"mountain"
+
+
+def test_fetch_images_retries_duplicates_and_removes_stale(tmp_path, monkeypatch):
+    fetcher = FakeFetcher()
+    monkeypatch.setattr(compose_video, "HAS_REQUESTS", True)
+    monkeypatch.setattr(compose_video, "fetch_scene_image", fetcher)
+    image_dir = tmp_path / "images" / "demo"
+    image_dir.mkdir(parents=True)
+    (image_dir / "scene-9.jpg").write_bytes(b"old")
+
+    image_map = fetch_images_for_scenes(_scenes("temple", "temple"), tmp_path, "demo")
+
+    assert sorted(image_map) == ["scene-1", "scene-2"]
+    assert ("scene-2", "nature,forest,path") in fetcher.calls
+    assert (image_dir / "scene-2.jpg").read_bytes() == b"nature,forest,path"
+    assert not (image_dir / "scene-9.jpg").exists()
+
+
+def test_compose_rerun_skips_unchanged_assets(tmp_path, monkeypatch):
+    probes = []
+
+    def fake_duration(path):
+        probes.append(path.name)
+        return 2.0 if path.exists() else 0.0
+
+    fetcher = FakeFetcher()
+    monkeypatch.setattr(compose_video, "get_audio_duration", fake_duration)
+    monkeypatch.setattr(compose_video, "HAS_REQUESTS", True)
+    monkeypatch.setattr(compose_video, "fetch_scene_image", fetcher)
+
+    audio_dir = tmp_path / "audio"
+    audio_dir.mkdir()
+    for scene_id in ("scene-1", "scene-2"):
+        (audio_dir / f"{scene_id}.mp3").write_bytes(scene_id.encode())
+    storyboard = tmp_path / "storyboard.json"
+    storyboard.write_text(
+        json.dumps({"meta": {"slug": "demo"}, "scenes": _scenes("temple", "lotus")}), encoding="utf-8"
+    )
+    output = tmp_path / "video-studio" / "src" / "data" / "remotion-data.json"
+
+    assert compose(storyboard, audio_dir, 30, output, workers=1) == (120, 2)
+    assert sorted(probes) == ["scene-1.mp3", "scene-2.mp3"]
+
+    probes.clear()
+    fetcher.calls.clear()
+    (audio_dir / "scene-2.mp3").write_bytes(b"re-recorded")
+    compose(storyboard, audio_dir, 30, output, workers=2)
+
+    assert probes == ["scene-2.mp3"]
+    assert fetcher.calls == []
+    data = json.loads(output.read_text(encoding="utf-8"))
+    assert data["scenes"][1]["audioFile"] == "audio/demo/scene-2.mp3"
+    assert data["scenes"][1]["imageFile"] == "images/demo/scene-2.jpg"
+    public_audio = tmp_path / "video-studio" / "public" / "audio" / "demo" / "scene-2.mp3"
+    assert public_audio.read_bytes() == b"re-recorded"
@@ -0,0 +1,178 @@
+"""
+tests/tools/test_concat_audio.py — Podcast 後製 filtergraph 管線測試
+
+覆蓋重點：
+  - filtergraph：intro/outro 淡入淡出、段落間 apad 靜音（最後一段不補）、concat 輸入數
+  - ebur128 摘要解析與固定增益 / loudnorm 的選擇
+  - 正規化快取：依來源內容命中、同內容只轉一次；依最近使用時間與總量清除
+  - render_podcast：預設量測 + 輸出兩次 ffmpeg，不寫中間檔；measure=False 時單趟 loudnorm
+"""
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).parent.parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+import tools.concat_audio as concat_audio  # noqa: E402
+from tools.concat_audio import (  # noqa: E402
+    MEASURE_FILTER,
+    build_filtergraph,
+    chord_input,
+    loudness_filter,
+    normalize_turns,
+    parse_ebur128_summary,
+    prune_wav_cache,
+    render_podcast,
+)
+
+EBUR128_STDERR = """
+[Parsed_ebur128_0 @ 0x1] Summary:
+
+  Integrated loudness:
+    I:         -19.5 LUFS
+    Threshold: -30.1 LUFS
+
+  Loudness range:
+    LRA:         6.2 LU
+    Threshold: -40.0 LUFS
+    LRA low:   -24.0 LUFS
+    LRA high:  -17.8 LUFS
+
+  True peak:
+    Peak:       -7.3 dBFS
+"""
+
+
+def _graph(turns, silence_ms=100, loudness="volume=1.00dB"):
+    return build_filtergraph(
+        turns, silence_ms=silence_ms, tone_duration_s=2.5, fade_in_s=0.3, fade_out_s=1.2, loudness=loudness
+    )
+
+
+def test_filtergraph_pads_between_turns_only():
+    chains = _graph(3).split(";")
+
+    assert chains[0].startswith("[0:a]afade=t=in:d=0.3,afade=t=out:st=1.3:d=1.2")
+    assert "apad=pad_dur=0.1" in chains[1] and "apad=pad_dur=0.1" in chains[2]
+    assert "apad" not in chains[3]
+    assert chains[4].startswith("[4:a]afade")
+    assert chains[5] == "[s0][s1][s2][s3][s4]concat=n=5:v=0:a=1[cat]"
+    assert chains[6] == f"[cat]volume=1.00dB,aresample={concat_audio.OUTPUT_SAMPLE_RATE}[out]"
+
+
+def test_filtergraph_without_turns_joins_intro_and_outro():
+    chains = _graph(0, loudness=MEASURE_FILTER).split(";")
+
+    assert chains[-2] == "[s0][s1]concat=n=2:v=0:a=1[cat]"
+    assert chains[-1] == f"[cat]{MEASURE_FILTER}[out]"
+
+
+def test_parse_ebur128_summary():
+    stats = parse_ebur128_summary(EBUR128_STDERR)
+
+    assert stats == {"input_i": -19.5, "input_thresh": -30.1, "input_lra": 6.2, "input_tp": -7.3}
+    assert parse_ebur128_summary("no summary") is None
+    assert parse_ebur128_summary(EBUR128_STDERR.replace("-19.5", "-inf")) is None
+
+
+def test_loudness_filter_prefers_linear_gain_when_peak_allows():
+    stats = parse_ebur128_summary(EBUR128_STDERR)
+
+    assert loudness_filter(-14, stats) == "volume=5.50dB"
+    # 增益後 true peak 超過 -1 dBTP → 改用帶量測值的 loudnorm
+    peaky = dict(stats, input_tp=-3.0)
+    assert loudness_filter(-14, peaky).startswith("loudnorm=I=-14:TP=-1:LRA=11:measured_I=-19.5")
+    wide = dict(stats, input_lra=14.0)
+    assert loudness_filter(-14, wide).startswith("loudnorm=")
+    assert loudness_filter(-14, None) == "loudnorm=I=-14:TP=-1:LRA=11"
+
+
+def test_normalize_turns_caches_by_source_content(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_normalize(source, output):
+        calls.append(source.name)
+        output.write_bytes(b"RIFF" + source.read_bytes())
+
+    monkeypatch.setattr(concat_audio, "normalize_to_wav", fake_normalize)
+    sources = []
+    for name, body in [("turn_001_host_a.mp3", b"a"), ("turn_002_host_b.mp3", b"b"), ("turn_003_host_a.mp3", b"a")]:
+        path = tmp_path / name
+        path.write_bytes(body)
+        sources.append(path)
+    cache = tmp_path / "cache"
+
+    first = normalize_turns(sources, cache, workers=2)
+    second = normalize_turns(sources, cache, workers=2)
+
+    assert sorted(calls) == ["turn_001_host_a.mp3", "turn_002_host_b.mp3"]
+    assert first == second
+    assert first[0] == first[2]
+    assert first[1].read_bytes() == b"RIFFb"
+    assert not list(cache.glob("*.part.wav"))
+
+
+def _render(tmp_path, monkeypatch, **kwargs):
+    invocations = []
+
+    def fake_ffmpeg(*args):
+        invocations.append(args)
+        stderr = EBUR128_STDERR if args[-1] == "-" else ""
+        return subprocess.CompletedProcess(args, 0, "", stderr)
+
+    monkeypatch.setattr(concat_audio, "ffmpeg", fake_ffmpeg)
+    wavs = [tmp_path / "a.wav", tmp_path / "b.wav"]
+
+    render_podcast(
+        wavs,
+        tmp_path / "out" / "podcast.mp3",
+        intro=chord_input([264], [0.3], 2.5),
+        outro=chord_input([196], [0.3], 2.5),
+        silence_ms=100,
+        tone_duration_s=2.5,
+        fade_in_s=0.3,
+        fade_out_s=1.2,
+        bitrate_kbps=128,
+        target_lufs=-14,
+        **kwargs,
+    )
+    return invocations
+
+
+def test_render_podcast_single_pass_without_measurement(tmp_path, monkeypatch):
+    (encode,) = _render(tmp_path, monkeypatch, measure=False)
+
+    graph = encode[encode.index("-filter_complex") + 1]
+    assert "[cat]loudnorm=I=-14:TP=-1:LRA=11,aresample=48000[out]" in graph
+    assert MEASURE_FILTER not in graph
+    assert encode[-1] == str(tmp_path / "out" / "podcast.mp3")
+
+
+def test_render_podcast_measures_then_encodes_in_one_graph(tmp_path, monkeypatch):
+    measure, encode = _render(tmp_path, monkeypatch)
+
+    assert measure[-3:] == ("-f", "null", "-")
+    assert MEASURE_FILTER in measure[measure.index("-filter_complex") + 1]
+    graph = encode[encode.index("-filter_complex") + 1]
+    assert "[cat]volume=5.50dB" in graph
+    assert encode.count("-i") == 4
+    assert encode[-1] == str(tmp_path / "out" / "podcast.mp3")
+    assert "libmp3lame" in encode
+
+
+def test_prune_wav_cache_drops_stale_then_least_recent(tmp_path):
+    now = time.time()
+    ages = {"old": 40, "a": 3, "b": 2, "c": 1, "keep": 50}
+    for name, days in ages.items():
+        path = tmp_path / f"{name}.wav"
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (now - days * 86400, now - days * 86400))
+
+    removed = prune_wav_cache(tmp_path, [tmp_path / "keep.wav"], max_bytes=300, max_age_days=30)
+
+    assert removed == 2
+    assert sorted(p.stem for p in tmp_path.glob("*.wav")) == ["b", "c", "keep"]
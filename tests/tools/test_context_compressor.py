@@ -8,9 +8,13 @@ tests/tools/test_context_compressor.py — ADR-036 Context Compression TDD
   - prompt_injection：非空且內容正確
   - cleanup_stale_sessions：舊 session 被移除，新鮮 session 保留
   - context-usage.json 不存在時 graceful 初始化
+  - Session 計數檔：並行更新不遺失、彙總檔只在建立/狀態轉換時改寫
+  - record_tool_call：壓縮提示只在狀態轉換時回傳
+  - budget.yaml 閾值依 mtime 快取
 """
 import json
 import sys
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
 from unittest.mock import patch
@@ -21,12 +25,14 @@ REPO_ROOT = Path(__file__).parent.parent.parent
 if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
+import tools.context_compressor as context_compressor  # noqa: E402
 from tools.context_compressor import (  # noqa: E402
     ContextState,
     SessionUsage,
     check_threshold,
     cleanup_stale_sessions,
     get_or_create_session,
+    record_tool_call,
     update_session,
 )
 
@@ -137,6 +143,101 @@ class TestUpdateSession:
         assert "sid00003" in data["sessions"]
 
 
+class TestSessionCounterFiles:
+    def _patches(self, tmp_path):
+        usage_path = tmp_path / "context-usage.json"
+        return (
+            patch("tools.context_compressor.CONTEXT_USAGE_PATH", usage_path),
+            patch("tools.context_compressor.STATE_DIR", tmp_path),
+            patch("tools.context_compressor._load_thresholds", return_value=(0.65, 0.80, 200_000)),
+        )
+
+    def test_aggregate_written_only_on_create_and_transition(self, tmp_path):
+        """同一狀態內的更新只寫 Session 計數檔，彙總檔不變。"""
+        usage_path = tmp_path / "context-usage.json"
+        p1, p2, p3 = self._patches(tmp_path)
+        with p1, p2, p3:
+            update_session("sid00010", input_chars=100, output_chars=100)
+            before = usage_path.read_text(encoding="utf-8")
+            update_session("sid00010", input_chars=100, output_chars=100)
+            assert usage_path.read_text(encoding="utf-8") == before
+            # 讀取端仍看到最新累計
+            assert get_or_create_session("sid00010").total_input_chars == 200
+
+            update_session("sid00010", input_chars=WARN_CHARS, output_chars=0)
+        data = json.loads(usage_path.read_text(encoding="utf-8"))
+        assert data["sessions"]["sid00010"]["state"] == ContextState.WARNING.value
+
+        counter = tmp_path / "context-usage.sessions" / "sid00010.json"
+        assert json.loads(counter.read_text(encoding="utf-8"))["total_input_chars"] == 200 + WARN_CHARS
+
+    def test_concurrent_updates_not_lost(self, tmp_path):
+        """並行更新同一 Session 時累計不遺失。"""
+        p1, p2, p3 = self._patches(tmp_path)
+        with p1, p2, p3:
+            def _worker():
+                for _ in range(20):
+                    update_session("sid00011", input_chars=1, output_chars=2)
+
+            threads = [threading.Thread(target=_worker) for _ in range(5)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            session = get_or_create_session("sid00011")
+
+        assert session.total_input_chars == 100
+        assert session.total_output_chars == 200
+
+    def test_legacy_aggregate_entry_is_continued(self, tmp_path):
+        """升級前只存在彙總檔的 Session，首次更新沿用其累計。"""
+        usage_path = tmp_path / "context-usage.json"
+        usage_path.write_text(json.dumps({
+            "schema_version": 1,
+            "sessions": {"legacy01": {"session_id": "legacy01", "total_input_chars": 700,
+                                      "total_output_chars": 0, "state": "normal"}},
+            "updated": "",
+        }), encoding="utf-8")
+        p1, p2, p3 = self._patches(tmp_path)
+        with p1, p2, p3:
+            session = update_session("legacy01", input_chars=7, output_chars=0)
+        assert session.total_input_chars == 707
+
+
+class TestRecordToolCall:
+    def test_hint_only_on_state_transition(self, tmp_path):
+        """進入 warning / critical 時各回傳一次提示，同狀態內不重複。"""
+        with patch("tools.context_compressor.CONTEXT_USAGE_PATH", tmp_path / "context-usage.json"), \
+             patch("tools.context_compressor.STATE_DIR", tmp_path), \
+             patch("tools.context_compressor._load_thresholds", return_value=(0.65, 0.80, 200_000)):
+            assert record_tool_call("sid00020", SAFE_CHARS, 0) is None
+            warn = record_tool_call("sid00020", WARN_CHARS - SAFE_CHARS, 0)
+            repeat = record_tool_call("sid00020", 10, 0)
+            critical = record_tool_call("sid00020", CRITICAL_CHARS - WARN_CHARS, 0)
+
+        assert warn["action"] == "inject_buffer_window"
+        assert repeat is None
+        assert critical["action"] == "inject_summary"
+
+
+class TestThresholdCache:
+    def test_thresholds_cached_until_file_changes(self, tmp_path, monkeypatch):
+        budget = tmp_path / "budget.yaml"
+        budget.write_text("context_compression:\n  warn_threshold: 0.5\n", encoding="utf-8")
+        monkeypatch.setattr(context_compressor, "BUDGET_YAML_PATH", budget)
+        monkeypatch.setattr(context_compressor, "_thresholds_cache", None)
+
+        assert context_compressor._load_thresholds()[0] == 0.5
+        # 快取命中時不重新解析 YAML
+        monkeypatch.setitem(sys.modules, "yaml", None)
+        assert context_compressor._load_thresholds()[0] == 0.5
+
+        monkeypatch.undo()
+        monkeypatch.setattr(context_compressor, "BUDGET_YAML_PATH", budget)
+        budget.write_text("context_compression:\n  warn_threshold: 0.55\n", encoding="utf-8")
+        assert context_compressor._load_thresholds()[0] == 0.55
+
+
 # ── check_threshold ───────────────────────────────────────────────────────────
 
 class TestCheckThreshold:
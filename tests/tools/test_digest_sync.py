@@ -1,9 +1,13 @@
 import sys
 import shutil
+import threading
 from datetime import datetime, timezone
 from pathlib import Path
 import json as jsonlib
 
+import pytest
+import requests
+
 REPO_ROOT = Path(__file__).parent.parent.parent
 if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
@@ -12,6 +16,7 @@ from tools.digest_sync import (  # noqa: E402
     SyncResult,
     build_digest_note,
     flush_sync_queue,
+    load_sync_settings,
     main,
     search_digest_notes,
     sync_digest_memory,
@@ -339,3 +344,201 @@ def test_main_sync_mode_prints_sync_result(monkeypatch, capsys):
     output = jsonlib.loads(capsys.readouterr().out)
     assert output["success"] is True
     assert output["note_id"] == "note-1"
+
+
+class BulkSession:
+    """模擬支援多筆匯入的 KB：記錄呼叫次數，可指定匯入失敗的標題。"""
+
+    def __init__(self, *, failing_titles=(), health_status=200, dedup_fail_titles=()):
+        self.failing_titles = set(failing_titles)
+        self.dedup_fail_titles = set(dedup_fail_titles)
+        self.health_status = health_status
+        self.calls = {"health": 0, "hybrid": 0, "import": 0}
+        self.import_sizes = []
+
+    def get(self, url, timeout):
+        self.calls["health"] += 1
+        return FakeResponse({"status": "ok"}, status_code=self.health_status)
+
+    def post(self, url, json, timeout):
+        if url.endswith("/api/search/hybrid"):
+            self.calls["hybrid"] += 1
+            if json["query"] in self.dedup_fail_titles:
+                return FakeResponse(status_code=503)
+            digest_date = json["query"].split(" - ")[-1]
+            items = [{"id": f"existing-{digest_date}", "metadata": {"digestDate": digest_date}}]
+            return FakeResponse({"items": items if digest_date.endswith("01") else []})
+        if url.endswith("/api/import"):
+            self.calls["import"] += 1
+            self.import_sizes.append(len(json["notes"]))
+            note_ids, errors = [], []
+            for index, note in enumerate(json["notes"]):
+                if note["title"] in self.failing_titles:
+                    errors.append({"index": index, "error": "embedding failed"})
+                else:
+                    note_ids.append(note.get("id", f"new-{note['digestDate']}"))
+            return FakeResponse(
+                {
+                    "message": f"Imported {len(note_ids)} notes, {len(errors)} failed",
+                    "result": {"failed": len(errors), "errors": errors, "noteIds": note_ids},
+                }
+            )
+        raise AssertionError(url)
+
+
+def _write_bulk_queue(name, count):
+    tmp_path = _make_local_tmp(name)
+    queue_path = tmp_path / "queue.json"
+    items = [
+        {"title": f"Daily Digest Memory - 2026-03-{day:02d}", "digestDate": f"2026-03-{day:02d}", "topic": "AI"}
+        for day in range(1, count + 1)
+    ]
+    queue_path.write_text(jsonlib.dumps({"items": items}, ensure_ascii=False), encoding="utf-8")
+    return queue_path
+
+
+def _flush_bulk(queue_path, session, **kwargs):
+    kwargs.setdefault("batch_size", 4)
+    return flush_sync_queue(
+        "http://localhost:3000",
+        queue_path=queue_path,
+        max_retries=2,
+        timeout=10,
+        session=session,
+        sleep_seconds=0,
+        mode="bulk",
+        dedup_workers=3,
+        **kwargs,
+    )
+
+
+def test_flush_sync_queue_bulk_uses_one_health_and_import_per_batch():
+    queue_path = _write_bulk_queue("digest_sync_bulk", 10)
+    session = BulkSession()
+
+    flushed = _flush_bulk(queue_path, session)
+
+    assert len(flushed) == 10
+    assert all(item.success for item in flushed)
+    assert session.calls == {"health": 3, "hybrid": 10, "import": 3}
+    assert session.import_sizes == [4, 4, 2]
+    assert flushed[0].note_id == "existing-2026-03-01"
+    assert flushed[1].note_id == "new-2026-03-02"
+    assert jsonlib.loads(queue_path.read_text(encoding="utf-8"))["items"] == []
+
+
+def test_flush_sync_queue_bulk_keeps_partial_failures_in_queue():
+    queue_path = _write_bulk_queue("digest_sync_bulk_partial", 6)
+    session = BulkSession(
+        failing_titles={"Daily Digest Memory - 2026-03-02"},
+        dedup_fail_titles={"Daily Digest Memory - 2026-03-05"},
+    )
+
+    flushed = _flush_bulk(queue_path, session)
+
+    assert [item.success for item in flushed] == [True, False, True, True, False, True]
+    assert flushed[1].message == "embedding failed"
+    assert flushed[2].note_id == "new-2026-03-03"
+    # dedup 失敗的筆不送進 import
+    assert session.import_sizes == [4, 1]
+    remaining = jsonlib.loads(queue_path.read_text(encoding="utf-8"))["items"]
+    assert [item["digestDate"] for item in remaining] == ["2026-03-02", "2026-03-05"]
+
+
+def test_flush_sync_queue_bulk_stops_when_health_fails():
+    queue_path = _write_bulk_queue("digest_sync_bulk_down", 10)
+    session = BulkSession(health_status=500)
+
+    flushed = _flush_bulk(queue_path, session)
+
+    assert len(flushed) == 4
+    assert not any(item.success for item in flushed)
+    assert session.calls == {"health": 2, "hybrid": 0, "import": 0}
+    assert len(jsonlib.loads(queue_path.read_text(encoding="utf-8"))["items"]) == 10
+
+
+def test_flush_sync_queue_bulk_respects_max_batches():
+    queue_path = _write_bulk_queue("digest_sync_bulk_limit", 10)
+    session = BulkSession()
+
+    flushed = _flush_bulk(queue_path, session, batch_size=3, max_batches=2)
+
+    assert len(flushed) == 6
+    remaining = jsonlib.loads(queue_path.read_text(encoding="utf-8"))["items"]
+    assert [item["digestDate"] for item in remaining] == ["2026-03-07", "2026-03-08", "2026-03-09", "2026-03-10"]
+
+
+def test_flush_sync_queue_bulk_requeues_unattributed_failures():
+    queue_path = _write_bulk_queue("digest_sync_bulk_unmapped", 3)
+
+    class OpaqueFailureSession(BulkSession):
+        def post(self, url, json, timeout):
+            if url.endswith("/api/import"):
+                return FakeResponse({"message": "partial", "result": {"failed": 1, "errors": ["boom"], "noteIds": ["a", "b"]}})
+            return super().post(url, json, timeout)
+
+    flushed = _flush_bulk(queue_path, OpaqueFailureSession())
+
+    assert not any(item.success for item in flushed)
+    assert len(jsonlib.loads(queue_path.read_text(encoding="utf-8"))["items"]) == 3
+
+
+def test_flush_sync_queue_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        flush_sync_queue("http://localhost:3000", queue_path=Path("unused.json"), max_retries=1, timeout=1, mode="turbo")
+
+
+class ThreadRecordingSession(requests.Session):
+    """真正的 requests.Session 子類：記錄每個實例被哪些執行緒用來發 dedup 查詢。"""
+
+    backend = None
+    instances = []
+
+    def __init__(self):
+        super().__init__()
+        self.threads = set()
+        self.closed = False
+        ThreadRecordingSession.instances.append(self)
+
+    def get(self, url, timeout):
+        return self.backend.get(url, timeout)
+
+    def post(self, url, json, timeout):
+        if url.endswith("/api/search/hybrid"):
+            self.threads.add(threading.get_ident())
+        return self.backend.post(url, json, timeout)
+
+    def close(self):
+        self.closed = True
+        super().close()
+
+
+def test_flush_sync_queue_bulk_gives_each_dedup_worker_its_own_session(monkeypatch):
+    queue_path = _write_bulk_queue("digest_sync_bulk_sessions", 10)
+    backend = BulkSession()
+    monkeypatch.setattr(ThreadRecordingSession, "backend", backend)
+    monkeypatch.setattr(ThreadRecordingSession, "instances", [])
+    session = ThreadRecordingSession()
+    session.headers["Authorization"] = "Bearer test"
+
+    flushed = _flush_bulk(queue_path, session)
+
+    assert all(item.success for item in flushed)
+    assert backend.calls == {"health": 3, "hybrid": 10, "import": 3}
+    # 呼叫端的 Session 只給主執行緒用，dedup 查詢各在工作執行緒自己的 Session
+    workers = ThreadRecordingSession.instances[1:]
+    assert not session.threads
+    assert 1 <= len(workers) <= 3
+    assert all(len(worker.threads) == 1 for worker in workers)
+    assert all(worker.headers["Authorization"] == "Bearer test" for worker in workers)
+    assert all(worker.closed for worker in workers)
+    assert not session.closed
+
+
+def test_load_sync_settings_falls_back_to_serial_for_unknown_flush_mode():
+    tmp_path = _make_local_tmp("digest_sync_settings")
+    config = tmp_path / "long_term_memory.yaml"
+    config.write_text("sync_queue:\n  flush_mode: turbo\n", encoding="utf-8")
+    assert load_sync_settings(config)["flush_mode"] == "serial"
+    config.write_text("sync_queue:\n  flush_mode: Bulk\n", encoding="utf-8")
+    assert load_sync_settings(config)["flush_mode"] == "bulk"
@@ -0,0 +1,168 @@
+"""
+tests/tools/test_generate_podcast_audio.py — Podcast TTS 排程器測試
+
+覆蓋重點：
+  - 並行上限與 token bucket 限速
+  - 失敗重試、重試耗盡計入失敗數
+  - 結果依 turn_XXX_host 保持腳本順序
+  - 內容定址快取：重跑時只合成先前失敗的段落
+"""
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).parent.parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from tools.generate_podcast_audio import (  # noqa: E402
+    Segment,
+    TokenBucket,
+    TTSScheduler,
+    cache_key,
+    generate_all,
+)
+
+
+class FakeBackend:
+    """本地假 TTS：寫出「聲音|文字」位元組，可指定前幾次呼叫失敗的文字。"""
+
+    def __init__(self, *, delay=0.01, fail_times=None):
+        self.delay = delay
+        self.fail_times = dict(fail_times or {})
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+    async def __call__(self, text, voice, output_path):
+        self.calls.append(text)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail_times.get(text, 0) > 0:
+                self.fail_times[text] -= 1
+                raise ConnectionError(f"boom {text}")
+            Path(output_path).write_bytes(f"{voice}|{text}".encode("utf-8"))
+        finally:
+            self.active -= 1
+
+
+def _segments(tmp_path, count, voice="v-a"):
+    return [
+        Segment(f"turn_{i:03d}_host_a", f"第 {i} 段", voice, tmp_path / f"turn_{i:03d}_host_a.mp3")
+        for i in range(1, count + 1)
+    ]
+
+
+def _scheduler(backend, **kwargs):
+    kwargs.setdefault("rate", 0)
+    kwargs.setdefault("base_delay", 0)
+    return TTSScheduler(backend, rng=random.Random(0), **kwargs)
+
+
+def test_scheduler_bounds_concurrency_and_keeps_order(tmp_path):
+    backend = FakeBackend()
+    segments = _segments(tmp_path, 12)
+
+    results = asyncio.run(_scheduler(backend, concurrency=3).run(segments))
+
+    assert list(results) == [segment.key for segment in segments]
+    assert all(results.values())
+    assert backend.max_active == 3
+    assert (tmp_path / "turn_007_host_a.mp3").read_bytes() == "v-a|第 7 段".encode("utf-8")
+
+
+def test_scheduler_retries_then_reports_failure(tmp_path):
+    backend = FakeBackend(fail_times={"第 1 段": 1, "第 2 段": 5})
+    scheduler = _scheduler(backend, max_retries=3)
+
+    results = asyncio.run(scheduler.run(_segments(tmp_path, 3)))
+
+    assert results == {"turn_001_host_a": True, "turn_002_host_a": False, "turn_003_host_a": True}
+    assert scheduler.stats["retries"] == 3
+    assert scheduler.stats["failed"] == 1
+    assert not (tmp_path / "turn_002_host_a.mp3").exists()
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_scheduler_cache_skips_already_synthesized_segments(tmp_path):
+    cache_dir = tmp_path / "cache"
+    out = tmp_path / "out"
+    out.mkdir()
+    first = FakeBackend(fail_times={"第 4 段": 9})
+    asyncio.run(_scheduler(first, max_retries=1, cache_dir=cache_dir).run(_segments(out, 5)))
+    assert not (out / "turn_004_host_a.mp3").exists()
+
+    second = FakeBackend()
+    scheduler = _scheduler(second, cache_dir=cache_dir)
+    results = asyncio.run(scheduler.run(_segments(out, 5)))
+
+    assert all(results.values())
+    assert second.calls == ["第 4 段"]
+    assert scheduler.stats["cache_hits"] == 4
+    assert (cache_dir / f"{cache_key('v-a', '第 4 段')}.mp3").exists()
+
+
+def test_scheduler_cache_is_keyed_by_voice_and_shares_duplicates(tmp_path):
+    cache_dir = tmp_path / "cache"
+    backend = FakeBackend()
+    segments = [
+        Segment("turn_001_host_a", "嗯", "v-a", tmp_path / "turn_001_host_a.mp3"),
+        Segment("turn_002_host_b", "嗯", "v-b", tmp_path / "turn_002_host_b.mp3"),
+        Segment("turn_003_host_a", "嗯", "v-a", tmp_path / "turn_003_host_a.mp3"),
+    ]
+
+    results = asyncio.run(_scheduler(backend, cache_dir=cache_dir).run(segments))
+
+    assert all(results.values())
+    assert sorted(backend.calls) == ["嗯", "嗯"]
+    assert (tmp_path / "turn_003_host_a.mp3").read_bytes() == "v-a|嗯".encode("utf-8")
+    assert (tmp_path / "turn_002_host_b.mp3").read_bytes() == "v-b|嗯".encode("utf-8")
+
+
+def test_token_bucket_spaces_requests():
+    async def run():
+        bucket = TokenBucket(rate=50, burst=1)
+        started = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # 首個 token 立即可用，其後每 20ms 一個
+    assert asyncio.run(run()) >= 0.09
+
+
+def test_generate_all_uses_injected_backend(tmp_path):
+    script = tmp_path / "script.jsonl"
+    script.write_text(
+        "\n".join(
+            [
+                json.dumps({"turn": 1, "host": "host_a", "text": "大家好，我是曉晨"}, ensure_ascii=False),
+                json.dumps({"turn": 2, "speaker": "Host-B", "text": "今天聊 AI"}, ensure_ascii=False),
+                "{not json",
+            ]
+        ),
+        encoding="utf-8",
+    )
+    backend = FakeBackend(delay=0)
+
+    failures = asyncio.run(
+        generate_all(
+            script,
+            tmp_path / "audio",
+            "voice-a",
+            "voice-b",
+            {"explicit_rules": {"AI": "人工智慧"}},
+            backend=backend,
+            rate=0,
+            cache_dir=tmp_path / "cache",
+        )
+    )
+
+    assert failures == 1
+    assert (tmp_path / "audio" / "turn_001_host_a.mp3").exists()
+    assert (tmp_path / "audio" / "turn_002_host_b.mp3").read_bytes() == "voice-b|今天聊 人工智慧".encode("utf-8")
@@ -0,0 +1,323 @@
+"""
+tests/tools/test_kb_snapshot.py — 知識庫筆記本地快照測試
+
+覆蓋重點：
+  - 首次完整同步；之後帶 updatedAfter + If-None-Match 增量同步，304 不改快照
+  - 依 updatedAt 合併（舊資料不覆蓋新資料）、min_interval 內不連線
+  - get：本地命中不連線、未命中才打 /api/notes/{id}
+  - by_tag / notes 排序與 isDeleted 過濾
+  - KB 離線時保留既有快照；rebuild 清除已硬刪除的筆記
+  - 對照 KB server 的 /api/notes（limit 上限 100、含等於的 (updatedAt, id) 游標、集合 ETag）
+    翻頁：不漏掉較舊或同時間戳的變動，未變動時 304
+  - 完整同步翻完後移除硬刪除的筆記；沒翻完（含忽略游標的舊版伺服器）不刪
+"""
+import hashlib
+import sys
+import urllib.parse
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).parent.parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from tools.kb_snapshot import KBSnapshot  # noqa: E402
+
+BASE = "http://kb.test"
+
+
+def _note(nid, updated, *, tags=(), created=None, **extra):
+    return {
+        "id": nid,
+        "title": f"筆記 {nid}",
+        "tags": list(tags),
+        "createdAt": created or updated,
+        "updatedAt": updated,
+        "contentText": f"內容 {nid}",
+        **extra,
+    }
+
+
+class FakeKB:
+    """記錄請求的假 KB：list 回應依序取用（用完回空頁），單筆查詢由 by_id 提供。"""
+
+    def __init__(self, responses=(), by_id=None):
+        self.responses = list(responses)
+        self.by_id = dict(by_id or {})
+        self.requests = []
+
+    def __call__(self, url, headers, timeout):
+        parsed = urllib.parse.urlparse(url)
+        self.requests.append((parsed.path, dict(urllib.parse.parse_qsl(parsed.query)), dict(headers)))
+        if parsed.path == "/api/notes":
+            response = self.responses.pop(0) if self.responses else (200, {}, [])
+            if isinstance(response, Exception):
+                raise response
+            return response
+        note_id = urllib.parse.unquote(parsed.path.rsplit("/", 1)[-1])
+        if note_id in self.by_id:
+            return 200, {}, self.by_id[note_id]
+        return 404, {}, None
+
+
+class KBServer:
+    """與 knowledge-base-search/src/server.ts 的 GET /api/notes 行為一致的假 KB。
+
+    limit 上限 100；order 預設 desc；updatedAfter 含等於，搭配 afterId 為 (updatedAt, id) 游標；
+    ETag 為整個集合的版本，If-None-Match 相符回 304。legacy=True 模擬舊版：忽略上述參數、無 ETag。
+    """
+
+    def __init__(self, notes, *, legacy=False):
+        self.notes = {note["id"]: note for note in notes}
+        self.legacy = legacy
+        self.requests = []
+
+    def etag(self):
+        digest = hashlib.sha1()
+        for note in sorted(self.notes.values(), key=lambda n: (n["updatedAt"], n["id"])):
+            digest.update(f"{note['id']}\0{note['updatedAt']}\n".encode("utf-8"))
+        return f'W/"{digest.hexdigest()}"'
+
+    def __call__(self, url, headers, timeout):
+        params = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(url).query))
+        self.requests.append((params, dict(headers)))
+        limit = min(100, max(1, int(params.get("limit", 20))))
+        notes = sorted(self.notes.values(), key=lambda n: (n["updatedAt"], n["id"]))
+        if self.legacy:
+            return 200, {}, {"notes": notes[::-1][:limit]}
+        etag = self.etag()
+        if headers.get("If-None-Match") == etag:
+            return 304, {"etag": etag}, None
+        after, after_id = params.get("updatedAfter"), params.get("afterId")
+        if after:
+            notes = [
+                n for n in notes
+                if n["updatedAt"] > after or (n["updatedAt"] == after and (after_id is None or n["id"] > after_id))
+            ]
+        if params.get("order") != "asc":
+            notes.reverse()
+        return 200, {"etag": etag}, {"notes": notes[:limit]}
+
+
+def _snapshot(tmp_path, kb):
+    return KBSnapshot(tmp_path / "snapshot.json", base_url=BASE, http_get=kb)
+
+
+def test_first_sync_is_full_then_delta_with_etag(tmp_path):
+    kb = FakeKB(
+        [
+            (200, {"ETag": '"v1"'}, {"notes": [_note("a", "2026-10-01T00:00:00Z"), _note("b", "2026-10-02T00:00:00Z")]}),
+            (200, {}, []),
+            (200, {"ETag": '"v2"'}, [_note("c", "2026-10-03T00:00:00Z")]),
+            (200, {}, []),
+            (304, {}, None),
+        ]
+    )
+    snapshot = _snapshot(tmp_path, kb)
+
+    first = snapshot.sync(100)
+    second = snapshot.sync(100, min_interval=0)
+    third = snapshot.sync(100, min_interval=0)
+
+    assert first == {"mode": "full", "fetched": 2, "changed": 2, "removed": 0, "total": 2}
+    assert second["mode"] == "delta" and second["total"] == 3
+    assert third["mode"] == "not_modified" and third["total"] == 3
+    _, params, headers = kb.requests[0]
+    assert "updatedAfter" not in params and "If-None-Match" not in headers
+    _, params, headers = kb.requests[2]
+    assert params["updatedAfter"] == "2026-10-02T00:00:00Z"
+    assert headers["If-None-Match"] == '"v1"'
+    # 後續頁不帶 If-None-Match
+    assert "If-None-Match" not in kb.requests[3][2]
+    assert kb.requests[4][2]["If-None-Match"] == '"v2"'
+
+
+def test_sync_persists_and_skips_network_within_min_interval(tmp_path):
+    kb = FakeKB([(200, {}, [_note("a", "2026-10-01T00:00:00Z")])])
+    _snapshot(tmp_path, kb).sync(50)
+
+    reopened = _snapshot(tmp_path, kb)
+    stats = reopened.sync(50)
+
+    assert stats["mode"] == "fresh"
+    assert len(kb.requests) == 2
+    assert reopened.get("a", fetch_missing=False)["title"] == "筆記 a"
+
+
+def test_merge_keeps_newer_local_copy(tmp_path):
+    kb = FakeKB(
+        [
+            (200, {}, [_note("a", "2026-10-05T00:00:00Z", title="新")]),
+            (200, {}, []),
+            (200, {}, [_note("a", "2026-10-01T00:00:00Z", title="舊"), _note("b", "2026-10-06T00:00:00Z")]),
+        ]
+    )
+    snapshot = _snapshot(tmp_path, kb)
+    snapshot.sync()
+
+    stats = snapshot.sync(min_interval=0)
+
+    assert stats["changed"] == 1
+    assert snapshot.notes_by_id["a"]["title"] == "新"
+
+
+def test_get_hits_locally_and_fetches_misses(tmp_path):
+    summary = {"id": "s", "title": "摘要", "updatedAt": "2026-10-01T00:00:00Z", "tags": ["AI"]}
+    kb = FakeKB(
+        [(200, {}, [_note("a", "2026-10-01T00:00:00Z"), summary])],
+        by_id={"s": {"note": _note("s", "2026-10-01T00:00:00Z", tags=["AI"])}, "x": _note("x", "2026-09-01T00:00:00Z")},
+    )
+    snapshot = _snapshot(tmp_path, kb)
+    snapshot.sync()
+
+    assert snapshot.get("a")["contentText"] == "內容 a"
+    assert len(kb.requests) == 2
+    # 只有摘要（無 contentText）→ 補抓完整筆記並寫回快照
+    assert snapshot.get("s")["contentText"] == "內容 s"
+    assert snapshot.get("x")["id"] == "x"
+    assert snapshot.get("missing") is None
+    assert [path for path, _, _ in kb.requests[2:]] == ["/api/notes/s", "/api/notes/x", "/api/notes/missing"]
+    assert "x" in _snapshot(tmp_path, kb).notes_by_id
+
+
+def test_tag_index_and_ordering_skip_deleted(tmp_path):
+    kb = FakeKB(
+        [
+            (
+                200,
+                {},
+                [
+                    _note("a", "2026-10-01T00:00:00Z", tags=["AI"], created="2026-09-20T00:00:00Z"),
+                    _note("b", "2026-10-03T00:00:00Z", tags=["AI", "工具"], created="2026-09-10T00:00:00Z"),
+                    _note("c", "2026-10-02T00:00:00Z", tags=["AI"], isDeleted=True),
+                ],
+            )
+        ]
+    )
+    snapshot = _snapshot(tmp_path, kb)
+    snapshot.sync()
+
+    assert [n["id"] for n in snapshot.by_tag("AI")] == ["b", "a"]
+    assert [n["id"] for n in snapshot.by_tag("AI", include_deleted=True)] == ["b", "c", "a"]
+    assert [n["id"] for n in snapshot.notes()] == ["b", "a"]
+    assert [n["id"] for n in snapshot.notes(sort_key="createdAt")] == ["a", "b"]
+    assert snapshot.by_tag("無此標籤") == []
+
+
+def test_offline_keeps_existing_snapshot(tmp_path):
+    kb = FakeKB([(200, {}, [_note("a", "2026-10-01T00:00:00Z")]), (200, {}, []), ConnectionRefusedError("down")])
+    snapshot = _snapshot(tmp_path, kb)
+    snapshot.sync()
+
+    stats = snapshot.sync(min_interval=0)
+
+    assert stats["mode"] == "offline"
+    assert "down" in stats["error"]
+    assert stats["total"] == 1
+    assert [n["id"] for n in _snapshot(tmp_path, kb).notes()] == ["a"]
+
+
+def test_rebuild_drops_notes_removed_upstream(tmp_path):
+    kb = FakeKB(
+        [
+            (200, {}, [_note("a", "2026-10-01T00:00:00Z"), _note("b", "2026-10-02T00:00:00Z")]),
+            (200, {}, []),
+            (200, {}, [_note("b", "2026-10-02T00:00:00Z")]),
+        ]
+    )
+    snapshot = _snapshot(tmp_path, kb)
+    snapshot.sync()
+
+    snapshot.sync(rebuild=True)
+
+    assert list(snapshot.notes_by_id) == ["b"]
+    assert "updatedAfter" not in kb.requests[2][1]
+
+
+def test_snapshot_from_other_kb_is_ignored(tmp_path):
+    kb = FakeKB([(200, {}, [_note("a", "2026-10-01T00:00:00Z")])])
+    _snapshot(tmp_path, kb).sync()
+
+    other = KBSnapshot(tmp_path / "snapshot.json", base_url="http://other.test", http_get=kb)
+
+    assert other.notes_by_id == {}
+
+
+def test_delta_pages_past_server_cap(tmp_path):
+    kb = KBServer([_note("a", "2026-10-01T00:00:00Z")])
+    snapshot = _snapshot(tmp_path, kb)
+    snapshot.sync(300)
+    for i in range(150):
+        kb.notes[f"n{i:03d}"] = _note(f"n{i:03d}", f"2026-10-02T00:{i // 60:02d}:{i % 60:02d}Z")
+
+    stats = snapshot.sync(300, min_interval=0)
+
+    assert stats["mode"] == "delta" and stats["fetched"] == 151
+    assert len(snapshot.notes_by_id) == 151
+    first, _ = kb.requests[2]
+    assert first["updatedAfter"] == "2026-10-01T00:00:00Z" and "afterId" not in first
+    assert kb.requests[3][0]["afterId"] == "n098"
+    assert all(params["order"] == "asc" for params, _ in kb.requests)
+
+
+def test_notes_sharing_boundary_timestamp_are_not_skipped(tmp_path):
+    kb = KBServer([_note(f"n{i:03d}", "2026-10-02T00:00:00Z") for i in range(130)])
+    snapshot = _snapshot(tmp_path, kb)
+
+    stats = snapshot.sync(300)
+
+    assert stats["fetched"] == 130 and len(snapshot.notes_by_id) == 130
+    assert [params.get("afterId") for params, _ in kb.requests] == [None, "n099"]
+
+
+def test_unchanged_kb_answers_not_modified(tmp_path):
+    kb = KBServer([_note("a", "2026-10-01T00:00:00Z"), _note("b", "2026-10-02T00:00:00Z")])
+    snapshot = _snapshot(tmp_path, kb)
+    snapshot.sync()
+
+    stats = snapshot.sync(min_interval=0)
+
+    assert stats["mode"] == "not_modified"
+    assert kb.requests[-1][1]["If-None-Match"] == kb.etag()
+
+
+def test_full_resync_drops_hard_deleted_notes(tmp_path):
+    kb = KBServer([_note(f"n{i:03d}", f"2026-10-02T00:{i // 60:02d}:{i % 60:02d}Z") for i in range(250)])
+    snapshot = _snapshot(tmp_path, kb)
+    snapshot.sync(300)
+    del kb.notes["n010"], kb.notes["n200"]
+
+    stats = snapshot.sync(300, force=True)
+
+    assert stats["removed"] == 2
+    assert len(snapshot.notes_by_id) == 248 and "n200" not in snapshot.notes_by_id
+
+
+def test_server_ignoring_cursor_stops_without_pruning(tmp_path):
+    kb = KBServer([_note(f"n{i:03d}", f"2026-10-02T00:{i // 60:02d}:{i % 60:02d}Z") for i in range(150)])
+    snapshot = _snapshot(tmp_path, kb)
+    snapshot.sync(300)
+    kb.legacy = True
+    del kb.notes["n140"]
+
+    stats = snapshot.sync(300, force=True)
+
+    assert len(kb.requests) == 4  # 首次同步 2 頁；舊版伺服器回同一頁，游標不前進即停
+    assert stats["removed"] == 0 and "n140" in snapshot.notes_by_id
+
+
+def test_incomplete_full_listing_keeps_notes(tmp_path):
+    kb = FakeKB(
+        [
+            (200, {}, [_note("a", "2026-10-01T00:00:00Z"), _note("b", "2026-10-02T00:00:00Z")]),
+            (200, {}, []),
+            (200, {}, [_note("a", "2026-10-01T00:00:00Z")]),
+            ConnectionResetError("reset"),
+        ]
+    )
+    snapshot = _snapshot(tmp_path, kb)
+    snapshot.sync()
+
+    stats = snapshot.sync(force=True)
+
+    assert stats["removed"] == 0 and "reset" in stats["error"]
+    assert sorted(snapshot.notes_by_id) == ["a", "b"]
@@ -42,3 +42,36 @@ def test_snapshot_and_restore_roundtrip():
     assert result["restored_dirs"] == 1
     assert '"before"' in digest.read_text(encoding="utf-8")
     assert '"v1"' in continuity.read_text(encoding="utf-8")
+
+
+def test_restore_replaces_segment_store():
+    tmp_path = _make_local_tmp("long_term_memory_rollback_segments")
+    source_root = tmp_path / "workspace"
+    segments = source_root / "data" / "long_term_memory_optimized.segments"
+    segments.mkdir(parents=True)
+    (segments / "snapshot.json").write_text('{"records":[],"next_segment":1}\n', encoding="utf-8")
+
+    snapshot_dir = create_snapshot(label="test", source_root=source_root)
+    (segments / "segment-000001.jsonl").write_text('{"op":"put"}\n', encoding="utf-8")
+
+    restore_snapshot(snapshot_dir, target_root=source_root)
+
+    assert sorted(item.name for item in segments.iterdir()) == ["snapshot.json"]
+
+
+def test_restore_of_legacy_snapshot_drops_segment_store():
+    tmp_path = _make_local_tmp("long_term_memory_rollback_legacy")
+    source_root = tmp_path / "workspace"
+    legacy = source_root / "data" / "long_term_memory_optimized.json"
+    legacy.parent.mkdir(parents=True)
+    legacy.write_text('{"records":[]}\n', encoding="utf-8")
+
+    snapshot_dir = create_snapshot(label="test", source_root=source_root)
+    segments = source_root / "data" / "long_term_memory_optimized.segments"
+    segments.mkdir()
+    (segments / "snapshot.json").write_text('{"records":[]}\n', encoding="utf-8")
+
+    restore_snapshot(snapshot_dir, target_root=source_root)
+
+    assert legacy.exists()
+    assert not segments.exists()
@@ -225,6 +225,28 @@ class TestCheckPhaseBudget:
         assert result["trace_tokens"] == 0.0
         assert result["warn_phase"] is False
 
+    def test_unmerged_journal_deltas_included(self, tmp_path):
+        """post_tool_logger 寫入 journal 但尚未壓實時，讀取前應先合併。"""
+        usage = _make_token_usage(phase="phase1", phase_tokens=100_000, trace_tokens=0)
+        usage_path = tmp_path / "token-usage.json"
+        usage_path.write_text(json.dumps(usage), encoding="utf-8")
+        journal = tmp_path / "token-usage.journal"
+        journal.mkdir()
+        ts = datetime.now().isoformat()
+        (journal / f"{ts[:10]}-1.jsonl").write_text(
+            json.dumps({"ts": ts, "in": 350_000, "out": 0, "phase": "phase1",
+                        "trace": "abc123def456"}) + "\n",
+            encoding="utf-8",
+        )
+
+        with patch("tools.phase_budget_reporter.TOKEN_USAGE_PATH", usage_path), \
+             patch("tools.phase_budget_reporter._load_budget_config",
+                   return_value=_make_budget_config(phase1_limit=500_000)):
+            result = check_phase_budget("phase1", "abc123def456")
+
+        assert result["phase_tokens"] == 200_000.0
+        assert result["trace_tokens"] == 100_000.0
+
 
 # ── format_phase_summary ──────────────────────────────────────────────────────
 
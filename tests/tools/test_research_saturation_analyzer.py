@@ -0,0 +1,96 @@
+"""
+tests/tools/test_research_saturation_analyzer.py — 研究主題分群（MinHash/LSH）測試
+
+覆蓋重點：
+  - 小量輸入逐對比較，大量輸入走 LSH 候選 + 精確 Jaccard 驗證，分群結果一致
+  - MinHash 簽章持久化：重新載入後不重算，只為新關鍵字集合計算
+  - KB 歷史合併時略過已在 registry 的筆記
+"""
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).parent.parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+import tools.research_saturation_analyzer as rsa  # noqa: E402
+from tools.research_saturation_analyzer import (  # noqa: E402
+    MinHashIndex,
+    build_topic_stats,
+    merge_kb_history,
+)
+
+
+def _entries(n, seed=7):
+    rng = random.Random(seed)
+    vocab = [f"topic{i}" for i in range(60)]
+    return [
+        {"topic": " ".join(rng.sample(vocab, rng.randrange(1, 5))),
+         "tags": rng.sample(vocab, rng.randrange(0, 3)),
+         "date": f"2026-03-{rng.randrange(1, 28):02d}"}
+        for _ in range(n)
+    ]
+
+
+class TestClustering:
+    def test_near_duplicate_topics_clustered(self):
+        entries = [
+            {"topic": "LLM agent memory cache", "tags": [], "date": "2026-03-01"},
+            {"topic": "unrelated gardening notes", "tags": [], "date": "2026-03-02"},
+            {"topic": "agent memory cache design", "tags": [], "date": "2026-03-03"},
+        ]
+        stats = build_topic_stats(entries)
+        assert stats["LLM agent memory cache"]["count"] == 2
+        assert stats["unrelated gardening notes"]["count"] == 1
+
+    def test_lsh_path_matches_exhaustive(self, monkeypatch):
+        entries = _entries(300)
+        exhaustive = build_topic_stats(entries)
+        monkeypatch.setattr(rsa, "EXACT_PAIRWISE_MAX", 10)
+        assert build_topic_stats(entries, MinHashIndex()) == exhaustive
+
+    def test_candidates_require_shared_keyword(self):
+        sets = [{"alpha", "beta"}, {"gamma", "delta"}, {"alpha", "beta", "eps"}, set()]
+        assert MinHashIndex().candidate_pairs(sets) == {0: [2]}
+
+
+class TestSignaturePersistence:
+    def test_signatures_reused_and_extended(self, tmp_path):
+        path = tmp_path / "research-minhash.json"
+        sets = [{"alpha", "beta"}, {"gamma"}]
+        first = MinHashIndex(path)
+        signatures = [first.signature(s) for s in sets]
+        first.save()
+
+        second = MinHashIndex(path)
+        assert [second.signature(s) for s in sets] == signatures
+        assert second.computed == 0
+        second.signature({"new", "topic"})
+        assert second.computed == 1
+
+    def test_save_drops_unused_sets(self, tmp_path):
+        path = tmp_path / "research-minhash.json"
+        first = MinHashIndex(path)
+        first.signature({"old"})
+        first.save()
+        second = MinHashIndex(path)
+        second.signature({"current"})
+        second.save()
+        assert MinHashIndex(path)._signatures.keys() == {MinHashIndex._key({"current"})}
+
+    def test_bands_must_divide_permutations(self):
+        with pytest.raises(ValueError):
+            MinHashIndex(bands=3, permutations=8)
+
+
+class TestKbHistory:
+    def test_registry_notes_not_duplicated(self):
+        registry = [{"topic": "A", "kb_note_title": "Note A", "tags": []}]
+        kb = [
+            {"topic": "Note A", "kb_note_title": "Note A", "tags": []},
+            {"topic": "Note B", "kb_note_title": "Note B", "tags": []},
+        ]
+        assert [e["topic"] for e in merge_kb_history(registry, kb)] == ["Note B", "A"]
@@ -0,0 +1,117 @@
+"""
+tests/tools/test_skill_anomaly_detector.py — Skill 呼叫鏈串流分析測試
+
+覆蓋重點：
+  - A→B→A 來回切換、重複讀取、未快取配置檔的偵測與門檻
+  - 單趟串流：接受 generator、開啟中的 session 數受上限約束
+  - 去重保留最高次數，同次數時保留最先出現的 session
+  - iter_entries 依日期由舊到新逐日串流，同時只持有一天的索引（不進 log_index 快取）
+"""
+import gc
+import json
+import sys
+from datetime import timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+REPO_ROOT = Path(__file__).parent.parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+import tools.skill_anomaly_detector as detector  # noqa: E402
+from tools.skill_anomaly_detector import (  # noqa: E402
+    SessionChainAnalyzer,
+    analyze_skill_chains,
+    detect_duplicate_api,
+)
+
+
+def _calls(sid, *steps):
+    return [{"sid": sid, "tool": tool, "summary": summary} for tool, summary in steps]
+
+
+def _by_type(result, chain_type):
+    return [c for c in result["inefficient_chains"] if c["type"] == chain_type]
+
+
+class TestChainPatterns:
+    def test_circular_call_counted_once_per_window(self):
+        steps = [("Read", "a"), ("Bash", "x")] * 3 + [("Read", "a")]
+        result = analyze_skill_chains(iter(_calls("s1", *steps)))
+        circular = _by_type(result, "circular_call")
+        assert {c["pattern"]: c["oscillation_count"] for c in circular} == {
+            "Read ↔ Bash": 3, "Bash ↔ Read": 2,
+        }
+
+    def test_single_oscillation_not_flagged(self):
+        result = analyze_skill_chains(_calls("s1", ("Read", "a"), ("Bash", "x"), ("Read", "a")))
+        assert _by_type(result, "circular_call") == []
+
+    def test_repeated_read_and_uncached_config(self):
+        steps = [("Read", "config/app.yaml")] * 3 + [("Read", "src/main.py")] * 4
+        result = analyze_skill_chains(_calls("s1", *steps))
+        assert [(c["file"], c["read_count"]) for c in _by_type(result, "repeated_read")] == [
+            ("src/main.py", 4),
+        ]
+        assert [(c["file"], c["read_count"]) for c in _by_type(result, "uncached_config")] == [
+            ("config/app.yaml", 3),
+        ]
+
+    def test_trace_id_fallback_and_session_count(self):
+        entries = _calls("", ("Read", "a")) + _calls("s1", ("Read", "a"))
+        entries[0]["trace_id"] = "t1"
+        assert analyze_skill_chains(entries)["total_sessions_analyzed"] == 2
+
+    def test_dedup_keeps_highest_then_first_session(self):
+        entries = (_calls("s1", *[("Read", "f")] * 4) + _calls("s2", *[("Read", "f")] * 5)
+                   + _calls("s3", *[("Read", "f")] * 5))
+        (chain,) = _by_type(analyze_skill_chains(entries), "repeated_read")
+        assert (chain["session_id"], chain["read_count"]) == ("s2", 5)
+
+
+class TestStreaming:
+    def test_open_sessions_bounded(self):
+        analyzer = SessionChainAnalyzer(max_open_sessions=2)
+        for i in range(10):
+            for entry in _calls(f"s{i}", *[("Read", f"f{i}")] * 4):
+                analyzer.add(entry)
+            assert len(analyzer._open) <= 2
+        result = analyzer.result()
+        assert result["total_sessions_analyzed"] == 10
+        assert len(_by_type(result, "repeated_read")) == 10
+
+    def test_duplicate_api_accepts_generator(self):
+        entries = _calls("s1", *[("WebFetch", "https://x")] * 4)
+        (anomaly,) = detect_duplicate_api(e for e in entries)
+        assert anomaly["count_in_session"] == 4
+
+    def test_iter_entries_oldest_day_first(self, tmp_path):
+        today = detector._today().date()
+        for offset, tool in ((0, "Write"), (1, "Read")):
+            day = (today - timedelta(days=offset)).isoformat()
+            (tmp_path / f"{day}.jsonl").write_text(
+                json.dumps({"ts": f"{day}T10:00:00+08:00", "tool": tool, "sid": "s"}) + "\n",
+                encoding="utf-8")
+        with patch.object(detector, "LOGS_DIR", tmp_path):
+            assert [e["tool"] for e in detector.iter_entries(2)] == ["Read", "Write"]
+
+    def test_iter_entries_holds_one_day_of_segments(self, tmp_path):
+        log_index = sys.modules[detector.load_frame.__module__]
+        today = detector._today().date()
+        for offset in range(10):
+            day = (today - timedelta(days=offset)).isoformat()
+            (tmp_path / f"{day}.jsonl").write_text(
+                "".join(json.dumps({"ts": f"{day}T10:00:00+08:00", "tool": "Read", "sid": f"s{i}"}) + "\n"
+                        for i in range(50)),
+                encoding="utf-8")
+        cached_before = len(log_index._SEGMENT_CACHE)
+        live = []
+        with patch.object(detector, "LOGS_DIR", tmp_path):
+            for i, _ in enumerate(detector.iter_entries(10)):
+                if i % 50 == 0:
+                    gc.collect()
+                    live.append(sum(isinstance(o, log_index.Segment) and Path(o.log_path).parent == tmp_path
+                                    for o in gc.get_objects()))
+        assert len(live) == 10
+        assert max(live) <= 2
+        assert len(log_index._SEGMENT_CACHE) == cached_before
@@ -7,6 +7,8 @@ tests/tools/test_time_slot_risk_scorer.py — ADR-037 時段風險評分器 TDD
   - get_current_risk：整合呼叫不 crash
   - write_risk_report：輸出格式驗證
   - 高風險時段（5/7/13）被正確識別
+  - 物化報告：簽章有效時查表、日誌/SLA 設定變更時失效
+  - 過期報告：閘門沿用舊報告並節流地背景 --refresh
 """
 import json
 import sys
@@ -21,11 +23,13 @@ REPO_ROOT = Path(__file__).parent.parent.parent
 if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
+import tools.time_slot_risk_scorer as scorer  # noqa: E402
 from tools.time_slot_risk_scorer import (  # noqa: E402
     HourStats,
     RiskScore,
     compute_hour_stats,
     get_current_risk,
+    load_risk_report,
     score_time_slot,
     write_risk_report,
 )
@@ -33,6 +37,16 @@ from tools.time_slot_risk_scorer import (  # noqa: E402
 
 # ── Fixtures ─────────────────────────────────────────────────────────────────
 
+@pytest.fixture(autouse=True)
+def spawned(tmp_path, monkeypatch):
+    """物化報告寫到暫存目錄，不污染 state/；背景 --refresh 只記錄不實際啟動。"""
+    monkeypatch.setattr(scorer, "RISK_REPORT_PATH", tmp_path / "state" / "time-slot-risk.json")
+    monkeypatch.setattr(scorer, "REFRESH_MARKER_PATH", tmp_path / "state" / "time-slot-risk.refresh")
+    calls = []
+    monkeypatch.setattr(scorer.subprocess, "Popen", lambda args, **kwargs: calls.append(args))
+    return calls
+
+
 def _make_entry(hour: int, has_error: bool = False, error_category: str = "") -> dict:
     """建立假的 JSONL 日誌 entry。"""
     ts = datetime(2026, 3, 22, hour, 0, 0).isoformat()
@@ -139,6 +153,34 @@ class TestComputeHourStats:
         assert 10 in result
         assert result[10].total_runs == 1
 
+    def test_failure_weights_without_numpy_match(self, tmp_path, monkeypatch):
+        """無 numpy 時的 array 後備路徑與 numpy 路徑結果相同。"""
+        from array import array
+        has_error = array("B", [1, 0, 1, 0])
+        loop = array("B", [1, 1, 0, 0])
+        expected = [2, 1, 1, 0]
+        assert list(scorer._failure_weights(has_error, loop)) == expected
+        monkeypatch.setattr(scorer, "np", None)
+        weights = scorer._failure_weights(has_error, loop)
+        assert list(weights) == expected
+        assert weights.tobytes() == bytes(expected)
+
+    def test_failure_trend_and_modes(self, tmp_path):
+        """跨日失敗率上升時 failure_trend > 0；失敗模式只統計失敗列。"""
+        today = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+        for day, failed in ((today - timedelta(days=1), False), (today, True)):
+            entries = [{"ts": day.isoformat(), "has_error": failed, "tags": [],
+                        "error_category": "timeout"} for _ in range(2)]
+            (tmp_path / f"{day.date().isoformat()}.jsonl").write_text(
+                "".join(json.dumps(e) + "\n" for e in entries), encoding="utf-8")
+
+        with patch("tools.time_slot_risk_scorer.LOG_DIR", tmp_path):
+            result = compute_hour_stats(days=2)
+
+        assert result[8].total_runs == 4
+        assert result[8].failure_modes == {"timeout": 2}
+        assert result[8].failure_trend == pytest.approx(1.0)
+
 
 # ── score_time_slot ───────────────────────────────────────────────────────────
 
@@ -263,3 +305,131 @@ class TestWriteRiskReport:
             report = write_risk_report(output_path="/nonexistent_path/risk.json")
         assert isinstance(report, dict)
         assert "risk" in report
+
+
+# ── 物化報告 ──────────────────────────────────────────────────────────────────
+
+class TestMaterializedReport:
+    @pytest.fixture
+    def env(self, tmp_path, monkeypatch):
+        log_dir = tmp_path / "logs"
+        log_dir.mkdir()
+        sla = tmp_path / "external-sla.yaml"
+        sla.write_text("known_high_risk_hours: [5, 7, 13]\n", encoding="utf-8")
+        monkeypatch.setattr(scorer, "LOG_DIR", log_dir)
+        monkeypatch.setattr(scorer, "EXTERNAL_SLA_PATH", sla)
+        monkeypatch.setattr(scorer, "RISK_REPORT_PATH", tmp_path / "time-slot-risk.json")
+        log_file = log_dir / f"{datetime.now().date().isoformat()}.jsonl"
+        log_file.write_text(json.dumps(_make_entry(hour=10)) + "\n", encoding="utf-8")
+        return log_file, sla
+
+    def test_gate_is_lookup_when_fresh(self, env, monkeypatch):
+        first = get_current_risk(hour=10)
+        assert load_risk_report() is not None
+
+        def _fail(*args, **kwargs):
+            raise AssertionError("fresh report should be looked up, not recomputed")
+
+        monkeypatch.setattr(scorer, "compute_hour_stats", _fail)
+        assert get_current_risk(hour=10) == first
+        assert get_current_risk(hour=3).hour == 3
+
+    def test_report_covers_all_hours(self, env):
+        report = write_risk_report()
+        assert sorted(map(int, report["hour_risks"])) == list(range(24))
+        assert report["risk"] == report["hour_risks"][str(report["current_hour"])]
+
+    def test_active_log_appends_served_within_staleness_bound(self, env):
+        log_file, _ = env
+        write_risk_report()
+        with open(log_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(_make_entry(hour=10, has_error=True)) + "\n")
+        assert load_risk_report() is not None
+
+        # 超過 MAX_STALENESS_SECONDS 即不再視為新鮮；重新物化後反映當日新增的行
+        self._age(scorer.MAX_STALENESS_SECONDS + 60)
+        assert load_risk_report() is None
+        assert load_risk_report(max_age=None) is not None
+        write_risk_report()
+        report = load_risk_report()
+        assert report["hour_stats"]["10"]["failed_runs"] == 1
+
+    @staticmethod
+    def _age(seconds):
+        report = json.loads(scorer.RISK_REPORT_PATH.read_text(encoding="utf-8"))
+        aged = datetime.now().astimezone() - timedelta(seconds=seconds)
+        report["generated_at"] = aged.isoformat()
+        scorer.RISK_REPORT_PATH.write_text(json.dumps(report), encoding="utf-8")
+
+    def test_stale_report_served_while_refreshing_in_background(self, env, monkeypatch, spawned):
+        first = get_current_risk(hour=10)
+        self._age(scorer.MAX_STALENESS_SECONDS + 60)
+
+        def _fail(*args, **kwargs):
+            raise AssertionError("stale report should be served, not recomputed on the gate")
+
+        monkeypatch.setattr(scorer, "compute_hour_stats", _fail)
+        assert get_current_risk(hour=10) == first
+        assert len(spawned) == 1
+        assert spawned[0][-5:] == ["--refresh", "--days", "14", "--format", "text"]
+
+        # 節流：標記檔仍新鮮時不重複啟動
+        assert get_current_risk(hour=10) == first
+        assert len(spawned) == 1
+
+    def test_past_log_change_served_stale_then_refreshed(self, env, monkeypatch, spawned):
+        log_file, _ = env
+        yesterday = (datetime.now() - timedelta(days=1)).date().isoformat()
+        past_log = log_file.parent / f"{yesterday}.jsonl"
+        past_log.write_text(json.dumps(_make_entry(hour=9)) + "\n", encoding="utf-8")
+        write_risk_report()
+        with open(past_log, "a", encoding="utf-8") as f:
+            f.write(json.dumps(_make_entry(hour=9, has_error=True)) + "\n")
+        assert load_risk_report() is None
+        get_current_risk(hour=9)
+        assert len(spawned) == 1
+
+    def test_too_old_report_recomputed_synchronously(self, env, spawned):
+        log_file, _ = env
+        write_risk_report()
+        with open(log_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(_make_entry(hour=10, has_error=True)) + "\n")
+        self._age(scorer.MAX_SERVE_STALE_SECONDS + 60)
+        get_current_risk(hour=10)
+        assert spawned == []
+        assert load_risk_report()["hour_stats"]["10"]["failed_runs"] == 1
+
+    def test_sla_change_is_never_served_stale(self, env, spawned):
+        _, sla = env
+        write_risk_report()
+        sla.write_text("known_high_risk_hours: [10]\n", encoding="utf-8")
+        get_current_risk(hour=10)
+        assert spawned == []
+        assert load_risk_report() is not None
+
+    def test_past_log_change_invalidates(self, env):
+        log_file, _ = env
+        yesterday = (datetime.now() - timedelta(days=1)).date().isoformat()
+        past_log = log_file.parent / f"{yesterday}.jsonl"
+        past_log.write_text(json.dumps(_make_entry(hour=9)) + "\n", encoding="utf-8")
+        write_risk_report()
+        with open(past_log, "a", encoding="utf-8") as f:
+            f.write(json.dumps(_make_entry(hour=9, has_error=True)) + "\n")
+        assert load_risk_report() is None
+
+    def test_sla_config_change_invalidates(self, env):
+        _, sla = env
+        write_risk_report()
+        sla.write_text("known_high_risk_hours: [10]\n", encoding="utf-8")
+        assert load_risk_report() is None
+
+    def test_days_window_is_part_of_signature(self, env):
+        write_risk_report(days=14)
+        assert load_risk_report(days=14) is not None
+        assert load_risk_report(days=7) is None
+
+    def test_refresh_cli_materializes(self, env, monkeypatch, capsys):
+        monkeypatch.setattr(sys, "argv", ["time_slot_risk_scorer.py", "--refresh", "--format", "text"])
+        scorer.main()
+        assert load_risk_report() is not None
+        assert "[時段風險評估]" in capsys.readouterr().out
@@ -9,16 +9,33 @@
   - 本工具驗證：重算 hash 是否一致、鏈式連接是否未斷
 
 遇到 rotation_marker（50MB 輪轉標記）時重置鏈起點，不視為斷鏈。
+若存在鏈頭 sidecar（{log}.head，append 時記錄最後 _hash 與 byte offset），
+且 offset 與檔案大小一致，另外比對 sidecar hash 與鏈尾是否相符。
+
+平行驗證（--workers）：
+  每個檔案依 byte offset 切成 CHUNK_BYTES 大小、對齊行尾的區段，所有檔案的
+  區段一起交給 process pool 重算 hash。區段內的鏈由 worker 自行驗證；區段第一
+  筆記錄的 _prev_hash 則在主進程依序接上前一區段的鏈尾（stitch），結果與逐行
+  循序驗證相同（錯誤訊息、行號、順序一致）。
+
+增量驗證（--incremental）：
+  state/audit-verify-checkpoint.json 記錄每個檔案最後驗證通過的 byte offset、
+  當時的鏈尾 hash 與行數；下次只驗證 offset 之後新增的記錄。檢查點最後一行的
+  SHA-256 不符（檔案被截斷或改寫）時退回完整驗證。已通過區段的竄改需以完整
+  驗證（不加 --incremental）偵測。
 
 使用方式：
   uv run python tools/audit_verify.py --log logs/structured/hooks.jsonl
   uv run python tools/audit_verify.py --log-dir logs/structured/
+  uv run python tools/audit_verify.py --log-dir logs/structured/ --workers 8 --incremental
   uv run python tools/audit_verify.py --mission-alignment
 """
 import argparse
 import hashlib
 import json
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Iterator
 
@@ -26,6 +43,17 @@ REPO_ROOT = Path(__file__).parent.parent
 LOG_DIR = REPO_ROOT / "logs" / "structured"
 BACKLOG_PATH = REPO_ROOT / "context" / "improvement-backlog.json"
 MISSION_PATH = REPO_ROOT / "context" / "mission.yaml"
+CHECKPOINT_PATH = REPO_ROOT / "state" / "audit-verify-checkpoint.json"
+# 與 hooks/post_tool_logger.py CHAIN_HEAD_SUFFIX 一致
+CHAIN_HEAD_SUFFIX = ".head"
+# 平行驗證的區段大小（對齊到下一個行尾）
+CHUNK_BYTES = 8 * 1024 * 1024
+MAX_ERRORS = 20
+
+_HOOKS_DIR = str(REPO_ROOT / "hooks")
+if _HOOKS_DIR not in sys.path:
+    sys.path.insert(0, _HOOKS_DIR)
+from hook_utils import atomic_write_json, safe_load_json  # noqa: E402
 
 
 def _compute_entry_hash(entry: dict) -> str:
@@ -39,96 +67,342 @@ def _compute_entry_hash(entry: dict) -> str:
     ).hexdigest()[:16]
 
 
-def _iter_jsonl(path: Path) -> Iterator[tuple[int, dict]]:
-    """逐行解析 JSONL，回傳 (行號, dict) 的迭代器。"""
-    with open(path, encoding="utf-8") as f:
-        for lineno, line in enumerate(f, start=1):
-            line = line.strip()
+def _iter_jsonl(path: Path, start: int = 0, end: "int | None" = None) -> Iterator[tuple[int, int, "dict | None"]]:
+    """逐行解析 [start, end) 範圍的 JSONL，回傳 (區段內行號, 行起點 offset, dict) 的迭代器。
+
+    空白行回傳 None；無法解碼或解析的行回傳 {"_parse_error": True, ...}。
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        pos = start
+        lineno = 0
+        while end is None or pos < end:
+            raw = f.readline()
+            if not raw:
+                break
+            line_start = pos
+            pos += len(raw)
+            lineno += 1
+            try:
+                line = raw.decode("utf-8").strip()
+            except UnicodeDecodeError:
+                yield lineno, line_start, {"_parse_error": True, "_raw": raw[:100].hex()}
+                continue
             if not line:
+                yield lineno, line_start, None
                 continue
             try:
-                yield lineno, json.loads(line)
+                entry = json.loads(line)
             except json.JSONDecodeError:
-                yield lineno, {"_parse_error": True, "_raw": line[:100]}
+                entry = None
+            if not isinstance(entry, dict):
+                entry = {"_parse_error": True, "_raw": line[:100]}
+            yield lineno, line_start, entry
 
 
-def verify_log_file(path: Path) -> dict:
-    """
-    驗證單一 JSONL 日誌的鏈式完整性。
+def _verify_chunk(path: str, start: int, end: "int | None") -> dict:
+    """驗證單一區段的鏈（可在 worker 進程執行，回傳值皆可 pickle）。
 
-    Returns:
-        {
-            "file": str, "total": int, "valid": int, "errors": list[str],
-            "rotations": int, "passed": bool
-        }
+    區段開頭的鏈尾未知：第一個鏈事件若是帶 _hash 的記錄，其 _prev_hash 以
+    "head" 回傳，由 _stitch() 與前一區段的鏈尾比對。錯誤以 (區段內行號, 訊息)
+    回傳，行號由 _stitch() 換算成檔案行號。
     """
     errors = []
-    valid_count = 0
-    rotation_count = 0
+    error_count = 0
+    total = valid = rotations = lines = 0
+    head = None
+    chain_seen = False
     prev_hash = ""
-    total = 0
-
-    for lineno, entry in _iter_jsonl(path):
+    last_line_start = start
+
+    def _error(lineno, message):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < MAX_ERRORS:
+            errors.append((lineno, message))
+
+    for lineno, line_start, entry in _iter_jsonl(path, start, end):
+        lines = lineno
+        last_line_start = line_start
+        if entry is None:
+            continue
         total += 1
 
         if entry.get("_parse_error"):
-            errors.append(f"L{lineno}: JSON 解析失敗")
+            _error(lineno, "JSON 解析失敗")
             prev_hash = ""  # 斷鏈後重置
+            chain_seen = True
             continue
 
         # 輪轉標記：重置鏈起點（不視為錯誤）
         if entry.get("_type") == "rotation_marker":
-            rotation_count += 1
+            rotations += 1
             prev_hash = entry.get("_hash", "")
-            valid_count += 1
+            chain_seen = True
+            valid += 1
             continue
 
         stored_hash = entry.get("_hash")
 
         # 若記錄不含 _hash（舊格式），跳過驗證
         if stored_hash is None:
-            valid_count += 1
+            valid += 1
             continue
 
-        # 驗證 _prev_hash 一致性
+        # 驗證 _prev_hash 一致性（區段第一個鏈事件交由 _stitch 比對）
         entry_prev = entry.get("_prev_hash", "")
-        if entry_prev != prev_hash:
-            errors.append(
-                f"L{lineno}: _prev_hash 不符（期望 '{prev_hash[:8]}...'，"
-                f"實際 '{entry_prev[:8]}...'）"
-            )
+        if not chain_seen:
+            head = (lineno, entry_prev)
+        elif entry_prev != prev_hash:
+            _error(lineno, _prev_hash_mismatch(prev_hash, entry_prev))
 
         # 驗證 hash 重算一致性
         computed = _compute_entry_hash(entry)
         if computed != stored_hash:
-            errors.append(
-                f"L{lineno}: hash 不符（期望 '{stored_hash}'，"
-                f"重算 '{computed}'）— 可能被篡改"
-            )
+            _error(lineno, f"hash 不符（期望 '{stored_hash}'，重算 '{computed}'）— 可能被篡改")
         else:
-            valid_count += 1
+            valid += 1
 
         prev_hash = stored_hash
+        chain_seen = True
 
-    passed = len(errors) == 0
     return {
-        "file": str(path),
+        "lines": lines,
+        "total": total,
+        "valid": valid,
+        "rotations": rotations,
+        "errors": errors,
+        "error_count": error_count,
+        "head": head,
+        "chain_seen": chain_seen,
+        "tail": prev_hash,
+        "last_line_start": last_line_start,
+    }
+
+
+def _verify_chunk_task(task: tuple) -> dict:
+    return _verify_chunk(*task)
+
+
+def _prev_hash_mismatch(expected: str, actual: str) -> str:
+    return f"_prev_hash 不符（期望 '{expected[:8]}...'，實際 '{actual[:8]}...'）"
+
+
+def _chunk_ranges(path: Path, start: int, end: int, chunk_bytes: int) -> list:
+    """把 [start, end) 切成約 chunk_bytes 大小、邊界對齊行尾的區段。"""
+    ranges = []
+    with open(path, "rb") as f:
+        pos = start
+        while pos < end:
+            boundary = pos + chunk_bytes
+            if boundary >= end:
+                ranges.append((pos, end))
+                break
+            f.seek(boundary)
+            f.readline()  # 前進到下一個行尾
+            boundary = min(f.tell(), end)
+            ranges.append((pos, boundary))
+            pos = boundary
+    return ranges or [(start, end)]
+
+
+def _run_chunks(tasks: list, workers: int) -> list:
+    """依序回傳各區段結果；workers > 1 且區段不只一個時使用 process pool。"""
+    if workers > 1 and len(tasks) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                return list(pool.map(_verify_chunk_task, tasks))
+        except (OSError, NotImplementedError, RuntimeError):
+            pass  # 無法建立 process pool（受限環境）時退回循序驗證
+    return [_verify_chunk_task(task) for task in tasks]
+
+
+def _stitch(chunks: list, prev_hash: str = "", line_offset: int = 0) -> dict:
+    """依序接合區段結果：比對區段邊界的 _prev_hash，換算行號並累計統計。"""
+    errors = []
+    error_count = 0
+    total = valid = rotations = 0
+    for chunk in chunks:
+        if chunk["head"] is not None:
+            lineno, entry_prev = chunk["head"]
+            if entry_prev != prev_hash:
+                error_count += 1
+                errors.append(f"L{line_offset + lineno}: {_prev_hash_mismatch(prev_hash, entry_prev)}")
+        if len(errors) < MAX_ERRORS:
+            errors.extend(f"L{line_offset + lineno}: {message}" for lineno, message in chunk["errors"])
+        error_count += chunk["error_count"]
+        if chunk["chain_seen"]:
+            prev_hash = chunk["tail"]
+        total += chunk["total"]
+        valid += chunk["valid"]
+        rotations += chunk["rotations"]
+        line_offset += chunk["lines"]
+    return {
         "total": total,
-        "valid": valid_count,
-        "errors": errors[:20],  # 最多顯示 20 個錯誤
-        "rotations": rotation_count,
+        "valid": valid,
+        "rotations": rotations,
+        "errors": errors,
+        "error_count": error_count,
+        "tail_hash": prev_hash,
+        "lines": line_offset,
+    }
+
+
+def _check_chain_head(path: Path, tail_hash: str) -> "str | None":
+    """比對鏈頭 sidecar 與實際鏈尾；sidecar 不存在或已過時（offset 不符）時略過。"""
+    head_path = path.with_name(path.name + CHAIN_HEAD_SUFFIX)
+    if not head_path.exists():
+        return None
+    try:
+        head = json.loads(head_path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return f"{head_path.name}: 鏈頭 sidecar 解析失敗"
+    if not isinstance(head, dict) or head.get("offset") != path.stat().st_size:
+        return None
+    if head.get("hash", "") != tail_hash:
+        return (
+            f"{head_path.name}: 鏈頭 sidecar 不符（sidecar '{str(head.get('hash', ''))[:8]}...'，"
+            f"鏈尾 '{tail_hash[:8]}...'）"
+        )
+    return None
+
+
+def _line_digest(path: Path, start: int, end: int) -> str:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return hashlib.sha256(f.read(end - start)).hexdigest()
+
+
+def _resume_point(path: Path, checkpoint: "dict | None", size: int) -> tuple[int, str, int]:
+    """由檢查點取得 (起始 offset, 鏈尾 hash, 已驗證行數)；檢查點失效時從頭開始。"""
+    if not isinstance(checkpoint, dict):
+        return 0, "", 0
+    try:
+        offset = int(checkpoint["offset"])
+        last_line_start = int(checkpoint["last_line_start"])
+        if not 0 <= last_line_start < offset <= size:
+            return 0, "", 0
+        if _line_digest(path, last_line_start, offset) != checkpoint["last_line_sha256"]:
+            return 0, "", 0
+        return offset, str(checkpoint["hash"]), int(checkpoint["lines"])
+    except (KeyError, TypeError, ValueError, OSError):
+        return 0, "", 0
+
+
+def _plan_file(path: Path, chunk_bytes: int, checkpoint: "dict | None" = None) -> dict:
+    size = path.stat().st_size
+    start, prev_hash, lines = _resume_point(path, checkpoint, size)
+    ranges = _chunk_ranges(path, start, size, chunk_bytes) if size > start else []
+    return {"path": path, "size": size, "start": start, "prev_hash": prev_hash,
+            "lines": lines, "ranges": ranges}
+
+
+def _finish_file(plan: dict, chunks: list) -> tuple[dict, "dict | None"]:
+    """接合單檔區段結果，回傳 (驗證結果, 新檢查點或 None)。"""
+    path = plan["path"]
+    stitched = _stitch(chunks, plan["prev_hash"], plan["lines"])
+    errors = stitched["errors"]
+    error_count = stitched["error_count"]
+    head_error = _check_chain_head(path, stitched["tail_hash"])
+    if head_error:
+        errors.append(head_error)
+        error_count += 1
+
+    passed = error_count == 0
+    result = {
+        "file": str(path),
+        "total": stitched["total"],
+        "valid": stitched["valid"],
+        "errors": errors[:MAX_ERRORS],  # 最多顯示 20 個錯誤
+        "rotations": stitched["rotations"],
         "passed": passed,
     }
 
+    checkpoint = None
+    size = plan["size"]
+    last_line_start = chunks[-1]["last_line_start"] if chunks else None
+    if passed and last_line_start is not None and size > 0:
+        with open(path, "rb") as f:
+            f.seek(size - 1)
+            complete = f.read(1) == b"\n"
+        if complete:  # 最後一行尚未寫完時不推進檢查點
+            checkpoint = {
+                "offset": size,
+                "hash": stitched["tail_hash"],
+                "lines": stitched["lines"],
+                "last_line_start": last_line_start,
+                "last_line_sha256": _line_digest(path, last_line_start, size),
+            }
+    return result, checkpoint
+
+
+def verify_log_file(path: Path, workers: int = 1, chunk_bytes: int = CHUNK_BYTES) -> dict:
+    """
+    驗證單一 JSONL 日誌的鏈式完整性。
+
+    Args:
+        workers: > 1 時大檔案分區段以 process pool 平行驗證
+        chunk_bytes: 區段大小
 
-def verify_log_dir(log_dir: Path) -> dict:
-    """批次驗證目錄下所有 JSONL 日誌。"""
+    Returns:
+        {
+            "file": str, "total": int, "valid": int, "errors": list[str],
+            "rotations": int, "passed": bool
+        }
+    """
+    plan = _plan_file(Path(path), chunk_bytes)
+    tasks = [(str(plan["path"]), start, end) for start, end in plan["ranges"]]
+    result, _ = _finish_file(plan, _run_chunks(tasks, workers))
+    return result
+
+
+def verify_log_dir(
+    log_dir: Path,
+    workers: int = 1,
+    incremental: bool = False,
+    checkpoint_path: Path = CHECKPOINT_PATH,
+    chunk_bytes: int = CHUNK_BYTES,
+) -> dict:
+    """批次驗證目錄下所有 JSONL 日誌。
+
+    所有檔案的區段一起排入同一個 process pool（workers > 1 時）。
+    incremental=True 時從 checkpoint_path 記錄的 offset 接續驗證，並為通過的
+    檔案更新檢查點；未通過的檔案保留舊檢查點，下次仍會重新回報錯誤。
+    """
     if not log_dir.exists():
         return {"error": f"目錄不存在：{log_dir}", "files_checked": 0, "all_passed": True}
 
-    results = []
+    checkpoints = safe_load_json(str(checkpoint_path), default={}) if incremental else {}
+    if not isinstance(checkpoints, dict):
+        checkpoints = {}
+
+    plans = []
+    tasks = []
     for jsonl_file in sorted(log_dir.glob("*.jsonl")):
-        results.append(verify_log_file(jsonl_file))
+        key = str(jsonl_file.resolve())
+        plan = _plan_file(jsonl_file, chunk_bytes, checkpoints.get(key) if incremental else None)
+        plan["key"] = key
+        plan["task_slice"] = (len(tasks), len(tasks) + len(plan["ranges"]))
+        tasks.extend((str(jsonl_file), start, end) for start, end in plan["ranges"])
+        plans.append(plan)
+
+    chunk_results = _run_chunks(tasks, workers)
+
+    results = []
+    for plan in plans:
+        first, last = plan["task_slice"]
+        result, checkpoint = _finish_file(plan, chunk_results[first:last])
+        if incremental:
+            result["since_offset"] = plan["start"]
+            if checkpoint is not None:
+                checkpoints[plan["key"]] = checkpoint
+        results.append(result)
+
+    if incremental:
+        try:
+            atomic_write_json(str(checkpoint_path), checkpoints)
+        except OSError as e:
+            print(f"[audit_verify] 檢查點寫入失敗：{e}", file=sys.stderr)
 
     all_passed = all(r["passed"] for r in results)
     return {
@@ -194,6 +468,11 @@ def main():
     parser.add_argument("--log", help="驗證單一 JSONL 日誌檔案")
     parser.add_argument("--log-dir", help="批次驗證目錄（預設 logs/structured/）")
     parser.add_argument("--mission-alignment", action="store_true", help="查詢目標對齊狀況")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="平行驗證的 process 數（預設 CPU 核心數，1 = 循序）")
+    parser.add_argument("--incremental", action="store_true",
+                        help="只驗證上次檢查點之後新增的記錄（僅 --log-dir 模式）")
+    parser.add_argument("--checkpoint", default=str(CHECKPOINT_PATH), help="增量驗證檢查點檔案")
     args = parser.parse_args()
 
     if args.mission_alignment:
@@ -202,13 +481,16 @@ def main():
         return
 
     if args.log:
-        result = verify_log_file(Path(args.log))
+        result = verify_log_file(Path(args.log), workers=args.workers)
         print(json.dumps(result, ensure_ascii=False, indent=2))
         sys.exit(0 if result["passed"] else 1)
 
     # 預設：批次驗證 logs/structured/
     log_dir = Path(args.log_dir) if args.log_dir else LOG_DIR
-    result = verify_log_dir(log_dir)
+    result = verify_log_dir(
+        log_dir, workers=args.workers, incremental=args.incremental,
+        checkpoint_path=Path(args.checkpoint),
+    )
     print(json.dumps(result, ensure_ascii=False, indent=2))
     sys.exit(0 if result["all_passed"] else 1)
 
@@ -22,6 +22,11 @@ REPO_ROOT = Path(__file__).parent.parent
 BUDGET_CONFIG = REPO_ROOT / "config" / "budget.yaml"
 TOKEN_USAGE = REPO_ROOT / "state" / "token-usage.json"
 
+_HOOKS_DIR = str(REPO_ROOT / "hooks")
+if _HOOKS_DIR not in sys.path:
+    sys.path.insert(0, _HOOKS_DIR)
+from token_journal import compact_token_usage  # noqa: E402
+
 
 def _load_budget_config() -> dict:
     try:
@@ -31,6 +36,14 @@ def _load_budget_config() -> dict:
         raise ImportError("需要 pyyaml：uv add pyyaml")
 
 
+def _compact_token_journal() -> None:
+    """把 post_tool_logger 寫入的 token journal 合併進 token-usage.json（失敗時沿用既有內容）。"""
+    try:
+        compact_token_usage(str(TOKEN_USAGE))
+    except (TimeoutError, OSError):
+        pass
+
+
 def check_budget(task_type: str, provider: str, estimated_tokens: int = 50) -> dict:
     """
     呼叫前預算預檢查（原子化，不實際扣款）。
@@ -41,6 +54,7 @@ def check_budget(task_type: str, provider: str, estimated_tokens: int = 50) -> d
     """
     try:
         config = _load_budget_config()
+        _compact_token_journal()
         try:
             usage_data = json.loads(TOKEN_USAGE.read_text(encoding="utf-8"))
         except FileNotFoundError:
@@ -137,6 +151,7 @@ def get_status() -> dict:
     """查詢當日預算使用狀況（供 --status 命令使用）"""
     try:
         config = _load_budget_config()
+        _compact_token_journal()
         usage_data = json.loads(TOKEN_USAGE.read_text(encoding="utf-8"))
     except Exception as e:
         return {"error": str(e)}
@@ -2,15 +2,22 @@
 """cache_analyzer.py - 快取命中率分析工具（ADR-046）
 分析 JSONL 日誌中的快取事件，計算命中率並與目標比較。
 """
+import argparse
 import json
 import re
-from pathlib import Path
-from datetime import datetime, timedelta, timezone
+import sys
 from collections import defaultdict
-import argparse
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
 
 PROJECT_ROOT = Path(__file__).parent.parent
 
+_HOOKS_DIR = str(PROJECT_ROOT / "hooks")
+if _HOOKS_DIR not in sys.path:
+    sys.path.insert(0, _HOOKS_DIR)
+from log_index import load_frame  # noqa: E402
+
+
 def load_hit_rate_targets():
     """從 cache-policy.yaml 讀取命中率目標"""
     try:
@@ -31,48 +38,30 @@ def analyze_cache_events(days: int = 7) -> dict:
     if not log_dir.exists():
         return {}
 
-    for log_file in sorted(log_dir.glob("*.jsonl")):
-        try:
-            with open(log_file, encoding="utf-8", errors="ignore") as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        entry = json.loads(line)
-                    except json.JSONDecodeError:
-                        continue
-
-                    ts_str = entry.get("timestamp", "")
-                    try:
-                        ts = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
-                        if ts < cutoff:
-                            continue
-                    except Exception:
-                        continue
-
-                    # 從 summary/tags 辨識快取事件
-                    summary = entry.get("summary", "").lower()
-                    tags = entry.get("tags", [])
-
-                    source = None
-                    for src in ["todoist", "pingtung", "hackernews", "knowledge", "gmail", "chatroom"]:
-                        if src in summary or any(src in str(t) for t in tags):
-                            source = "pingtung-news" if src == "pingtung" else src
-                            break
-
-                    if source is None:
-                        continue
-
-                    if "cache_hit" in tags or "cache-hit" in summary or "valid" in summary:
-                        stats[source]["hits"] += 1
-                    elif "cache_miss" in tags or "cache-miss" in summary:
-                        stats[source]["misses"] += 1
-                    elif "degraded" in tags or "stale" in summary:
-                        stats[source]["degraded"] += 1
-        except Exception:
+    # 欄式索引（log_index）：ts 已解析為 epoch，summary/tags 直接取用，不重複 json.loads
+    frame = load_frame(log_dir)
+    recent = frame.where(ts >= cutoff.timestamp() for ts in frame.column("ts"))
+
+    for summary, tags in zip(recent.column("summary"), recent.column("tags")):
+        # 從 summary/tags 辨識快取事件
+        summary = summary.lower()
+
+        source = None
+        for src in ["todoist", "pingtung", "hackernews", "knowledge", "gmail", "chatroom"]:
+            if src in summary or any(src in str(t) for t in tags):
+                source = "pingtung-news" if src == "pingtung" else src
+                break
+
+        if source is None:
             continue
 
+        if "cache_hit" in tags or "cache-hit" in summary or "valid" in summary:
+            stats[source]["hits"] += 1
+        elif "cache_miss" in tags or "cache-miss" in summary:
+            stats[source]["misses"] += 1
+        elif "degraded" in tags or "stale" in summary:
+            stats[source]["degraded"] += 1
+
     return dict(stats)
 
 def compute_hit_rates(stats: dict) -> dict:
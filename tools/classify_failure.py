@@ -10,7 +10,7 @@ ADR-20260323-042: 失敗模式 Taxonomy 與根因自動分類
 import json
 import sys
 from collections import Counter
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
 
 import yaml
@@ -20,6 +20,11 @@ TAXONOMY_PATH = PROJECT_ROOT / "config" / "failure-taxonomy.yaml"
 LOGS_DIR = PROJECT_ROOT / "logs" / "structured"
 OUTPUT_PATH = PROJECT_ROOT / "analysis" / "failure-classification.json"
 
+_HOOKS_DIR = str(PROJECT_ROOT / "hooks")
+if _HOOKS_DIR not in sys.path:
+    sys.path.insert(0, _HOOKS_DIR)
+from log_index import load_frame, recent_dates  # noqa: E402
+
 
 def load_taxonomy() -> dict:
     """載入 failure-taxonomy.yaml，回傳 {category: {keywords: [...]}} 結構。"""
@@ -54,30 +59,17 @@ def classify_record(record: dict, categories: dict) -> str:
 
 def scan_failures(days: int, categories: dict) -> list[dict]:
     """掃描最近 N 天的 JSONL 日誌，提取失敗記錄並分類。"""
-    today = datetime.now().date()
+    frame = load_frame(LOGS_DIR, dates=recent_dates(days, datetime.now().date()))
+    # 先以索引的 tags 篩出失敗列，只讀回這些行的完整記錄
     failures = []
-    for d in range(days):
-        log_file = LOGS_DIR / f"{(today - timedelta(days=d)).isoformat()}.jsonl"
-        if not log_file.exists():
-            continue
-        with open(log_file, encoding="utf-8") as f:
-            for line in f:
-                if not line.strip():
-                    continue
-                try:
-                    record = json.loads(line)
-                except json.JSONDecodeError:
-                    continue
-                tags = record.get("tags", [])
-                if not any(t in tags for t in ("error", "warn", "block", "blocked")):
-                    continue
-                failures.append({
-                    "ts": record.get("ts", ""),
-                    "tool": record.get("tool", ""),
-                    "tags": tags,
-                    "error_category": record.get("error_category", ""),
-                    "classified_as": classify_record(record, categories),
-                })
+    for record in frame.with_tag("error", "warn", "block", "blocked").records():
+        failures.append({
+            "ts": record.get("ts", ""),
+            "tool": record.get("tool", ""),
+            "tags": record.get("tags", []),
+            "error_category": record.get("error_category", ""),
+            "classified_as": classify_record(record, categories),
+        })
     return failures
 
 
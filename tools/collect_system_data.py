@@ -2,6 +2,7 @@
 """系統洞察資料收集腳本"""
 import json
 import statistics
+import sys
 from collections import Counter, defaultdict
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -19,6 +20,11 @@ STATE_DIR = BASE_DIR / "state"
 CONTEXT_DIR = BASE_DIR / "context"
 CONFIG_DIR = BASE_DIR / "config"
 
+_HOOKS_DIR = str(BASE_DIR / "hooks")
+if _HOOKS_DIR not in sys.path:
+    sys.path.insert(0, _HOOKS_DIR)
+from log_index import load_frame  # noqa: E402
+
 
 def _load_research_exclude_keys() -> set:
     """從 benchmark.yaml 讀取 avg_io_per_call.exclude_task_keys（研究類任務排除清單）"""
@@ -80,55 +86,47 @@ def collect_jsonl_stats():
     call_count = 0
 
     try:
-        # 遍歷近 7 天的 JSONL 檔案
-        for i in range(7):
-            date = START_DATE + timedelta(days=i)
-            file_path = LOGS_DIR / f"{date.strftime('%Y-%m-%d')}.jsonl"
-
-            if not file_path.exists():
-                continue
-
-            with open(file_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    try:
-                        entry = json.loads(line.strip())
-                        stats["total_calls"] += 1
-
-                        # 攔截事件：僅計 event==blocked 或 tags 含 "blocked"（與 query_logs 一致）
-                        if entry.get("event") == "blocked" or "blocked" in entry.get("tags", []):
-                            stats["blocked_count"] += 1
-
-                        # 工具分佈
-                        tool_name = entry.get("tool")
-                        if tool_name:
-                            stats["tool_distribution"][tool_name] += 1
-
-                        # 標籤分佈
-                        tags = entry.get("tags", [])
-                        for tag in tags:
-                            stats["tag_distribution"][tag] += 1
-
-                            # skill-read 中的 Skill 名稱
-                            if tag == "skill-read":
-                                summary = entry.get("summary", "")
-                                if "/skills/" in summary or "\\skills\\" in summary:
-                                    # 支援 Unix 和 Windows 路徑分隔符
-                                    path_parts = summary.replace("\\", "/").split("/skills/")
-                                    if len(path_parts) > 1:
-                                        skill_name = path_parts[1].split("/")[0]
-                                        stats["unique_skills"].add(skill_name)
-
-                        # 輸出長度（排除研究類任務，其報告完整性不受字元限制）
-                        output_len = entry.get("output_len", 0)
-                        if output_len:
-                            task_key = entry.get("cause_chain", {}).get("task_key", "")
-                            if task_key in RESEARCH_EXCLUDE_KEYS:
-                                stats["excluded_research_calls"] += 1
-                            else:
-                                total_output_len += output_len
-                                call_count += 1
-                    except json.JSONDecodeError:
-                        continue
+        # 近 7 天的日誌欄式索引（log_index，僅解析新增的行）
+        dates = [(START_DATE + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(7)]
+        frame = load_frame(LOGS_DIR, dates=dates)
+        stats["total_calls"] = len(frame)
+
+        for event, tool_name, tags, summary, output_len, task_key in zip(
+            frame.column("event"),
+            frame.column("tool"),
+            frame.column("tags"),
+            frame.column("summary"),
+            frame.column("output_len"),
+            frame.column("task_key"),
+        ):
+            # 攔截事件：僅計 event==blocked 或 tags 含 "blocked"（與 query_logs 一致）
+            if event == "blocked" or "blocked" in tags:
+                stats["blocked_count"] += 1
+
+            # 工具分佈
+            if tool_name:
+                stats["tool_distribution"][tool_name] += 1
+
+            # 標籤分佈
+            for tag in tags:
+                stats["tag_distribution"][tag] += 1
+
+                # skill-read 中的 Skill 名稱
+                if tag == "skill-read":
+                    if "/skills/" in summary or "\\skills\\" in summary:
+                        # 支援 Unix 和 Windows 路徑分隔符
+                        path_parts = summary.replace("\\", "/").split("/skills/")
+                        if len(path_parts) > 1:
+                            skill_name = path_parts[1].split("/")[0]
+                            stats["unique_skills"].add(skill_name)
+
+            # 輸出長度（排除研究類任務，其報告完整性不受字元限制）
+            if output_len:
+                if task_key in RESEARCH_EXCLUDE_KEYS:
+                    stats["excluded_research_calls"] += 1
+                else:
+                    total_output_len += output_len
+                    call_count += 1
 
         if stats["total_calls"] > 0:
             stats["data_available"] = True
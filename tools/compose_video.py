@@ -4,15 +4,24 @@ tools/compose_video.py
 計算每個場景的幀數（ffprobe 讀音訊時長 × fps），
 下載 AI 場景背景圖（Pollinations.ai，無需 API Key），
 輸出 remotion-data.json 供 Remotion 渲染使用。
+
+資產準備以有界執行緒池並行（--workers）：ffprobe 與圖片下載同時進行。
+每個 slug 一份資產快取（video-studio/.cache/compose-<slug>.json）記錄：
+  - 音訊時長：以檔案大小 + mtime 為鍵，未變動的音訊不再 ffprobe
+  - 場景圖：prompt / 場景位置 / 類型與檔案 md5，未變動的場景不再下載或重算 md5
+音訊與圖片目錄改為增量同步，只複製變動的檔案並移除已不存在的場景資產；
+因此只修改一個場景後重跑，只會重做該場景的工作。
 """
 
 import argparse
 import hashlib
 import json
+import os
 import shutil
 import subprocess
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from urllib.parse import quote as url_quote
 
@@ -22,6 +31,9 @@ try:
 except ImportError:
     HAS_REQUESTS = False
 
+DEFAULT_WORKERS = 4
+CACHE_VERSION = 1
+
 
 def get_audio_duration(audio_path: Path) -> float:
     """用 ffprobe 取得音訊時長（秒）。找不到檔案回傳 0.0。"""
@@ -55,6 +67,113 @@ def duration_to_frames(duration_s: float, fps: int, min_frames: int = 30) -> int
     return max(frames, min_frames)
 
 
+def _stat_signature(path: Path) -> list[int] | None:
+    """檔案的 [size, mtime_ns]；不存在時回傳 None。"""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+class AssetCache:
+    """compose 的資產快取：音訊時長與場景圖紀錄（一個 slug 一份 JSON）。"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        data = {}
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            pass
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            data = {}
+        self.durations: dict[str, dict] = data.get("durations", {})
+        self.images: dict[str, dict] = data.get("images", {})
+
+    def duration(self, audio_path: Path) -> float | None:
+        entry = self.durations.get(str(audio_path.resolve()))
+        if entry and entry.get("stat") == _stat_signature(audio_path):
+            return float(entry["duration"])
+        return None
+
+    def set_duration(self, audio_path: Path, duration: float):
+        self.durations[str(audio_path.resolve())] = {
+            "stat": _stat_signature(audio_path),
+            "duration": duration,
+        }
+
+    def image(self, scene_id: str, dest_path: Path, **fields) -> dict | None:
+        """場景圖紀錄仍有效（prompt 等欄位相同且檔案未變）時回傳紀錄。"""
+        record = self.images.get(scene_id)
+        if not record or record.get("stat") != _stat_signature(dest_path):
+            return None
+        if any(record.get(key) != value for key, value in fields.items()):
+            return None
+        return record
+
+    def set_image(self, scene_id: str, dest_path: Path, md5: str, **fields):
+        self.images[scene_id] = {**fields, "md5": md5, "stat": _stat_signature(dest_path)}
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.tmp")
+        payload = {"version": CACHE_VERSION, "durations": self.durations, "images": self.images}
+        tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+def submit_probes(audio_paths: list[Path], cache: AssetCache | None, pool: ThreadPoolExecutor) -> dict:
+    """送出音訊時長查詢：快取命中（大小與 mtime 未變）時直接給值，否則交給執行緒池跑 ffprobe。
+
+    回傳 {path: 秒數或 Future}，交由 collect_probes() 取回結果。
+    """
+    jobs: dict = {}
+    for path in dict.fromkeys(audio_paths):
+        cached = cache.duration(path) if cache else None
+        jobs[path] = cached if cached is not None else pool.submit(get_audio_duration, path)
+    return jobs
+
+
+def collect_probes(jobs: dict, cache: AssetCache | None) -> dict[Path, float]:
+    durations: dict[Path, float] = {}
+    for path, job in jobs.items():
+        if isinstance(job, float):
+            durations[path] = job
+            continue
+        durations[path] = job.result()
+        if cache and durations[path] > 0:
+            cache.set_duration(path, durations[path])
+    if cache:
+        current = {str(path.resolve()) for path in jobs}
+        cache.durations = {key: entry for key, entry in cache.durations.items() if key in current}
+    return durations
+
+
+def sync_files(sources: list[Path], dest_dir: Path) -> tuple[int, int, int]:
+    """增量同步：只複製大小或 mtime 不同的檔案，並刪除 dest_dir 中不在 sources 的檔案。
+
+    回傳 (複製, 略過, 刪除) 數量。shutil.copy2 會保留 mtime，未變動的檔案下次即可略過。
+    """
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    names = set()
+    copied = skipped = 0
+    for src in sources:
+        names.add(src.name)
+        dest = dest_dir / src.name
+        if _stat_signature(dest) == _stat_signature(src):
+            skipped += 1
+            continue
+        shutil.copy2(src, dest)
+        copied += 1
+    removed = 0
+    for stale in dest_dir.iterdir():
+        if stale.is_file() and stale.name not in names:
+            stale.unlink()
+            removed += 1
+    return copied, skipped, removed
+
+
 # 專有名詞／抽象詞 → 圖庫可搜到的具體英文關鍵字（依內容選圖用）
 CONTENT_TO_KEYWORDS = {
     "avalokitesvara": "statue,buddha,temple",
@@ -159,39 +278,70 @@ def _file_md5(path: Path) -> str:
     return hashlib.md5(path.read_bytes()).hexdigest()[:8]
 
 
-def fetch_images_for_scenes(scenes: list, public_dir: Path, slug: str) -> dict[str, str]:
-    """為所有場景下載背景圖（依內容關鍵字）。若與前一張重複則用場景類型 fallback 重試。"""
+def fetch_images_for_scenes(
+    scenes: list,
+    public_dir: Path,
+    slug: str,
+    *,
+    cache: AssetCache | None = None,
+    pool: ThreadPoolExecutor | None = None,
+) -> dict[str, str]:
+    """為所有場景下載背景圖（依內容關鍵字）。若與前一張重複則用場景類型 fallback 重試。
+
+    快取紀錄仍有效的場景直接沿用既有圖片；其餘場景並行下載，
+    再依場景順序做重複圖檢查（fallback 重試維持循序，結果與逐張下載一致）。
+    """
     if not HAS_REQUESTS:
         return {}
 
     image_dir = public_dir / "images" / slug
-    if image_dir.exists():
-        shutil.rmtree(image_dir)
-    image_dir.mkdir(parents=True)
-
-    image_map: dict[str, str] = {}
-    seen_md5: set[str] = set()
+    image_dir.mkdir(parents=True, exist_ok=True)
 
+    planned = []
     for idx, scene in enumerate(scenes):
-        scene_id = scene.get("id", "")
-        scene_type = scene.get("type", "content_slide")
         image_prompt = scene.get("imagePrompt", "")
         if not image_prompt:
             continue
-
+        scene_id = scene.get("id", "")
+        fields = {"prompt": image_prompt, "index": idx, "type": scene.get("type", "content_slide")}
         dest_path = image_dir / f"{scene_id}.jpg"
-        print(f"  [IMG] {scene_id}: 下載圖片... prompt={image_prompt[:50]}")
-        success = fetch_scene_image(image_prompt, dest_path, scene_index=idx)
+        record = cache.image(scene_id, dest_path, **fields) if cache else None
+        planned.append((idx, scene_id, fields, dest_path, record))
+
+    to_fetch = [item for item in planned if item[4] is None]
+    for _, scene_id, fields, _, _ in to_fetch:
+        print(f"  [IMG] {scene_id}: 下載圖片... prompt={fields['prompt'][:50]}")
+
+    def fetch(item) -> bool:
+        idx, _, fields, dest_path, _ = item
+        return fetch_scene_image(fields["prompt"], dest_path, scene_index=idx)
+
+    own_pool = pool is None
+    pool = pool or ThreadPoolExecutor(max_workers=DEFAULT_WORKERS)
+    try:
+        fetched = dict(zip((item[1] for item in to_fetch), pool.map(fetch, to_fetch)))
+    finally:
+        if own_pool:
+            pool.shutdown()
+
+    image_map: dict[str, str] = {}
+    seen_md5: set[str] = set()
+    for idx, scene_id, fields, dest_path, record in planned:
+        if record is not None:
+            seen_md5.add(record["md5"])
+            image_map[scene_id] = f"images/{slug}/{scene_id}.jpg"
+            continue
 
+        success = fetched[scene_id]
         if success and dest_path.exists():
             current_md5 = _file_md5(dest_path)
             if current_md5 in seen_md5:
                 fallback_kw = SCENE_TYPE_FALLBACK_KEYWORDS.get(
-                    scene_type, "nature,landscape"
+                    fields["type"], "nature,landscape"
                 )
                 print(f"  [IMG] {scene_id}: 與前面某張重複，改用 fallback 關鍵字 [{fallback_kw}] 重試")
                 retry_ok = fetch_scene_image(
-                    image_prompt,
+                    fields["prompt"],
                     dest_path,
                     scene_index=idx,
                     keywords_override=fallback_kw,
@@ -201,30 +351,46 @@ def fetch_images_for_scenes(scenes: list, public_dir: Path, slug: str) -> dict[s
                     current_md5 = _file_md5(dest_path)
             seen_md5.add(current_md5)
             image_map[scene_id] = f"images/{slug}/{scene_id}.jpg"
+            if cache:
+                cache.set_image(scene_id, dest_path, current_md5, **fields)
             print(f"  [IMG] {scene_id}: ✓ 儲存完成")
         else:
             print(f"  [IMG] {scene_id}: ✗ 失敗，使用 fallback 背景")
 
+    # 移除已不屬於任何場景（或本次下載失敗）的舊圖
+    keep = {f"{scene_id}.jpg" for scene_id in image_map}
+    for stale in image_dir.iterdir():
+        if stale.is_file() and stale.name not in keep:
+            stale.unlink()
+    if cache:
+        cache.images = {scene_id: cache.images[scene_id] for scene_id in image_map if scene_id in cache.images}
     return image_map
 
 
 def copy_audio_to_public(audio_dir: Path, public_dir: Path, slug: str) -> Path:
-    """複製音訊檔案到 video-studio/public/audio/<slug>/ 供 Remotion staticFile() 使用。"""
+    """同步音訊檔案到 video-studio/public/audio/<slug>/ 供 Remotion staticFile() 使用（只複製變動的檔案）。"""
     dest_dir = public_dir / "audio" / slug
-    if dest_dir.exists():
-        shutil.rmtree(dest_dir)
-    dest_dir.mkdir(parents=True)
-
-    copied = 0
-    for mp3 in audio_dir.glob("*.mp3"):
-        shutil.copy2(mp3, dest_dir / mp3.name)
-        copied += 1
+    copied, skipped, removed = sync_files(sorted(audio_dir.glob("*.mp3")), dest_dir)
 
-    print(f"[INFO] 已複製 {copied} 個音訊檔案到 {dest_dir}")
+    print(f"[INFO] 音訊同步到 {dest_dir}：複製 {copied}、未變動 {skipped}、移除 {removed}")
     return dest_dir
 
 
-def compose(storyboard_path: Path, audio_dir: Path, fps: int, output_path: Path):
+def _scene_audio_path(scene: dict, audio_dir: Path) -> Path:
+    """推斷場景對應的音訊檔（與 script_file 同名、副檔名改 .mp3；無 script_file 時用場景 id）。"""
+    script_file = scene.get("script_file", "")
+    if script_file:
+        return audio_dir / f"{Path(script_file).stem}.mp3"
+    return audio_dir / f"{scene.get('id', '')}.mp3"
+
+
+def compose(
+    storyboard_path: Path,
+    audio_dir: Path,
+    fps: int,
+    output_path: Path,
+    workers: int = DEFAULT_WORKERS,
+):
     """讀取 storyboard.json，計算幀數，輸出 remotion-data.json。"""
     with open(storyboard_path, encoding="utf-8") as f:
         storyboard = json.load(f)
@@ -239,30 +405,29 @@ def compose(storyboard_path: Path, audio_dir: Path, fps: int, output_path: Path)
     # public_dir = tools/video-studio/public/
     video_studio_dir = output_path.parent.parent.parent
     public_dir = video_studio_dir / "public"
+    cache = AssetCache(video_studio_dir / ".cache" / f"compose-{slug}.json")
 
-    # 複製音訊到 public/audio/<slug>/
+    # 同步音訊到 public/audio/<slug>/
     copy_audio_to_public(audio_dir, public_dir, slug)
 
-    # 下載 AI 場景背景圖到 public/images/<slug>/
-    print("[INFO] 開始下載 AI 場景背景圖...")
-    image_map = fetch_images_for_scenes(scenes_in, public_dir, slug)
+    audio_paths = [_scene_audio_path(scene, audio_dir) for scene in scenes_in]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        # ffprobe 先送進執行緒池，與圖片下載同時進行
+        probes = submit_probes(audio_paths, cache, pool)
+
+        # 下載 AI 場景背景圖到 public/images/<slug>/
+        print("[INFO] 開始下載 AI 場景背景圖...")
+        image_map = fetch_images_for_scenes(scenes_in, public_dir, slug, cache=cache, pool=pool)
+        durations = collect_probes(probes, cache)
+    cache.save()
     if image_map:
         print(f"[INFO] 成功下載 {len(image_map)} / {len(scenes_in)} 張場景圖")
     else:
         print("[INFO] 未下載任何場景圖（無 imagePrompt 或 requests 未安裝），使用 fallback 背景")
 
-    for scene in scenes_in:
+    for scene, audio_path in zip(scenes_in, audio_paths):
         scene_id = scene.get("id", "")
-        script_file = scene.get("script_file", "")
-
-        # 推斷對應音訊檔名（同名，副檔名改 .mp3）
-        if script_file:
-            stem = Path(script_file).stem
-            audio_path = audio_dir / f"{stem}.mp3"
-        else:
-            audio_path = audio_dir / f"{scene_id}.mp3"
-
-        duration_s = get_audio_duration(audio_path)
+        duration_s = durations[audio_path]
         frames = duration_to_frames(duration_s, fps)
 
         # 使用相對於 public/ 的路徑，讓 Remotion staticFile() 可以正確解析
@@ -309,6 +474,7 @@ def main():
     parser.add_argument("--audio-dir", required=True, help="audio/ 目錄路徑")
     parser.add_argument("--fps", type=int, default=30, help="影格率")
     parser.add_argument("--output", required=True, help="remotion-data.json 輸出路徑")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="ffprobe / 圖片下載並行數")
     args = parser.parse_args()
 
     storyboard_path = Path(args.storyboard)
@@ -320,7 +486,7 @@ def main():
         sys.exit(1)
 
     print(f"[INFO] 讀取分鏡稿: {storyboard_path}")
-    total_frames, scene_count = compose(storyboard_path, audio_dir, args.fps, output_path)
+    total_frames, scene_count = compose(storyboard_path, audio_dir, args.fps, output_path, args.workers)
 
     duration_s = total_frames / args.fps
     print(f"[DONE] remotion-data.json 已寫入: {output_path}")
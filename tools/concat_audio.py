@@ -7,15 +7,31 @@ Podcast 音訊後製：
   4. loudnorm 正規化（-14 LUFS）
   5. 輸出 MP3 128kbps
 
+預設管線（render_podcast）：
+  - turn 正規化以執行緒池並行驅動多個 ffmpeg 行程，結果依來源內容 sha256
+    快取（podcasts/.tts-cache/wav，超過 WAV_CACHE_MAX_AGE_DAYS 未用或總量超過
+    WAV_CACHE_MAX_BYTES 時由最久未用的開始清除），重跑時不再轉檔
+  - intro/outro 以 lavfi 輸入、段落間靜音以 apad 在 filtergraph 內生成
+  - concat + 兩趟響度正規化 + libmp3lame 由同一個 filtergraph 完成：第一趟以 ebur128
+    量測（輸出到 null），第二趟依量測值套用固定增益或 loudnorm 並直接編碼 MP3，
+    不再寫出 concat_raw.wav / concat_norm.wav 等中間檔
+--legacy-pipeline 保留舊的逐步流程（concat_and_export，單趟 loudnorm）。
+
 注意：concat demuxer 需要所有輸入格式完全一致，
-      因此先把 intro/outro/silence/turn 都轉成相同 WAV 格式再串接。
+      因此舊流程先把 intro/outro/silence/turn 都轉成相同 WAV 格式再串接。
 """
 
 import argparse
+import hashlib
 import json
+import math
+import os
+import re
 import subprocess
 import sys
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import yaml
@@ -24,6 +40,16 @@ import yaml
 SAMPLE_RATE = 24000
 CHANNELS = 1
 CODEC = "pcm_s16le"
+SAMPLE_FORMAT = "s16"
+# 與舊流程輸出的 MP3 取樣率一致（舊流程 loudnorm 升頻到 192kHz 後由 libmp3lame 降到 48kHz）
+OUTPUT_SAMPLE_RATE = 48000
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_WAV_CACHE_DIR = REPO_ROOT / "podcasts" / ".tts-cache" / "wav"
+WAV_CACHE_MAX_BYTES = 1 << 30  # 約 90 集的 turn WAV
+WAV_CACHE_MAX_AGE_DAYS = 30
+LOUDNORM_TP = -1
+LOUDNORM_LRA = 11
 
 
 def load_config(config_path: str) -> dict:
@@ -57,6 +83,20 @@ def normalize_to_wav(input_path: Path, output_path: Path):
     )
 
 
+def chord_input(freqs: list[float], weights: list[float], duration_s: float) -> list[str]:
+    """和弦的 lavfi 輸入參數：aevalsrc 運算式 Σ(weight * sin(2π * t * freq))。"""
+    if len(freqs) != len(weights):
+        raise ValueError("freqs 與 weights 長度必須相同")
+    terms = [f"{w:.3f}*sin(2*PI*t*{f})" for f, w in zip(freqs, weights)]
+    expr = "+".join(terms)
+    return ["-f", "lavfi", "-i", f"aevalsrc={expr}:s={SAMPLE_RATE}:d={duration_s}"]
+
+
+def fade_filter(duration_s: float, fade_in_s: float, fade_out_s: float) -> str:
+    fade_out_start = max(0.0, duration_s - fade_out_s)
+    return f"afade=t=in:d={fade_in_s},afade=t=out:st={fade_out_start}:d={fade_out_s}"
+
+
 def generate_chord(
     freqs: list[float],
     weights: list[float],
@@ -70,18 +110,9 @@ def generate_chord(
     freqs   : 頻率列表（Hz），例如 [264, 330, 396]
     weights : 對應權重（建議總和 ≤ 1 以防削波）
     """
-    if len(freqs) != len(weights):
-        raise ValueError("freqs 與 weights 長度必須相同")
-
-    # 建立 aevalsrc 運算式：Σ(weight * sin(2π * t * freq))
-    terms = [f"{w:.3f}*sin(2*PI*t*{f})" for f, w in zip(freqs, weights)]
-    expr = "+".join(terms)
-
-    fade_out_start = max(0.0, duration_s - fade_out_s)
     ffmpeg(
-        "-f", "lavfi",
-        "-i", f"aevalsrc={expr}:s={SAMPLE_RATE}:d={duration_s}",
-        "-af", f"afade=t=in:d={fade_in_s},afade=t=out:st={fade_out_start}:d={fade_out_s}",
+        *chord_input(freqs, weights, duration_s),
+        "-af", fade_filter(duration_s, fade_in_s, fade_out_s),
         "-ar", str(SAMPLE_RATE),
         "-ac", str(CHANNELS),
         "-acodec", CODEC,
@@ -134,6 +165,20 @@ def resolve_host_key(turn: dict) -> str:
     return "host_a"
 
 
+def collect_turn_audio(audio_dir: Path, turns: list[dict]) -> list[Path]:
+    """依 turn 順序列出存在的 turn_XXX_host.mp3；缺漏的段落警告後跳過。"""
+    files: list[Path] = []
+    for turn in turns:
+        turn_num = turn.get("turn", 0)
+        host = resolve_host_key(turn)
+        mp3_file = audio_dir / f"turn_{turn_num:03d}_{host}.mp3"
+        if not mp3_file.exists():
+            print(f"[WARN] 音訊段落不存在，跳過: {mp3_file}", file=sys.stderr)
+            continue
+        files.append(mp3_file)
+    return files
+
+
 def concat_and_export(
     audio_dir: Path,
     turns: list[dict],
@@ -145,25 +190,19 @@ def concat_and_export(
     target_lufs: float,
     norm_dir: Path,
 ):
-    """串接音訊、正規化、輸出 MP3。"""
+    """串接音訊、正規化、輸出 MP3（舊流程：每一步都寫出中間 WAV）。"""
 
     # Step 1：將所有 turn MP3 轉換為統一 WAV 格式
     print("[INFO] 將 TTS 段落轉換為統一 WAV 格式...")
     turn_wavs: list[Path] = []
-    for turn in turns:
-        turn_num = turn.get("turn", 0)
-        host = resolve_host_key(turn)
-        mp3_file = audio_dir / f"turn_{turn_num:03d}_{host}.mp3"
-        if not mp3_file.exists():
-            print(f"[WARN] 音訊段落不存在，跳過: {mp3_file}", file=sys.stderr)
-            continue
-        wav_file = norm_dir / f"turn_{turn_num:03d}_{host}.wav"
+    for mp3_file in collect_turn_audio(audio_dir, turns):
+        wav_file = norm_dir / f"{mp3_file.stem}.wav"
         normalize_to_wav(mp3_file, wav_file)
-        turn_wavs.append((turn, wav_file))
+        turn_wavs.append(wav_file)
 
     # Step 2：組合 intro + turns + silences + outro（全部為相同格式 WAV）
     segments: list[Path] = [intro_wav]
-    for turn, wav_file in turn_wavs:
+    for wav_file in turn_wavs:
         segments.append(wav_file)
         segments.append(silence_wav)
     # 移除最後多餘的靜音，加上 outro
@@ -211,12 +250,274 @@ def concat_and_export(
     )
 
 
+def source_digest(path: Path) -> str:
+    """正規化快取鍵：來源音訊內容 + 目標格式的 sha256。"""
+    digest = hashlib.sha256(f"{SAMPLE_RATE}:{CHANNELS}:{CODEC}\n".encode("utf-8"))
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalize_turns(sources: list[Path], cache_dir: Path, workers: int | None = None) -> list[Path]:
+    """把各段 turn 轉成統一 WAV，依來源內容快取；回傳與 sources 同序的 WAV 路徑。
+
+    每段是獨立的 ffmpeg 行程，執行緒池只負責等待行程結束，
+    因此可同時跑 workers 個轉檔而不受 GIL 限制。
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    targets = [cache_dir / f"{source_digest(src)}.wav" for src in sources]
+    pending: dict[Path, Path] = {}
+    for src, target in zip(sources, targets):
+        if target in pending:
+            continue
+        if target.exists() and target.stat().st_size > 0:
+            os.utime(target)  # 命中即更新 mtime，prune_wav_cache 依此判斷最近使用
+        else:
+            pending[target] = src
+    if pending:
+        print(f"[INFO] 正規化 {len(pending)} 段（快取命中 {len(set(targets)) - len(pending)} 段）...")
+        workers = workers or min(8, os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            list(pool.map(lambda item: _normalize_into(item[1], item[0]), pending.items()))
+    else:
+        print(f"[INFO] {len(targets)} 段皆命中正規化快取")
+    return targets
+
+
+def prune_wav_cache(
+    cache_dir: Path,
+    keep: list[Path] | None = None,
+    *,
+    max_bytes: int = WAV_CACHE_MAX_BYTES,
+    max_age_days: float = WAV_CACHE_MAX_AGE_DAYS,
+) -> int:
+    """清除過久未用的快取 WAV，總量仍超過 max_bytes 時由最久未用的開始刪；回傳刪除數。
+
+    keep（本集用到的 WAV）不會被刪除。
+    """
+    keep_set = {Path(path) for path in keep or ()}
+    entries = []
+    for path in cache_dir.glob("*.wav"):
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    entries.sort()
+    cutoff = time.time() - max_age_days * 86400
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for mtime, size, path in entries:
+        if path in keep_set or (mtime >= cutoff and total <= max_bytes):
+            continue
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def _normalize_into(source: Path, target: Path) -> None:
+    # 先寫入 .part.wav 再改名，中斷時不會留下半成品被當成快取
+    partial = target.with_name(f"{target.stem}.part.wav")
+    try:
+        normalize_to_wav(source, partial)
+        os.replace(partial, target)
+    finally:
+        partial.unlink(missing_ok=True)
+
+
+MEASURE_FILTER = "ebur128=peak=true:framelog=quiet"
+
+
+def parse_ebur128_summary(stderr: str) -> dict | None:
+    """從 ebur128 摘要取出 integrated / threshold / LRA / true peak；無法取得有限數值時回傳 None。"""
+    summary = stderr[stderr.rfind("Summary:"):] if "Summary:" in stderr else ""
+    integrated = re.search(r"Integrated loudness:\s*I:\s*(-?[\d.]+|-inf) LUFS\s*Threshold:\s*(-?[\d.]+|-inf) LUFS", summary)
+    lra = re.search(r"LRA:\s*(-?[\d.]+) LU", summary)
+    peak = re.search(r"True peak:\s*Peak:\s*(-?[\d.]+|-inf) dBFS", summary)
+    if not (integrated and lra and peak):
+        return None
+    stats = {
+        "input_i": float(integrated.group(1)),
+        "input_thresh": float(integrated.group(2)),
+        "input_lra": float(lra.group(1)),
+        "input_tp": float(peak.group(1)),
+    }
+    if not all(math.isfinite(value) for value in stats.values()):
+        return None
+    return stats
+
+
+def loudness_filter(target_lufs: float, measured: dict | None) -> str:
+    """依第一趟量測值決定第二趟的正規化濾鏡。
+
+    與 loudnorm 兩趟模式（linear=true）的判斷一致：增益後 true peak 不超過 TP、
+    且量測 LRA 不大於目標 LRA 時，正規化就是固定增益，直接用 volume（不必升頻到 192kHz）；
+    否則帶入量測值做 loudnorm 動態正規化。
+    """
+    base = f"loudnorm=I={target_lufs}:TP={LOUDNORM_TP}:LRA={LOUDNORM_LRA}"
+    if measured is None:
+        return base
+    gain = target_lufs - measured["input_i"]
+    if measured["input_tp"] + gain <= LOUDNORM_TP and measured["input_lra"] <= LOUDNORM_LRA:
+        return f"volume={gain:.2f}dB"
+    return (
+        f"{base}:measured_I={measured['input_i']}:measured_TP={measured['input_tp']}"
+        f":measured_LRA={measured['input_lra']}:measured_thresh={measured['input_thresh']}"
+    )
+
+
+def build_filtergraph(
+    turn_count: int,
+    *,
+    silence_ms: int,
+    tone_duration_s: float,
+    fade_in_s: float,
+    fade_out_s: float,
+    loudness: str,
+) -> str:
+    """產生 intro + turns（段落間 apad 靜音）+ outro → concat → loudness 的 filtergraph。
+
+    輸入順序：0 = intro（lavfi），1..turn_count = 各段 WAV，turn_count + 1 = outro（lavfi）；
+    輸出標籤為 [out]。loudness 為量測（MEASURE_FILTER）或正規化濾鏡。
+    """
+    fmt = f"aformat=sample_fmts={SAMPLE_FORMAT}:sample_rates={SAMPLE_RATE}:channel_layouts=mono"
+    fades = fade_filter(tone_duration_s, fade_in_s, fade_out_s)
+    chains = [f"[0:a]{fades},{fmt}[s0]"]
+    for index in range(1, turn_count + 1):
+        pad = f",apad=pad_dur={silence_ms / 1000.0}" if index < turn_count and silence_ms > 0 else ""
+        chains.append(f"[{index}:a]{fmt}{pad}[s{index}]")
+    outro = turn_count + 1
+    chains.append(f"[{outro}:a]{fades},{fmt}[s{outro}]")
+    labels = "".join(f"[s{index}]" for index in range(outro + 1))
+    chains.append(f"{labels}concat=n={outro + 1}:v=0:a=1[cat]")
+    if loudness == MEASURE_FILTER:
+        chains.append(f"[cat]{loudness}[out]")
+    else:
+        chains.append(f"[cat]{loudness},aresample={OUTPUT_SAMPLE_RATE}[out]")
+    return ";".join(chains)
+
+
+def render_podcast(
+    turn_wavs: list[Path],
+    output_mp3: Path,
+    *,
+    intro: list[str],
+    outro: list[str],
+    silence_ms: int,
+    tone_duration_s: float,
+    fade_in_s: float,
+    fade_out_s: float,
+    bitrate_kbps: int,
+    target_lufs: float,
+    measure: bool = True,
+):
+    """以同一 filtergraph 完成串接、兩趟響度正規化與 MP3 編碼，不寫中間檔。
+
+    intro / outro 為 chord_input() 產生的 lavfi 輸入參數。
+    measure=False 時略過 ebur128 量測，改為單趟 loudnorm 動態正規化。
+    """
+    inputs = [*intro]
+    for wav in turn_wavs:
+        inputs += ["-i", str(wav)]
+    inputs += outro
+
+    def graph(loudness: str) -> str:
+        return build_filtergraph(
+            len(turn_wavs),
+            silence_ms=silence_ms,
+            tone_duration_s=tone_duration_s,
+            fade_in_s=fade_in_s,
+            fade_out_s=fade_out_s,
+            loudness=loudness,
+        )
+
+    stats = None
+    if measure:
+        print(f"[INFO] 量測響度（{len(turn_wavs)} 段 + intro/outro）...")
+        measured = ffmpeg(
+            "-nostats",
+            *inputs,
+            "-filter_complex", graph(MEASURE_FILTER),
+            "-map", "[out]",
+            "-f", "null", "-",
+        )
+        stats = parse_ebur128_summary(measured.stderr)
+        if stats is None:
+            print("[WARN] 無法取得響度量測值，改用單趟 loudnorm 動態正規化", file=sys.stderr)
+    loudness = loudness_filter(target_lufs, stats)
+
+    output_mp3.parent.mkdir(parents=True, exist_ok=True)
+    mode = "固定增益" if loudness.startswith("volume=") else "loudnorm"
+    print(f"[INFO] 串接 + 正規化 ({target_lufs} LUFS，{mode}) + 匯出 MP3 ({bitrate_kbps}kbps)...")
+    ffmpeg(
+        *inputs,
+        "-filter_complex", graph(loudness),
+        "-map", "[out]",
+        "-codec:a", "libmp3lame",
+        "-b:a", f"{bitrate_kbps}k",
+        str(output_mp3),
+    )
+
+
+def _run_legacy_pipeline(
+    audio_dir: Path,
+    turns: list[dict],
+    output_mp3: Path,
+    *,
+    intro: tuple[list[float], list[float]],
+    outro: tuple[list[float], list[float]],
+    tone_duration: float,
+    fade_in_s: float,
+    fade_out_s: float,
+    silence_ms: int,
+    bitrate_kbps: int,
+    target_lufs: float,
+):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp = Path(tmp_dir)
+        intro_wav = tmp / "intro.wav"
+        outro_wav = tmp / "outro.wav"
+        silence_wav = tmp / "silence.wav"
+        norm_dir = tmp / "normalized"
+        norm_dir.mkdir()
+
+        print(f"[INFO] 生成 Intro 和弦（{intro[0]} Hz）...")
+        generate_chord(*intro, tone_duration, fade_in_s, fade_out_s, intro_wav)
+
+        print(f"[INFO] 生成 Outro 和弦（{outro[0]} Hz）...")
+        generate_chord(*outro, tone_duration, fade_in_s, fade_out_s, outro_wav)
+
+        print(f"[INFO] 生成 {silence_ms}ms 靜音段落...")
+        generate_silence(silence_ms, silence_wav)
+
+        concat_and_export(
+            audio_dir=audio_dir,
+            turns=turns,
+            intro_wav=intro_wav,
+            outro_wav=outro_wav,
+            silence_wav=silence_wav,
+            output_mp3=output_mp3,
+            bitrate_kbps=bitrate_kbps,
+            target_lufs=target_lufs,
+            norm_dir=norm_dir,
+        )
+
+
 def main():
     parser = argparse.ArgumentParser(description="Podcast 音訊後製：串接 + 正規化 + MP3 輸出")
     parser.add_argument("--audio-dir", required=True, help="podcast-audio/ 目錄路徑")
     parser.add_argument("--script", required=True, help="podcast-script.jsonl 路徑")
     parser.add_argument("--output", required=True, help="輸出 MP3 路徑")
     parser.add_argument("--config", default="config/media-pipeline.yaml")
+    parser.add_argument("--workers", type=int, default=None, help="並行正規化的 ffmpeg 行程數（預設 min(8, CPU)）")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_WAV_CACHE_DIR), help="正規化 WAV 快取目錄")
+    parser.add_argument("--no-cache", action="store_true", help="正規化 WAV 只寫入暫存目錄")
+    parser.add_argument("--legacy-pipeline", action="store_true", help="使用舊的逐步串接流程（每步寫中間 WAV）")
     args = parser.parse_args()
 
     audio_dir = Path(args.audio_dir)
@@ -244,37 +545,34 @@ def main():
     outro_freqs = cfg.get("outro_freqs_hz", [cfg.get("outro_freq_hz", 330)])
     outro_weights = cfg.get("outro_weights", [0.35] * len(outro_freqs))
 
-    with tempfile.TemporaryDirectory() as tmp_dir:
-        tmp = Path(tmp_dir)
-        intro_wav = tmp / "intro.wav"
-        outro_wav = tmp / "outro.wav"
-        silence_wav = tmp / "silence.wav"
-        norm_dir = tmp / "normalized"
-        norm_dir.mkdir()
+    turns = read_turn_order(script_path)
+    print(f"[INFO] 共 {len(turns)} 段對話，開始處理...")
 
-        print(f"[INFO] 生成 Intro 和弦（{intro_freqs} Hz）...")
-        generate_chord(intro_freqs, intro_weights, tone_duration, fade_in_s, fade_out_s, intro_wav)
-
-        print(f"[INFO] 生成 Outro 和弦（{outro_freqs} Hz）...")
-        generate_chord(outro_freqs, outro_weights, tone_duration, fade_in_s, fade_out_s, outro_wav)
-
-        print(f"[INFO] 生成 {silence_ms}ms 靜音段落...")
-        generate_silence(silence_ms, silence_wav)
-
-        turns = read_turn_order(script_path)
-        print(f"[INFO] 共 {len(turns)} 段對話，開始處理...")
-
-        concat_and_export(
-            audio_dir=audio_dir,
-            turns=turns,
-            intro_wav=intro_wav,
-            outro_wav=outro_wav,
-            silence_wav=silence_wav,
-            output_mp3=output_mp3,
-            bitrate_kbps=bitrate_kbps,
-            target_lufs=target_lufs,
-            norm_dir=norm_dir,
+    if args.legacy_pipeline:
+        _run_legacy_pipeline(
+            audio_dir, turns, output_mp3,
+            intro=(intro_freqs, intro_weights), outro=(outro_freqs, outro_weights),
+            tone_duration=tone_duration, fade_in_s=fade_in_s, fade_out_s=fade_out_s,
+            silence_ms=silence_ms, bitrate_kbps=bitrate_kbps, target_lufs=target_lufs,
         )
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_dir = Path(tmp_dir) if args.no_cache else Path(args.cache_dir)
+            turn_wavs = normalize_turns(collect_turn_audio(audio_dir, turns), cache_dir, args.workers)
+            render_podcast(
+                turn_wavs,
+                output_mp3,
+                intro=chord_input(intro_freqs, intro_weights, tone_duration),
+                outro=chord_input(outro_freqs, outro_weights, tone_duration),
+                silence_ms=silence_ms,
+                tone_duration_s=tone_duration,
+                fade_in_s=fade_in_s,
+                fade_out_s=fade_out_s,
+                bitrate_kbps=bitrate_kbps,
+                target_lufs=target_lufs,
+            )
+            if not args.no_cache:
+                prune_wav_cache(cache_dir, turn_wavs)
 
     print(f"[DONE] Podcast 已輸出至: {output_mp3}")
 
@@ -11,11 +11,19 @@ Context Compression 閾值觸發機制（ADR-036）
 
 此模組由 hooks/post_tool_logger.py 透過 dynamic import 呼叫，
 所有操作必須 silent fail（不可拋出例外影響 Hook 主流程）。
+
+儲存結構：
+  - state/context-usage.sessions/{sid}.json：每個 Session 一個計數檔，
+    update_session 只持該 Session 的 FileLock 讀寫這個小檔（O(1)、團隊模式
+    並行 Agent 不互相覆蓋）
+  - state/context-usage.json：彙總檔，只在 Session 建立與狀態轉換時更新；
+    讀取端以各計數檔覆蓋彙總檔中的對應條目，因此看到的仍是最新累計
 """
 from __future__ import annotations
 
 import json
 import os
+import sys
 from dataclasses import asdict, dataclass, field
 from datetime import datetime, timedelta
 from enum import Enum
@@ -25,6 +33,12 @@ REPO_ROOT = Path(__file__).parent.parent
 STATE_DIR = REPO_ROOT / "state"
 CONTEXT_USAGE_PATH = STATE_DIR / "context-usage.json"
 BUDGET_YAML_PATH = REPO_ROOT / "config" / "budget.yaml"
+SESSIONS_SUFFIX = ".sessions"
+
+_HOOKS_DIR = str(REPO_ROOT / "hooks")
+if _HOOKS_DIR not in sys.path:
+    sys.path.insert(0, _HOOKS_DIR)
+from hook_utils import FileLock, atomic_write_json  # noqa: E402
 
 # 預設閾值（若 budget.yaml 讀取失敗則使用）
 MAX_CONTEXT_TOKENS = 200_000     # Claude Sonnet 4.6 上下文視窗
@@ -51,8 +65,20 @@ class SessionUsage:
 
 # ── 配置載入 ─────────────────────────────────────────────────────────────────
 
+# budget.yaml 閾值快取：(檔案簽章, (warn, critical, max_tokens))
+_thresholds_cache: tuple | None = None
+
+
 def _load_thresholds() -> tuple[float, float, int]:
-    """從 budget.yaml 載入壓縮閾值，失敗時使用預設值。"""
+    """從 budget.yaml 載入壓縮閾值（依 mtime/size 快取），失敗時使用預設值。"""
+    global _thresholds_cache
+    try:
+        st = os.stat(BUDGET_YAML_PATH)
+        signature = (str(BUDGET_YAML_PATH), st.st_mtime_ns, st.st_size)
+    except OSError:
+        return WARN_THRESHOLD, CRITICAL_THRESHOLD, MAX_CONTEXT_TOKENS
+    if _thresholds_cache is not None and _thresholds_cache[0] == signature:
+        return _thresholds_cache[1]
     try:
         import yaml
         with open(BUDGET_YAML_PATH, encoding="utf-8") as f:
@@ -61,20 +87,53 @@ def _load_thresholds() -> tuple[float, float, int]:
         warn = float(cc.get("warn_threshold", WARN_THRESHOLD))
         critical = float(cc.get("critical_threshold", CRITICAL_THRESHOLD))
         max_tokens = int(cc.get("max_context_tokens", MAX_CONTEXT_TOKENS))
-        return warn, critical, max_tokens
     except Exception:
         return WARN_THRESHOLD, CRITICAL_THRESHOLD, MAX_CONTEXT_TOKENS
+    _thresholds_cache = (signature, (warn, critical, max_tokens))
+    return warn, critical, max_tokens
 
 
 # ── 狀態持久化 ────────────────────────────────────────────────────────────────
 
-def _load_context_usage() -> dict:
-    """讀取 state/context-usage.json，不存在時回傳空結構。"""
+def _sessions_dir() -> Path:
+    """Session 計數檔目錄（state/context-usage.sessions）。"""
+    return CONTEXT_USAGE_PATH.with_suffix(SESSIONS_SUFFIX)
+
+
+def _session_path(sid_key: str) -> Path:
+    safe_key = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in sid_key)
+    return _sessions_dir() / f"{safe_key}.json"
+
+
+def _read_json(path: Path) -> dict | None:
     try:
-        with open(CONTEXT_USAGE_PATH, encoding="utf-8") as f:
-            return json.load(f)
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
     except (OSError, json.JSONDecodeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _load_aggregate() -> dict:
+    """只讀彙總檔 state/context-usage.json，不存在時回傳空結構。"""
+    data = _read_json(CONTEXT_USAGE_PATH)
+    if data is None:
         return {"schema_version": 1, "sessions": {}, "updated": ""}
+    data.setdefault("sessions", {})
+    return data
+
+
+def _load_context_usage() -> dict:
+    """讀取彙總檔並以各 Session 計數檔覆蓋（最新累計）。"""
+    data = _load_aggregate()
+    sessions = data["sessions"]
+    sessions_dir = _sessions_dir()
+    if sessions_dir.is_dir():
+        for path in sessions_dir.glob("*.json"):
+            record = _read_json(path)
+            if record is not None:
+                sessions[path.stem] = record
+    return data
 
 
 def _save_context_usage(data: dict) -> None:
@@ -89,16 +148,29 @@ def _save_context_usage(data: dict) -> None:
         pass  # Silent fail
 
 
+def _publish_session(session: SessionUsage) -> None:
+    """Session 建立或狀態轉換時，把最新記錄寫入彙總檔（持彙總檔鎖）。"""
+    try:
+        STATE_DIR.mkdir(parents=True, exist_ok=True)
+        with FileLock(str(CONTEXT_USAGE_PATH)):
+            data = _load_aggregate()
+            data["sessions"][session.session_id] = asdict(session)
+            data["updated"] = datetime.now().isoformat()
+            _save_context_usage(data)
+    except OSError:
+        pass  # Silent fail（含 FileLock 逾時）
+
+
 # ── 公開 API ──────────────────────────────────────────────────────────────────
 
 def get_or_create_session(session_id: str) -> SessionUsage:
     """取得或建立 Session 使用記錄。"""
-    data = _load_context_usage()
-    sessions = data.get("sessions", {})
     sid_key = session_id[:8]
+    s = _read_json(_session_path(sid_key))
+    if s is None:
+        s = _load_aggregate()["sessions"].get(sid_key)
 
-    if sid_key in sessions:
-        s = sessions[sid_key]
+    if s is not None:
         return SessionUsage(
             session_id=s.get("session_id", sid_key),
             phase=s.get("phase", ""),
@@ -120,6 +192,48 @@ def get_or_create_session(session_id: str) -> SessionUsage:
     )
 
 
+def _update_session(
+    session_id: str,
+    input_chars: int,
+    output_chars: int,
+    phase: str = "",
+) -> tuple[SessionUsage, dict, str]:
+    """累計並持久化，回傳 (session, check_threshold 結果, 更新前狀態)。"""
+    sid_key = session_id[:8]
+    path = _session_path(sid_key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with FileLock(str(path)):
+        existing = _read_json(path)
+        created = existing is None
+        if created:
+            # 首次建立計數檔：沿用彙總檔中的舊記錄（升級前的累計）
+            existing = _load_aggregate()["sessions"].get(sid_key, {})
+        previous_state = existing.get("state", ContextState.NORMAL.value)
+        new_input = existing.get("total_input_chars", 0) + input_chars
+        new_output = existing.get("total_output_chars", 0) + output_chars
+        new_tokens = int((new_input + new_output) / 3.5)
+
+        session = SessionUsage(
+            session_id=sid_key,
+            phase=phase or existing.get("phase", ""),
+            total_input_chars=new_input,
+            total_output_chars=new_output,
+            estimated_tokens=new_tokens,
+            last_updated=datetime.now().isoformat(),
+            state=previous_state,
+        )
+
+        # 計算新狀態
+        threshold_result = check_threshold(session)
+        session.state = threshold_result["state"]
+        atomic_write_json(str(path), asdict(session))
+
+    if created or session.state != previous_state:
+        _publish_session(session)
+    return session, threshold_result, previous_state
+
+
 def update_session(
     session_id: str,
     input_chars: int,
@@ -129,6 +243,9 @@ def update_session(
     """
     更新 Session token 累計並持久化。
 
+    只持該 Session 計數檔的鎖讀寫單一小檔；彙總檔僅在 Session 建立與
+    狀態轉換時更新。
+
     Args:
         session_id: Session ID（取前 8 字）
         input_chars: 本次工具呼叫的 input 字元數
@@ -138,35 +255,29 @@ def update_session(
     Returns:
         更新後的 SessionUsage
     """
-    data = _load_context_usage()
-    sessions = data.setdefault("sessions", {})
-    sid_key = session_id[:8]
-
-    existing = sessions.get(sid_key, {})
-    new_input = existing.get("total_input_chars", 0) + input_chars
-    new_output = existing.get("total_output_chars", 0) + output_chars
-    new_tokens = int((new_input + new_output) / 3.5)
-
-    session = SessionUsage(
-        session_id=sid_key,
-        phase=phase or existing.get("phase", ""),
-        total_input_chars=new_input,
-        total_output_chars=new_output,
-        estimated_tokens=new_tokens,
-        last_updated=datetime.now().isoformat(),
-        state=existing.get("state", ContextState.NORMAL.value),
-    )
+    session, _, _ = _update_session(session_id, input_chars, output_chars, phase)
+    return session
 
-    # 計算新狀態
-    _, _, max_tokens = _load_thresholds()
-    threshold_result = check_threshold(session)
-    session.state = threshold_result["state"]
 
-    sessions[sid_key] = asdict(session)
-    data["updated"] = datetime.now().isoformat()
+def record_tool_call(
+    session_id: str,
+    input_chars: int,
+    output_chars: int,
+    phase: str = "",
+) -> dict | None:
+    """
+    post_tool_logger 入口：更新累計，僅在狀態轉換時回傳壓縮提示。
 
-    _save_context_usage(data)
-    return session
+    Returns:
+        狀態轉換到 warning / critical 時回傳 check_threshold() 結果，否則 None
+        （同一狀態內的後續工具呼叫不重複注入提示）
+    """
+    session, threshold_result, previous_state = _update_session(
+        session_id, input_chars, output_chars, phase
+    )
+    if session.state != previous_state and threshold_result["prompt_injection"]:
+        return threshold_result
+    return None
 
 
 def check_threshold(session: SessionUsage) -> dict:
@@ -226,25 +337,36 @@ def check_threshold(session: SessionUsage) -> dict:
 
 def cleanup_stale_sessions(max_age_hours: int = 4) -> int:
     """
-    清除超過 max_age_hours 的舊 Session 記錄。
+    清除超過 max_age_hours 的舊 Session 記錄（彙總檔條目與計數檔）。
 
     Returns:
         清除的 Session 數量
     """
-    data = _load_context_usage()
-    sessions = data.get("sessions", {})
+    if not CONTEXT_USAGE_PATH.exists() and not _sessions_dir().is_dir():
+        return 0
     cutoff = (datetime.now() - timedelta(hours=max_age_hours)).isoformat()
-
-    stale_keys = [
-        k for k, v in sessions.items()
-        if v.get("last_updated", "") < cutoff
-    ]
-
-    for k in stale_keys:
-        del sessions[k]
-
-    if stale_keys:
-        data["updated"] = datetime.now().isoformat()
-        _save_context_usage(data)
+    try:
+        with FileLock(str(CONTEXT_USAGE_PATH)):
+            data = _load_aggregate()
+            sessions = data["sessions"]
+            merged = _load_context_usage()["sessions"]
+
+            stale_keys = [
+                k for k, v in merged.items()
+                if v.get("last_updated", "") < cutoff
+            ]
+
+            for k in stale_keys:
+                sessions.pop(k, None)
+                try:
+                    _session_path(k).unlink()
+                except OSError:
+                    pass
+
+            if stale_keys:
+                data["updated"] = datetime.now().isoformat()
+                _save_context_usage(data)
+    except OSError:
+        return 0
 
     return len(stale_keys)
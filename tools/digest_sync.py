@@ -4,12 +4,19 @@ Daily Digest 長期記憶同步工具。
 
 讀取 context/digest-memory.json，建立可檢索的長期記憶筆記，並以重試機制
 寫入 knowledge-base-search API。
+
+待同步佇列有兩種沖刷模式：
+- serial：逐筆呼叫 sync_note（health + dedup + 單筆 import，三次往返/筆）
+- bulk：每批只檢查一次 health，dedup 查詢以有界執行緒池並行（每個工作執行緒
+  各自一個 requests.Session），整批一次 /api/import，再把部分失敗逐筆對回佇列
 """
 from __future__ import annotations
 
 import argparse
 import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
@@ -22,6 +29,7 @@ REPO_ROOT = Path(__file__).resolve().parent.parent
 DEFAULT_DIGEST_MEMORY_PATH = REPO_ROOT / "context" / "digest-memory.json"
 DEFAULT_CONFIG_PATH = REPO_ROOT / "config" / "long_term_memory.yaml"
 DEFAULT_QUEUE_PATH = REPO_ROOT / "state" / "long_term_memory_sync_queue.json"
+FLUSH_MODES = ("serial", "bulk")
 
 
 def _load_json(path: Path) -> dict[str, Any]:
@@ -173,15 +181,42 @@ def load_sync_settings(config_path: Path = DEFAULT_CONFIG_PATH) -> dict[str, Any
     config = _load_yaml(config_path)
     queue = config.get("sync_queue", {}) if isinstance(config.get("sync_queue"), dict) else {}
     sync = config.get("sync", {}) if isinstance(config.get("sync"), dict) else {}
+    # 設定檔的未知模式退回 serial，不讓整個同步流程因 ValueError 中斷
+    flush_mode = str(queue.get("flush_mode") or "serial").strip().lower()
     return {
         "queue_path": REPO_ROOT / str(queue.get("path", "state/long_term_memory_sync_queue.json")),
         "max_queue_size": int(queue.get("max_items", 2000) or 2000),
         "flush_batch_size": int(queue.get("flush_batch_size", 20) or 20),
+        "flush_mode": flush_mode if flush_mode in FLUSH_MODES else "serial",
+        "flush_max_batches": int(queue.get("flush_max_batches", 0) or 0) or None,
+        "dedup_workers": int(queue.get("dedup_workers", 4) or 4),
         "timeout": int(sync.get("timeout_seconds", 10) or 10),
         "max_retries": int(sync.get("max_retries", 3) or 3),
     }
 
 
+def _resolve_existing_id(
+    base_url: str,
+    note: dict[str, Any],
+    *,
+    session: requests.Session,
+    timeout: int,
+) -> None:
+    """以 hybrid 搜尋找同一 digestDate 的既有筆記；命中時寫入 note["id"]，讓 import 走 upsert。"""
+    dedup = session.post(
+        f"{base_url}/api/search/hybrid",
+        json={"query": note["title"], "topK": 3, "topic": note.get("topic")},
+        timeout=timeout,
+    )
+    dedup.raise_for_status()
+    items = dedup.json().get("items", [])
+    for item in items:
+        metadata = item.get("metadata", {})
+        if metadata.get("digestDate") == note.get("digestDate"):
+            note["id"] = item.get("id")
+            break
+
+
 def sync_note(
     base_url: str,
     note: dict[str, Any],
@@ -192,7 +227,6 @@ def sync_note(
     sleep_seconds: float = 0.5,
 ) -> SyncResult:
     session = session or requests.Session()
-    title_query = note["title"]
     attempts = 0
     last_error = ""
     for attempt in range(1, max_retries + 1):
@@ -201,18 +235,7 @@ def sync_note(
             health = session.get(f"{base_url}/api/health", timeout=timeout)
             health.raise_for_status()
 
-            dedup = session.post(
-                f"{base_url}/api/search/hybrid",
-                json={"query": title_query, "topK": 3, "topic": note.get("topic")},
-                timeout=timeout,
-            )
-            dedup.raise_for_status()
-            items = dedup.json().get("items", [])
-            for item in items:
-                metadata = item.get("metadata", {})
-                if metadata.get("digestDate") == note.get("digestDate"):
-                    note["id"] = item.get("id")
-                    break
+            _resolve_existing_id(base_url, note, session=session, timeout=timeout)
 
             imported = session.post(
                 f"{base_url}/api/import",
@@ -250,6 +273,208 @@ def enqueue_note(note: dict[str, Any], *, queue_path: Path, max_queue_size: int)
     return len(queue)
 
 
+def _with_retries(call, *, max_retries: int, sleep_seconds: float) -> tuple[bool, Any, int, str]:
+    """執行 call()，RequestException 時以指數退避重試；回傳 (成功, 回傳值, 嘗試次數, 最後錯誤)。"""
+    last_error = ""
+    for attempt in range(1, max_retries + 1):
+        try:
+            return True, call(), attempt, ""
+        except requests.RequestException as exc:
+            last_error = str(exc)
+            if attempt < max_retries:
+                time.sleep(sleep_seconds * (2 ** (attempt - 1)))
+    return False, None, max_retries, last_error
+
+
+def _map_import_result(notes: list[dict[str, Any]], body: dict[str, Any]) -> list[tuple[str | None, str]] | None:
+    """把批次 /api/import 的回應對回每一筆：回傳 [(note_id, error)]，error 非空代表該筆失敗。
+
+    errors 以 index（或唯一的 title）指出失敗筆；其餘筆依序對應 noteIds。
+    有失敗卻無法歸屬到特定筆時回傳 None，由呼叫端整批保留在佇列。
+    """
+    result = body.get("result") or {}
+    note_ids = list(result.get("noteIds") or [])
+    errors = result.get("errors") or []
+    title_index: dict[Any, int | None] = {}
+    for index, note in enumerate(notes):
+        title = note.get("title")
+        title_index[title] = None if title in title_index else index
+
+    failed: dict[int, str] = {}
+    for error in errors:
+        index = None
+        message = str(error)
+        if isinstance(error, dict):
+            message = str(error.get("error") or error.get("message") or error)
+            if isinstance(error.get("index"), int):
+                index = error["index"]
+            elif error.get("title") is not None:
+                index = title_index.get(error["title"])
+        if index is None or not 0 <= index < len(notes):
+            return None
+        failed[index] = message
+    if int(result.get("failed", len(failed)) or 0) != len(failed):
+        return None
+    if not failed and len(note_ids) != len(notes):
+        # 全部成功但 noteIds 不完整：仍視為成功，id 退回 dedup 找到的既有 id
+        return [(note.get("id"), "") for note in notes]
+    if len(note_ids) != len(notes) - len(failed):
+        return None
+
+    ids = iter(note_ids)
+    return [(None, failed[index]) if index in failed else (next(ids), "") for index in range(len(notes))]
+
+
+class _WorkerSessions:
+    """dedup 工作執行緒各自的 Session。
+
+    requests.Session 不保證執行緒安全：呼叫端的 Session 只留給主執行緒（health / import），
+    工作執行緒第一次取用時建立同型別的 Session 並複製 headers/auth/proxies/verify/cert/cookies。
+    注入的非 requests.Session 物件（測試替身）由呼叫端保證執行緒安全，直接共用。
+    """
+
+    def __init__(self, session: Any) -> None:
+        self._session = session
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._created: list[requests.Session] = []
+
+    def get(self) -> Any:
+        if not isinstance(self._session, requests.Session):
+            return self._session
+        worker = getattr(self._local, "session", None)
+        if worker is None:
+            worker = type(self._session)()
+            for attr in ("auth", "verify", "cert", "trust_env"):
+                setattr(worker, attr, getattr(self._session, attr))
+            worker.headers.update(self._session.headers)
+            worker.proxies.update(self._session.proxies)
+            worker.params.update(self._session.params)
+            worker.cookies.update(self._session.cookies)
+            self._local.session = worker
+            with self._lock:
+                self._created.append(worker)
+        return worker
+
+    def close(self) -> None:
+        with self._lock:
+            created, self._created = self._created, []
+        for worker in created:
+            worker.close()
+
+
+def _flush_batch(
+    base_url: str,
+    batch: list[dict[str, Any]],
+    *,
+    session: requests.Session,
+    pool: ThreadPoolExecutor,
+    worker_sessions: _WorkerSessions,
+    max_retries: int,
+    timeout: int,
+    sleep_seconds: float,
+) -> tuple[list[SyncResult], bool]:
+    """沖刷一批佇列筆記；回傳 (各筆結果, 服務是否可用)。服務不可用時呼叫端應停止後續批次。"""
+
+    def check_health() -> None:
+        session.get(f"{base_url}/api/health", timeout=timeout).raise_for_status()
+
+    healthy, _, attempts, error = _with_retries(check_health, max_retries=max_retries, sleep_seconds=sleep_seconds)
+    if not healthy:
+        return [SyncResult(success=False, attempts=attempts, message=error) for _ in batch], False
+
+    def resolve(note: dict[str, Any]) -> tuple[bool, Any, int, str]:
+        return _with_retries(
+            lambda: _resolve_existing_id(base_url, note, session=worker_sessions.get(), timeout=timeout),
+            max_retries=max_retries,
+            sleep_seconds=sleep_seconds,
+        )
+
+    results: list[SyncResult | None] = [None] * len(batch)
+    ready: list[int] = []
+    for index, (ok, _, attempts, error) in enumerate(pool.map(resolve, batch)):
+        if ok:
+            ready.append(index)
+        else:
+            # dedup 未確認就匯入可能產生重複筆記，留待下次沖刷
+            results[index] = SyncResult(success=False, attempts=attempts, message=error)
+
+    if ready:
+        notes = [batch[index] for index in ready]
+
+        def import_notes() -> dict[str, Any]:
+            response = session.post(
+                f"{base_url}/api/import",
+                json={"notes": notes, "autoSync": True},
+                timeout=timeout,
+            )
+            response.raise_for_status()
+            return response.json()
+
+        ok, body, attempts, error = _with_retries(import_notes, max_retries=max_retries, sleep_seconds=sleep_seconds)
+        mapped = _map_import_result(notes, body) if ok else None
+        if mapped is None:
+            message = error or f"無法對應批次匯入結果：{(body or {}).get('message', '')}"
+            for index in ready:
+                results[index] = SyncResult(success=False, attempts=attempts, message=message)
+        else:
+            message = body.get("message", "ok")
+            for index, (note_id, note_error) in zip(ready, mapped):
+                results[index] = SyncResult(
+                    success=not note_error,
+                    attempts=attempts,
+                    note_id=note_id,
+                    message=note_error or message,
+                )
+    return [result for result in results if result is not None], True
+
+
+def _flush_bulk(
+    base_url: str,
+    queue: list[dict[str, Any]],
+    *,
+    queue_path: Path,
+    session: requests.Session,
+    max_retries: int,
+    timeout: int,
+    sleep_seconds: float,
+    batch_size: int,
+    max_batches: int | None,
+    dedup_workers: int,
+) -> list[SyncResult]:
+    batch_size = max(1, batch_size)
+    kept: list[dict[str, Any]] = []
+    results: list[SyncResult] = []
+    offset = 0
+    batches = 0
+    worker_sessions = _WorkerSessions(session)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, dedup_workers)) as pool:
+            while offset < len(queue) and (max_batches is None or batches < max_batches):
+                batch = queue[offset : offset + batch_size]
+                offset += len(batch)
+                batches += 1
+                batch_results, healthy = _flush_batch(
+                    base_url,
+                    batch,
+                    session=session,
+                    pool=pool,
+                    worker_sessions=worker_sessions,
+                    max_retries=max_retries,
+                    timeout=timeout,
+                    sleep_seconds=sleep_seconds,
+                )
+                results.extend(batch_results)
+                kept.extend(note for note, result in zip(batch, batch_results) if not result.success)
+                # 每批寫回一次：中斷時已匯入的筆記不會被重送
+                _write_queue(queue_path, kept + queue[offset:])
+                if not healthy:
+                    break
+    finally:
+        worker_sessions.close()
+    return results
+
+
 def flush_sync_queue(
     base_url: str,
     *,
@@ -259,12 +484,35 @@ def flush_sync_queue(
     session: requests.Session | None = None,
     sleep_seconds: float = 0.5,
     batch_size: int = 20,
+    mode: str = "serial",
+    max_batches: int | None = None,
+    dedup_workers: int = 4,
 ) -> list[SyncResult]:
+    """沖刷待同步佇列，成功的筆記移出佇列、失敗的保留。
+
+    serial 模式只處理前 batch_size 筆；bulk 模式以 batch_size 為每次 import 的筆數，
+    連續處理至佇列清空、達 max_batches 批，或服務 health 檢查失敗為止。
+    """
+    if mode not in FLUSH_MODES:
+        raise ValueError(f"未知的 flush mode：{mode}")
     queue = _load_queue(queue_path)
     if not queue:
         return []
 
     session = session or requests.Session()
+    if mode == "bulk":
+        return _flush_bulk(
+            base_url,
+            queue,
+            queue_path=queue_path,
+            session=session,
+            max_retries=max_retries,
+            timeout=timeout,
+            sleep_seconds=sleep_seconds,
+            batch_size=batch_size,
+            max_batches=max_batches,
+            dedup_workers=dedup_workers,
+        )
     remaining: list[dict[str, Any]] = []
     results: list[SyncResult] = []
     for index, note in enumerate(queue):
@@ -298,6 +546,7 @@ def sync_digest_memory(
     queue_path: Path | None = None,
     queue_max_items: int | None = None,
     flush_batch_size: int | None = None,
+    flush_mode: str | None = None,
 ) -> tuple[dict[str, Any], SyncResult]:
     settings = load_sync_settings()
     queue_path = queue_path or settings["queue_path"]
@@ -311,6 +560,9 @@ def sync_digest_memory(
         session=session,
         sleep_seconds=sleep_seconds,
         batch_size=flush_batch_size,
+        mode=flush_mode or settings["flush_mode"],
+        max_batches=settings["flush_max_batches"],
+        dedup_workers=settings["dedup_workers"],
     )
     payload = _load_json(digest_memory_path)
     note = build_digest_note(payload, now=now)
@@ -387,6 +639,9 @@ def main() -> None:
     parser.add_argument("--timeout", type=int, default=settings["timeout"])
     parser.add_argument("--queue-path", default=str(settings["queue_path"]))
     parser.add_argument("--flush-queue", action="store_true", help="只嘗試沖刷待同步佇列")
+    parser.add_argument("--flush-mode", choices=FLUSH_MODES, default=settings["flush_mode"])
+    parser.add_argument("--batch-size", type=int, default=settings["flush_batch_size"])
+    parser.add_argument("--dedup-workers", type=int, default=settings["dedup_workers"])
     parser.add_argument("--query", help="改為執行摘要檢索，而非同步")
     parser.add_argument("--top-k", type=int, default=5)
     parser.add_argument("--topic")
@@ -420,6 +675,9 @@ def main() -> None:
             queue_path=Path(args.queue_path),
             max_retries=args.max_retries,
             timeout=args.timeout,
+            batch_size=args.batch_size,
+            mode=args.flush_mode,
+            dedup_workers=args.dedup_workers,
         )
         result = {
             "flushed": len(flushed),
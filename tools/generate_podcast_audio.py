@@ -3,18 +3,31 @@ tools/generate_podcast_audio.py
 Podcast TTS 生成：讀取 podcast-script.jsonl，
 依 host 使用不同 edge-tts 聲音，逐段輸出 MP3 檔案。
 支援三路聲線：host_a（曉晨）、host_b（云哲）、host_guest（特別來賓；聲音見 --voice-guest / media-pipeline.yaml）。
+
+合成由 TTSScheduler 排程：有界並行（--concurrency）、token bucket 限速（--rate）、
+失敗以指數退避加抖動重試（--retries），結果依 turn_XXX_host 保持腳本順序。
+已合成的段落以「聲音 + 展開後文字」的 sha256 存入內容定址快取（--cache-dir），
+重跑時（例如只有一段失敗）其餘段落直接從快取複製，不再呼叫 TTS。
 """
 
 import argparse
 import asyncio
+import hashlib
 import json
+import os
+import random
 import re
+import shutil
 import sys
+import time
+from dataclasses import dataclass
 from pathlib import Path
 
-import edge_tts
 import yaml
 
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_CACHE_DIR = REPO_ROOT / "podcasts" / ".tts-cache"
+
 
 def resolve_host_key(turn: dict) -> str:
     """從 host 或 speaker 取得 TTS 與檔名用的 host 鍵。
@@ -67,17 +80,167 @@ def expand_abbreviations(text: str, rules: dict) -> str:
     return text
 
 
-async def synthesize_segment(text: str, voice: str, output_path: Path) -> bool:
-    """呼叫 edge-tts 合成單段語音，儲存為 MP3（edge-tts 7.x 預設 MP3）。"""
+async def edge_tts_backend(text: str, voice: str, output_path: Path) -> None:
+    """預設 TTS 後端：edge-tts 合成並存為 MP3（edge-tts 7.x 預設 MP3）。失敗時拋出例外。"""
+    import edge_tts
+
+    communicate = edge_tts.Communicate(text, voice)
+    await communicate.save(str(output_path))
+
+
+async def synthesize_segment(text: str, voice: str, output_path: Path, backend=None) -> bool:
+    """合成單段語音（不經排程與快取）。"""
     try:
-        communicate = edge_tts.Communicate(text, voice)
-        await communicate.save(str(output_path))
+        await (backend or edge_tts_backend)(text, voice, output_path)
         return True
     except Exception as e:
         print(f"[ERROR] TTS 失敗 {output_path.name}: {e}", file=sys.stderr)
         return False
 
 
+def cache_key(voice: str, text: str) -> str:
+    """內容定址快取鍵：聲音 + 展開後文字的 sha256。"""
+    return hashlib.sha256(f"{voice}\n{text}".encode("utf-8")).hexdigest()
+
+
+class TokenBucket:
+    """asyncio token bucket：平均每秒 rate 次，最多累積 burst 次；rate <= 0 表示不限速。"""
+
+    def __init__(self, rate: float, burst: int = 1, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._clock = clock
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = self._clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class Segment:
+    """一段待合成的對話；key 為 turn_XXX_host（亦為輸出檔名主體）。"""
+
+    key: str
+    text: str
+    voice: str
+    output_path: Path
+
+
+class TTSScheduler:
+    """有界並行的 TTS 排程器（限速、重試、內容定址快取）。
+
+    backend 為 async callable(text, voice, output_path)，失敗時拋出例外；
+    測試可注入本地假後端。cache_dir 為 None 時停用快取，直接寫到輸出檔。
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        *,
+        concurrency: int = 4,
+        rate: float = 3.0,
+        burst: int | None = None,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        cache_dir: Path | None = None,
+        rng: random.Random | None = None,
+    ):
+        self.backend = backend or edge_tts_backend
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max(1, max_retries)
+        self.base_delay = base_delay
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.rate = rate
+        self.burst = burst or self.concurrency
+        self.rng = rng or random.Random()
+        self.stats = {"synthesized": 0, "cache_hits": 0, "retries": 0, "failed": 0}
+
+    async def run(self, segments: list[Segment], on_done=None) -> dict[str, bool]:
+        """合成全部段落；回傳 {key: 成功與否}，順序與 segments 相同。
+
+        on_done(segment, ok, cached) 於每段完成時呼叫（完成順序，可用於進度輸出）。
+        """
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._bucket = TokenBucket(self.rate, self.burst)
+        self._inflight: dict[str, asyncio.Task] = {}
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        async def one(segment: Segment) -> bool:
+            ok, cached = await self._produce(segment)
+            if on_done:
+                on_done(segment, ok, cached)
+            return ok
+
+        outcomes = await asyncio.gather(*(one(segment) for segment in segments))
+        return {segment.key: ok for segment, ok in zip(segments, outcomes)}
+
+    async def _produce(self, segment: Segment) -> tuple[bool, bool]:
+        """回傳 (成功, 是否來自快取)。"""
+        if self.cache_dir is None:
+            ok = await self._synthesize(segment, segment.output_path)
+            return ok, False
+
+        digest = cache_key(segment.voice, segment.text)
+        cached_path = self.cache_dir / f"{digest}.mp3"
+        if _non_empty(cached_path):
+            self.stats["cache_hits"] += 1
+            shutil.copyfile(cached_path, segment.output_path)
+            return True, True
+        # 同一聲音與文字的段落（如重複的短句）共用一次合成
+        task = self._inflight.get(digest)
+        if task is None:
+            task = asyncio.ensure_future(self._synthesize(segment, cached_path))
+            self._inflight[digest] = task
+        ok = await task
+        if ok:
+            shutil.copyfile(cached_path, segment.output_path)
+        return ok, False
+
+    async def _synthesize(self, segment: Segment, target: Path) -> bool:
+        partial = target.with_name(f"{target.name}.part")
+        last_error: Exception | None = None
+        async with self._semaphore:
+            for attempt in range(1, self.max_retries + 1):
+                await self._bucket.acquire()
+                try:
+                    await self.backend(segment.text, segment.voice, partial)
+                    if not _non_empty(partial):
+                        raise RuntimeError("TTS 後端未產生音訊")
+                    os.replace(partial, target)
+                    self.stats["synthesized"] += 1
+                    return True
+                except Exception as e:
+                    last_error = e
+                    if attempt < self.max_retries:
+                        self.stats["retries"] += 1
+                        delay = self.base_delay * (2 ** (attempt - 1))
+                        await asyncio.sleep(delay * (0.5 + self.rng.random()))
+        partial.unlink(missing_ok=True)
+        self.stats["failed"] += 1
+        print(f"[ERROR] TTS 失敗 {segment.key}: {last_error}", file=sys.stderr)
+        return False
+
+
+def _non_empty(path: Path) -> bool:
+    try:
+        return path.stat().st_size > 0
+    except OSError:
+        return False
+
+
 async def generate_all(
     script_path: Path,
     output_dir: Path,
@@ -85,6 +248,12 @@ async def generate_all(
     voice_b: str,
     abbrev_rules: dict,
     voice_guest: str | None = None,
+    *,
+    backend=None,
+    concurrency: int = 4,
+    rate: float = 3.0,
+    max_retries: int = 3,
+    cache_dir: Path | None = DEFAULT_CACHE_DIR,
 ) -> int:
     """批次生成所有對話段落音訊，回傳失敗數量。"""
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -97,9 +266,7 @@ async def generate_all(
     with open(script_path, encoding="utf-8") as f:
         lines = [ln.strip() for ln in f if ln.strip()]
 
-    total = len(lines)
-    print(f"[INFO] 共 {total} 段對話，開始 TTS 生成...")
-
+    segments: list[Segment] = []
     for i, line in enumerate(lines, 1):
         try:
             turn = json.loads(line)
@@ -116,18 +283,34 @@ async def generate_all(
         voice = voice_map.get(host, voice_a)
 
         # 輸出檔名：turn_001_host_a.mp3
-        filename = f"turn_{turn_num:03d}_{host}.mp3"
-        output_path = output_dir / filename
-
-        print(f"[{i}/{total}] {filename} ({len(tts_text)} 字)")
-        ok = await synthesize_segment(tts_text, voice, output_path)
-        if not ok:
-            failures += 1
-
-        # edge-tts 免費 API，稍作間隔避免觸發速率限制
-        if i < total:
-            await asyncio.sleep(0.3)
-
+        key = f"turn_{turn_num:03d}_{host}"
+        segments.append(Segment(key, tts_text, voice, output_dir / f"{key}.mp3"))
+
+    total = len(segments)
+    print(f"[INFO] 共 {total} 段對話，開始 TTS 生成（並行 {concurrency}，限速 {rate}/秒）...")
+    done = 0
+
+    def report(segment: Segment, ok: bool, cached: bool) -> None:
+        nonlocal done
+        done += 1
+        status = "快取" if cached else ("完成" if ok else "失敗")
+        print(f"[{done}/{total}] {segment.output_path.name} ({len(segment.text)} 字) {status}")
+
+    # edge-tts 免費 API：以並行上限 + token bucket 取代固定間隔，避免觸發速率限制
+    scheduler = TTSScheduler(
+        backend,
+        concurrency=concurrency,
+        rate=rate,
+        max_retries=max_retries,
+        cache_dir=cache_dir,
+    )
+    results = await scheduler.run(segments, on_done=report)
+    failures += sum(1 for ok in results.values() if not ok)
+    stats = scheduler.stats
+    print(
+        f"[INFO] TTS 統計：合成 {stats['synthesized']}、快取命中 {stats['cache_hits']}、"
+        f"重試 {stats['retries']}、失敗 {stats['failed']}"
+    )
     return failures
 
 
@@ -143,6 +326,11 @@ def main():
         help="host_guest TTS 聲音（與 config/media-pipeline.yaml 之 podcast.voice_guest 一致）",
     )
     parser.add_argument("--abbrev-rules", default="config/tts-abbreviation-rules.yaml")
+    parser.add_argument("--concurrency", type=int, default=4, help="同時進行的 TTS 請求上限")
+    parser.add_argument("--rate", type=float, default=3.0, help="每秒最多發出的 TTS 請求數（<= 0 不限速）")
+    parser.add_argument("--retries", type=int, default=3, help="每段最多嘗試次數")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help="內容定址 TTS 快取目錄")
+    parser.add_argument("--no-cache", action="store_true", help="停用 TTS 快取")
     args = parser.parse_args()
 
     script_path = Path(args.input)
@@ -154,7 +342,18 @@ def main():
 
     rules = load_abbrev_rules(args.abbrev_rules)
     failures = asyncio.run(
-        generate_all(script_path, output_dir, args.voice_a, args.voice_b, rules, args.voice_guest)
+        generate_all(
+            script_path,
+            output_dir,
+            args.voice_a,
+            args.voice_b,
+            rules,
+            args.voice_guest,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            max_retries=args.retries,
+            cache_dir=None if args.no_cache else Path(args.cache_dir),
+        )
     )
 
     if failures > 0:
@@ -1,13 +1,47 @@
 #!/usr/bin/env python3
 """Generate static website from knowledge base notes."""
+import argparse
 import json
 import re
+import sys
 from datetime import datetime
 from pathlib import Path
 
-# Load notes
-with open('D:/Source/daily-digest-prompt/cache/full_notes.json', 'r', encoding='utf-8') as f:
-    notes = json.load(f)
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+if str(PROJECT_DIR) not in sys.path:
+    sys.path.insert(0, str(PROJECT_DIR))
+
+from tools.kb_snapshot import KBSnapshot  # noqa: E402
+
+SITE_CATEGORIES = ('佛學', '思維方法', 'AI技術', 'Claude_Code')
+
+
+def note_category(note):
+    if note.get('category'):
+        return note['category']
+    for tag in note.get('tags') or []:
+        if tag in SITE_CATEGORIES:
+            return tag
+    return '其他'
+
+
+def load_notes(sync=False):
+    """Read notes from the local KB snapshot (synced first only when asked), else full_notes.json."""
+    snapshot = KBSnapshot()
+    if sync:
+        stats = snapshot.sync()
+        if stats.get('error'):
+            print(f"[WARN] KB sync failed, using local snapshot: {stats['error']}")
+    if snapshot.notes_by_id:
+        return [dict(n, category=note_category(n), tags=n.get('tags') or []) for n in snapshot.notes()]
+    with open('D:/Source/daily-digest-prompt/cache/full_notes.json', 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+parser = argparse.ArgumentParser(description='Generate static website from knowledge base notes.')
+parser.add_argument('--sync', action='store_true', help='sync the local KB snapshot with the KB API first')
+args, _ = parser.parse_known_args()
+notes = load_notes(sync=args.sync)
 
 def slugify(text, note_id):
     """Generate ASCII-safe slug using ID prefix and English parts."""
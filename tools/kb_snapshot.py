@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+tools/kb_snapshot.py — 知識庫筆記本地快照（增量同步）
+
+run_podcast_create、score-kb-notes、generate_site 原本每次執行都從 KB API
+重新下載 250–300 筆含 contentText 的完整筆記列表。本模組把筆記存成本地快照
+（cache/kb-notes-snapshot.json），之後只同步變動：
+
+    snapshot = KBSnapshot()
+    snapshot.sync(limit=100)          # 帶 If-None-Match + updatedAfter 增量同步（limit 為每頁筆數）
+    snapshot.get(note_id)             # 本地命中直接回傳，未命中才 GET /api/notes/{id}
+    snapshot.by_tag("AI")             # 本地 tag 索引
+    snapshot.notes(sort_key="createdAt")
+
+同步規則：
+  - 距上次同步不到 min_interval 秒時不連線
+  - 以 ETag（若伺服器有回）發 If-None-Match，304 代表快照仍是最新
+  - 帶 updatedAfter=<快照內最大 updatedAt>（含等於），依 updatedAt 由舊到新翻頁，
+    下一頁以上一頁最後一筆的 (updatedAt, id) 接續（updatedAfter + afterId），直到拿到
+    空頁或比先前頁短的一頁；伺服器壓低 limit 時也不會漏掉較舊或同時間戳的變動。
+    伺服器忽略這些參數時游標不前進即停止（不視為翻完），依 updatedAt 合併結果仍正確
+  - 每 full_resync_hours 做一次完整同步（不帶 updatedAfter / ETag）；
+    軟刪除以 isDeleted 反映，完整列表翻完後移除其中已不存在的（硬刪除）筆記
+  - KB 無法連線時保留既有快照（回傳的 stats 帶 error），呼叫端照常讀取本地資料
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+_HOOKS_DIR = str(REPO_ROOT / "hooks")
+if _HOOKS_DIR not in sys.path:
+    sys.path.insert(0, _HOOKS_DIR)
+
+from hook_utils import FileLock, atomic_write_json, safe_load_json  # noqa: E402
+
+SNAPSHOT_PATH = REPO_ROOT / "cache" / "kb-notes-snapshot.json"
+SNAPSHOT_VERSION = 1
+DEFAULT_KB_BASE = "http://localhost:3000"
+DEFAULT_MIN_INTERVAL = 300
+DEFAULT_FULL_RESYNC_HOURS = 24
+
+# http_get(url, headers, timeout) -> (status, response_headers, parsed_json | None)
+HttpGet = Callable[[str, dict, float], "tuple[int, dict, Any]"]
+
+
+def _default_kb_base() -> str:
+    try:
+        from tools.config_loader import get_kb_api_base
+
+        return get_kb_api_base()
+    except ImportError:
+        return DEFAULT_KB_BASE
+
+
+def _urllib_get(url: str, headers: dict, timeout: float) -> tuple[int, dict, Any]:
+    request = urllib.request.Request(url, headers={"Accept": "application/json", **headers})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as resp:
+            return resp.status, dict(resp.headers), json.loads(resp.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return 304, dict(e.headers or {}), None
+        raise
+
+
+def _parse_ts(raw: Any) -> float:
+    if not raw:
+        return 0.0
+    try:
+        dt = datetime.fromisoformat(str(raw).replace("Z", "+00:00"))
+    except ValueError:
+        return 0.0
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _note_list(payload: Any) -> list[dict]:
+    """相容 /api/notes 的多種回傳格式（list / notes / data / results）。"""
+    if isinstance(payload, list):
+        items = payload
+    elif isinstance(payload, dict):
+        items = payload.get("notes") or payload.get("data") or payload.get("results") or []
+    else:
+        items = []
+    return [item for item in items if isinstance(item, dict) and item.get("id")]
+
+
+class KBSnapshot:
+    """知識庫筆記快照：本地 ID / tag 查詢，增量同步，未命中才打 API。"""
+
+    def __init__(
+        self,
+        path: Path = SNAPSHOT_PATH,
+        *,
+        base_url: str | None = None,
+        http_get: HttpGet | None = None,
+        timeout: float = 20,
+    ):
+        self.path = Path(path)
+        self.base_url = (base_url or _default_kb_base()).rstrip("/")
+        self.http_get = http_get or _urllib_get
+        self.timeout = timeout
+        self._load()
+
+    # ── 持久化 ──────────────────────────────────────────
+    def _load(self) -> None:
+        data = safe_load_json(str(self.path), default={})
+        if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION:
+            data = {}
+        # 換了 KB 來源就不沿用舊快照
+        if data.get("base_url") not in (None, self.base_url):
+            data = {}
+        self.notes_by_id: dict[str, dict] = {
+            nid: note for nid, note in (data.get("notes") or {}).items() if isinstance(note, dict)
+        }
+        self.etag: str | None = data.get("etag")
+        self.synced_at: float = float(data.get("synced_at") or 0.0)
+        self.full_synced_at: float = float(data.get("full_synced_at") or 0.0)
+        self._rebuild_tag_index()
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with FileLock(str(self.path)):
+            self._write()
+
+    def _write(self) -> None:
+        atomic_write_json(
+            str(self.path),
+            {
+                "version": SNAPSHOT_VERSION,
+                "base_url": self.base_url,
+                "etag": self.etag,
+                "synced_at": self.synced_at,
+                "full_synced_at": self.full_synced_at,
+                "notes": self.notes_by_id,
+            },
+        )
+
+    def _rebuild_tag_index(self) -> None:
+        self._tags: dict[str, set[str]] = {}
+        for nid, note in self.notes_by_id.items():
+            for tag in note.get("tags") or []:
+                self._tags.setdefault(str(tag), set()).add(nid)
+
+    # ── 同步 ────────────────────────────────────────────
+    def high_water(self) -> str | None:
+        """快照內最新的 updatedAt（原字串），作為增量同步的起點。"""
+        best, best_ts = None, 0.0
+        for note in self.notes_by_id.values():
+            ts = _parse_ts(note.get("updatedAt"))
+            if ts > best_ts:
+                best, best_ts = note.get("updatedAt"), ts
+        return best
+
+    def _merge(self, notes: list[dict]) -> int:
+        changed = 0
+        for note in notes:
+            current = self.notes_by_id.get(note["id"])
+            if current is None or _parse_ts(note.get("updatedAt")) >= _parse_ts(current.get("updatedAt")):
+                if current != note:
+                    self.notes_by_id[note["id"]] = note
+                    changed += 1
+        return changed
+
+    def _fetch_pages(
+        self, limit: int, since: str | None, etag: str | None
+    ) -> tuple[int, dict, list[dict], bool, str | None]:
+        """依 (updatedAt, id) 游標由舊到新翻頁，直到拿到空頁或比先前頁短的一頁。
+
+        updatedAfter 含等於、afterId 為同時間戳內的次序（knowledge-base-search 的
+        /api/notes），游標取上一頁最後一筆，不會越過實際收到的資料，也不會跳過
+        同時間戳的筆記；重複收到的筆記依 id 去重。伺服器可能把 limit 壓低（上限 100 筆），
+        不滿 limit 的首頁無法判斷是否被截斷，因此再多要一頁確認。
+        回傳 (首頁 status, 首頁 headers, 筆記, 是否翻完, 錯誤)；翻到一半失敗時保留已收到的頁。
+        """
+        cursor: tuple[str | None, str | None] = (since, None)
+        by_id: dict[str, dict] = {}
+        largest = 0
+        first_status, first_headers = 0, {}
+
+        def result(complete: bool, error: str | None = None):
+            return first_status, first_headers, list(by_id.values()), complete, error
+
+        while True:
+            params = {"limit": limit, "sort": "updatedAt", "order": "asc"}
+            if cursor[0]:
+                params["updatedAfter"] = cursor[0]
+            if cursor[1]:
+                params["afterId"] = cursor[1]
+            headers = {"If-None-Match": etag} if etag and not first_status else {}
+            url = f"{self.base_url}/api/notes?{urllib.parse.urlencode(params)}"
+            try:
+                status, response_headers, payload = self.http_get(url, headers, self.timeout)
+            except Exception as e:
+                if not first_status:
+                    raise
+                return result(False, str(e))
+            if not first_status:
+                first_status, first_headers = status, response_headers
+                if status == 304:
+                    return result(True)
+            page = _note_list(payload)
+            for note in page:
+                by_id[note["id"]] = note
+            if not page or len(page) < largest:
+                return result(True)
+            largest = len(page)
+            last = (page[-1].get("updatedAt"), str(page[-1]["id"]))
+            # 伺服器忽略 updatedAfter / afterId 或排序時游標不會前進，無法確定是否翻完
+            if (_parse_ts(last[0]), last[1]) <= (_parse_ts(cursor[0]), cursor[1] or ""):
+                return result(False)
+            cursor = last
+
+    def sync(
+        self,
+        limit: int = 300,
+        *,
+        force: bool = False,
+        rebuild: bool = False,
+        min_interval: float = DEFAULT_MIN_INTERVAL,
+        full_resync_hours: float = DEFAULT_FULL_RESYNC_HOURS,
+    ) -> dict:
+        """與 KB 增量同步；回傳 {"mode", "fetched", "changed", "removed", "total"[, "error"]}。
+
+        limit 為每頁筆數。完整同步翻完所有頁後，移除列表中已不存在（硬刪除）的筆記；
+        rebuild=True 先清空快照再完整下載。
+        """
+        now = time.time()
+        stats = {"mode": "fresh", "fetched": 0, "changed": 0, "removed": 0}
+        if not (force or rebuild) and self.notes_by_id and now - self.synced_at < min_interval:
+            stats["total"] = len(self.notes_by_id)
+            return stats
+
+        full = force or rebuild or not self.notes_by_id or now - self.full_synced_at >= full_resync_hours * 3600
+        since = None if full else self.high_water()
+        try:
+            status, response_headers, notes, complete, error = self._fetch_pages(
+                limit, since, None if full else self.etag
+            )
+        except Exception as e:
+            stats.update(mode="offline", error=str(e), total=len(self.notes_by_id))
+            return stats
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with FileLock(str(self.path)):
+            # 其他行程可能剛同步過：以磁碟上的最新快照為底再合併
+            self._load()
+            if rebuild:
+                self.notes_by_id = {}
+            if status == 304:
+                stats["mode"] = "not_modified"
+            else:
+                stats["mode"] = "full" if full else "delta"
+                stats["fetched"] = len(notes)
+                stats["changed"] = self._merge(notes)
+                if full and complete:
+                    seen = {note["id"] for note in notes}
+                    for nid in [nid for nid in self.notes_by_id if nid not in seen]:
+                        del self.notes_by_id[nid]
+                        stats["removed"] += 1
+                if full and not error:
+                    self.full_synced_at = now
+                self.etag = response_headers.get("ETag") or response_headers.get("etag")
+                self._rebuild_tag_index()
+            if error:
+                stats["error"] = error
+            self.synced_at = now
+            self._write()
+        stats["total"] = len(self.notes_by_id)
+        return stats
+
+    # ── 查詢 ────────────────────────────────────────────
+    def get(self, note_id: str, *, fetch_missing: bool = True) -> dict | None:
+        """依 ID 取筆記；本地沒有（或只有不含 contentText 的摘要）時才 GET /api/notes/{id}。"""
+        note = self.notes_by_id.get(note_id)
+        if note is not None and "contentText" in note:
+            return note
+        if not fetch_missing:
+            return note
+        url = f"{self.base_url}/api/notes/{urllib.parse.quote(str(note_id), safe='')}"
+        try:
+            status, _, payload = self.http_get(url, {}, self.timeout)
+        except Exception:
+            return note
+        if status != 200 or not isinstance(payload, dict):
+            return note
+        fetched = payload.get("note") if isinstance(payload.get("note"), dict) else payload
+        if fetched.get("id") == note_id:
+            self.notes_by_id[note_id] = fetched
+            for tag in fetched.get("tags") or []:
+                self._tags.setdefault(str(tag), set()).add(note_id)
+            self.save()
+        return fetched
+
+    def by_tag(self, tag: str, *, include_deleted: bool = False) -> list[dict]:
+        notes = [self.notes_by_id[nid] for nid in self._tags.get(tag, ())]
+        if not include_deleted:
+            notes = [note for note in notes if not note.get("isDeleted")]
+        return sorted(notes, key=lambda note: _parse_ts(note.get("updatedAt")), reverse=True)
+
+    def notes(self, *, sort_key: str = "updatedAt", include_deleted: bool = False) -> list[dict]:
+        """全部筆記，依 sort_key（updatedAt / createdAt）由新到舊。"""
+        notes = [note for note in self.notes_by_id.values() if include_deleted or not note.get("isDeleted")]
+        return sorted(notes, key=lambda note: _parse_ts(note.get(sort_key)), reverse=True)
+
+
+_shared: KBSnapshot | None = None
+
+
+def shared_snapshot(base_url: str | None = None) -> KBSnapshot:
+    """同一行程共用一份快照（避免重複讀檔）。"""
+    global _shared
+    if _shared is None or (base_url and _shared.base_url != base_url.rstrip("/")):
+        _shared = KBSnapshot(base_url=base_url)
+    return _shared
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="同步知識庫筆記本地快照")
+    parser.add_argument("--base-url", default=None)
+    parser.add_argument("--limit", type=int, default=300)
+    parser.add_argument("--force", action="store_true", help="忽略同步間隔並做完整同步")
+    parser.add_argument("--rebuild", action="store_true", help="清空快照後完整下載")
+    args = parser.parse_args()
+
+    stats = KBSnapshot(base_url=args.base_url).sync(args.limit, force=args.force, rebuild=args.rebuild)
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
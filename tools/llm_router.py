@@ -25,6 +25,12 @@ REPO_ROOT = Path(__file__).parent.parent
 CONFIG_PATH = REPO_ROOT / "config" / "llm-router.yaml"
 TOKEN_USAGE_PATH = REPO_ROOT / "state" / "token-usage.json"
 
+_HOOKS_DIR = str(REPO_ROOT / "hooks")
+if _HOOKS_DIR not in sys.path:
+    sys.path.insert(0, _HOOKS_DIR)
+from hook_utils import FileLock  # noqa: E402
+
+
 # P4-B：classify/extract 回傳 schema（Structured Generation）
 class SchemaViolationError(ValueError):
     """Groq Relay 回傳格式不符合預期 schema。"""
@@ -183,17 +189,21 @@ def call_groq_relay(endpoint: str, mode: str, content: str, max_tokens: int) ->
 
 
 def update_token_usage(provider: str) -> None:
-    """更新 state/token-usage.json 的 groq_calls / claude_calls 計數（schema v2）。"""
+    """更新 state/token-usage.json 的 groq_calls / claude_calls 計數（schema v2）。
+
+    與 token journal 壓實共用 FileLock，避免覆寫掉壓實剛寫入的累計與 offset。
+    """
     try:
         import datetime
-        usage = json.loads(TOKEN_USAGE_PATH.read_text(encoding="utf-8"))
-        today = datetime.date.today().isoformat()
-        day_record = usage.setdefault("daily", {}).setdefault(today, {})
-        key = "groq_calls" if provider == "groq" else ("groq_skipped" if provider == "groq_skipped" else "claude_calls")
-        day_record[key] = day_record.get(key, 0) + 1
-        TOKEN_USAGE_PATH.write_text(
-            json.dumps(usage, ensure_ascii=False, indent=2), encoding="utf-8"
-        )
+        with FileLock(str(TOKEN_USAGE_PATH)):
+            usage = json.loads(TOKEN_USAGE_PATH.read_text(encoding="utf-8"))
+            today = datetime.date.today().isoformat()
+            day_record = usage.setdefault("daily", {}).setdefault(today, {})
+            key = "groq_calls" if provider == "groq" else ("groq_skipped" if provider == "groq_skipped" else "claude_calls")
+            day_record[key] = day_record.get(key, 0) + 1
+            TOKEN_USAGE_PATH.write_text(
+                json.dumps(usage, ensure_ascii=False, indent=2), encoding="utf-8"
+            )
     except (FileNotFoundError, json.JSONDecodeError, KeyError, OSError):
         pass  # token usage 追蹤失敗不中斷主流程
 
@@ -18,7 +18,12 @@ TARGETS = [
 ]
 TARGET_DIRS = [
     "context/continuity",
+    "data/long_term_memory_optimized.segments",
 ]
+# 分段儲存整個目錄即為一份狀態：還原時先清空，避免快照之後新增的 segment 被重播
+REPLACE_DIRS = {
+    "data/long_term_memory_optimized.segments",
+}
 
 
 def _safe_label(label: str) -> str:
@@ -89,9 +94,18 @@ def restore_snapshot(snapshot_dir: Path, *, target_root: Path = REPO_ROOT) -> di
         if not source.exists():
             continue
         destination = target_root / str(relative)
+        if str(relative) in REPLACE_DIRS and destination.exists():
+            shutil.rmtree(destination)
         shutil.copytree(source, destination, dirs_exist_ok=True)
         restored_dirs += 1
 
+    # 分段儲存之前的快照只有舊版 JSON：移除現有分段目錄，下次載入時重新遷移
+    for relative in REPLACE_DIRS:
+        legacy = str(Path(relative).with_suffix(".json").as_posix())
+        destination = target_root / relative
+        if legacy in files and relative not in directories and destination.exists():
+            shutil.rmtree(destination)
+
     return {"restored_files": restored_files, "restored_dirs": restored_dirs}
 
 
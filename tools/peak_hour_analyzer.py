@@ -3,16 +3,24 @@
 分析 JSONL 日誌，識別 7:00 和 13:00 等高失敗時段的根因。
 三層監控：alerts（即時告警）+ logging（結構化日誌）+ metrics（趨勢指標）
 """
+import argparse
 import json
 import re
-from pathlib import Path
-from datetime import datetime, timedelta, timezone
+import sys
 from collections import defaultdict
-import argparse
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
 
 PROJECT_ROOT = Path(__file__).parent.parent
 TZ_OFFSET = 8  # UTC+8
 
+_HOOKS_DIR = str(PROJECT_ROOT / "hooks")
+if _HOOKS_DIR not in sys.path:
+    sys.path.insert(0, _HOOKS_DIR)
+from hour_histogram import build_matrix  # noqa: E402
+from log_index import load_frame  # noqa: E402
+
+
 def load_alert_config() -> dict:
     """載入高峰時段告警設定"""
     config_path = PROJECT_ROOT / "config" / "peak-hour-alerts.yaml"
@@ -31,29 +39,15 @@ def parse_logs(days: int = 14) -> list[dict]:
     cutoff = datetime.now(timezone.utc) - timedelta(days=days)
     records = []
 
-    # 從 JSONL 結構化日誌讀取
+    # 從 JSONL 結構化日誌讀取（欄式索引 log_index；只讀回失敗列的完整記錄供根因分類）
     if log_dir.exists():
-        for log_file in sorted(log_dir.glob("*.jsonl")):
-            try:
-                with open(log_file, encoding="utf-8", errors="ignore") as f:
-                    for line in f:
-                        line = line.strip()
-                        if not line:
-                            continue
-                        try:
-                            entry = json.loads(line)
-                        except json.JSONDecodeError:
-                            continue
-                        ts_str = entry.get("timestamp", "")
-                        try:
-                            ts = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
-                            if ts < cutoff:
-                                continue
-                        except Exception:
-                            continue
-                        records.append(entry)
-            except Exception:
-                continue
+        frame = load_frame(log_dir)
+        recent = frame.where(ts >= cutoff.timestamp() for ts in frame.column("ts"))
+        failed = [bool(b) or e for b, e in zip(recent.column("blocked"), recent.has_tag("error"))]
+        records.extend(recent.where(failed).records())
+        for ts, is_failure in zip(recent.column("ts"), failed):
+            if not is_failure:
+                records.append({"timestamp": datetime.fromtimestamp(ts, timezone.utc).isoformat()})
 
     # 從 run-fsm.json 補充執行記錄
     fsm_path = PROJECT_ROOT / "state" / "run-fsm.json"
@@ -98,33 +92,39 @@ def classify_failure_cause(entry: dict) -> str:
         return "pipeline_phase"
     return "unknown"
 
+def _record_epoch(entry: dict) -> float:
+    """記錄時間 → epoch 秒（無時區者視為 UTC）；無法解析時為 NaN。"""
+    ts_str = entry.get("timestamp") or entry.get("ts", "")
+    try:
+        ts = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        return ts.timestamp()
+    except Exception:
+        return float("nan")
+
+def _is_failure(entry: dict) -> bool:
+    if entry.get("type") == "fsm_run":
+        return not entry.get("success", True)
+    return "error" in entry.get("tags", []) or bool(entry.get("blocked"))
+
 def analyze_by_hour(records: list[dict]) -> dict:
-    """按小時統計成功/失敗"""
-    hourly = defaultdict(lambda: {"success": 0, "failure": 0, "causes": defaultdict(int)})
+    """按小時統計成功/失敗（UTC+8 小時分桶由 hour_histogram 一次完成）"""
+    epochs = [_record_epoch(entry) for entry in records]
+    failures = [_is_failure(entry) for entry in records]
+    matrix = build_matrix(epochs, failures, utc_offset=TZ_OFFSET * 3600)
 
-    for entry in records:
-        ts_str = entry.get("timestamp", "")
-        try:
-            ts = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
-            local_hour = (ts.hour + TZ_OFFSET) % 24
-        except Exception:
-            continue
+    causes = defaultdict(lambda: defaultdict(int))
+    for entry, epoch, is_failure in zip(records, epochs, failures):
+        if is_failure and epoch == epoch:  # 只對失敗且時間可解析者分類根因
+            local_hour = int((epoch // 3600 + TZ_OFFSET) % 24)
+            causes[local_hour][classify_failure_cause(entry)] += 1
 
-        # 判斷是否失敗
-        is_failure = False
-        if entry.get("type") == "fsm_run":
-            is_failure = not entry.get("success", True)
-        elif "error" in entry.get("tags", []) or entry.get("blocked"):
-            is_failure = True
-
-        if is_failure:
-            hourly[local_hour]["failure"] += 1
-            cause = classify_failure_cause(entry)
-            hourly[local_hour]["causes"][cause] += 1
-        else:
-            hourly[local_hour]["success"] += 1
-
-    return {h: dict(v) for h, v in hourly.items()}
+    hourly = {}
+    for hour, (total, failure) in enumerate(zip(matrix.hour_totals(), matrix.hour_failures())):
+        if total:
+            hourly[hour] = {"success": total - failure, "failure": failure, "causes": causes[hour]}
+    return hourly
 
 def compute_failure_rates(hourly: dict) -> dict:
     """計算各小時失敗率"""
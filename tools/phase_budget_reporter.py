@@ -21,6 +21,11 @@ REPO_ROOT = Path(__file__).parent.parent
 TOKEN_USAGE_PATH = REPO_ROOT / "state" / "token-usage.json"
 BUDGET_YAML_PATH = REPO_ROOT / "config" / "budget.yaml"
 
+_HOOKS_DIR = str(REPO_ROOT / "hooks")
+if _HOOKS_DIR not in sys.path:
+    sys.path.insert(0, _HOOKS_DIR)
+from token_journal import compact_token_usage  # noqa: E402
+
 
 def _load_budget_config() -> dict:
     """載入 budget.yaml，失敗時回傳預設值。"""
@@ -44,7 +49,13 @@ def _load_budget_config() -> dict:
 
 
 def _load_token_usage() -> dict:
-    """讀取 state/token-usage.json，不存在時回傳空結構。"""
+    """讀取 state/token-usage.json（先合併 hook 寫入的 journal），不存在時回傳空結構。"""
+    try:
+        usage = compact_token_usage(str(TOKEN_USAGE_PATH))
+        if usage is not None:
+            return usage
+    except (TimeoutError, OSError):
+        pass  # 壓實失敗時讀取既有內容
     try:
         with open(TOKEN_USAGE_PATH, encoding="utf-8") as f:
             return json.load(f)
@@ -7,15 +7,30 @@ calculates saturation scores, and outputs:
   - analysis/high-potential-topics.json
 Also updates context/research-series.json with saturation scores.
 
+Small inputs are clustered with exhaustive pairwise Jaccard. Larger inputs
+(e.g. the full KB history via --include-kb) use a MinHash/LSH index to find
+candidate pairs; every candidate is still verified with exact Jaccard.
+MinHash signatures are persisted in state/research-minhash.json, so only new
+keyword sets are hashed on later runs.
+
 Usage:
     uv run python tools/research_saturation_analyzer.py
+    uv run python tools/research_saturation_analyzer.py --include-kb
 """
 
 from __future__ import annotations
 
+import argparse
+import base64
+import hashlib
 import json
+import random
 import re
-from collections import Counter
+import sys
+import urllib.error
+import urllib.request
+from array import array
+from collections import Counter, defaultdict
 from datetime import datetime
 from pathlib import Path
 
@@ -28,6 +43,19 @@ SERIES_PATH = PROJECT_ROOT / "context" / "research-series.json"
 ANALYSIS_DIR = PROJECT_ROOT / "analysis"
 CLUSTERS_OUT = ANALYSIS_DIR / "research-topic-clusters.json"
 HIGH_POTENTIAL_OUT = ANALYSIS_DIR / "high-potential-topics.json"
+SIGNATURES_PATH = PROJECT_ROOT / "state" / "research-minhash.json"
+
+_HOOKS_DIR = str(PROJECT_ROOT / "hooks")
+if _HOOKS_DIR not in sys.path:
+    sys.path.insert(0, _HOOKS_DIR)
+from hook_utils import atomic_write_json, safe_load_json  # noqa: E402
+
+try:
+    from tools.config_loader import get_kb_api_base
+    KB_API_BASE = get_kb_api_base()
+except ImportError:
+    KB_API_BASE = "http://localhost:3000"
+KB_HISTORY_LIMIT = 5000
 
 # Saturation formula weights
 W_COUNT = 0.4
@@ -38,6 +66,18 @@ W_DEPTH = 0.1  # applied as (1 - depth)
 SATURATED_THRESHOLD = 0.7
 NEEDS_DEEPENING_THRESHOLD = 0.3
 
+# Topic clustering
+CLUSTER_JACCARD = 0.25
+EXACT_PAIRWISE_MAX = 500  # up to this many entries, compare every pair
+# MinHash/LSH: 128 bands x 2 rows. A pair at the clustering threshold
+# (J = 0.25) is missed with probability (1 - 0.25**2)**128 ≈ 0.03%, while
+# pairs without a shared keyword are never candidates.
+MINHASH_PERMUTATIONS = 256
+LSH_BANDS = 128
+MINHASH_SEED = 39
+SIGNATURES_VERSION = 1
+_MERSENNE_61 = (1 << 61) - 1
+
 # Chinese / English stopwords (minimal set, good enough for clustering)
 STOPWORDS: set[str] = {
     # English
@@ -100,6 +140,121 @@ def _parse_date(d: str | None) -> datetime | None:
     return None
 
 
+# ---------------------------------------------------------------------------
+# MinHash / LSH
+# ---------------------------------------------------------------------------
+
+def _token_hash(token: str) -> int:
+    """Stable 64-bit token hash (built-in hash() is salted per process)."""
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _permutations(count: int = MINHASH_PERMUTATIONS, seed: int = MINHASH_SEED) -> list[tuple[int, int]]:
+    rng = random.Random(seed)
+    return [(rng.randrange(1, _MERSENNE_61), rng.randrange(0, _MERSENNE_61)) for _ in range(count)]
+
+
+class MinHashIndex:
+    """MinHash signatures (persisted, keyed by keyword set) and LSH banding."""
+
+    def __init__(self, path: Path | None = None, bands: int = LSH_BANDS,
+                 permutations: int = MINHASH_PERMUTATIONS):
+        if permutations % bands:
+            raise ValueError("permutations must be a multiple of bands")
+        self.path = path
+        self.bands = bands
+        self.rows = permutations // bands
+        self._perms = _permutations(permutations)
+        self._signatures: dict[str, str] = {}  # keyword-set key -> base64 of array('I')
+        self._used: set[str] = set()
+        self.computed = 0
+        if path is not None:
+            data = safe_load_json(str(path), default={})
+            if (isinstance(data, dict) and data.get("version") == SIGNATURES_VERSION
+                    and data.get("permutations") == permutations
+                    and data.get("seed") == MINHASH_SEED
+                    and isinstance(data.get("signatures"), dict)):
+                self._signatures = data["signatures"]
+
+    @staticmethod
+    def _key(keywords: set[str]) -> str:
+        return hashlib.sha1("\x1f".join(sorted(keywords)).encode("utf-8")).hexdigest()
+
+    def signature(self, keywords: set[str]) -> array:
+        key = self._key(keywords)
+        self._used.add(key)
+        cached = self._signatures.get(key)
+        if cached is not None:
+            sig = array("I")
+            try:
+                sig.frombytes(base64.b64decode(cached))
+            except (TypeError, ValueError):
+                sig = array("I")
+            if len(sig) == len(self._perms):
+                return sig
+        permuted = [[(a * h + b) % _MERSENNE_61 for a, b in self._perms]
+                    for h in map(_token_hash, keywords)]
+        sig = array("I", [min(values) & 0xFFFFFFFF for values in zip(*permuted)])
+        self._signatures[key] = base64.b64encode(sig.tobytes()).decode("ascii")
+        self.computed += 1
+        return sig
+
+    def _band_keys(self, sig: array):
+        """One hashable key per band (two 32-bit rows packed into one 64-bit int)."""
+        if self.rows == 2:
+            return array("Q", sig.tobytes())
+        width = self.rows * 4
+        raw = sig.tobytes()
+        return [raw[start:start + width] for start in range(0, len(raw), width)]
+
+    def candidate_pairs(self, keyword_sets: list[set[str]]) -> dict[int, list[int]]:
+        """For each index i, the sorted indices j > i sharing at least one LSH band."""
+        ids = [i for i, keywords in enumerate(keyword_sets) if keywords]
+        flat = array("Q") if self.rows == 2 else []
+        for i in ids:
+            flat.extend(self._band_keys(self.signature(keyword_sets[i])))
+        neighbors: dict[int, set[int]] = defaultdict(set)
+        for band in range(self.bands):
+            column = flat[band::self.bands]
+            # Most band keys are unique; Counter finds the colliding ones in C
+            shared = {key for key, count in Counter(column).items() if count > 1}
+            if not shared:
+                continue
+            buckets: dict = defaultdict(list)
+            for i, key in zip(ids, column):
+                if key in shared:
+                    buckets[key].append(i)
+            for members in buckets.values():
+                for pos in range(len(members) - 1):
+                    neighbors[members[pos]].update(members[pos + 1:])
+        return {i: sorted(js) for i, js in neighbors.items()}
+
+    def save(self) -> None:
+        """Persist signatures used in this run (drops keyword sets that disappeared)."""
+        if self.path is None:
+            return
+        signatures = {k: v for k, v in self._signatures.items() if k in self._used}
+        try:
+            atomic_write_json(str(self.path), {
+                "version": SIGNATURES_VERSION,
+                "permutations": len(self._perms),
+                "seed": MINHASH_SEED,
+                "signatures": signatures,
+            })
+        except OSError as e:
+            print(f"  [WARN] Failed to persist MinHash signatures: {e}")
+
+
+def _similar_pairs(keyword_sets: list[set[str]], index: MinHashIndex | None) -> dict:
+    """Candidate neighbours j > i for each i: all pairs when small, LSH otherwise."""
+    n = len(keyword_sets)
+    if n <= EXACT_PAIRWISE_MAX:
+        return {i: range(i + 1, n) for i in range(n)}
+    if index is None:
+        index = MinHashIndex()
+    return index.candidate_pairs(keyword_sets)
+
+
 # ---------------------------------------------------------------------------
 # Core logic
 # ---------------------------------------------------------------------------
@@ -114,10 +269,48 @@ def load_series() -> dict:
         return json.load(f)
 
 
-def build_topic_stats(entries: list[dict]) -> dict[str, dict]:
+def load_kb_history(limit: int = KB_HISTORY_LIMIT) -> list[dict]:
+    """Fetch KB notes as registry-style entries (topic/tags/date) for full-history runs."""
+    url = f"{KB_API_BASE}/api/notes?limit={limit}&sort=createdAt&order=desc"
+    try:
+        req = urllib.request.Request(url, headers={"Accept": "application/json"})
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            raw = json.loads(resp.read().decode("utf-8"))
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        print(f"  [WARN] KB API unavailable ({KB_API_BASE}): {e}")
+        return []
+    notes = raw if isinstance(raw, list) else raw.get("data", raw.get("notes", raw.get("results", [])))
+    entries = []
+    for note in notes if isinstance(notes, list) else []:
+        title = str(note.get("title") or "").strip()
+        if not title:
+            continue
+        tags = note.get("tags") if isinstance(note.get("tags"), list) else []
+        entries.append({
+            "date": str(note.get("createdAt") or "")[:10] or None,
+            "task_type": "kb_note",
+            "topic": title,
+            "tags": [str(t) for t in tags],
+            "kb_note_title": title,
+        })
+    entries.reverse()  # oldest first, matching registry order
+    return entries
+
+
+def merge_kb_history(entries: list[dict], kb_entries: list[dict]) -> list[dict]:
+    """KB history first, then registry entries; notes already in the registry are skipped."""
+    registered = {e.get("kb_note_title") for e in entries if e.get("kb_note_title")}
+    return [e for e in kb_entries if e["kb_note_title"] not in registered] + list(entries)
+
+
+def build_topic_stats(entries: list[dict], index: MinHashIndex | None = None) -> dict[str, dict]:
     """
     Aggregate entries into topic clusters.
     Returns {cluster_label: {keywords, count, last_date, dates, word_count, entries}}.
+
+    Each unassigned entry seeds a cluster and absorbs later unassigned entries
+    whose keyword Jaccard with the seed is >= CLUSTER_JACCARD. Large inputs
+    only check MinHash/LSH candidates (see _similar_pairs).
     """
     # Step 1: compute keyword sets per entry
     entry_kws: list[tuple[dict, set[str]]] = []
@@ -128,7 +321,8 @@ def build_topic_stats(entries: list[dict]) -> dict[str, dict]:
         kws = _keyword_set(combined)
         entry_kws.append((e, kws))
 
-    # Step 2: greedy clustering by Jaccard overlap
+    # Step 2: greedy clustering by Jaccard overlap (candidates verified exactly)
+    neighbors = _similar_pairs([kws for _, kws in entry_kws], index)
     clusters: list[dict] = []
     assigned = [False] * len(entry_kws)
 
@@ -148,11 +342,12 @@ def build_topic_stats(entries: list[dict]) -> dict[str, dict]:
         cluster["word_count"] += len(entry_i.get("topic", ""))
         assigned[i] = True
 
-        for j, (entry_j, kws_j) in enumerate(entry_kws):
+        for j in neighbors.get(i, ()):
             if assigned[j]:
                 continue
+            entry_j, kws_j = entry_kws[j]
             sim = _jaccard(kws_i, kws_j)
-            if sim >= 0.25:
+            if sim >= CLUSTER_JACCARD:
                 cluster["entries"].append(entry_j)
                 cluster["keywords"] |= kws_j
                 dj = _parse_date(entry_j.get("date"))
@@ -328,13 +523,29 @@ def update_research_series(series_data: dict, scored: dict[str, dict]) -> dict:
 # ---------------------------------------------------------------------------
 
 def main():
+    parser = argparse.ArgumentParser(description="Research saturation analyzer (ADR-039)")
+    parser.add_argument("--include-kb", action="store_true",
+                        help="also cluster the full KB note history (GET /api/notes)")
+    parser.add_argument("--kb-limit", type=int, default=KB_HISTORY_LIMIT,
+                        help=f"max KB notes to fetch (default {KB_HISTORY_LIMIT})")
+    args = parser.parse_args()
+
     print("[research_saturation_analyzer] Loading research-registry.json ...")
     registry = load_registry()
     entries = registry.get("entries", [])
     print(f"  Found {len(entries)} entries")
 
+    if args.include_kb:
+        print("[research_saturation_analyzer] Loading KB note history ...")
+        kb_entries = load_kb_history(args.kb_limit)
+        entries = merge_kb_history(entries, kb_entries)
+        print(f"  Found {len(kb_entries)} KB notes, {len(entries)} entries total")
+
     print("[research_saturation_analyzer] Building topic clusters ...")
-    stats = build_topic_stats(entries)
+    index = MinHashIndex(SIGNATURES_PATH)
+    stats = build_topic_stats(entries, index)
+    if len(entries) > EXACT_PAIRWISE_MAX:
+        index.save()
     print(f"  Built {len(stats)} clusters")
 
     print("[research_saturation_analyzer] Computing saturation scores ...")
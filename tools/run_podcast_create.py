@@ -12,11 +12,17 @@ import argparse
 import json
 import re
 import subprocess
+import sys
 import urllib.request
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 PROJECT_DIR = Path(__file__).resolve().parent.parent
+if str(PROJECT_DIR) not in sys.path:
+    sys.path.insert(0, str(PROJECT_DIR))
+
+from tools.kb_snapshot import shared_snapshot  # noqa: E402
+
 HISTORY_PATH = PROJECT_DIR / "context" / "podcast-history.json"
 PODCAST_CFG = PROJECT_DIR / "config" / "podcast.yaml"
 
@@ -53,13 +59,8 @@ def fetch_hybrid_search(query: str, top_k: int = 15) -> list[dict]:
 
 
 def fetch_note(note_id: str) -> dict | None:
-    """GET /api/notes/{id}"""
-    url = f"{KB_BASE}/api/notes/{note_id}"
-    try:
-        with urllib.request.urlopen(urllib.request.Request(url), timeout=10) as resp:
-            return json.loads(resp.read().decode("utf-8"))
-    except Exception:
-        return None
+    """依 ID 取筆記：本地快照命中直接回傳，未命中才 GET /api/notes/{id}"""
+    return shared_snapshot(KB_BASE).get(note_id)
 
 
 def load_used_note_ids(within_days: int = 30) -> set[str]:
@@ -122,15 +123,12 @@ def has_excluded_tag(tags: list[str]) -> bool:
 
 
 def fetch_notes_list(limit: int = 250) -> list[dict]:
-    """GET /api/notes?limit=…（hybrid 無結果時的後備選材）"""
-    url = f"{KB_BASE}/api/notes?limit={limit}"
-    try:
-        with urllib.request.urlopen(urllib.request.Request(url), timeout=20) as resp:
-            data = json.loads(resp.read().decode("utf-8"))
-        return data.get("notes", data if isinstance(data, list) else [])
-    except Exception as e:
-        print(f"[WARN] 無法取得筆記列表: {e}")
-        return []
+    """本地快照增量同步後取最近更新的 limit 筆（hybrid 無結果時的後備選材）"""
+    snapshot = shared_snapshot(KB_BASE)
+    stats = snapshot.sync(limit)
+    if stats.get("error"):
+        print(f"[WARN] 無法同步筆記列表，改用本地快照（{stats['total']} 筆）: {stats['error']}")
+    return snapshot.notes()[:limit]
 
 
 def _note_updated_ts(note: dict) -> float:
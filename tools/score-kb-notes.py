@@ -24,13 +24,18 @@ tools/score-kb-notes.py
 import argparse
 import json
 import re
-import urllib.error
+import sys
 import urllib.request
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 # ─── 設定 ────────────────────────────────────────────────
-PROJECT_DIR   = Path(__file__).parent.parent
+PROJECT_DIR   = Path(__file__).resolve().parent.parent
+if str(PROJECT_DIR) not in sys.path:
+    sys.path.insert(0, str(PROJECT_DIR))
+
+from tools.kb_snapshot import shared_snapshot  # noqa: E402
+
 SCORES_PATH   = PROJECT_DIR / "state" / "kb-note-scores.json"
 HISTORY_PATH  = PROJECT_DIR / "context" / "podcast-history.json"
 try:
@@ -173,22 +178,12 @@ def score_note(note: dict) -> dict:
 # ─── KB API 查詢 ────────────────────────────────────────────
 
 def fetch_notes(limit: int = DEFAULT_LIMIT) -> list[dict]:
-    """從 KB API 查詢筆記（GET /api/notes）。"""
-    url = f"{KB_API_BASE}/api/notes?limit={limit}&sort=createdAt&order=desc"
-    try:
-        req = urllib.request.Request(url, headers={"Accept": "application/json"})
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            raw = json.loads(resp.read().decode('utf-8'))
-            # 相容多種回傳格式
-            if isinstance(raw, list):
-                return raw
-            return raw.get('data', raw.get('notes', raw.get('results', [])))
-    except urllib.error.URLError as e:
-        print(f"[ERROR] KB API 連線失敗 ({KB_API_BASE}): {e}")
-        return []
-    except Exception as e:
-        print(f"[ERROR] 查詢筆記失敗: {e}")
-        return []
+    """增量同步本地快照（cache/kb-notes-snapshot.json）後取最新建立的 limit 筆。"""
+    snapshot = shared_snapshot(KB_API_BASE)
+    stats = snapshot.sync(limit)
+    if stats.get("error"):
+        print(f"[WARN] KB API 同步失敗 ({KB_API_BASE})，改用本地快照: {stats['error']}")
+    return snapshot.notes(sort_key="createdAt")[:limit]
 
 
 def check_kb_health() -> bool:
@@ -262,8 +257,10 @@ def main():
 
     # 健康檢查
     if not check_kb_health():
-        print("[WARN] KB API 服務未啟動，跳過評分")
-        return
+        if not shared_snapshot(KB_API_BASE).notes_by_id:
+            print("[WARN] KB API 服務未啟動，跳過評分")
+            return
+        print("[WARN] KB API 服務未啟動，以本地快照評分")
 
     # 查詢筆記
     print(f"[INFO] 查詢 KB 筆記（上限 {args.limit} 筆）...")
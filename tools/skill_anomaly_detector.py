@@ -14,7 +14,9 @@ from __future__ import annotations
 
 import json
 import statistics
-from collections import Counter, defaultdict
+import sys
+from collections import Counter, OrderedDict, defaultdict
+from collections.abc import Iterable, Iterator
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
@@ -24,6 +26,11 @@ LOGS_DIR = PROJECT_ROOT / "logs" / "structured"
 ANALYSIS_DIR = PROJECT_ROOT / "analysis"
 CONTEXT_DIR = PROJECT_ROOT / "context"
 
+_HOOKS_DIR = str(PROJECT_ROOT / "hooks")
+if _HOOKS_DIR not in sys.path:
+    sys.path.insert(0, _HOOKS_DIR)
+from log_index import load_frame  # noqa: E402
+
 LOOKBACK_DAYS = 7
 
 # Anomaly thresholds
@@ -33,6 +40,11 @@ HIGH_FAILURE_RATE = 0.30
 INEFFICIENT_IO_BYTES = 10_000  # 10 KB per call
 DUPLICATE_API_THRESHOLD = 3  # same URL in one session
 REPEATED_READ_THRESHOLD = 3  # same file read >N times in a session
+CONFIG_READ_THRESHOLD = 2  # same config/yaml file read >N times in a session
+CIRCULAR_MIN_OSCILLATIONS = 2  # A->B->A seen at least N times in a session
+# Chain analysis keeps rolling state for at most this many open sessions; the
+# least recently active session is finalized when the cap is exceeded.
+MAX_OPEN_SESSIONS = 4096
 
 
 def _today() -> datetime:
@@ -47,27 +59,28 @@ def _date_range(days: int) -> list[str]:
 
 
 def load_entries(days: int = LOOKBACK_DAYS) -> list[dict]:
-    """Load JSONL entries from recent N days."""
-    entries: list[dict] = []
-    dates = _date_range(days)
-    for date_str in dates:
-        path = LOGS_DIR / f"{date_str}.jsonl"
-        if not path.exists():
-            continue
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    entry = json.loads(line)
-                    entries.append(entry)
-                except json.JSONDecodeError:
-                    continue
-    return entries
+    """Load entries from recent N days via the shared log index (ts is epoch seconds)."""
+    frame = load_frame(LOGS_DIR, dates=_date_range(days))
+    return frame.rows(
+        "ts", "tool", "sid", "trace_id", "summary", "input_len", "output_len", "has_error",
+    )
 
 
-def compute_tool_stats(entries: list[dict]) -> dict[str, dict]:
+def iter_entries(days: int = LOOKBACK_DAYS) -> Iterator[dict]:
+    """Stream entries oldest day first, materializing only one day's rows at a time.
+
+    Each log file is append-only in time order, so the stream is already
+    chronological within a session. Segments bypass the log_index process
+    cache, so a day's columns are released once its rows are consumed.
+    """
+    for day in reversed(_date_range(days)):
+        frame = load_frame(LOGS_DIR, dates=[day], cache=False)
+        yield from frame.rows(
+            "ts", "tool", "sid", "trace_id", "summary", "input_len", "output_len", "has_error",
+        )
+
+
+def compute_tool_stats(entries: Iterable[dict]) -> dict[str, dict]:
     """Compute per-tool statistics: call_count, total_input, total_output, failures, avg_io."""
     stats: dict[str, dict] = defaultdict(lambda: {
         "call_count": 0,
@@ -77,7 +90,7 @@ def compute_tool_stats(entries: list[dict]) -> dict[str, dict]:
         "durations": [],
     })
     for e in entries:
-        tool = e.get("tool", "unknown")
+        tool = e.get("tool") or "unknown"
         s = stats[tool]
         s["call_count"] += 1
         s["total_input"] += e.get("input_len", 0)
@@ -175,24 +188,22 @@ def detect_inefficient_io(tool_stats: dict[str, dict]) -> list[dict]:
     return anomalies
 
 
-def detect_duplicate_api(entries: list[dict]) -> list[dict]:
+def detect_duplicate_api(entries: Iterable[dict]) -> list[dict]:
     """Detect same URL/summary called >3 times in a single session."""
-    # Group by session (sid)
-    sessions: dict[str, list[dict]] = defaultdict(list)
+    # Per-session (tool, summary) counters; entries themselves are not kept
+    sessions: dict[str, Counter] = defaultdict(Counter)
     for e in entries:
         sid = e.get("sid", "")
-        if sid:
-            sessions[sid].append(e)
+        if not sid:
+            continue
+        url_counts = sessions[sid]
+        summary = e.get("summary", "")
+        if summary:
+            url_counts[(e.get("tool", ""), summary)] += 1
 
     anomalies = []
     seen_pairs: set[tuple[str, str]] = set()
-    for sid, session_entries in sessions.items():
-        url_counts: Counter = Counter()
-        for e in session_entries:
-            summary = e.get("summary", "")
-            tool = e.get("tool", "")
-            if summary:
-                url_counts[(tool, summary)] += 1
+    for sid, url_counts in sessions.items():
         for (tool, summary), count in url_counts.items():
             if count > DUPLICATE_API_THRESHOLD:
                 key = (tool, summary)
@@ -213,29 +224,67 @@ def detect_duplicate_api(entries: list[dict]) -> list[dict]:
     return anomalies
 
 
-def analyze_skill_chains(entries: list[dict]) -> dict:
-    """Analyze call chains per session for inefficiencies."""
-    sessions: dict[str, list[dict]] = defaultdict(list)
-    for e in entries:
-        sid = e.get("sid") or e.get("trace_id", "")
-        if sid:
-            sessions[sid].append(e)
+class _SessionState:
+    """Rolling per-session state: last two tools, A->B->A counts, Read counts."""
+
+    __slots__ = ("order", "prev2", "prev1", "oscillations", "reads")
+
+    def __init__(self, order: int) -> None:
+        self.order = order  # first-appearance rank, used for stable report order
+        self.prev2: str | None = None
+        self.prev1: str | None = None
+        self.oscillations: Counter = Counter()  # (A, B) -> count of A->B->A windows
+        self.reads: Counter = Counter()  # Read summary -> count
+
+    def add(self, tool: str, summary: str) -> None:
+        if self.prev2 == tool and self.prev1 != tool:
+            self.oscillations[(tool, self.prev1)] += 1
+        self.prev2, self.prev1 = self.prev1, tool
+        if tool == "Read":
+            self.reads[summary] += 1
+
+
+def _short(path: str) -> str:
+    return path if len(path) <= 80 else path[:77] + "..."
+
 
-    inefficient_chains: list[dict] = []
+def _chain_weight(chain: dict) -> int:
+    return chain.get("read_count", chain.get("oscillation_count", 0))
 
-    for sid, session_entries in sessions.items():
-        # Sort by timestamp
-        session_entries.sort(key=lambda x: x.get("ts", ""))
 
+class SessionChainAnalyzer:
+    """Single-pass chain analysis over a chronological log stream.
+
+    Memory is bounded by the open-session cap and each session's distinct
+    files/tool pairs, not by the number of entries.
+    """
+
+    def __init__(self, max_open_sessions: int = MAX_OPEN_SESSIONS) -> None:
+        self.max_open_sessions = max_open_sessions
+        self._open: OrderedDict[str, _SessionState] = OrderedDict()
+        self._seen: set[str] = set()
+        self._chains: dict[str, dict] = {}  # type:file|pattern -> highest-count chain
+
+    def add(self, entry: dict) -> None:
+        sid = entry.get("sid") or entry.get("trace_id", "")
+        if not sid:
+            return
+        state = self._open.get(sid)
+        if state is None:
+            state = self._open[sid] = _SessionState(len(self._seen))
+            self._seen.add(sid)
+            if len(self._open) > self.max_open_sessions:
+                self._finalize(*self._open.popitem(last=False))
+        else:
+            self._open.move_to_end(sid)
+        state.add(entry.get("tool", ""), entry.get("summary", ""))
+
+    def _finalize(self, sid: str, state: _SessionState) -> None:
         # Pattern 1: Read same file >3 times
-        read_files: Counter = Counter()
-        for e in session_entries:
-            if e.get("tool") == "Read":
-                read_files[e.get("summary", "")] += 1
-        for filepath, count in read_files.items():
+        for filepath, count in state.reads.items():
             if count > REPEATED_READ_THRESHOLD:
-                short_path = filepath if len(filepath) <= 80 else filepath[:77] + "..."
-                inefficient_chains.append({
+                short_path = _short(filepath)
+                self._keep("file", {
                     "type": "repeated_read",
                     "session_id": sid,
                     "file": short_path,
@@ -244,38 +293,22 @@ def analyze_skill_chains(entries: list[dict]) -> dict:
                 })
 
         # Pattern 2: Circular calls (A->B->A pattern in tool sequence)
-        tool_sequence = [e.get("tool", "") for e in session_entries]
-        if len(tool_sequence) >= 3:
-            circular_pairs: set[tuple[str, str]] = set()
-            for i in range(len(tool_sequence) - 2):
-                if tool_sequence[i] == tool_sequence[i + 2] and tool_sequence[i] != tool_sequence[i + 1]:
-                    pair = (tool_sequence[i], tool_sequence[i + 1])
-                    circular_pairs.add(pair)
-            for a, b in circular_pairs:
-                # Only flag if it happens frequently (>2 oscillations)
-                pattern_count = sum(
-                    1 for i in range(len(tool_sequence) - 2)
-                    if tool_sequence[i] == a and tool_sequence[i + 1] == b and tool_sequence[i + 2] == a
-                )
-                if pattern_count >= 2:
-                    inefficient_chains.append({
-                        "type": "circular_call",
-                        "session_id": sid,
-                        "pattern": f"{a} ↔ {b}",
-                        "oscillation_count": pattern_count,
-                        "suggestion": f"偵測到 {a} ↔ {b} 來回切換 {pattern_count} 次。建議合併操作或重構工作流程。",
-                    })
+        for (a, b), pattern_count in state.oscillations.items():
+            if pattern_count >= CIRCULAR_MIN_OSCILLATIONS:
+                self._keep("pattern", {
+                    "type": "circular_call",
+                    "session_id": sid,
+                    "pattern": f"{a} ↔ {b}",
+                    "oscillation_count": pattern_count,
+                    "suggestion": f"偵測到 {a} ↔ {b} 來回切換 {pattern_count} 次。建議合併操作或重構工作流程。",
+                })
 
         # Pattern 3: Not using cache - reading config files that should be cached
-        config_reads = [
-            e for e in session_entries
-            if e.get("tool") == "Read" and ("config" in e.get("summary", "").lower() or "yaml" in e.get("summary", "").lower())
-        ]
-        config_file_counts: Counter = Counter(e.get("summary", "") for e in config_reads)
-        for filepath, count in config_file_counts.items():
-            if count > 2:
-                short_path = filepath if len(filepath) <= 80 else filepath[:77] + "..."
-                inefficient_chains.append({
+        for filepath, count in state.reads.items():
+            lowered = filepath.lower()
+            if count > CONFIG_READ_THRESHOLD and ("config" in lowered or "yaml" in lowered):
+                short_path = _short(filepath)
+                self._keep("file", {
                     "type": "uncached_config",
                     "session_id": sid,
                     "file": short_path,
@@ -283,19 +316,35 @@ def analyze_skill_chains(entries: list[dict]) -> dict:
                     "suggestion": f"配置檔 '{short_path}' 在同一 session 讀取 {count} 次，建議載入後快取。",
                 })
 
-    # Deduplicate by type+file (keep highest count)
-    deduped: dict[str, dict] = {}
-    for chain in inefficient_chains:
-        key = f"{chain['type']}:{chain.get('file', chain.get('pattern', ''))}"
-        if key not in deduped or chain.get("read_count", chain.get("oscillation_count", 0)) > deduped[key].get("read_count", deduped[key].get("oscillation_count", 0)):
-            deduped[key] = chain
+    def _keep(self, field: str, chain: dict) -> None:
+        """Deduplicate by type+file/pattern, keeping the highest count."""
+        key = f"{chain['type']}:{chain[field]}"
+        current = self._chains.get(key)
+        if current is None or _chain_weight(chain) > _chain_weight(current):
+            self._chains[key] = chain
+
+    def result(self) -> dict:
+        for sid, state in sorted(self._open.items(), key=lambda item: item[1].order):
+            self._finalize(sid, state)
+        self._open.clear()
+        return {
+            "scan_period_days": LOOKBACK_DAYS,
+            "total_sessions_analyzed": len(self._seen),
+            "inefficient_chains": list(self._chains.values()),
+            "generated_at": _today().isoformat(),
+        }
+
 
-    return {
-        "scan_period_days": LOOKBACK_DAYS,
-        "total_sessions_analyzed": len(sessions),
-        "inefficient_chains": list(deduped.values()),
-        "generated_at": _today().isoformat(),
-    }
+def analyze_skill_chains(entries: Iterable[dict]) -> dict:
+    """Analyze call chains per session for inefficiencies (single streaming pass).
+
+    Entries must arrive in chronological order within each session, as they do
+    when streamed from the append-only logs (see iter_entries).
+    """
+    analyzer = SessionChainAnalyzer()
+    for e in entries:
+        analyzer.add(e)
+    return analyzer.result()
 
 
 def build_health_report(
@@ -362,15 +411,15 @@ def main() -> None:
     print(f"[Skill Anomaly Detector] Scanning {LOOKBACK_DAYS} days of logs...")
     print(f"  Logs dir: {LOGS_DIR}")
 
-    # Load
-    entries = load_entries(LOOKBACK_DAYS)
-    print(f"  Loaded {len(entries)} log entries")
+    # Each analysis streams the logs day by day; log_index keeps the parsed
+    # columns in process, so re-streaming does not re-parse any JSON.
+    tool_stats = compute_tool_stats(iter_entries(LOOKBACK_DAYS))
+    total_entries = sum(s["call_count"] for s in tool_stats.values())
+    print(f"  Loaded {total_entries} log entries")
 
-    if not entries:
+    if not total_entries:
         print("  No log entries found. Generating empty reports.")
 
-    # Tool stats
-    tool_stats = compute_tool_stats(entries)
     print(f"  Tracked {len(tool_stats)} unique tools")
 
     # Detect anomalies
@@ -379,21 +428,21 @@ def main() -> None:
     anomalies.extend(detect_underuse(tool_stats))
     anomalies.extend(detect_high_failure_rate(tool_stats))
     anomalies.extend(detect_inefficient_io(tool_stats))
-    anomalies.extend(detect_duplicate_api(entries))
+    anomalies.extend(detect_duplicate_api(iter_entries(LOOKBACK_DAYS)))
     print(f"  Detected {len(anomalies)} anomalies")
 
     # Chain analysis
-    chain_analysis = analyze_skill_chains(entries)
+    chain_analysis = analyze_skill_chains(iter_entries(LOOKBACK_DAYS))
     print(f"  Found {len(chain_analysis['inefficient_chains'])} inefficient chains")
 
     # Health report
-    health_report = build_health_report(tool_stats, anomalies, chain_analysis, len(entries))
+    health_report = build_health_report(tool_stats, anomalies, chain_analysis, total_entries)
 
     # Baseline (tool stats + anomalies)
     baseline = {
         "generated_at": _today().isoformat(),
         "scan_period_days": LOOKBACK_DAYS,
-        "total_entries": len(entries),
+        "total_entries": total_entries,
         "tool_stats": tool_stats,
         "anomalies": anomalies,
     }
@@ -5,28 +5,62 @@
 分析 logs/structured/*.jsonl 中各小時的失敗率，結合外部 SLA 盤點，
 計算當前時段的風險評分，供 run-todoist-agent-team.ps1 Phase 0e 閘門使用。
 
+24 小時的評分物化於 state/time-slot-risk.json，並記錄計算當下各日誌檔的
+(size, mtime_ns) 與 config/external-sla.yaml 的雜湊；閘門只需比對簽章後查表。
+當日日誌每次工具呼叫都會附加，不列入簽章，改以 MAX_STALENESS_SECONDS 限制
+報告年齡；過去日誌或 SLA 設定變更、跨日、報告過舊時才重新計算
+（log_index 只解析新增的行）。報告過舊但簽章僅日誌部分不符、且未超過
+MAX_SERVE_STALE_SECONDS 時，閘門先沿用舊報告並在背景啟動 --refresh，
+不在閘門路徑上同步重算；沒有可用報告或 SLA 設定變更時才同步計算。
+
 使用方式：
   uv run python tools/time_slot_risk_scorer.py
   uv run python tools/time_slot_risk_scorer.py --hour 5
   uv run python tools/time_slot_risk_scorer.py --days 14 --format json
+  uv run python tools/time_slot_risk_scorer.py --refresh       # 背景排程：重新物化
   uv run python tools/time_slot_risk_scorer.py --write-report
 """
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
+import operator
+import os
+import subprocess
 import sys
+from array import array
 from collections import Counter, defaultdict
 from dataclasses import asdict, dataclass, field
-from datetime import date, datetime, timedelta
+from datetime import datetime
 from pathlib import Path
-from typing import Iterator
 
 REPO_ROOT = Path(__file__).parent.parent
 LOG_DIR = REPO_ROOT / "logs" / "structured"
 EXTERNAL_SLA_PATH = REPO_ROOT / "config" / "external-sla.yaml"
 STATE_DIR = REPO_ROOT / "state"
-
+RISK_REPORT_PATH = STATE_DIR / "time-slot-risk.json"
+CACHE_VERSION = 2
+DEFAULT_DAYS = 14
+# 物化報告可沿用的最長時間（當日日誌的新增內容最多延遲這麼久才反映）
+MAX_STALENESS_SECONDS = 1800
+# 過期報告在背景重算期間仍可沿用的上限，超過則閘門同步重算
+MAX_SERVE_STALE_SECONDS = 6 * 3600
+# 背景重算的節流：標記檔在此秒數內更新過就不再啟動新的 --refresh
+REFRESH_THROTTLE_SECONDS = 300
+REFRESH_MARKER_PATH = STATE_DIR / "time-slot-risk.refresh"
+
+_HOOKS_DIR = str(REPO_ROOT / "hooks")
+if _HOOKS_DIR not in sys.path:
+    sys.path.insert(0, _HOOKS_DIR)
+from hook_utils import atomic_write_json, safe_load_json  # noqa: E402
+from hour_histogram import build_matrix  # noqa: E402
+from log_index import load_frame, recent_dates  # noqa: E402
+
+try:  # numpy 為選用依賴；未安裝時以 array 模組逐元素相加
+    import numpy as np
+except ImportError:  # pragma: no cover - 僅在未安裝 numpy 的環境執行
+    np = None
 
 # ── 資料結構 ────────────────────────────────────────────────────────────────
 
@@ -37,6 +71,7 @@ class HourStats:
     failed_runs: int
     failure_rate: float
     failure_modes: dict = field(default_factory=dict)  # {"timeout": 3, "api_error": 2}
+    failure_trend: float = 0.0         # 每日失敗率的線性斜率（/天），> 0 表示惡化中
 
 
 @dataclass
@@ -79,36 +114,29 @@ def _load_sla_config() -> dict:
 
 # ── 日誌讀取 ─────────────────────────────────────────────────────────────────
 
-def _iter_jsonl(path: Path) -> Iterator[dict]:
-    """逐行解析 JSONL，跳過無效行。"""
-    try:
-        with open(path, encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    yield json.loads(line)
-                except json.JSONDecodeError:
-                    pass
-    except OSError:
-        pass
+def _load_recent_frame(days: int):
+    """讀取最近 N 天日誌的欄式索引（log_index，僅解析新增的行）。"""
+    return load_frame(LOG_DIR, dates=recent_dates(days))
 
 
-def _load_recent_entries(days: int) -> list[dict]:
-    """讀取最近 N 天的日誌記錄。"""
-    entries = []
-    today = date.today()
-    for i in range(days):
-        d = today - timedelta(days=i)
-        log_file = LOG_DIR / f"{d.isoformat()}.jsonl"
-        if log_file.exists():
-            entries.extend(_iter_jsonl(log_file))
-    return entries
+def _local_utc_offset() -> int:
+    """本機時區的 UTC 偏移秒數（日誌的日期分桶用）。"""
+    offset = datetime.now().astimezone().utcoffset()
+    return int(offset.total_seconds()) if offset else 0
 
 
 # ── 核心分析 ─────────────────────────────────────────────────────────────────
 
+def _failure_weights(has_error: array, loop_suspected: array):
+    """逐列失敗權重（has_error + loop-suspected，0-2）的 uint8 陣列。
+
+    兩者皆為 "B" typed array：有 numpy 時以 frombuffer 直接相加，不建立逐列 Python 物件。
+    """
+    if np is not None:
+        return np.frombuffer(has_error, dtype=np.uint8) + np.frombuffer(loop_suspected, dtype=np.uint8)
+    return array("B", map(operator.add, has_error, loop_suspected))
+
+
 def compute_hour_stats(days: int = 14) -> dict[int, HourStats]:
     """
     掃描最近 N 天的日誌，依 hour_of_day 統計各小時失敗率。
@@ -116,47 +144,47 @@ def compute_hour_stats(days: int = 14) -> dict[int, HourStats]:
     Returns:
         dict mapping hour (0-23) → HourStats
     """
-    entries = _load_recent_entries(days)
-
-    hour_data: dict[int, dict] = defaultdict(lambda: {
-        "total": 0, "errors": 0, "modes": Counter()
-    })
-
-    for entry in entries:
-        ts = entry.get("ts", "")
-        if not ts:
-            continue
-        try:
-            hour = datetime.fromisoformat(ts).hour
-        except (ValueError, TypeError):
-            continue
-
-        hour_data[hour]["total"] += 1
-        if entry.get("has_error"):
-            hour_data[hour]["errors"] += 1
-            mode = entry.get("error_category", "unknown")
-            hour_data[hour]["modes"][mode] += 1
-        # loop-suspected 也計為失敗信號
-        if "loop-suspected" in entry.get("tags", []):
-            hour_data[hour]["errors"] += 1
-            hour_data[hour]["modes"]["loop_suspected"] += 1
+    frame = _load_recent_frame(days)
+
+    # loop-suspected 也計為失敗信號（與 has_error 分別計次）
+    failures = _failure_weights(frame.numeric("has_error"), frame.tag_mask("loop-suspected"))
+    matrix = build_matrix(frame.numeric("ts"), failures,
+                          utc_offset=_local_utc_offset(), hours=frame.numeric("hour"))
+
+    # 失敗模式只需解碼失敗列的 error_category
+    modes: dict[int, Counter] = defaultdict(Counter)
+    failed = frame.where(failures.tobytes())
+    for hour, err, mode, loop in zip(
+        failed.column("hour"),
+        failed.column("has_error"),
+        failed.column("error_category"),
+        failed.has_tag("loop-suspected"),
+    ):
+        if err:
+            modes[hour][mode or "unknown"] += 1
+        if loop:
+            modes[hour]["loop_suspected"] += 1
 
     result: dict[int, HourStats] = {}
-    for h, data in hour_data.items():
-        total = data["total"]
-        errors = data["errors"]
+    for h, (total, errors, trend) in enumerate(zip(
+        matrix.hour_totals(), matrix.hour_failures(), matrix.trends()
+    )):
+        if not total:
+            continue
         result[h] = HourStats(
             hour=h,
             total_runs=total,
             failed_runs=errors,
-            failure_rate=errors / total if total > 0 else 0.0,
-            failure_modes=dict(data["modes"].most_common(5)),
+            failure_rate=errors / total,
+            failure_modes=dict(modes[h].most_common(5)),
+            failure_trend=trend,
         )
 
     return result
 
 
-def score_time_slot(hour: int, hour_stats: dict[int, HourStats]) -> RiskScore:
+def score_time_slot(hour: int, hour_stats: dict[int, HourStats],
+                    config: dict | None = None) -> RiskScore:
     """
     套用多因子加權風險評分模型，計算指定小時的風險評分。
 
@@ -166,7 +194,8 @@ def score_time_slot(hour: int, hour_stats: dict[int, HourStats]) -> RiskScore:
     3. resource_contention — 資源競爭（尖峰時段特徵）
     4. task_complexity — 任務複雜度（靜態基準）
     """
-    config = _load_sla_config()
+    if config is None:
+        config = _load_sla_config()
     weights = config.get("risk_model", {}).get("weights", {})
     thresholds = config.get("risk_model", {}).get("thresholds", {})
     known_high_risk = set(config.get("known_high_risk_hours", [5, 7, 13]))
@@ -250,26 +279,130 @@ def score_time_slot(hour: int, hour_stats: dict[int, HourStats]) -> RiskScore:
     )
 
 
-def get_current_risk(days: int = 14) -> RiskScore:
+def get_current_risk(days: int = DEFAULT_DAYS, hour: int | None = None) -> RiskScore:
     """
-    一站式函式：計算當前小時的風險評分。
-    供 PS1 腳本直接呼叫。
+    一站式函式：查詢當前（或指定）小時的風險評分。
+    供 PS1 腳本直接呼叫；物化報告在 MAX_STALENESS_SECONDS 內且簽章相符時只是查表。
+    報告過舊或日誌已變更時先沿用舊報告並背景 --refresh；無可用報告才同步重算並寫回。
     """
-    current_hour = datetime.now().hour
-    hour_stats = compute_hour_stats(days=days)
-    return score_time_slot(current_hour, hour_stats)
+    if hour is None:
+        hour = datetime.now().hour
+    report = load_risk_report(days=days)
+    if report is None:
+        report = load_risk_report(days=days, max_age=MAX_SERVE_STALE_SECONDS, check_logs=False)
+        if report is not None:
+            spawn_background_refresh(days)
+        else:
+            report = write_risk_report(days=days)
+    try:
+        return RiskScore(**report["hour_risks"][str(hour)])
+    except (KeyError, TypeError):
+        return score_time_slot(hour, compute_hour_stats(days=days))
+
+
+def _cache_signature(days: int) -> dict:
+    """物化報告的失效簽章：視窗內過去各日日誌 (size, mtime_ns) + external-sla.yaml 雜湊。
+
+    當日日誌只記日期（跨日即失效），其新增內容由 MAX_STALENESS_SECONDS 控制。
+    """
+    today, *past = recent_dates(days)
+    logs = {today: "active"}
+    for day in past:
+        try:
+            st = (LOG_DIR / f"{day}.jsonl").stat()
+            logs[day] = [st.st_size, st.st_mtime_ns]
+        except OSError:
+            logs[day] = None
+    try:
+        sla_hash = hashlib.sha256(EXTERNAL_SLA_PATH.read_bytes()).hexdigest()
+    except OSError:
+        sla_hash = ""
+    return {
+        "version": CACHE_VERSION,
+        "log_dir": str(LOG_DIR),
+        "days": days,
+        "logs": logs,
+        "external_sla_sha256": sla_hash,
+    }
 
 
-def write_risk_report(output_path: str | None = None) -> dict:
+def load_risk_report(
+    days: int = DEFAULT_DAYS,
+    path: str | None = None,
+    max_age: float | None = MAX_STALENESS_SECONDS,
+    check_logs: bool = True,
+) -> dict | None:
+    """讀取物化報告；簽章不符、超過 max_age 秒（None 不限）或格式不完整時回傳 None。
+
+    check_logs=False 時不比對各日日誌的 (size, mtime_ns)，只要求版本、日誌目錄、
+    視窗天數與 SLA 雜湊相符（供閘門在背景重算期間沿用舊報告）。
     """
-    計算當前時段風險並寫入 state/time-slot-risk.json。
+    report = safe_load_json(str(path or RISK_REPORT_PATH))
+    if not isinstance(report, dict):
+        return None
+    cache, signature = report.get("cache"), _cache_signature(days)
+    if not check_logs and isinstance(cache, dict):
+        cache = {**cache, "logs": signature["logs"]}
+    if cache != signature:
+        return None
+    if max_age is not None:
+        try:
+            generated = datetime.fromisoformat(report["generated_at"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        if (datetime.now().astimezone() - generated).total_seconds() > max_age:
+            return None
+    hour_risks = report.get("hour_risks")
+    if not isinstance(hour_risks, dict) or len(hour_risks) != 24:
+        return None
+    return report
+
+
+def spawn_background_refresh(days: int = DEFAULT_DAYS) -> bool:
+    """在背景啟動 --refresh 重新物化報告；REFRESH_THROTTLE_SECONDS 內已啟動過則略過。
 
     Returns:
-        報告 dict（含 generated_at, current_hour, risk, hour_stats）
+        是否實際啟動了子進程
     """
+    try:
+        age = datetime.now().timestamp() - REFRESH_MARKER_PATH.stat().st_mtime
+        if 0 <= age < REFRESH_THROTTLE_SECONDS:
+            return False
+    except OSError:
+        pass
+    try:
+        REFRESH_MARKER_PATH.parent.mkdir(parents=True, exist_ok=True)
+        REFRESH_MARKER_PATH.touch()
+    except OSError:
+        return False
+    kwargs = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL,
+              "stderr": subprocess.DEVNULL, "close_fds": True}
+    if os.name == "nt":
+        kwargs["creationflags"] = (getattr(subprocess, "DETACHED_PROCESS", 0)
+                                   | getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0))
+    else:
+        kwargs["start_new_session"] = True
+    try:
+        subprocess.Popen([sys.executable, str(Path(__file__).resolve()), "--refresh",
+                          "--days", str(days), "--format", "text"], **kwargs)
+    except OSError:
+        return False
+    return True
+
+
+def write_risk_report(output_path: str | None = None, days: int = DEFAULT_DAYS) -> dict:
+    """
+    重新計算 24 小時風險並物化到 state/time-slot-risk.json。
+
+    Returns:
+        報告 dict（含 generated_at, current_hour, risk, hour_stats, hour_risks, cache）
+    """
+    # 簽章先於讀取日誌取得：計算期間若有新日誌寫入，下次查詢會判定失效
+    signature = _cache_signature(days)
     current_hour = datetime.now().hour
-    hour_stats = compute_hour_stats()
-    risk = score_time_slot(current_hour, hour_stats)
+    hour_stats = compute_hour_stats(days=days)
+    config = _load_sla_config()
+    hour_risks = {str(h): asdict(score_time_slot(h, hour_stats, config)) for h in range(24)}
 
     # 序列化 hour_stats
     stats_dict = {}
@@ -280,20 +413,21 @@ def write_risk_report(output_path: str | None = None) -> dict:
             "failed_runs": s.failed_runs,
             "failure_rate": round(s.failure_rate, 4),
             "failure_modes": s.failure_modes,
+            "failure_trend": round(s.failure_trend, 4),
         }
 
     report = {
         "generated_at": datetime.now().astimezone().isoformat(),
         "current_hour": current_hour,
-        "risk": asdict(risk),
+        "risk": hour_risks[str(current_hour)],
         "hour_stats": stats_dict,
+        "hour_risks": hour_risks,
+        "cache": signature,
     }
 
-    target_path = output_path or str(STATE_DIR / "time-slot-risk.json")
+    target_path = output_path or str(RISK_REPORT_PATH)
     try:
-        Path(target_path).parent.mkdir(parents=True, exist_ok=True)
-        with open(target_path, "w", encoding="utf-8") as f:
-            json.dump(report, f, ensure_ascii=False, indent=2)
+        atomic_write_json(target_path, report)
     except OSError as e:
         print(f"[time_slot_risk_scorer] 寫入報告失敗: {e}", file=sys.stderr)
 
@@ -308,14 +442,15 @@ def main() -> None:
     parser.add_argument("--days", type=int, default=14, help="分析最近 N 天日誌（預設 14）")
     parser.add_argument("--format", choices=["json", "text"], default="json")
     parser.add_argument("--write-report", action="store_true", help="寫入 state/time-slot-risk.json")
+    parser.add_argument("--refresh", action="store_true",
+                        help="重新計算並物化 state/time-slot-risk.json（背景排程用）")
     args = parser.parse_args()
 
     hour = args.hour if args.hour is not None else datetime.now().hour
-    hour_stats = compute_hour_stats(days=args.days)
-    risk = score_time_slot(hour, hour_stats)
 
-    if args.write_report:
-        report = write_risk_report()
+    if args.write_report or args.refresh:
+        report = write_risk_report(days=args.days)
+        risk = get_current_risk(days=args.days, hour=hour)
         if args.format == "json":
             print(json.dumps(report, ensure_ascii=False, indent=2))
         else:
@@ -325,6 +460,7 @@ def main() -> None:
                 print(f"  跳過類型: {', '.join(risk.skip_task_types)}")
         return
 
+    risk = get_current_risk(days=args.days, hour=hour)
     if args.format == "json":
         output = {
             "generated_at": datetime.now().astimezone().isoformat(),
@@ -17,13 +17,18 @@ import argparse
 import json
 import sys
 from collections import Counter, defaultdict
-from datetime import date, datetime, timedelta
+from datetime import datetime
 from pathlib import Path
-from typing import Iterator
 
 REPO_ROOT = Path(__file__).parent.parent
 LOG_DIR = REPO_ROOT / "logs" / "structured"
 
+_HOOKS_DIR = str(REPO_ROOT / "hooks")
+if _HOOKS_DIR not in sys.path:
+    sys.path.insert(0, _HOOKS_DIR)
+from hour_histogram import build_matrix  # noqa: E402
+from log_index import load_frame, recent_dates  # noqa: E402
+
 # ── 根因規則（pattern → suggested_fix）──────────────────────────────────────
 ROOT_CAUSE_RULES: list[dict] = [
     {
@@ -65,29 +70,9 @@ ROOT_CAUSE_RULES: list[dict] = [
 ]
 
 
-def _iter_jsonl(path: Path) -> Iterator[dict]:
-    """逐行解析 JSONL，跳過無效行。"""
-    with open(path, encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                yield json.loads(line)
-            except json.JSONDecodeError:
-                pass
-
-
-def _load_recent_entries(days: int) -> list[dict]:
-    """讀取最近 N 天的日誌記錄。"""
-    entries = []
-    today = date.today()
-    for i in range(days):
-        d = today - timedelta(days=i)
-        log_file = LOG_DIR / f"{d.isoformat()}.jsonl"
-        if log_file.exists():
-            entries.extend(_iter_jsonl(log_file))
-    return entries
+def _load_recent_frame(days: int):
+    """讀取最近 N 天日誌的欄式索引（log_index，僅解析新增的行）。"""
+    return load_frame(LOG_DIR, dates=recent_dates(days))
 
 
 def _match_rule(entry: dict, pattern: dict) -> bool:
@@ -203,18 +188,16 @@ def run_analysis(days: int = 3, trace_id_filter: str | None = None) -> dict:
             "traces": list[dict],
         }
     """
-    entries = _load_recent_entries(days)
-
-    # 依 trace_id 分組（空 trace_id 的記錄跳過）
-    trace_groups: dict[str, list[dict]] = defaultdict(list)
-    for entry in entries:
-        tid = entry.get("trace_id", "")
-        if not tid:
-            continue
-        trace_groups[tid].append(entry)
+    frame = _load_recent_frame(days)
 
+    # 依 trace_id 分組（空 trace_id 的記錄跳過）；先在索引上篩選，只讀回需要的完整記錄
     if trace_id_filter:
-        trace_groups = {k: v for k, v in trace_groups.items() if k == trace_id_filter}
+        traced = frame.where(tid == trace_id_filter for tid in frame.column("trace_id"))
+    else:
+        traced = frame.where(frame.column("trace_id"))
+    trace_groups: dict[str, list[dict]] = defaultdict(list)
+    for entry in traced.records():
+        trace_groups[entry.get("trace_id", "")].append(entry)
 
     results = []
     for tid, trace_entries in trace_groups.items():
@@ -251,7 +234,7 @@ def run_analysis(days: int = 3, trace_id_filter: str | None = None) -> dict:
         "healthy_traces": len(healthy_traces),
         "top_issues": top_issues,
         "traces": sorted(results, key=lambda r: r["error_count"], reverse=True),
-        "hour_breakdown": analyze_by_hour(entries),   # ADR-037: 時段失敗分佈
+        "hour_breakdown": _hour_breakdown(frame),   # ADR-037: 時段失敗分佈
     }
 
 
@@ -260,7 +243,7 @@ def analyze_by_hour(entries: list[dict]) -> dict[int, dict]:
     ADR-037：依 hour_of_day 聚合失敗統計。
 
     Args:
-        entries: 日誌記錄列表（來自 _load_recent_entries）
+        entries: 日誌記錄列表
 
     Returns:
         dict mapping hour (0-23) → {
@@ -271,35 +254,54 @@ def analyze_by_hour(entries: list[dict]) -> dict[int, dict]:
             "top_modes": dict[str, int],  # 最多 3 個失敗模式
         }
     """
-    hour_data: dict[int, dict] = defaultdict(lambda: {
-        "total": 0, "errors": 0, "modes": Counter()
-    })
-
+    epochs, hours, errors, modes = [], [], [], []
     for entry in entries:
         ts = entry.get("ts", "")
         if not ts:
             continue
         try:
-            hour = datetime.fromisoformat(ts).hour
+            dt = datetime.fromisoformat(ts)
         except (ValueError, TypeError):
             continue
+        epochs.append(dt.timestamp())
+        hours.append(dt.hour)
+        errors.append(bool(entry.get("has_error")))
+        modes.append(entry.get("error_category", "unknown"))
+    return _aggregate_by_hour(epochs, hours, errors, modes)
+
+
+def _hour_breakdown(frame) -> dict[int, dict]:
+    """log_index frame 的時段失敗分佈（失敗模式只解碼錯誤列）。"""
+    errors = frame.where(frame.numeric("has_error"))
+    modes = [mode or "unknown" for mode in errors.column("error_category")]
+    return _aggregate_by_hour(frame.numeric("ts"), frame.numeric("hour"),
+                              frame.numeric("has_error"), modes, error_hours=errors.column("hour"))
 
-        hour_data[hour]["total"] += 1
-        if entry.get("has_error"):
-            hour_data[hour]["errors"] += 1
-            mode = entry.get("error_category", "unknown")
-            hour_data[hour]["modes"][mode] += 1
+
+def _aggregate_by_hour(epochs, hours, errors, modes, error_hours=None) -> dict[int, dict]:
+    """以 hour_histogram 聚合各小時總數/錯誤數；hour < 0 表示時間無法解析。
+
+    modes 與 error_hours 只需涵蓋錯誤列（error_hours 為 None 時 modes 與全部列對齊）。
+    """
+    matrix = build_matrix(epochs, errors, hours=hours)
+    if error_hours is None:
+        error_hours = [h for h, err in zip(hours, errors) if err]
+        modes = [m for m, err in zip(modes, errors) if err]
+    mode_counts: dict[int, Counter] = defaultdict(Counter)
+    for hour, mode in zip(error_hours, modes):
+        if hour >= 0:
+            mode_counts[hour][mode] += 1
 
     result = {}
-    for h, data in sorted(hour_data.items()):
-        total = data["total"]
-        errors = data["errors"]
+    for h, (total, failed) in enumerate(zip(matrix.hour_totals(), matrix.hour_failures())):
+        if not total:
+            continue
         result[h] = {
             "hour": h,
             "total": total,
-            "errors": errors,
-            "failure_rate": round(errors / total, 4) if total > 0 else 0.0,
-            "top_modes": dict(data["modes"].most_common(3)),
+            "errors": failed,
+            "failure_rate": round(failed / total, 4),
+            "top_modes": dict(mode_counts[h].most_common(3)),
         }
 
     return result